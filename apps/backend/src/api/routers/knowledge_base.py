@@ -24,6 +24,9 @@ from ...schemas.knowledge_base_schema import (
 )
 from ...services.document_processing_service import document_processing_service
 from ...services.embedding_integration_service import EmbeddingIntegrationService
+from ...services.faiss_vector_database import FaissVectorDatabase
+from ...services.sharded_vector_database import ShardedVectorDatabase
+from ...services.numpy_vector_database import NumpyVectorDatabase
 from ...core.config import settings
 from ...core.exceptions import (
     BaseAppException,
@@ -45,8 +48,53 @@ router = APIRouter(prefix="/knowledge-base", tags=["knowledge-base"])
 security = HTTPBearer()
 
 # 創建 embedding 整合服務實例
+_vector_options = dict(
+    index_factory=settings.vector_index_factory,
+    nprobe=settings.vector_nprobe,
+    ef_search=settings.vector_ef_search,
+    read_only=settings.vector_read_only,
+    rescore_factor=settings.vector_rescore_factor,
+    # 分片時每個工作程序只持有各知識庫的一部分，平分記憶體上限
+    memory_budget_bytes=(
+        settings.vector_index_memory_budget_mb * 1024 * 1024 // max(settings.vector_num_shards, 1) or None
+    ),
+    write_coalesce_max_batch=settings.vector_write_coalesce_max_batch,
+    write_coalesce_delay=settings.vector_write_coalesce_delay_ms / 1000
+)
+
+if settings.vector_db_type == "numpy":
+    _vector_database = NumpyVectorDatabase(
+        settings.vector_db_path,
+        dimension=settings.vector_dimension,
+        metric=settings.vector_metric,
+        vector_dtype=settings.vector_numpy_dtype,
+        read_only=settings.vector_read_only
+    )
+elif settings.vector_num_shards > 1:
+    _vector_database = ShardedVectorDatabase(
+        settings.vector_db_path,
+        num_shards=settings.vector_num_shards,
+        dimension=settings.vector_dimension,
+        metric=settings.vector_metric,
+        shard_options=_vector_options
+    )
+else:
+    _vector_database = FaissVectorDatabase(
+        settings.vector_db_path,
+        dimension=settings.vector_dimension,
+        metric=settings.vector_metric,
+        **_vector_options
+    )
+
 embedding_service = EmbeddingIntegrationService(
-    vector_db_path=settings.vector_db_path
+    vector_database=_vector_database,
+    lexical_index_path=settings.lexical_index_path,
+    rrf_k=settings.hybrid_search_rrf_k,
+    search_cache_size=settings.search_cache_size,
+    search_cache_max_results=settings.search_cache_max_results,
+    dedup_enabled=settings.ingest_dedup_enabled,
+    dedup_max_hamming_distance=settings.ingest_dedup_max_hamming_distance,
+    dedup_vector_threshold=settings.ingest_dedup_vector_threshold
 )
 
 
@@ -297,6 +345,9 @@ async def delete_knowledge_base(
             knowledge_base, db
         )
         
+        # 刪除向量索引（每個知識庫一個目錄，直接移除）
+        await embedding_service.delete_knowledge_base_vectors(str(knowledge_base.id))
+        
         # 刪除知識庫記錄
         db.delete(knowledge_base)
         db.commit()
@@ -516,6 +567,46 @@ async def get_embedding_status(
         )
 
 
+@router.get("/{knowledge_base_id}/vector-stats")
+async def get_vector_stats(
+    knowledge_base_id: str,
+    current_user: User = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """
+    獲取知識庫向量索引的即時計數（讀取增量維護的計數器，適合頻繁輪詢）
+    """
+    try:
+        knowledge_base = db.query(KnowledgeBase).filter(
+            KnowledgeBase.id == knowledge_base_id,
+            KnowledgeBase.user_id == current_user.id
+        ).first()
+        
+        if not knowledge_base:
+            raise NotFoundError(f"找不到知識庫: {knowledge_base_id}")
+        
+        counters = await embedding_service.get_vector_counters(str(knowledge_base.id))
+        
+        return {
+            "knowledgeBaseId": str(knowledge_base.id),
+            "totalVectors": counters.get('total_vectors', 0),
+            "activeVectors": counters.get('active_vectors', 0),
+            "deletedVectors": counters.get('deleted_vectors', 0),
+            "tombstonedVectors": counters.get('tombstoned_vectors', 0),
+            "uniqueDocuments": counters.get('unique_documents', 0),
+            "storageBytes": counters.get('storage_bytes', 0)
+        }
+        
+    except BaseAppException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取向量統計失敗: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"獲取向量統計失敗: {str(e)}"
+        )
+
+
 async def _process_embeddings_background(knowledge_base_id: str):
     """
     背景任務：處理知識庫 Embedding
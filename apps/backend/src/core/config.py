@@ -55,14 +55,31 @@ class Settings(BaseSettings):
     ollama_max_retries: int = 3
     
     # 向量資料庫設定
-    vector_db_type: str = "faiss"
+    vector_db_type: str = "faiss"  # "faiss" 或 "numpy"（純 NumPy 記憶體映射精確搜索）
+    vector_numpy_dtype: str = "float32"  # NumPy 後端的向量儲存型別（"float32" 或 "float16"）
     vector_db_path: str = "/app/data/vector_db"
     vector_dimension: int = 384
     vector_metric: str = "cosine"
+    vector_index_factory: str = "Flat"  # 例如 "SQfp16"、"SQ8"、"IVF1024,Flat"、"HNSW32"、"IVF1024,PQ32"
+    vector_nprobe: int = 16
+    vector_ef_search: int = 64
+    vector_rescore_factor: int = 4  # 量化索引以原始向量重算的候選倍數
+    vector_read_only: bool = False  # 唯讀副本以記憶體映射共用索引快照
+    vector_num_shards: int = 1  # 大於 1 時以多個工作程序分片搜索
+    vector_index_memory_budget_mb: int = 0  # 知識庫索引合計的常駐記憶體上限，超過時逐出最久未使用的索引（0 不限制）
+    vector_write_coalesce_max_batch: int = 256  # 同時到達的單筆向量寫入合併為一批的最大筆數（1 不合併）
+    vector_write_coalesce_delay_ms: float = 0.0  # 單筆寫入等待更多請求合併的毫秒數（0 只合併同時到達的寫入）
+    lexical_index_path: str = "/app/data/lexical_index"  # BM25 詞彙索引目錄
+    hybrid_search_rrf_k: int = 60  # 混合搜索倒數排名融合常數
+    search_cache_size: int = 1024  # 搜索結果快取的查詢數量上限（0 停用）
+    search_cache_max_results: int = 20000  # 搜索結果快取合計保留的結果筆數上限
     
     # Embedding 處理設定
     embedding_batch_size: int = 10
     embedding_concurrent_limit: int = 5
+    ingest_dedup_enabled: bool = False  # 導入時去除重複分塊，重複分塊共用同一個向量
+    ingest_dedup_max_hamming_distance: int = 5  # 近似重複候選的 SimHash 漢明距離上限
+    ingest_dedup_vector_threshold: float = 0.98  # 確認近似重複所需的向量餘弦相似度
     
     # 文件處理設定
     max_file_size: int = 10 * 1024 * 1024  # 10MB
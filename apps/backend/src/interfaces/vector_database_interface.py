@@ -4,10 +4,17 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Tuple, Any, Union
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Tuple, Any, Union, AsyncIterator
 from dataclasses import dataclass
 from datetime import datetime
 
+import numpy as np
+
+
+# 範圍搜索預設的結果數量上限
+DEFAULT_RANGE_SEARCH_MAX_RESULTS = 10000
+
 
 @dataclass
 class VectorSearchResult:
@@ -71,7 +78,7 @@ class VectorDatabaseInterface(ABC):
     @abstractmethod
     async def store_vectors_batch(
         self,
-        embeddings: List[List[float]],
+        embeddings: Union[List[List[float]], np.ndarray],
         document_ids: List[str],
         metadata_list: Optional[List[Dict[str, Any]]] = None
     ) -> List[str]:
@@ -79,7 +86,7 @@ class VectorDatabaseInterface(ABC):
         批次儲存向量
         
         Args:
-            embeddings: 向量數據列表
+            embeddings: 向量數據列表或 (n, dimension) 矩陣
             document_ids: 文件ID列表
             metadata_list: 元數據列表
             
@@ -101,6 +108,18 @@ class VectorDatabaseInterface(ABC):
         """
         pass
     
+    async def get_vectors(self, vector_ids: List[str]) -> List[Optional[VectorRecord]]:
+        """
+        批次根據向量ID獲取向量記錄
+        
+        Args:
+            vector_ids: 向量ID列表
+            
+        Returns:
+            List[Optional[VectorRecord]]: 與輸入順序對應的向量記錄，不存在的為None
+        """
+        return [await self.get_vector(vector_id) for vector_id in vector_ids]
+    
     @abstractmethod
     async def delete_vector(self, vector_id: str) -> bool:
         """
@@ -127,13 +146,29 @@ class VectorDatabaseInterface(ABC):
         """
         pass
     
+    async def delete_vectors_by_document_path(self, document_path: str) -> int:
+        """
+        刪除同一文件路徑下的所有分塊向量
+        
+        預設實作不支援按路徑刪除，返回0
+        
+        Args:
+            document_path: 文件路徑
+            
+        Returns:
+            int: 刪除的向量數量
+        """
+        return 0
+    
     @abstractmethod
     async def similarity_search(
         self,
         query_embedding: List[float],
         top_k: int = 10,
         similarity_threshold: float = 0.7,
-        document_ids: Optional[List[str]] = None
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
     ) -> List[VectorSearchResult]:
         """
         相似性搜索
@@ -143,12 +178,126 @@ class VectorDatabaseInterface(ABC):
             top_k: 返回結果數量
             similarity_threshold: 相似度閾值
             document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式，例如 {"language": "python", "document_path": {"prefix": "src/"}}
             
         Returns:
             List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
         """
         pass
     
+    async def similarity_search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[VectorSearchResult]]:
+        """
+        批次相似性搜索
+        
+        預設實作逐一呼叫 similarity_search，實作可覆寫為單次批次搜索
+        
+        Args:
+            query_embeddings: 查詢向量列表
+            top_k: 每個查詢返回的結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式，例如 {"language": "python", "document_path": {"prefix": "src/"}}
+            
+        Returns:
+            List[List[VectorSearchResult]]: 與查詢順序對應的搜索結果列表
+        """
+        return [
+            await self.similarity_search(
+                query_embedding,
+                top_k=top_k,
+                similarity_threshold=similarity_threshold,
+                document_ids=document_ids,
+                knowledge_base_ids=knowledge_base_ids,
+                metadata_filter=metadata_filter
+            )
+            for query_embedding in query_embeddings
+        ]
+    
+    async def range_search(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        max_results: Optional[int] = DEFAULT_RANGE_SEARCH_MAX_RESULTS,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[VectorSearchResult]:
+        """
+        範圍搜索，返回所有相似度不低於閾值的結果，不受 top_k 截斷
+        
+        預設實作以涵蓋所有向量的 top_k 呼叫 similarity_search，實作應覆寫為原生範圍搜索
+        
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            max_results: 結果數量上限，超過時只保留相似度最高者（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式，例如 {"language": "python", "document_path": {"prefix": "src/"}}
+            
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        top_k = max_results if max_results is not None else await self.get_vector_count()
+        if top_k <= 0:
+            return []
+        return await self.similarity_search(
+            query_embedding,
+            top_k=top_k,
+            similarity_threshold=similarity_threshold,
+            document_ids=document_ids,
+            knowledge_base_ids=knowledge_base_ids,
+            metadata_filter=metadata_filter
+        )
+    
+    async def range_search_iter(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        batch_size: int = 1000,
+        max_results: Optional[int] = None,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[List[VectorSearchResult]]:
+        """
+        串流範圍搜索，依相似度降序逐批返回結果，適用命中數很大的查詢
+        
+        預設實作取得完整的範圍搜索結果後分批返回，實作可覆寫為逐批建立結果
+        
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            batch_size: 每批的結果數量
+            max_results: 結果數量上限（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式，例如 {"language": "python", "document_path": {"prefix": "src/"}}
+            
+        Yields:
+            List[VectorSearchResult]: 一批搜索結果
+        """
+        results = await self.range_search(
+            query_embedding,
+            similarity_threshold=similarity_threshold,
+            max_results=max_results,
+            document_ids=document_ids,
+            knowledge_base_ids=knowledge_base_ids,
+            metadata_filter=metadata_filter
+        )
+        for start in range(0, len(results), batch_size):
+            yield results[start:start + batch_size]
+    
     @abstractmethod
     async def get_vector_count(self) -> int:
         """
@@ -169,6 +318,28 @@ class VectorDatabaseInterface(ABC):
         """
         pass
     
+    def get_write_generation(self) -> Optional[int]:
+        """
+        取得寫入世代，內容改變時必須改變，供上層快取判斷失效
+        
+        預設實作不追蹤寫入，返回None（上層不應快取）
+        
+        Returns:
+            Optional[int]: 寫入世代
+        """
+        return None
+    
+    async def get_counters(self) -> Dict[str, Any]:
+        """
+        取得即時計數（總數、有效數、各知識庫向量數等）
+        
+        預設以 get_statistics 取得；增量維護計數的實作應覆寫為 O(1) 讀取
+        
+        Returns:
+            Dict[str, Any]: 計數資訊
+        """
+        return await self.get_statistics()
+    
     @abstractmethod
     async def health_check(self) -> bool:
         """
@@ -222,6 +393,82 @@ class VectorDatabaseInterface(ABC):
         """
         pass
     
+    async def get_index(
+        self,
+        index_name: str,
+        create: bool = False
+    ) -> Optional["VectorDatabaseInterface"]:
+        """
+        取得指定名稱的索引
+        
+        不支援多索引的實作將所有名稱對應到資料庫本身
+        
+        Args:
+            index_name: 索引名稱
+            create: 索引不存在時是否創建
+            
+        Returns:
+            Optional[VectorDatabaseInterface]: 索引實例，不存在且未要求創建時返回None
+        """
+        return self
+    
+    @asynccontextmanager
+    async def use_index(
+        self,
+        index_name: str,
+        create: bool = False
+    ) -> AsyncIterator[Optional["VectorDatabaseInterface"]]:
+        """
+        取得指定名稱的索引並在區塊內使用
+        
+        會逐出閒置索引的實作應覆寫為在區塊內固定索引；預設實作不逐出，直接使用 get_index
+        
+        Args:
+            index_name: 索引名稱
+            create: 索引不存在時是否創建
+            
+        Yields:
+            Optional[VectorDatabaseInterface]: 索引實例，不存在且未要求創建時為None
+        """
+        yield await self.get_index(index_name, create=create)
+    
+    async def get_index_counters(self, index_name: str) -> Optional[Dict[str, Any]]:
+        """
+        取得指定名稱索引的計數，供頻繁輪詢使用
+        
+        會逐出閒置索引的實作應覆寫為不加載索引、不影響逐出順序；預設實作經由 get_index 取得，
+        不支援多索引的實作只能提供該知識庫的有效向量數
+        
+        Args:
+            index_name: 索引名稱
+            
+        Returns:
+            Optional[Dict[str, Any]]: 計數資訊，索引不存在時返回None
+        """
+        index = await self.get_index(index_name)
+        if index is None:
+            return None
+        
+        counters = await index.get_counters()
+        if index is self:
+            return {'active_vectors': counters.get('knowledge_bases', {}).get(index_name, 0)}
+        return counters
+    
+    async def get_index_write_generation(self, index_name: str) -> Optional[int]:
+        """
+        取得指定名稱索引的寫入世代，供上層快取判斷失效
+        
+        會逐出閒置索引的實作應覆寫為不加載索引、不影響逐出順序；預設實作經由 get_index 取得
+        
+        Args:
+            index_name: 索引名稱
+            
+        Returns:
+            Optional[int]: 寫入世代，無法追蹤時返回None
+        """
+        index = await self.get_index(index_name)
+        return None if index is None else index.get_write_generation()
+    
     @abstractmethod
     async def backup_index(
         self,
@@ -0,0 +1,58 @@
+"""
+非同步讀寫鎖
+允許多個讀者同時持有，寫者獨佔；有寫者等待時新讀者需排隊，避免寫者飢餓
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class AsyncReadWriteLock:
+    """寫者優先的 asyncio 讀寫鎖"""
+
+    def __init__(self):
+        """初始化讀寫鎖"""
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @property
+    def readers(self) -> int:
+        """目前持有讀鎖的數量"""
+        return self._readers
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        """取得共享讀鎖"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._writer and self._writers_waiting == 0)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        """取得獨佔寫鎖"""
+        async with self._condition:
+            self._writers_waiting += 1
+            try:
+                await self._condition.wait_for(lambda: not self._writer and self._readers == 0)
+            finally:
+                self._writers_waiting -= 1
+                if not self._writer and self._readers == 0:
+                    # 取消等待時喚醒被本寫者擋住的讀者
+                    self._condition.notify_all()
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writer = False
+                self._condition.notify_all()
@@ -0,0 +1,297 @@
+"""
+BM25 詞彙索引
+以排序詞表加上 CSR 形式的倒排陣列儲存每個知識庫的分塊詞頻，
+補足向量搜索對識別碼、錯誤碼與函數名稱等精確字詞的召回
+"""
+
+import os
+import re
+import math
+import logging
+import numpy as np
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# 含分隔符的複合識別碼，例如 os.path.join、ORA-00942、module:function
+_COMPOUND_PATTERN = re.compile(r"\w+(?:[.\-:/]\w+)*")
+_SEPARATOR_PATTERN = re.compile(r"[.\-:/_]+")
+# 駝峰命名與數字的子詞，例如 HTTPServerError -> HTTP, Server, Error
+_SUBWORD_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+
+MAX_TOKEN_LENGTH = 64
+MAX_TERM_FREQUENCY = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    將文本切分為小寫詞彙，保留完整識別碼並加入其子詞
+
+    Args:
+        text: 文本
+
+    Returns:
+        List[str]: 詞彙列表
+    """
+    tokens: List[str] = []
+
+    # 中日韓文字沒有空白分詞，以相鄰字元的雙字組索引
+    for run in _CJK_PATTERN.findall(text):
+        tokens.extend(run[i:i + 2] for i in range(max(1, len(run) - 1)))
+
+    for match in _COMPOUND_PATTERN.finditer(_CJK_PATTERN.sub(" ", text)):
+        compound = match.group(0)
+        if len(compound) > MAX_TOKEN_LENGTH:
+            continue
+
+        lowered = compound.lower()
+        tokens.append(lowered)
+
+        subwords = [
+            subword.lower()
+            for part in _SEPARATOR_PATTERN.split(compound) if part
+            for subword in (_SUBWORD_PATTERN.findall(part) or [part])
+        ]
+        if len(subwords) > 1 or (subwords and subwords[0] != lowered):
+            tokens.extend(subwords)
+
+    return tokens
+
+
+@dataclass
+class LexicalSearchResult:
+    """詞彙搜索結果"""
+    document_id: str
+    document_path: str
+    chunk_index: int
+    score: float
+
+
+class Bm25Index:
+    """以 numpy 陣列儲存的唯讀 BM25 倒排索引"""
+
+    def __init__(self, index_file: Path, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化 BM25 索引
+
+        Args:
+            index_file: 索引文件路徑（.npz）
+            k1: 詞頻飽和參數
+            b: 文件長度正規化參數
+        """
+        self.index_file = Path(index_file)
+        self.k1 = k1
+        self.b = b
+
+        # 排序詞表與 CSR 倒排：詞 i 的分塊為 postings[offsets[i]:offsets[i + 1]]
+        self._terms = np.zeros(0, dtype='<U1')
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._frequencies = np.zeros(0, dtype=np.uint16)
+
+        # 分塊表
+        self._doc_lengths = np.zeros(0, dtype=np.int32)
+        self._document_ids = np.zeros(0, dtype='<U1')
+        self._document_paths = np.zeros(0, dtype='<U1')
+        self._chunk_indexes = np.zeros(0, dtype=np.int32)
+        self._avg_doc_length = 0.0
+
+    @property
+    def document_count(self) -> int:
+        """已索引的分塊數量"""
+        return len(self._doc_lengths)
+
+    @property
+    def term_count(self) -> int:
+        """詞表大小"""
+        return len(self._terms)
+
+    @classmethod
+    def build(
+        cls,
+        index_file: Path,
+        chunks: List[Dict[str, Any]],
+        k1: float = 1.2,
+        b: float = 0.75
+    ) -> "Bm25Index":
+        """
+        從分塊建立索引
+
+        Args:
+            index_file: 索引文件路徑
+            chunks: 分塊列表，需包含 document_id、document_path、chunk_index 與 content
+            k1: 詞頻飽和參數
+            b: 文件長度正規化參數
+
+        Returns:
+            Bm25Index: 新建立的索引（尚未保存）
+        """
+        index = cls(index_file, k1=k1, b=b)
+
+        doc_term_counts = [Counter(tokenize(chunk.get('content', ''))) for chunk in chunks]
+        vocabulary = sorted(set().union(*doc_term_counts)) if doc_term_counts else []
+        term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+
+        pair_terms: List[int] = []
+        pair_docs: List[int] = []
+        pair_freqs: List[int] = []
+        for doc, counts in enumerate(doc_term_counts):
+            for term, frequency in counts.items():
+                pair_terms.append(term_ids[term])
+                pair_docs.append(doc)
+                pair_freqs.append(frequency)
+
+        term_array = np.asarray(pair_terms, dtype=np.int64)
+        doc_array = np.asarray(pair_docs, dtype=np.int32)
+        order = np.lexsort((doc_array, term_array))
+
+        index._terms = np.array(vocabulary, dtype=str)
+        index._offsets = np.concatenate([
+            [0], np.cumsum(np.bincount(term_array, minlength=len(vocabulary)))
+        ]).astype(np.int64)
+        index._postings = doc_array[order]
+        index._frequencies = np.minimum(
+            np.asarray(pair_freqs, dtype=np.int64)[order], MAX_TERM_FREQUENCY
+        ).astype(np.uint16)
+
+        index._doc_lengths = np.array(
+            [sum(counts.values()) for counts in doc_term_counts], dtype=np.int32
+        )
+        index._document_ids = np.array([str(c['document_id']) for c in chunks], dtype=str)
+        index._document_paths = np.array([str(c.get('document_path', '')) for c in chunks], dtype=str)
+        index._chunk_indexes = np.array([int(c.get('chunk_index', 0)) for c in chunks], dtype=np.int32)
+        index._avg_doc_length = float(index._doc_lengths.mean()) if len(chunks) else 0.0
+
+        logger.debug(f"建立 BM25 索引完成: {len(chunks)} 個分塊, {len(vocabulary)} 個詞")
+        return index
+
+    def without_paths(self, document_paths: List[str]) -> "Bm25Index":
+        """
+        移除指定文件路徑的分塊，返回新的索引（與從其餘分塊重新建立的結果相同，不需重新分詞）
+
+        Args:
+            document_paths: 要移除的文件路徑
+
+        Returns:
+            Bm25Index: 新的索引（尚未保存）
+        """
+        keep = ~np.isin(self._document_paths, np.asarray(list(document_paths), dtype=str))
+        index = Bm25Index(self.index_file, k1=self.k1, b=self.b)
+
+        # 保留的倒排依原順序壓縮，分塊編號重新連續編排，不再出現的詞從詞表移除
+        kept = keep[self._postings]
+        term_ids = np.repeat(np.arange(len(self._terms)), np.diff(self._offsets))
+        counts = np.bincount(term_ids[kept], minlength=len(self._terms))
+        renumbered = (np.cumsum(keep) - 1).astype(np.int32)
+
+        index._terms = self._terms[counts > 0]
+        index._offsets = np.concatenate([[0], np.cumsum(counts[counts > 0])]).astype(np.int64)
+        index._postings = renumbered[self._postings[kept]]
+        index._frequencies = self._frequencies[kept]
+
+        index._doc_lengths = self._doc_lengths[keep]
+        index._document_ids = self._document_ids[keep]
+        index._document_paths = self._document_paths[keep]
+        index._chunk_indexes = self._chunk_indexes[keep]
+        index._avg_doc_length = float(index._doc_lengths.mean()) if len(index._doc_lengths) else 0.0
+        return index
+
+    def save(self) -> None:
+        """以暫存文件寫入並原子替換索引文件"""
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+
+        with open(tmp_file, 'wb') as f:
+            np.savez(
+                f,
+                params=np.array([self.k1, self.b], dtype=np.float64),
+                terms=self._terms,
+                offsets=self._offsets,
+                postings=self._postings,
+                frequencies=self._frequencies,
+                doc_lengths=self._doc_lengths,
+                document_ids=self._document_ids,
+                document_paths=self._document_paths,
+                chunk_indexes=self._chunk_indexes
+            )
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_file, self.index_file)
+
+    def load(self) -> bool:
+        """
+        載入索引文件
+
+        Returns:
+            bool: 是否載入成功
+        """
+        if not self.index_file.exists():
+            return False
+
+        try:
+            with np.load(self.index_file, allow_pickle=False) as data:
+                self.k1, self.b = (float(value) for value in data['params'])
+                self._terms = data['terms']
+                self._offsets = data['offsets']
+                self._postings = data['postings']
+                self._frequencies = data['frequencies']
+                self._doc_lengths = data['doc_lengths']
+                self._document_ids = data['document_ids']
+                self._document_paths = data['document_paths']
+                self._chunk_indexes = data['chunk_indexes']
+        except (ValueError, OSError, KeyError) as e:
+            logger.warning(f"無法載入 BM25 索引: {self.index_file} - {str(e)}")
+            return False
+
+        self._avg_doc_length = float(self._doc_lengths.mean()) if len(self._doc_lengths) else 0.0
+        return True
+
+    def search(self, query: str, top_k: int = 10) -> List[LexicalSearchResult]:
+        """
+        以 BM25 分數搜索分塊
+
+        Args:
+            query: 查詢文本
+            top_k: 返回結果數量
+
+        Returns:
+            List[LexicalSearchResult]: 依分數由高到低排序的結果
+        """
+        if self.document_count == 0 or top_k <= 0:
+            return []
+
+        scores = np.zeros(self.document_count, dtype=np.float32)
+        total = self.document_count
+
+        for term in set(tokenize(query)):
+            position = int(np.searchsorted(self._terms, term))
+            if position >= len(self._terms) or self._terms[position] != term:
+                continue
+
+            start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+            docs = self._postings[start:end]
+            frequencies = self._frequencies[start:end].astype(np.float32)
+
+            idf = math.log(1 + (total - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[docs] / max(self._avg_doc_length, 1e-9))
+            scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+
+        return [
+            LexicalSearchResult(
+                document_id=str(self._document_ids[doc]),
+                document_path=str(self._document_paths[doc]),
+                chunk_index=int(self._chunk_indexes[doc]),
+                score=float(scores[doc])
+            )
+            for doc in matched.tolist()
+        ]
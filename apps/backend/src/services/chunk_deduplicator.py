@@ -0,0 +1,204 @@
+"""
+分塊去重
+導入時以內容雜湊找出完全相同的分塊，以 SimHash 找出近似重複的候選，
+再以向量相似度確認，重複的分塊只儲存一次向量
+"""
+
+import re
+import hashlib
+import numpy as np
+from collections import defaultdict
+from typing import List, Dict, Optional
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+SIMHASH_BITS = 64
+
+
+def content_digest(content: str) -> bytes:
+    """
+    計算忽略空白差異的內容雜湊
+
+    Args:
+        content: 分塊內容
+
+    Returns:
+        bytes: SHA-256 雜湊
+    """
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).digest()
+
+
+def simhash(content: str) -> int:
+    """
+    以小寫詞彙（依出現次數加權）計算 64 位元 SimHash，內容相近的分塊只有少數位元不同
+
+    Args:
+        content: 分塊內容
+
+    Returns:
+        int: SimHash 值
+    """
+    words = _WORD_PATTERN.findall(content.lower()) or [""]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest(), "little") for w in words],
+        dtype=np.uint64
+    )
+    weights = _bits(hashes).sum(axis=0, dtype=np.int64) * 2 - len(words)
+    return int(np.packbits(weights > 0, bitorder="little").view("<u8")[0])
+
+
+def _bits(values: np.ndarray) -> np.ndarray:
+    """將 uint64 陣列展開為位元矩陣 (n, 64)，第 i 欄為第 i 個位元"""
+    return np.unpackbits(values.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+
+
+class ChunkDeduplicator:
+    """
+    一次導入中的分塊去重狀態
+
+    近似重複以 SimHash 的漢明距離篩選：64 位元切成 max_hamming_distance + 1 段，
+    距離不超過門檻的兩個值至少有一段完全相同，因此只需比較同段的代表分塊
+    """
+
+    def __init__(
+        self,
+        max_hamming_distance: int = 5,
+        vector_threshold: float = 0.98,
+        max_candidates: int = 8
+    ):
+        """
+        初始化分塊去重
+
+        Args:
+            max_hamming_distance: 近似重複候選的 SimHash 漢明距離上限（0 到 15）
+            vector_threshold: 確認為重複所需的向量餘弦相似度
+            max_candidates: 每個分塊最多以向量比較的候選數
+        """
+        if not 0 <= max_hamming_distance < 16:
+            raise ValueError(f"漢明距離上限必須介於 0 到 15: {max_hamming_distance}")
+
+        self.max_hamming_distance = max_hamming_distance
+        self.vector_threshold = vector_threshold
+        self.max_candidates = max_candidates
+
+        bands = max_hamming_distance + 1
+        self._band_bits = SIMHASH_BITS // bands
+        self._bands = bands
+
+        self._digests: Dict[bytes, int] = {}
+        self._aliases: Dict[int, int] = {}
+
+        # 代表分塊依登記順序編號，SimHash 與單位向量以編號存取
+        self._keys: List[int] = []
+        self._simhashes = np.zeros(0, dtype=np.uint64)
+        self._embeddings: List[np.ndarray] = []
+        self._band_buckets: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(bands)]
+
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    @property
+    def duplicates(self) -> int:
+        """已找到的重複分塊數"""
+        return self.exact_duplicates + self.near_duplicates
+
+    def representative(self, key: int) -> int:
+        """
+        取得分塊最終的代表分塊
+
+        Args:
+            key: 分塊鍵
+
+        Returns:
+            int: 代表分塊鍵（分塊本身不是重複時為自己）
+        """
+        while key in self._aliases:
+            key = self._aliases[key]
+        return key
+
+    def exact_duplicate(self, key: int, content: str) -> Optional[int]:
+        """
+        檢查內容是否與先前的分塊完全相同，不同時登記內容雜湊
+
+        在產生 Embedding 之前呼叫，完全重複的分塊不需要 Embedding
+
+        Args:
+            key: 分塊鍵
+            content: 分塊內容
+
+        Returns:
+            Optional[int]: 相同內容的分塊鍵，沒有時為 None
+        """
+        digest = content_digest(content)
+        previous = self._digests.get(digest)
+        if previous is None:
+            self._digests[digest] = key
+            return None
+
+        self._aliases[key] = previous
+        self.exact_duplicates += 1
+        return previous
+
+    def near_duplicate(self, key: int, content: str, embedding: np.ndarray) -> Optional[int]:
+        """
+        以 SimHash 候選與向量相似度檢查近似重複，不重複時登記為代表分塊
+
+        Args:
+            key: 分塊鍵
+            content: 分塊內容
+            embedding: 分塊向量
+
+        Returns:
+            Optional[int]: 近似重複的代表分塊鍵，沒有時為 None
+        """
+        value = simhash(content)
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+        match = self._best_match(value, vector)
+        if match is not None:
+            self._aliases[key] = match
+            self.near_duplicates += 1
+            return match
+
+        ordinal = len(self._keys)
+        if ordinal == len(self._simhashes):
+            self._simhashes = np.concatenate([self._simhashes, np.zeros(max(ordinal, 64), dtype=np.uint64)])
+        self._simhashes[ordinal] = value
+        self._keys.append(key)
+        self._embeddings.append(vector)
+        for band, bucket in zip(self._band_values(value), self._band_buckets):
+            bucket[band].append(ordinal)
+        return None
+
+    def _band_values(self, value: int) -> List[int]:
+        """SimHash 各段的值（最後一段包含剩餘位元）"""
+        mask = (1 << self._band_bits) - 1
+        values = [(value >> (i * self._band_bits)) & mask for i in range(self._bands - 1)]
+        values.append(value >> ((self._bands - 1) * self._band_bits))
+        return values
+
+    def _best_match(self, value: int, vector: np.ndarray) -> Optional[int]:
+        """在漢明距離內最近的候選中找出向量相似度最高且達到門檻的代表分塊"""
+        ordinals = np.fromiter(
+            {
+                ordinal
+                for band, bucket in zip(self._band_values(value), self._band_buckets)
+                for ordinal in bucket.get(band, ())
+            },
+            dtype=np.int64
+        )
+        if not len(ordinals):
+            return None
+
+        distances = _bits(self._simhashes[ordinals] ^ np.uint64(value)).sum(axis=1)
+        close = np.flatnonzero(distances <= self.max_hamming_distance)
+        close = close[np.argsort(distances[close], kind='stable')][:self.max_candidates]
+        if not len(close):
+            return None
+
+        similarities = np.stack([self._embeddings[ordinal] for ordinal in ordinals[close]]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.vector_threshold:
+            return None
+        return self._keys[ordinals[close][best]]
@@ -3,25 +3,39 @@ Embedding 整合服務
 整合文件處理、Embedding 生成和向量資料庫儲存的完整工作流程
 """
 
+import re
+import heapq
 import logging
 import asyncio
-from typing import List, Dict, Optional, Any, Tuple
+from pathlib import Path
+from contextlib import AsyncExitStack
+from typing import List, Dict, Optional, Any, Tuple, Set
 from datetime import datetime
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from .document_processing_service import DocumentProcessingService, DocumentMetadata, ChunkingStrategy
 from .ollama_embedding_service import OllamaEmbeddingService, EmbeddingConfig
 from .faiss_vector_database import FaissVectorDatabase
+from .bm25_index import Bm25Index, LexicalSearchResult
+from .search_result_cache import SearchResultCache
+from .chunk_deduplicator import ChunkDeduplicator
+from .vector_metadata_filter import parse_metadata_filter
 from ..interfaces.vector_database_interface import VectorDatabaseInterface
 from ..models.knowledge_base import KnowledgeBase, DocumentChunk, KnowledgeBaseStatus
 from ..core.exceptions import BaseAppException, ServiceError
 
 logger = logging.getLogger(__name__)
 
+# 搜索模式：向量與詞彙混合（倒數排名融合）、純向量、純詞彙
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+
+_LEXICAL_INDEX_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_\-]{1,128}$")
+
 
 class EmbeddingProcessingStatus(Enum):
     """Embedding 處理狀態"""
@@ -44,6 +58,8 @@ class EmbeddingProcessingResult:
     stored_vectors: int
     processing_time_seconds: float
     error_details: Optional[str] = None
+    duplicate_chunks: int = 0
+    saved_vector_bytes: int = 0
 
 
 class EmbeddingProcessingError(BaseAppException):
@@ -52,7 +68,7 @@ class EmbeddingProcessingError(BaseAppException):
         super().__init__(
             status_code=500,
             message=f"Embedding 處理失敗: {message}",
-            error_code="EMBEDDING_PROCESSING_ERROR",
+            code="EMBEDDING_PROCESSING_ERROR",
             details=details
         )
 
@@ -67,7 +83,14 @@ class EmbeddingIntegrationService:
         vector_database: Optional[VectorDatabaseInterface] = None,
         chunking_strategy: Optional[ChunkingStrategy] = None,
         embedding_config: Optional[EmbeddingConfig] = None,
-        vector_db_path: Optional[str] = None
+        vector_db_path: Optional[str] = None,
+        lexical_index_path: Optional[str] = None,
+        rrf_k: int = 60,
+        search_cache_size: int = 1024,
+        search_cache_max_results: int = 20000,
+        dedup_enabled: bool = False,
+        dedup_max_hamming_distance: int = 5,
+        dedup_vector_threshold: float = 0.98
     ):
         """
         初始化 Embedding 整合服務
@@ -79,6 +102,13 @@ class EmbeddingIntegrationService:
             chunking_strategy: 分塊策略
             embedding_config: Embedding 配置
             vector_db_path: 向量資料庫路徑
+            lexical_index_path: BM25 詞彙索引目錄，未設定時只使用向量搜索
+            rrf_k: 倒數排名融合的平滑常數
+            search_cache_size: 搜索結果快取的查詢數量上限（0 表示停用）
+            search_cache_max_results: 搜索結果快取合計保留的結果筆數上限
+            dedup_enabled: 導入時是否去除重複分塊（重複分塊共用代表分塊的向量）
+            dedup_max_hamming_distance: 近似重複候選的 SimHash 漢明距離上限
+            dedup_vector_threshold: 確認近似重複所需的向量餘弦相似度
         """
         self.document_service = document_service or DocumentProcessingService(chunking_strategy)
         self.embedding_config = embedding_config or EmbeddingConfig()
@@ -91,6 +121,18 @@ class EmbeddingIntegrationService:
         
         self._processing_lock = asyncio.Lock()
         self._processing_status: Dict[str, EmbeddingProcessingStatus] = {}
+        
+        # 每個知識庫一個 BM25 索引，按需加載
+        self.lexical_index_path = Path(lexical_index_path) if lexical_index_path else None
+        self.rrf_k = rrf_k
+        self._lexical_indexes: Dict[str, Bm25Index] = {}
+        
+        # 搜索結果快取，以向量索引的寫入世代判斷失效
+        self._search_cache = SearchResultCache(search_cache_size, search_cache_max_results)
+        
+        self.dedup_enabled = dedup_enabled
+        self.dedup_max_hamming_distance = dedup_max_hamming_distance
+        self.dedup_vector_threshold = dedup_vector_threshold
     
     async def initialize(self) -> bool:
         """初始化所有服務組件"""
@@ -176,6 +218,7 @@ class EmbeddingIntegrationService:
         """
         start_time = datetime.now()
         knowledge_base_id = str(knowledge_base.id)
+        index_scope = AsyncExitStack()
         
         try:
             async with self._processing_lock:
@@ -237,6 +280,9 @@ class EmbeddingIntegrationService:
             
             logger.info(f"總共生成 {len(all_chunks)} 個文本分塊")
             
+            # 詞彙索引不依賴 Embedding 服務，先行建立
+            await self._build_lexical_index(knowledge_base_id, all_chunks)
+            
             # 3. 生成 Embeddings
             self._processing_status[knowledge_base_id] = EmbeddingProcessingStatus.GENERATING_EMBEDDINGS
             
@@ -245,66 +291,110 @@ class EmbeddingIntegrationService:
             
             embedded_chunks = 0
             stored_vectors = 0
+            vector_bytes = 0
+            replaced_paths = set()
+            ingested_paths = {chunk['document_path'] for chunk in all_chunks}
+            
+            # 去重時重複分塊引用代表分塊的向量ID（以分塊在 all_chunks 中的位置為鍵）
+            deduplicator = None
+            chunk_vector_ids: Dict[int, str] = {}
+            if self.dedup_enabled:
+                deduplicator = ChunkDeduplicator(self.dedup_max_hamming_distance, self.dedup_vector_threshold)
+            
+            # 每個知識庫使用獨立的向量索引，處理期間固定，不會因記憶體上限被逐出
+            vector_index = None
+            if self.vector_database:
+                vector_index = await index_scope.enter_async_context(
+                    self.vector_database.use_index(knowledge_base_id, create=True)
+                )
             
             # 批次處理分塊
             for i in range(0, len(all_chunks), batch_size):
                 batch_chunks = all_chunks[i:i + batch_size]
                 
                 try:
-                    # 提取文本內容
-                    batch_texts = [chunk['content'] for chunk in batch_chunks]
+                    # 完全重複的分塊不需要 Embedding
+                    embed_positions = list(range(len(batch_chunks)))
+                    if deduplicator:
+                        embed_positions = [
+                            j for j, chunk in enumerate(batch_chunks)
+                            if deduplicator.exact_duplicate(i + j, chunk['content']) is None
+                        ]
                     
-                    # 生成 Embeddings
-                    embeddings = await self.embedding_service.generate_embeddings_batch(
-                        batch_texts, 
-                        batch_size=min(len(batch_texts), 5)  # 控制並發數
-                    )
+                    # 提取文本內容
+                    batch_texts = [batch_chunks[j]['content'] for j in embed_positions]
                     
-                    embedded_chunks += len(embeddings)
+                    # 生成 Embeddings（float32 矩陣，直接交給向量資料庫）
+                    embeddings = None
+                    if batch_texts:
+                        embeddings = await self.embedding_service.generate_embeddings_array(
+                            batch_texts, 
+                            batch_size=min(len(batch_texts), 5)  # 控制並發數
+                        )
+                        embedded_chunks += len(embeddings)
+                        vector_bytes = embeddings.shape[1] * embeddings.dtype.itemsize
                     
                     if progress_callback:
-                        progress = 0.5 + (embedded_chunks / len(all_chunks)) * 0.3  # Embedding 佔30%
+                        handled = i + len(batch_chunks)
+                        progress = 0.5 + (handled / len(all_chunks)) * 0.3  # Embedding 佔30%
                         await progress_callback(f"已生成 {embedded_chunks}/{len(all_chunks)} 個 Embeddings", progress)
                     
+                    # 近似重複以 SimHash 候選與向量相似度確認，只有代表分塊寫入向量資料庫
+                    store_positions = list(range(len(embed_positions)))
+                    if deduplicator and embeddings is not None:
+                        store_positions = [
+                            k for k, j in enumerate(embed_positions)
+                            if deduplicator.near_duplicate(i + j, batch_chunks[j]['content'], embeddings[k]) is None
+                        ]
+                    store_chunks = [batch_chunks[embed_positions[k]] for k in store_positions]
+                    
                     # 4. 儲存到向量資料庫
-                    if self.vector_database:
+                    if vector_index:
                         self._processing_status[knowledge_base_id] = EmbeddingProcessingStatus.STORING_VECTORS
                         
+                        # 重新導入時先以文件倒排索引移除同一文件的舊向量；
+                        # 去重時本次未導入文件的重複分塊可能共用這些向量，先將其提升為代表分塊
+                        for document_path in {chunk['document_path'] for chunk in batch_chunks} - replaced_paths:
+                            if deduplicator:
+                                await self._promote_duplicates(
+                                    vector_index, knowledge_base_id, document_path, db, ingested_paths
+                                )
+                            await vector_index.delete_vectors_by_document_path(document_path)
+                            replaced_paths.add(document_path)
+                        
                         # 準備向量資料庫儲存的資料
-                        document_ids = [f"{knowledge_base_id}_{chunk['document_path']}_{chunk['chunk_index']}" 
-                                       for chunk in batch_chunks]
+                        document_ids = [self._chunk_document_id(knowledge_base_id, chunk)
+                                        for chunk in store_chunks]
                         
-                        metadata_list = [
-                            {
-                                'knowledge_base_id': knowledge_base_id,
-                                'document_path': chunk['document_path'],
-                                'chunk_index': chunk['chunk_index'],
-                                'chunk_size': chunk['chunk_size'],
-                                'language': chunk.get('language', 'unknown'),
-                                'file_type': chunk.get('file_type', ''),
-                                'encoding': chunk.get('encoding', '')
-                            }
-                            for chunk in batch_chunks
-                        ]
+                        metadata_list = [self._chunk_vector_metadata(knowledge_base_id, chunk)
+                                         for chunk in store_chunks]
                         
                         # 批次儲存向量
-                        vector_ids = await self.vector_database.store_vectors_batch(
-                            embeddings, 
-                            document_ids, 
-                            metadata_list
-                        )
+                        vector_ids = []
+                        if store_chunks:
+                            store_embeddings = embeddings
+                            if len(store_positions) != len(embeddings):
+                                store_embeddings = embeddings[store_positions]
+                            vector_ids = await vector_index.store_vectors_batch(
+                                store_embeddings, 
+                                document_ids, 
+                                metadata_list
+                            )
                         
                         stored_vectors += len(vector_ids)
+                        for k, vector_id in zip(store_positions, vector_ids):
+                            chunk_vector_ids[i + embed_positions[k]] = vector_id
                         
                         logger.debug(f"批次儲存 {len(vector_ids)} 個向量")
                     
-                    # 5. 儲存到 PostgreSQL
-                    for j, (chunk, embedding) in enumerate(zip(batch_chunks, embeddings)):
+                    # 5. 儲存到 PostgreSQL（重複分塊引用代表分塊的向量ID）
+                    for j, chunk in enumerate(batch_chunks):
                         try:
                             # 獲取對應的向量ID（如果有）
                             vector_id = None
-                            if self.vector_database and j < len(vector_ids):
-                                vector_id = vector_ids[j]
+                            if vector_index:
+                                position = deduplicator.representative(i + j) if deduplicator else i + j
+                                vector_id = chunk_vector_ids.get(position)
                             
                             # 創建 DocumentChunk 記錄
                             chunk_record = DocumentChunk(
@@ -353,6 +443,8 @@ class EmbeddingIntegrationService:
             
             # 計算處理時間
             processing_time = (datetime.now() - start_time).total_seconds()
+            duplicate_chunks = deduplicator.duplicates if deduplicator else 0
+            saved_vector_bytes = duplicate_chunks * vector_bytes
             
             # 更新處理狀態
             self._processing_status[knowledge_base_id] = EmbeddingProcessingStatus.COMPLETED
@@ -364,7 +456,9 @@ class EmbeddingIntegrationService:
                 total_chunks=len(all_chunks),
                 embedded_chunks=embedded_chunks,
                 stored_vectors=stored_vectors,
-                processing_time_seconds=processing_time
+                processing_time_seconds=processing_time,
+                duplicate_chunks=duplicate_chunks,
+                saved_vector_bytes=saved_vector_bytes
             )
             
             if progress_callback:
@@ -373,6 +467,10 @@ class EmbeddingIntegrationService:
             logger.info(f"知識庫 Embedding 處理完成: {knowledge_base.name}, "
                        f"文件: {processed_files}, 分塊: {len(all_chunks)}, "
                        f"向量: {stored_vectors}, 耗時: {processing_time:.2f}秒")
+            if deduplicator:
+                logger.info(f"去除重複分塊: 完全重複 {deduplicator.exact_duplicates}, "
+                           f"近似重複 {deduplicator.near_duplicates}, "
+                           f"節省向量空間 {saved_vector_bytes} 字節")
             
             return result
             
@@ -400,72 +498,494 @@ class EmbeddingIntegrationService:
                 processing_time_seconds=processing_time,
                 error_details=str(e)
             )
+        
+        finally:
+            await index_scope.aclose()
     
     async def search_similar_chunks(
         self,
         query_text: str,
         knowledge_base_id: Optional[str] = None,
         top_k: int = 10,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        search_mode: str = "hybrid",
+        metadata_filter: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         搜索相似的文本分塊
         
+        知識庫有 BM25 索引時，混合模式以倒數排名融合合併向量與詞彙結果；
+        Embedding 服務不可用時退回純詞彙搜索。詞彙索引不含語言與文件類型等欄位，
+        指定元數據過濾時混合模式只使用向量搜索，純詞彙模式不支援過濾
+        
         Args:
             query_text: 查詢文本
-            knowledge_base_id: 限制搜索的知識庫ID
+            knowledge_base_id: 限制搜索的知識庫ID，未指定時搜索所有知識庫的索引
             top_k: 返回結果數量
-            similarity_threshold: 相似度閾值
+            similarity_threshold: 相似度閾值（只作用於向量結果）
+            search_mode: 搜索模式（"hybrid"、"vector" 或 "lexical"）
+            metadata_filter: 元數據過濾表達式，例如 {"file_type": ".py", "document_path": {"prefix": "src/"}}
             
         Returns:
             List[Dict[str, Any]]: 搜索結果
         """
         try:
-            if not self.vector_database:
-                raise ServiceError("向量資料庫未初始化")
-            
-            # 生成查詢向量
-            query_embedding = await self.embedding_service.generate_embedding(query_text)
-            
-            # 設置文件ID過濾（如果指定了知識庫）
-            document_ids = None
-            if knowledge_base_id:
-                # 生成該知識庫的文件ID模式
-                document_ids = [f"{knowledge_base_id}_*"]  # 這需要向量資料庫支援模式匹配
-            
-            # 執行相似性搜索
-            search_results = await self.vector_database.similarity_search(
-                query_embedding,
-                top_k=top_k,
-                similarity_threshold=similarity_threshold,
-                document_ids=document_ids
-            )
+            if search_mode not in SEARCH_MODES:
+                raise ServiceError(f"不支援的搜索模式: {search_mode}")
             
-            # 格式化結果
-            formatted_results = []
-            for result in search_results:
-                formatted_result = {
-                    'vector_id': result.vector_id,
-                    'document_id': result.document_id,
-                    'similarity_score': result.similarity_score,
-                    'metadata': result.metadata,
-                    'content': result.metadata.get('content', ''),  # 如果元數據中有內容
-                    'document_path': result.metadata.get('document_path', ''),
-                    'chunk_index': result.metadata.get('chunk_index', 0)
-                }
-                formatted_results.append(formatted_result)
-            
-            logger.info(f"相似性搜索完成: 查詢='{query_text[:50]}...', 結果數={len(formatted_results)}")
-            return formatted_results
+            try:
+                filter_conditions = parse_metadata_filter(metadata_filter)
+            except ValueError as e:
+                raise ServiceError(f"元數據過濾表達式不合法: {str(e)}")
+            if filter_conditions and search_mode == "lexical":
+                raise ServiceError("純詞彙搜索不支援元數據過濾")
+            
+            cache_key = None
+            generation = None
+            if self._search_cache.enabled:
+                generation = await self._search_generation(knowledge_base_id, search_mode)
+                if generation is not None:
+                    cache_key = SearchResultCache.make_key(
+                        query_text, knowledge_base_id, top_k, similarity_threshold, search_mode, filter_conditions
+                    )
+                    cached_results = self._search_cache.get(cache_key, generation)
+                    if cached_results is not None:
+                        return cached_results
+            
+            lexical_index = None
+            if knowledge_base_id and search_mode != "vector" and not filter_conditions:
+                lexical_index = await self._get_lexical_index(knowledge_base_id)
+            
+            if search_mode == "lexical":
+                if lexical_index is None:
+                    return []
+                lexical_results = await asyncio.to_thread(lexical_index.search, query_text, top_k)
+                formatted_results = [self._format_lexical_result(result) for result in lexical_results]
+                if cache_key is not None:
+                    self._search_cache.put(cache_key, generation, formatted_results)
+                return formatted_results
+            
+            if lexical_index is None:
+                formatted_results = await self._vector_search(
+                    query_text, knowledge_base_id, top_k, similarity_threshold, metadata_filter
+                )
+                if cache_key is not None:
+                    self._search_cache.put(cache_key, generation, formatted_results)
+                logger.info(f"相似性搜索完成: 查詢='{query_text[:50]}...', 結果數={len(formatted_results)}")
+                return formatted_results
+            
+            # 混合搜索：兩路各取較深的候選後融合
+            candidate_k = top_k * 3
+            try:
+                vector_results = await self._vector_search(
+                    query_text, knowledge_base_id, candidate_k, similarity_threshold
+                )
+            except Exception as e:
+                logger.warning(f"向量搜索不可用，僅使用詞彙搜索: {str(e)}")
+                vector_results = []
+                # 降級結果不快取，服務恢復後即可得到完整結果
+                cache_key = None
+            
+            lexical_results = await asyncio.to_thread(lexical_index.search, query_text, candidate_k)
+            fused_results = self._fuse_results(vector_results, lexical_results)[:top_k]
+            if cache_key is not None:
+                self._search_cache.put(cache_key, generation, fused_results)
+            
+            logger.info(f"混合搜索完成: 查詢='{query_text[:50]}...', 向量={len(vector_results)}, "
+                        f"詞彙={len(lexical_results)}, 結果數={len(fused_results)}")
+            return fused_results
             
         except Exception as e:
             logger.error(f"相似性搜索失敗: {str(e)}")
             raise ServiceError(f"相似性搜索失敗: {str(e)}")
     
+    async def _search_generation(self, knowledge_base_id: Optional[str], search_mode: str) -> Optional[Any]:
+        """
+        取得搜索所依賴內容的寫入世代，無法追蹤時返回None（不快取）
+        
+        純詞彙搜索只依賴 BM25 索引，其重建或刪除時直接清除該知識庫的快取條目
+        """
+        if search_mode == "lexical":
+            return "lexical"
+        
+        if not self.vector_database:
+            return None
+        
+        # 每次快取探測都會查詢，不可加載未常駐的索引
+        if knowledge_base_id:
+            return await self.vector_database.get_index_write_generation(knowledge_base_id)
+        
+        # 未指定知識庫的搜索涵蓋所有索引，任一索引無法追蹤時不快取
+        generations = []
+        for index_name in await self.vector_database.list_indexes():
+            generation = await self.vector_database.get_index_write_generation(index_name)
+            if generation is None:
+                return None
+            generations.append((index_name, generation))
+        return tuple(generations)
+    
+    async def _vector_search(
+        self,
+        query_text: str,
+        knowledge_base_id: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """以 Embedding 執行向量搜索並格式化結果"""
+        if not self.vector_database:
+            raise ServiceError("向量資料庫未初始化")
+        
+        # 生成查詢向量
+        query_embedding = await self.embedding_service.generate_embedding(query_text)
+        
+        # 指定知識庫時只搜索該知識庫的索引，否則搜索所有索引後合併各自的 top-k
+        index_names = [knowledge_base_id] if knowledge_base_id else await self.vector_database.list_indexes()
+        search_results = []
+        searched = []
+        for index_name in index_names:
+            # 逐一固定索引（搜索期間不被逐出），不同時固定所有索引
+            async with self.vector_database.use_index(index_name) as vector_index:
+                # 不支援多索引的實作所有名稱都對應到資料庫本身，只搜索一次
+                if vector_index is None or any(vector_index is index for index in searched):
+                    continue
+                searched.append(vector_index)
+                
+                knowledge_base_ids = None
+                if knowledge_base_id and vector_index is self.vector_database:
+                    # 不支援多索引的實作在搜索時以知識庫ID預先過濾
+                    knowledge_base_ids = [knowledge_base_id]
+                
+                # 執行相似性搜索
+                search_results.extend(await vector_index.similarity_search(
+                    query_embedding,
+                    top_k=top_k,
+                    similarity_threshold=similarity_threshold,
+                    knowledge_base_ids=knowledge_base_ids,
+                    metadata_filter=metadata_filter
+                ))
+        
+        if len(searched) > 1:
+            search_results = heapq.nlargest(top_k, search_results, key=lambda result: result.similarity_score)
+        
+        # 格式化結果
+        formatted_results = []
+        for result in search_results:
+            formatted_result = {
+                'vector_id': result.vector_id,
+                'document_id': result.document_id,
+                'similarity_score': result.similarity_score,
+                'metadata': result.metadata,
+                'content': result.metadata.get('content', ''),  # 如果元數據中有內容
+                'document_path': result.metadata.get('document_path', ''),
+                'chunk_index': result.metadata.get('chunk_index', 0)
+            }
+            formatted_results.append(formatted_result)
+        
+        return formatted_results
+    
+    @staticmethod
+    def _format_lexical_result(result: LexicalSearchResult) -> Dict[str, Any]:
+        """將詞彙搜索結果格式化為與向量結果相同的結構"""
+        return {
+            'vector_id': None,
+            'document_id': result.document_id,
+            'similarity_score': 0.0,
+            'lexical_score': result.score,
+            'metadata': {'document_path': result.document_path, 'chunk_index': result.chunk_index},
+            'content': '',
+            'document_path': result.document_path,
+            'chunk_index': result.chunk_index
+        }
+    
+    def _fuse_results(
+        self,
+        vector_results: List[Dict[str, Any]],
+        lexical_results: List[LexicalSearchResult]
+    ) -> List[Dict[str, Any]]:
+        """
+        以倒數排名融合（RRF）合併向量與詞彙結果
+        
+        Args:
+            vector_results: 依相似度排序的向量結果
+            lexical_results: 依 BM25 分數排序的詞彙結果
+            
+        Returns:
+            List[Dict[str, Any]]: 依融合分數排序的結果
+        """
+        fused: Dict[str, Dict[str, Any]] = {}
+        
+        for rank, result in enumerate(vector_results):
+            fused[result['document_id']] = {**result, 'fusion_score': 1.0 / (self.rrf_k + rank + 1)}
+        
+        for rank, result in enumerate(lexical_results):
+            entry = fused.get(result.document_id)
+            if entry is None:
+                entry = self._format_lexical_result(result)
+                entry['fusion_score'] = 0.0
+                fused[result.document_id] = entry
+            entry['lexical_score'] = result.score
+            entry['fusion_score'] += 1.0 / (self.rrf_k + rank + 1)
+        
+        return sorted(fused.values(), key=lambda entry: entry['fusion_score'], reverse=True)
+    
+    def _lexical_index_file(self, knowledge_base_id: str) -> Optional[Path]:
+        """知識庫 BM25 索引文件路徑，未設定目錄或ID不合法時返回None"""
+        if self.lexical_index_path is None or not _LEXICAL_INDEX_NAME_PATTERN.match(knowledge_base_id):
+            return None
+        return self.lexical_index_path / f"{knowledge_base_id}.bm25.npz"
+    
+    async def _get_lexical_index(self, knowledge_base_id: str) -> Optional[Bm25Index]:
+        """取得知識庫的 BM25 索引，不存在時返回None"""
+        lexical_index = self._lexical_indexes.get(knowledge_base_id)
+        if lexical_index is not None:
+            return lexical_index
+        
+        index_file = self._lexical_index_file(knowledge_base_id)
+        if index_file is None or not index_file.exists():
+            return None
+        
+        lexical_index = Bm25Index(index_file)
+        if not await asyncio.to_thread(lexical_index.load):
+            return None
+        
+        self._lexical_indexes[knowledge_base_id] = lexical_index
+        return lexical_index
+    
+    async def _build_lexical_index(self, knowledge_base_id: str, chunks: List[Dict[str, Any]]) -> None:
+        """從分塊內容建立並保存知識庫的 BM25 索引（失敗不影響向量處理）"""
+        index_file = self._lexical_index_file(knowledge_base_id)
+        if index_file is None:
+            return
+        
+        try:
+            documents = [
+                {**chunk, 'document_id': self._chunk_document_id(knowledge_base_id, chunk)}
+                for chunk in chunks
+            ]
+            lexical_index = await asyncio.to_thread(Bm25Index.build, index_file, documents)
+            await asyncio.to_thread(lexical_index.save)
+            self._lexical_indexes[knowledge_base_id] = lexical_index
+            self._search_cache.invalidate_knowledge_base(knowledge_base_id)
+            
+            logger.info(f"BM25 索引建立完成: {knowledge_base_id}, "
+                        f"分塊: {lexical_index.document_count}, 詞彙: {lexical_index.term_count}")
+            
+        except Exception as e:
+            logger.error(f"建立 BM25 索引失敗: {knowledge_base_id} - {str(e)}")
+    
+    async def _remove_lexical_document(self, knowledge_base_id: str, document_path: str) -> None:
+        """從知識庫的 BM25 索引移除文件的分塊並保存"""
+        lexical_index = await self._get_lexical_index(knowledge_base_id)
+        if lexical_index is None:
+            return
+        
+        filtered = await asyncio.to_thread(lexical_index.without_paths, [document_path])
+        await asyncio.to_thread(filtered.save)
+        self._lexical_indexes[knowledge_base_id] = filtered
+    
+    @staticmethod
+    def _chunk_document_id(knowledge_base_id: str, chunk: Dict[str, Any]) -> str:
+        """分塊在向量與詞彙索引中共用的文件ID"""
+        return f"{knowledge_base_id}_{chunk['document_path']}_{chunk['chunk_index']}"
+    
+    @staticmethod
+    def _chunk_vector_metadata(knowledge_base_id: str, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """分塊寫入向量資料庫的元數據"""
+        return {
+            'knowledge_base_id': knowledge_base_id,
+            'document_path': chunk['document_path'],
+            'chunk_index': chunk['chunk_index'],
+            'chunk_size': chunk['chunk_size'],
+            'language': chunk.get('language', 'unknown'),
+            'file_type': chunk.get('file_type', ''),
+            'encoding': chunk.get('encoding', '')
+        }
+    
+    async def _promote_duplicates(
+        self,
+        vector_index: VectorDatabaseInterface,
+        knowledge_base_id: str,
+        document_path: str,
+        db: Session,
+        exclude_paths: Optional[Set[str]] = None
+    ) -> int:
+        """
+        文件的向量被其他文件的重複分塊共用時，以每個向量存活的第一個重複分塊重新儲存該向量
+        
+        被提升的分塊成為新的代表分塊，共用同一向量的分塊記錄改為引用新的向量ID；
+        之後刪除該文件的向量不影響重複分塊的搜索
+        
+        Args:
+            vector_index: 知識庫的向量索引
+            knowledge_base_id: 知識庫ID
+            document_path: 即將刪除或重新導入的文件路徑
+            db: 資料庫會話
+            exclude_paths: 不需提升的文件路徑（本次將重新導入）
+            
+        Returns:
+            int: 重新儲存的向量數
+        """
+        removed = db.query(DocumentChunk).filter(
+            DocumentChunk.knowledge_base_id == knowledge_base_id,
+            DocumentChunk.document_path == document_path
+        ).all()
+        shared_ids = {record.vector_id for record in removed if record.vector_id}
+        if not shared_ids:
+            return 0
+        
+        survivors = db.query(DocumentChunk).filter(
+            DocumentChunk.knowledge_base_id == knowledge_base_id,
+            DocumentChunk.document_path != document_path,
+            DocumentChunk.vector_id.in_(shared_ids)
+        ).order_by(DocumentChunk.document_path, DocumentChunk.chunk_index).all()
+        
+        groups: Dict[str, List[DocumentChunk]] = {}
+        for record in survivors:
+            if record.document_path not in (exclude_paths or ()):
+                groups.setdefault(record.vector_id, []).append(record)
+        if not groups:
+            return 0
+        
+        shared_vector_ids = list(groups)
+        vector_records = await vector_index.get_vectors(shared_vector_ids)
+        embeddings = {
+            vector_id: record.embedding for vector_id, record in zip(shared_vector_ids, vector_records)
+            if record is not None and len(record.embedding)
+        }
+        
+        # 索引不保留原始向量且無法重建時取不到向量，改由代表分塊的內容重新生成
+        missing = [vector_id for vector_id in shared_vector_ids if vector_id not in embeddings]
+        if missing:
+            try:
+                regenerated = await self.embedding_service.generate_embeddings_array(
+                    [groups[vector_id][0].content for vector_id in missing],
+                    batch_size=min(len(missing), 5)
+                )
+                embeddings.update(zip(missing, regenerated))
+            except Exception as e:
+                logger.warning(f"無法重新生成 {len(missing)} 個共用向量，對應的重複分塊將不再可搜索: {str(e)}")
+        
+        promoted = [vector_id for vector_id in shared_vector_ids if vector_id in embeddings]
+        if not promoted:
+            return 0
+        
+        # 分塊記錄的 file_size 保存的是分塊大小
+        leaders = [groups[vector_id][0] for vector_id in promoted]
+        chunks = [
+            {
+                'document_path': leader.document_path,
+                'chunk_index': leader.chunk_index,
+                'chunk_size': leader.file_size or len(leader.content),
+                'language': leader.language or 'unknown',
+                'file_type': leader.file_type or '',
+                'encoding': leader.encoding or ''
+            }
+            for leader in leaders
+        ]
+        new_ids = await vector_index.store_vectors_batch(
+            np.asarray([embeddings[vector_id] for vector_id in promoted], dtype=np.float32),
+            [self._chunk_document_id(knowledge_base_id, chunk) for chunk in chunks],
+            [self._chunk_vector_metadata(knowledge_base_id, chunk) for chunk in chunks]
+        )
+        
+        for vector_id, new_id in zip(promoted, new_ids):
+            for record in groups[vector_id]:
+                record.vector_id = new_id
+        
+        logger.info(f"文件 {document_path} 的 {len(new_ids)} 個共用向量已由重複分塊重新儲存")
+        return len(new_ids)
+    
+    async def delete_document_vectors(self, knowledge_base_id: str, document_path: str, db: Session) -> int:
+        """
+        刪除知識庫中單一文件的向量、分塊記錄與 BM25 詞彙索引條目
+        
+        其他文件的重複分塊共用此文件的向量時，先將其提升為代表分塊並重新儲存向量
+        
+        Args:
+            knowledge_base_id: 知識庫ID
+            document_path: 文件路徑
+            db: 資料庫會話
+            
+        Returns:
+            int: 刪除的向量數
+        """
+        try:
+            deleted = 0
+            if self.vector_database:
+                async with self.vector_database.use_index(knowledge_base_id) as vector_index:
+                    if vector_index is not None:
+                        await self._promote_duplicates(vector_index, knowledge_base_id, document_path, db)
+                        deleted = await vector_index.delete_vectors_by_document_path(document_path)
+            
+            db.query(DocumentChunk).filter(
+                DocumentChunk.knowledge_base_id == knowledge_base_id,
+                DocumentChunk.document_path == document_path
+            ).delete()
+            db.commit()
+            
+            await self._remove_lexical_document(knowledge_base_id, document_path)
+            # 純詞彙搜索的快取不以寫入世代判斷失效，需明確清除
+            self._search_cache.invalidate_knowledge_base(knowledge_base_id)
+            return deleted
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"刪除文件向量失敗: {knowledge_base_id}/{document_path} - {str(e)}")
+            return 0
+    
+    async def delete_knowledge_base_vectors(self, knowledge_base_id: str) -> bool:
+        """
+        刪除知識庫的所有向量與 BM25 詞彙索引
+        
+        Args:
+            knowledge_base_id: 知識庫ID
+            
+        Returns:
+            bool: 是否有向量被刪除
+        """
+        try:
+            self._lexical_indexes.pop(knowledge_base_id, None)
+            self._search_cache.invalidate_knowledge_base(knowledge_base_id)
+            index_file = self._lexical_index_file(knowledge_base_id)
+            if index_file is not None and index_file.exists():
+                index_file.unlink()
+            
+            if not self.vector_database:
+                return False
+            
+            return await self.vector_database.drop_index(knowledge_base_id)
+            
+        except Exception as e:
+            logger.error(f"刪除知識庫向量失敗: {knowledge_base_id} - {str(e)}")
+            return False
+    
     def get_processing_status(self, knowledge_base_id: str) -> Optional[EmbeddingProcessingStatus]:
         """獲取處理狀態"""
         return self._processing_status.get(knowledge_base_id)
     
+    async def get_vector_counters(self, knowledge_base_id: str) -> Dict[str, Any]:
+        """
+        取得知識庫向量索引的即時計數
+        
+        Args:
+            knowledge_base_id: 知識庫ID
+            
+        Returns:
+            Dict[str, Any]: 計數資訊，索引不存在時返回空字典
+        """
+        try:
+            if not self.vector_database:
+                return {}
+            
+            # 輪詢計數不加載未常駐的索引，也不影響其逐出順序
+            counters = await self.vector_database.get_index_counters(knowledge_base_id)
+            return counters or {}
+            
+        except Exception as e:
+            logger.error(f"獲取向量計數失敗: {knowledge_base_id} - {str(e)}")
+            return {}
+    
     async def get_statistics(self) -> Dict[str, Any]:
         """獲取服務統計資訊"""
         try:
@@ -476,6 +996,7 @@ class EmbeddingIntegrationService:
                     'healthy': await self.embedding_service.health_check() if self.embedding_service else False
                 },
                 'vector_database': None,
+                'search_cache': self._search_cache.stats,
                 'processing_status': dict(self._processing_status)
             }
             
@@ -4,15 +4,24 @@ Faiss 向量資料庫實作
 """
 
 import os
+import re
 import json
+import time
+import shutil
 import pickle
+import zlib
 import logging
 import asyncio
+import threading
+import itertools
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Union, Callable, AsyncIterator
 from datetime import datetime
 from dataclasses import asdict
+from functools import partial
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import uuid
 
 try:
@@ -25,12 +34,69 @@ except ImportError:
 from ..interfaces.vector_database_interface import (
     VectorDatabaseInterface,
     VectorRecord,
-    VectorSearchResult
+    VectorSearchResult,
+    DEFAULT_RANGE_SEARCH_MAX_RESULTS
 )
 from ..core.exceptions import BaseAppException
+from .vector_write_ahead_log import VectorWriteAheadLog, WalRecord, WAL_OP_ADD, WAL_OP_DELETE
+from .vector_metadata_store import VectorMetadataStore
+from .vector_id_postings import VectorIdPostings
+from .vector_metadata_filter import MetadataCondition, parse_metadata_filter
+from .vector_store_counters import VectorStoreCounters
+from .vector_document_index import VectorDocumentIndex, document_key, document_path_key
+from .vector_raw_store import RawVectorStore
+from .vector_index_residency import IndexResidencyTracker
+from .vector_write_coalescer import VectorWriteCoalescer
+from .async_rw_lock import AsyncReadWriteLock
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_INDEX_NAME = "default"
+_INDEX_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+# 每個聚類中心建議的最少訓練樣本數（Faiss 低於此值會發出警告）
+_MIN_POINTS_PER_CENTROID = 39
+
+# 過濾後的候選數不超過此值且只佔索引一小部分時，直接以原始向量精確計算候選分數，
+# 成本與候選數成正比而非與索引大小成正比
+_EXACT_FILTER_MAX_CANDIDATES = 4096
+_EXACT_FILTER_MAX_FRACTION = 1 / 16
+
+# IndexIDMap2 每個向量的 ID 映射開銷（id_map 陣列與反向雜湊表）估計值
+_ID_MAP_BYTES_PER_VECTOR = 24
+
+# 程序內全域遞增的寫入世代，索引重建或重新創建後也不會與舊值重複
+_write_generations = itertools.count(1)
+
+
+def _crc32_hex(data: bytes) -> str:
+    """計算 CRC32 校驗碼（十六進位字串）"""
+    return format(zlib.crc32(data) & 0xFFFFFFFF, '08x')
+
+
+def _file_crc32(path: Path, chunk_size: int = 1 << 20) -> str:
+    """以串流方式計算文件的 CRC32 校驗碼"""
+    crc = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            crc = zlib.crc32(chunk, crc)
+    return format(crc & 0xFFFFFFFF, '08x')
+
+
+def _manifest_checksum(manifest: Dict[str, Any]) -> str:
+    """計算清單內容（不含校驗碼欄位）的校驗碼"""
+    body = {k: v for k, v in manifest.items() if k != 'checksum'}
+    return _crc32_hex(json.dumps(body, sort_keys=True).encode('utf-8'))
+
+
+def _fsync_dir(path: Path) -> None:
+    """同步目錄項，確保重新命名已落盤"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 
 class FaissNotAvailableError(BaseAppException):
     """Faiss 庫不可用錯誤"""
@@ -38,7 +104,7 @@ class FaissNotAvailableError(BaseAppException):
         super().__init__(
             status_code=500,
             message=message,
-            error_code="FAISS_NOT_AVAILABLE"
+            code="FAISS_NOT_AVAILABLE"
         )
 
 
@@ -48,7 +114,7 @@ class VectorStorageError(BaseAppException):
         super().__init__(
             status_code=500,
             message=f"向量儲存失敗: {message}",
-            error_code="VECTOR_STORAGE_ERROR",
+            code="VECTOR_STORAGE_ERROR",
             details=details
         )
 
@@ -59,7 +125,7 @@ class VectorSearchError(BaseAppException):
         super().__init__(
             status_code=500,
             message=f"向量搜索失敗: {message}",
-            error_code="VECTOR_SEARCH_ERROR",
+            code="VECTOR_SEARCH_ERROR",
             details=details
         )
 
@@ -72,7 +138,23 @@ class FaissVectorDatabase(VectorDatabaseInterface):
         index_path: str,
         dimension: int = 384,
         metric: str = "cosine",
-        index_factory: str = "Flat"
+        index_factory: str = "Flat",
+        persistence_mode: str = "wal",
+        wal_segment_max_bytes: int = 64 * 1024 * 1024,
+        wal_compaction_bytes: int = 256 * 1024 * 1024,
+        tombstone_compaction_ratio: float = 0.2,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        ann_promotion_threshold: int = 50000,
+        train_sample_size: int = 100000,
+        raw_vector_dtype: Optional[str] = "float32",
+        search_workers: int = 4,
+        read_only: bool = False,
+        rescore_factor: int = 4,
+        verify_snapshot: bool = True,
+        memory_budget_bytes: Optional[int] = None,
+        write_coalesce_max_batch: int = 256,
+        write_coalesce_delay: float = 0.0
     ):
         """
         初始化 Faiss 向量資料庫
@@ -81,32 +163,124 @@ class FaissVectorDatabase(VectorDatabaseInterface):
             index_path: 索引文件路徑
             dimension: 向量維度
             metric: 距離度量方法
-            index_factory: Faiss 索引工廠字符串
+            index_factory: Faiss 索引工廠字符串（如 "Flat"、"SQfp16"、"SQ8"、"IVF1024,Flat"、"HNSW32"、"IVF1024,PQ32"）
+            persistence_mode: 持久化模式（"wal" 追加日誌並背景壓實，"snapshot" 每次寫入重寫完整快照）
+            wal_segment_max_bytes: 單個日誌段的最大大小
+            wal_compaction_bytes: 日誌累積超過此大小時觸發背景壓實
+            tombstone_compaction_ratio: 索引中已刪除向量比例超過此值時觸發背景移除
+            nprobe: IVF 索引預設搜索的倒排列表數
+            ef_search: HNSW 索引預設的搜索寬度
+            ann_promotion_threshold: 向量數達到此值後由 Flat 升級為近似最近鄰索引
+            train_sample_size: 訓練近似最近鄰索引時的最大取樣數
+            raw_vector_dtype: 原始向量儲存精度（"float16"、"float32"），None 表示不保留原始向量
+            search_workers: 執行 Faiss 搜索與磁盤寫入的專用執行緒數
+            read_only: 唯讀模式，以記憶體映射開啟現有快照，多個程序共用同一份頁面快取
+            rescore_factor: 量化索引（SQ/PQ）取回 top_k 倍數的候選，再以原始向量精確重算分數
+            verify_snapshot: 加載時校驗索引文件的校驗碼（需完整讀取一次索引文件）
+            memory_budget_bytes: 命名空間索引合計的常駐記憶體上限，超過時逐出最久未使用的索引
+                （None 表示不限制）
+            write_coalesce_max_batch: 同時進行的 store_vector 呼叫合併為一批寫入的最大筆數（1 表示不合併）
+            write_coalesce_delay: 沒有寫入進行中時等待更多 store_vector 呼叫的秒數（0 表示只合併同時到達的呼叫）
         """
         if not FAISS_AVAILABLE:
             raise FaissNotAvailableError()
         
+        if persistence_mode not in ("wal", "snapshot"):
+            raise VectorStorageError(f"不支援的持久化模式: {persistence_mode}")
+        
         self.index_path = Path(index_path)
         self.dimension = dimension
         self.metric = metric
-        self.index_factory = index_factory
-        
-        # 索引和元數據
-        self.index: Optional[faiss.Index] = None
-        self.metadata_map: Dict[int, Dict[str, Any]] = {}
-        self.vector_id_map: Dict[str, int] = {}  # vector_id -> faiss_id
-        self.reverse_id_map: Dict[int, str] = {}  # faiss_id -> vector_id
+        self.index_factory = re.sub(r"^IDMap2?,", "", index_factory)
+        self.persistence_mode = persistence_mode
+        self.wal_segment_max_bytes = wal_segment_max_bytes
+        self.wal_compaction_bytes = wal_compaction_bytes
+        self.tombstone_compaction_ratio = tombstone_compaction_ratio
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.ann_promotion_threshold = ann_promotion_threshold
+        self.train_sample_size = train_sample_size
+        self.raw_vector_dtype = raw_vector_dtype
+        self.search_workers = search_workers
+        self.read_only = read_only
+        self.rescore_factor = max(1, rescore_factor)
+        self.verify_snapshot = verify_snapshot
+        self.write_coalesce_max_batch = write_coalesce_max_batch
+        self.write_coalesce_delay = write_coalesce_delay
         
         # 文件路徑
         self.index_file = self.index_path / "faiss_index.bin"
+        self.manifest_file = self.index_path / "manifest.json"
+        self.metadata_dir = self.index_path / "metadata"
+        self.wal_dir = self.index_path / "wal"
+        self.indexes_dir = self.index_path / "indexes"
+        self.vectors_dir = self.index_path / "vectors"
+        self.fields_file = self.metadata_dir / "fields.npz"
+        
+        # 舊版 JSON 元數據文件（僅用於遷移）
         self.metadata_file = self.index_path / "metadata.json"
         self.id_map_file = self.index_path / "id_mapping.json"
         
+        # 索引和元數據
+        self.index: Optional[faiss.Index] = None
+        self.metadata_store = VectorMetadataStore(self.metadata_dir)
+        self._postings = VectorIdPostings()
+        self._counters = VectorStoreCounters()
+        self._documents = VectorDocumentIndex(self.metadata_dir / "documents.npy")
+        self.raw_vectors: Optional[RawVectorStore] = (
+            RawVectorStore(self.vectors_dir, dimension, raw_vector_dtype) if raw_vector_dtype else None
+        )
+        
         # 確保目錄存在
         self.index_path.mkdir(parents=True, exist_ok=True)
         
         self.next_id = 0
+        # 寫者鎖：序列化寫入、快照與重建
         self._lock = asyncio.Lock()
+        # 讀寫鎖：搜索共享持有，寫者只在發布記憶體變更時短暫獨佔
+        self._rw_lock = AsyncReadWriteLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._owns_executor = True
+        
+        # 寫入世代：每次發布寫入或替換索引時更新，供上層快取判斷失效
+        self._write_generation = 0
+        
+        # 快照世代：凍結時遞增，只有較新的世代可以提交
+        self._generation = 0
+        self._committed_generation = 0
+        self._snapshot_write_lock = threading.Lock()
+        
+        # 寫前日誌狀態
+        self._wal: Optional[VectorWriteAheadLog] = None
+        self._wal_checkpoint = 0  # 已併入基礎快照的最後日誌段ID
+        self._compaction_task: Optional[asyncio.Task] = None
+        
+        # 已標記刪除但仍在索引中的向量數量
+        self._tombstone_count = 0
+        self._tombstone_task: Optional[asyncio.Task] = None
+        # 已提交的索引與清單文件大小，供 O(1) 計算磁盤用量
+        self._snapshot_bytes = 0
+        self._promotion_task: Optional[asyncio.Task] = None
+        
+        # 藍綠重建：新世代在背景建立後原子切換，舊世代保留在記憶體中供即時回滾
+        self._rebuild_lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._index_generation = 0
+        self._previous_index: Optional[Dict[str, Any]] = None
+        
+        # 各命名空間（知識庫）的子索引，按需加載，超過記憶體上限時逐出最久未使用的索引
+        self._child_indexes: Dict[str, "FaissVectorDatabase"] = {}
+        self._indexes_lock = asyncio.Lock()
+        self._residency = IndexResidencyTracker(memory_budget_bytes)
+        # 已逐出、正在背景關閉（寫入快照）的子索引；關閉完成前再次取得會等待，不加載舊的磁盤內容
+        self._closing_indexes: Dict[str, asyncio.Task] = {}
+        # 已逐出子索引在逐出時的寫入世代；未加載期間內容不變，上層快取可沿用
+        self._evicted_generations: Dict[str, int] = {}
+        
+        # 單筆寫入合併：同時進行的 store_vector 以一次鎖、一條日誌記錄寫入
+        self._write_coalescer = VectorWriteCoalescer(
+            self._store_coalesced, max_batch=write_coalesce_max_batch, delay=write_coalesce_delay
+        )
     
     async def initialize(self) -> bool:
         """初始化向量資料庫"""
@@ -114,11 +288,28 @@ class FaissVectorDatabase(VectorDatabaseInterface):
             async with self._lock:
                 # 嘗試加載現有索引
                 if await self._load_existing_index():
+                    if self.read_only:
+                        # 唯讀模式只提供快照內容，不重放也不寫入日誌
+                        logger.info(f"以唯讀模式映射 Faiss 索引: {self.index_path}")
+                        return True
+                    
+                    await self._open_wal()
+                    self._maybe_schedule_promotion()
                     logger.info(f"成功加載現有 Faiss 索引: {self.index_path}")
                     return True
                 
+                if self.read_only:
+                    logger.error(f"唯讀模式下找不到索引快照: {self.index_path}")
+                    return False
+                
+                if self.manifest_file.exists():
+                    # 快照存在但無法加載（如校驗失敗），不以新索引覆寫
+                    logger.error(f"索引快照無法加載，拒絕覆寫: {self.index_path}")
+                    return False
+                
                 # 創建新索引
                 await self._create_new_index()
+                await self._open_wal()
                 logger.info(f"成功創建新 Faiss 索引: {self.index_path}")
                 return True
                 
@@ -129,25 +320,46 @@ class FaissVectorDatabase(VectorDatabaseInterface):
     async def _load_existing_index(self) -> bool:
         """加載現有索引"""
         try:
-            if not (self.index_file.exists() and 
-                   self.metadata_file.exists() and 
-                   self.id_map_file.exists()):
+            if not self.read_only:
+                self._recover_pending_snapshot()
+            
+            if not self.index_file.exists():
                 return False
             
-            # 加載 Faiss 索引
-            self.index = faiss.read_index(str(self.index_file))
+            if not self.manifest_file.exists():
+                if self.metadata_file.exists() and self.id_map_file.exists() and not self.read_only:
+                    return await self._migrate_legacy_metadata()
+                return False
             
-            # 加載元數據
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                metadata_data = json.load(f)
-                self.metadata_map = {int(k): v for k, v in metadata_data.items()}
+            manifest = self._read_manifest(self.manifest_file)
+            if self.verify_snapshot and 'index_checksum' in manifest:
+                if _file_crc32(self.index_file) != manifest['index_checksum']:
+                    raise VectorStorageError(f"索引文件校驗失敗: {self.index_file}")
+            
+            # 加載 Faiss 索引
+            self.index = self._ensure_id_map(self._read_index_file())
+            self._bump_write_generation()
             
-            # 加載ID映射
-            with open(self.id_map_file, 'r', encoding='utf-8') as f:
-                id_data = json.load(f)
-                self.vector_id_map = id_data.get('vector_id_map', {})
-                self.reverse_id_map = {int(k): v for k, v in id_data.get('reverse_id_map', {}).items()}
-                self.next_id = id_data.get('next_id', 0)
+            # 開啟元數據儲存，快照之後的列由日誌重放
+            self.metadata_store.open(
+                row_count=manifest.get('metadata_rows', 0),
+                heap_bytes=manifest.get('metadata_heap_bytes', 0),
+                read_only=self.read_only
+            )
+            self.next_id = manifest.get('next_id', 0)
+            self._wal_checkpoint = manifest.get('wal_checkpoint', 0)
+            self._generation = self._committed_generation = manifest.get('generation', 0)
+            self._open_raw_vectors(manifest.get('raw_vector_rows'))
+            self._load_document_index(manifest)
+            self._postings.rebuild(self.metadata_store)
+            self._load_field_index(manifest)
+            self._counters.rebuild(self.metadata_store)
+            self._refresh_tombstone_count()
+            self._snapshot_bytes = sum(
+                path.stat().st_size
+                for path in (self.index_file, self._documents.index_file, self.fields_file, self.manifest_file)
+                if path.exists()
+            )
             
             logger.debug(f"加載索引完成: {self.index.ntotal} 個向量")
             return True
@@ -156,398 +368,2001 @@ class FaissVectorDatabase(VectorDatabaseInterface):
             logger.error(f"加載現有索引失敗: {str(e)}")
             return False
     
-    async def _create_new_index(self) -> None:
-        """創建新索引"""
-        try:
-            # 根據度量方法選擇索引類型
-            if self.metric == "cosine":
-                # 餘弦相似度使用內積並正規化向量
-                index_string = f"Flat"
-                self.index = faiss.index_factory(self.dimension, index_string, faiss.METRIC_INNER_PRODUCT)
-            elif self.metric == "euclidean":
-                index_string = f"Flat"
-                self.index = faiss.index_factory(self.dimension, index_string, faiss.METRIC_L2)
-            elif self.metric == "dot_product":
-                index_string = f"Flat"
-                self.index = faiss.index_factory(self.dimension, index_string, faiss.METRIC_INNER_PRODUCT)
-            else:
-                raise VectorStorageError(f"不支援的度量方法: {self.metric}")
-            
-            # 初始化數據結構
-            self.metadata_map = {}
-            self.vector_id_map = {}
-            self.reverse_id_map = {}
-            self.next_id = 0
-            
-            # 保存初始索引
-            await self._save_index()
-            
-        except Exception as e:
-            raise VectorStorageError(f"創建新索引失敗: {str(e)}")
+    def _read_manifest(self, manifest_file: Path) -> Dict[str, Any]:
+        """讀取並校驗快照清單（舊版清單沒有校驗碼）"""
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        if 'checksum' in manifest and manifest['checksum'] != _manifest_checksum(manifest):
+            raise VectorStorageError(f"快照清單校驗失敗: {manifest_file}")
+        return manifest
     
-    async def _save_index(self) -> None:
-        """保存索引到磁盤"""
-        try:
-            # 保存 Faiss 索引
-            faiss.write_index(self.index, str(self.index_file))
-            
-            # 保存元數據
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.metadata_map, f, ensure_ascii=False, indent=2, default=str)
-            
-            # 保存ID映射
-            id_data = {
-                'vector_id_map': self.vector_id_map,
-                'reverse_id_map': self.reverse_id_map,
-                'next_id': self.next_id
-            }
-            with open(self.id_map_file, 'w', encoding='utf-8') as f:
-                json.dump(id_data, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            raise VectorStorageError(f"保存索引失敗: {str(e)}")
+    def _load_document_index(self, manifest: Dict[str, Any]) -> None:
+        """載入快照中的文件倒排索引，缺失或與快照不符時從元數據重建"""
+        index_file = self._documents.index_file
+        loaded = (
+            manifest.get('document_index_rows') == self.metadata_store.row_count
+            and index_file.exists()
+            and (not self.verify_snapshot or _file_crc32(index_file) == manifest.get('document_index_checksum'))
+            and self._documents.load()
+        )
+        if not loaded:
+            logger.info(f"重建文件倒排索引: {index_file}")
+            self._documents.rebuild(self.metadata_store)
     
-    def _normalize_vector(self, embedding: List[float]) -> np.ndarray:
-        """正規化向量（用於餘弦相似度）"""
-        vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
+    def _load_field_index(self, manifest: Dict[str, Any]) -> None:
+        """載入快照中的元數據欄位索引，缺失或與快照不符時改為第一次過濾才建立"""
+        rows = manifest.get('field_index_rows')
+        loaded = (
+            rows is not None
+            and rows <= self.metadata_store.row_count
+            and self.fields_file.exists()
+            and (not self.verify_snapshot or _file_crc32(self.fields_file) == manifest.get('field_index_checksum'))
+            and self._postings.load_fields(self.fields_file, rows)
+        )
+        if not loaded and rows is not None:
+            logger.info(f"欄位索引將於第一次過濾時重建: {self.fields_file}")
+    
+    def _recover_pending_snapshot(self) -> None:
+        """
+        處理快照提交中斷留下的暫存文件
         
-        if self.metric == "cosine":
-            # 正規化向量用於餘弦相似度計算
-            norm = np.linalg.norm(vector, axis=1, keepdims=True)
-            if norm > 0:
-                vector = vector / norm
+        索引文件已替換但清單尚未替換時，以已落盤的暫存清單完成提交；其他情況捨棄暫存文件
+        """
+        tmp_index_file = self.index_file.with_name(self.index_file.name + ".tmp")
+        tmp_manifest_file = self.manifest_file.with_name(self.manifest_file.name + ".tmp")
         
-        return vector
-    
-    async def close(self) -> None:
-        """關閉向量資料庫連接"""
-        try:
-            if self.index is not None:
-                await self._save_index()
-                self.index = None
-            
-            logger.info("Faiss 索引已關閉")
+        if tmp_manifest_file.exists():
+            try:
+                pending = self._read_manifest(tmp_manifest_file)
+                committed = (
+                    not tmp_index_file.exists()
+                    and self.index_file.exists()
+                    and _file_crc32(self.index_file) == pending.get('index_checksum')
+                )
+            except (ValueError, VectorStorageError):
+                committed = False
             
-        except Exception as e:
-            logger.error(f"關閉 Faiss 索引失敗: {str(e)}")
+            if committed:
+                os.replace(tmp_manifest_file, self.manifest_file)
+                logger.warning(f"已完成中斷的快照提交: 世代 {pending.get('generation')}")
+            else:
+                tmp_manifest_file.unlink()
+        
+        for tmp_file in (
+            tmp_index_file,
+            self._documents.index_file.with_name(self._documents.index_file.name + ".tmp"),
+            self.fields_file.with_name(self.fields_file.name + ".tmp")
+        ):
+            if tmp_file.exists():
+                tmp_file.unlink()
     
-    async def store_vector(
-        self,
-        embedding: List[float],
-        document_id: str,
-        metadata: Optional[Dict[str, Any]] = None
-    ) -> str:
-        """儲存向量到資料庫"""
-        try:
-            async with self._lock:
-                # 驗證向量維度
-                if len(embedding) != self.dimension:
-                    raise VectorStorageError(f"向量維度不匹配: {len(embedding)} != {self.dimension}")
-                
-                # 生成向量ID
-                vector_id = str(uuid.uuid4())
-                faiss_id = self.next_id
-                
-                # 正規化向量
-                normalized_vector = self._normalize_vector(embedding)
-                
-                # 添加到索引
-                self.index.add(normalized_vector)
-                
-                # 更新映射
-                self.vector_id_map[vector_id] = faiss_id
-                self.reverse_id_map[faiss_id] = vector_id
-                
-                # 儲存元數據
-                record_metadata = {
-                    'vector_id': vector_id,
-                    'document_id': document_id,
-                    'created_at': datetime.now().isoformat(),
-                    'dimension': len(embedding),
-                    **(metadata or {})
+    def _read_index_file(self) -> "faiss.Index":
+        """讀取索引文件，唯讀模式以記憶體映射開啟，不將整個索引載入記憶體"""
+        if not self.read_only:
+            return faiss.read_index(str(self.index_file))
+        
+        mmap_flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+        return faiss.read_index(str(self.index_file), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    
+    async def _migrate_legacy_metadata(self) -> bool:
+        """將舊版 JSON 元數據遷移至欄式儲存"""
+        self.index = self._ensure_id_map(faiss.read_index(str(self.index_file)))
+        
+        with open(self.metadata_file, 'r', encoding='utf-8') as f:
+            metadata_data = {int(k): v for k, v in json.load(f).items()}
+        
+        with open(self.id_map_file, 'r', encoding='utf-8') as f:
+            id_data = json.load(f)
+        
+        self.next_id = id_data.get('next_id', 0)
+        self._wal_checkpoint = id_data.get('wal_checkpoint', 0)
+        
+        self.metadata_store.open(row_count=0, heap_bytes=0)
+        reverse_id_map = {int(k): v for k, v in id_data.get('reverse_id_map', {}).items()}
+        
+        rows = []
+        for faiss_id in range(self.next_id):
+            metadata = metadata_data.get(faiss_id)
+            if metadata is None:
+                # 缺失的列以已刪除的佔位記錄填補，保持 faiss_id 連續
+                metadata = {
+                    'vector_id': reverse_id_map.get(faiss_id, str(uuid.uuid4())),
+                    'document_id': '',
+                    'deleted': True
                 }
-                self.metadata_map[faiss_id] = record_metadata
-                
-                self.next_id += 1
-                
-                # 定期保存（每100個向量）
-                if self.next_id % 100 == 0:
-                    await self._save_index()
-                
-                logger.debug(f"成功儲存向量: {vector_id}")
-                return vector_id
-                
-        except Exception as e:
-            logger.error(f"儲存向量失敗: {str(e)}")
-            raise VectorStorageError(str(e))
+            rows.append(metadata)
+        
+        self.metadata_store.append(0, rows)
+        self._open_raw_vectors(0)
+        self._documents.rebuild(self.metadata_store)
+        self._postings.rebuild(self.metadata_store)
+        self._counters.rebuild(self.metadata_store)
+        self._refresh_tombstone_count()
+        self._write_snapshot(self._freeze_snapshot())
+        
+        self.metadata_file.unlink()
+        self.id_map_file.unlink()
+        
+        logger.info(f"已將 {len(rows)} 筆舊版 JSON 元數據遷移至欄式儲存")
+        return True
     
-    async def store_vectors_batch(
-        self,
-        embeddings: List[List[float]],
-        document_ids: List[str],
-        metadata_list: Optional[List[Dict[str, Any]]] = None
-    ) -> List[str]:
-        """批次儲存向量"""
+    def _open_raw_vectors(self, row_count: Optional[int]) -> None:
+        """開啟原始向量儲存，快照中缺少的向量（如剛啟用儲存時）由索引重建補齊"""
+        if self.raw_vectors is None:
+            return
+        
+        self.raw_vectors.open(row_count=row_count, read_only=self.read_only)
+        if self.raw_vectors.row_count >= self.next_id:
+            return
+        
+        if self.read_only:
+            logger.warning("原始向量儲存不完整且唯讀模式無法補齊，改由索引重建向量")
+            self.raw_vectors.close()
+            self.raw_vectors = None
+            return
+        
+        missing_ids = np.arange(self.raw_vectors.row_count, self.next_id, dtype=np.int64)
+        live = ~self.metadata_store.deleted_mask(missing_ids)
+        vectors = np.zeros((len(missing_ids), self.dimension), dtype=np.float32)
+        
         try:
-            if len(embeddings) != len(document_ids):
-                raise VectorStorageError("embeddings 和 document_ids 長度不匹配")
-            
-            if metadata_list and len(metadata_list) != len(embeddings):
-                raise VectorStorageError("metadata_list 長度不匹配")
+            if live.any():
+                vectors[live] = self.index.reconstruct_batch(missing_ids[live])
+        except RuntimeError as e:
+            logger.warning(f"索引無法重建向量，停用原始向量儲存: {str(e)}")
+            self.raw_vectors.close()
+            self.raw_vectors = None
+            return
+        
+        # 已刪除的向量以零向量佔位，保持 faiss_id 連續
+        self.raw_vectors.append(int(missing_ids[0]), vectors)
+        logger.info(f"已由索引補齊 {len(missing_ids)} 個原始向量")
+    
+    def _reconstruct(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """取得已正規化的向量，優先讀取原始向量儲存，否則由索引重建"""
+        ids = np.asarray(faiss_ids, dtype=np.int64)
+        if self.raw_vectors is not None:
+            return self.raw_vectors.get(ids)
+        if len(ids) == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return self.index.reconstruct_batch(ids)
+    
+    async def _open_wal(self) -> None:
+        """開啟寫前日誌並重放基礎快照之後的記錄"""
+        if self.persistence_mode != "wal":
+            return
+        
+        self._wal = VectorWriteAheadLog(
+            self.wal_dir,
+            self.dimension,
+            segment_max_bytes=self.wal_segment_max_bytes
+        )
+        
+        replayed = 0
+        for record in self._wal.replay(self._wal_checkpoint):
+            replayed += self._apply_wal_record(record)
+        
+        self._wal.open(self._wal_checkpoint)
+        
+        if replayed:
+            logger.info(f"重放 WAL 完成: {replayed} 筆向量操作")
+    
+    def _apply_wal_record(self, record: WalRecord) -> int:
+        """將一筆 WAL 記錄套用到記憶體中的索引與元數據"""
+        if record.op == WAL_OP_ADD:
+            # 跳過已包含在基礎快照中的向量
+            keep = record.faiss_ids >= self.next_id
+            if not keep.any():
+                return 0
             
-            async with self._lock:
-                vector_ids = []
-                vectors_to_add = []
-                
-                for i, (embedding, document_id) in enumerate(zip(embeddings, document_ids)):
-                    # 驗證向量維度
-                    if len(embedding) != self.dimension:
-                        raise VectorStorageError(f"向量 {i} 維度不匹配: {len(embedding)} != {self.dimension}")
-                    
-                    # 生成向量ID
-                    vector_id = str(uuid.uuid4())
-                    faiss_id = self.next_id + i
-                    
-                    vector_ids.append(vector_id)
-                    
-                    # 正規化向量
-                    normalized_vector = self._normalize_vector(embedding)
-                    vectors_to_add.append(normalized_vector)
-                    
-                    # 更新映射
-                    self.vector_id_map[vector_id] = faiss_id
-                    self.reverse_id_map[faiss_id] = vector_id
-                    
-                    # 儲存元數據
-                    metadata = metadata_list[i] if metadata_list else {}
-                    record_metadata = {
-                        'vector_id': vector_id,
-                        'document_id': document_id,
-                        'created_at': datetime.now().isoformat(),
-                        'dimension': len(embedding),
-                        **metadata
-                    }
-                    self.metadata_map[faiss_id] = record_metadata
-                
-                # 批次添加向量
-                if vectors_to_add:
-                    batch_vectors = np.vstack(vectors_to_add)
-                    self.index.add(batch_vectors)
-                    
-                    self.next_id += len(vectors_to_add)
-                    
-                    # 保存索引
-                    await self._save_index()
-                
-                logger.info(f"成功批次儲存 {len(vector_ids)} 個向量")
-                return vector_ids
-                
-        except Exception as e:
-            logger.error(f"批次儲存向量失敗: {str(e)}")
-            raise VectorStorageError(str(e))
+            faiss_ids = record.faiss_ids[keep]
+            metadata_list = [m for m, k in zip(record.metadata_list, keep) if k]
+            self._publish_add(faiss_ids, record.vectors[keep], metadata_list)
+            return len(faiss_ids)
+        
+        if record.op == WAL_OP_DELETE:
+            deleted_at = record.metadata_list[0].get('deleted_at') if record.metadata_list else None
+            self._mark_deleted(record.faiss_ids, deleted_at)
+            return len(record.faiss_ids)
+        
+        logger.warning(f"忽略未知的 WAL 記錄類型: {record.op}")
+        return 0
     
-    async def get_vector(self, vector_id: str) -> Optional[VectorRecord]:
-        """根據向量ID獲取向量記錄"""
-        try:
-            async with self._lock:
-                faiss_id = self.vector_id_map.get(vector_id)
-                if faiss_id is None:
-                    return None
-                
-                metadata = self.metadata_map.get(faiss_id)
-                if metadata is None:
-                    return None
-                
-                # 從索引中重建向量（注意：Flat索引不支持直接獲取向量）
-                # 這是一個限制，實際應用中可能需要單獨儲存原始向量
-                
-                record = VectorRecord(
-                    vector_id=vector_id,
-                    document_id=metadata['document_id'],
-                    embedding=[],  # Faiss Flat 索引無法直接獲取原始向量
-                    metadata=metadata,
-                    created_at=datetime.fromisoformat(metadata['created_at'])
-                )
-                
-                return record
-                
-        except Exception as e:
-            logger.error(f"獲取向量失敗: {vector_id} - {str(e)}")
-            return None
+    def _maybe_schedule_compaction(self) -> None:
+        """日誌累積超過閾值時安排背景壓實"""
+        if self._wal is None or self._wal.pending_bytes < self.wal_compaction_bytes:
+            return
+        
+        if self._compaction_task is not None and not self._compaction_task.done():
+            return
+        
+        self._compaction_task = asyncio.create_task(self.checkpoint())
     
-    async def delete_vector(self, vector_id: str) -> bool:
-        """刪除向量"""
+    async def checkpoint(self) -> bool:
+        """
+        將日誌段合併為基礎快照並清除已合併的日誌段
+        
+        只在凍結世代時短暫持有寫者鎖；寫入暫存文件、同步與替換在背景執行緒進行，期間寫入可繼續
+        """
         try:
             async with self._lock:
-                faiss_id = self.vector_id_map.get(vector_id)
-                if faiss_id is None:
-                    return False
-                
-                # Faiss 不支援直接刪除，需要重建索引
-                # 這是一個限制，實際應用中可能需要使用支援刪除的索引類型
-                logger.warning("Faiss Flat 索引不支援直接刪除，需要重建索引")
-                
-                # 標記為已刪除（在元數據中）
-                if faiss_id in self.metadata_map:
-                    self.metadata_map[faiss_id]['deleted'] = True
-                    self.metadata_map[faiss_id]['deleted_at'] = datetime.now().isoformat()
-                
-                await self._save_index()
+                if self.index is None or self.read_only:
+                    return True
+                snapshot = await self._run_in_executor(self._freeze_snapshot)
+            
+            if not await asyncio.to_thread(self._write_snapshot, snapshot):
                 return True
-                
+            
+            sealed_id = snapshot['manifest']['wal_checkpoint']
+            if self._wal is not None and sealed_id:
+                async with self._lock:
+                    removed = self._wal.truncate_through(sealed_id) if self._wal is not None else 0
+                logger.info(f"WAL 壓實完成: 合併 {removed} 個日誌段至基礎快照")
+            return True
+            
         except Exception as e:
-            logger.error(f"刪除向量失敗: {vector_id} - {str(e)}")
+            logger.error(f"WAL 壓實失敗: {str(e)}")
             return False
     
-    async def delete_vectors_by_document(self, document_id: str) -> int:
-        """根據文件ID刪除所有相關向量"""
+    def _refresh_tombstone_count(self) -> None:
+        """根據索引大小與有效向量數重新計算墓碑數量"""
+        self._tombstone_count = max(0, int(self.index.ntotal) - self._counters.active)
+    
+    @property
+    def delete_ratio(self) -> float:
+        """索引中已刪除但尚未移除的向量比例"""
+        total = int(self.index.ntotal) if self.index is not None else 0
+        return self._tombstone_count / total if total else 0.0
+    
+    def _maybe_schedule_tombstone_compaction(self) -> None:
+        """墓碑比例超過閾值時安排背景移除"""
+        if self._tombstone_count == 0 or self.delete_ratio <= self.tombstone_compaction_ratio:
+            return
+        
+        if self._tombstone_task is not None and not self._tombstone_task.done():
+            return
+        
+        self._tombstone_task = asyncio.create_task(self.compact_tombstones())
+    
+    async def compact_tombstones(self) -> int:
+        """
+        從索引中物理移除已標記刪除的向量，並寫入新的基礎快照
+        
+        Returns:
+            int: 移除的向量數量
+        """
         try:
             async with self._lock:
-                deleted_count = 0
+                if self.index is None or self.read_only or self._tombstone_count == 0:
+                    return 0
                 
-                for faiss_id, metadata in self.metadata_map.items():
-                    if metadata.get('document_id') == document_id and not metadata.get('deleted', False):
-                        metadata['deleted'] = True
-                        metadata['deleted_at'] = datetime.now().isoformat()
-                        deleted_count += 1
+                tombstones = self._tombstone_count
+                try:
+                    async with self._rw_lock.write():
+                        removed = int(await self._run_in_executor(
+                            self.index.remove_ids, self.metadata_store.deleted_ids()
+                        ))
+                        self._refresh_tombstone_count()
+                except RuntimeError:
+                    removed = None
                 
-                if deleted_count > 0:
-                    await self._save_index()
-                
-                logger.info(f"標記刪除 {deleted_count} 個向量（文件ID: {document_id}）")
-                return deleted_count
+            if removed is not None:
+                # 快照中的索引需與移除結果一致，否則重啟後墓碑會重新出現
+                await self.checkpoint()
+                logger.info(f"墓碑壓實完成: 移除 {removed} 個已刪除向量")
+                return removed
+            
+            # 不支援 remove_ids 的索引類型（如 HNSW）在背景以存活向量重建後切換
+            if not await self._rebuild(self._active_index_type()):
+                return 0
+            
+            logger.info(f"墓碑壓實完成: 重建索引移除 {tombstones} 個已刪除向量")
+            return tombstones
                 
         except Exception as e:
-            logger.error(f"按文件ID刪除向量失敗: {document_id} - {str(e)}")
+            logger.error(f"墓碑壓實失敗: {str(e)}")
             return 0
     
-    async def similarity_search(
+    def _build_index(self, index_factory: str = "Flat") -> "faiss.Index":
+        """根據度量方法與工廠字符串建立帶 ID 映射的空索引"""
+        # 餘弦相似度使用內積並正規化向量
+        metric_types = {
+            "cosine": faiss.METRIC_INNER_PRODUCT,
+            "euclidean": faiss.METRIC_L2,
+            "dot_product": faiss.METRIC_INNER_PRODUCT
+        }
+        if self.metric not in metric_types:
+            raise VectorStorageError(f"不支援的度量方法: {self.metric}")
+        
+        # IDMap2 使 faiss_id 與索引內位置解耦，才能以 remove_ids 物理刪除
+        return faiss.index_factory(self.dimension, f"IDMap2,{index_factory}", metric_types[self.metric])
+    
+    def _build_trained_index(
         self,
-        query_embedding: List[float],
-        top_k: int = 10,
-        similarity_threshold: float = 0.7,
-        document_ids: Optional[List[str]] = None
-    ) -> List[VectorSearchResult]:
-        """相似性搜索"""
-        try:
-            async with self._lock:
-                if len(query_embedding) != self.dimension:
-                    raise VectorSearchError(f"查詢向量維度不匹配: {len(query_embedding)} != {self.dimension}")
-                
-                # 正規化查詢向量
-                query_vector = self._normalize_vector(query_embedding)
-                
-                # 執行搜索
-                search_k = min(top_k * 2, self.index.ntotal)  # 搜索更多候選以過濾
-                scores, indices = self.index.search(query_vector, search_k)
-                
-                results = []
-                for i, (score, faiss_id) in enumerate(zip(scores[0], indices[0])):
-                    if faiss_id == -1:  # 無效結果
-                        continue
-                    
-                    metadata = self.metadata_map.get(faiss_id)
-                    if not metadata or metadata.get('deleted', False):
-                        continue
-                    
-                    # 文件ID過濾
-                    if document_ids and metadata['document_id'] not in document_ids:
-                        continue
-                    
-                    # 轉換相似度分數
-                    if self.metric == "cosine":
-                        similarity_score = float(score)  # 內積結果已經是餘弦相似度
-                    elif self.metric == "euclidean":
-                        # L2距離轉換為相似度
-                        similarity_score = 1.0 / (1.0 + float(score))
-                    else:
-                        similarity_score = float(score)
-                    
-                    # 相似度閾值過濾
-                    if similarity_score < similarity_threshold:
-                        continue
-                    
-                    vector_id = self.reverse_id_map.get(faiss_id)
-                    if not vector_id:
-                        continue
-                    
-                    result = VectorSearchResult(
-                        vector_id=vector_id,
-                        document_id=metadata['document_id'],
-                        similarity_score=similarity_score,
-                        metadata=metadata
-                    )
-                    results.append(result)
-                    
-                    if len(results) >= top_k:
-                        break
-                
-                # 按相似度降序排序
-                results.sort(key=lambda x: x.similarity_score, reverse=True)
-                
-                logger.debug(f"相似性搜索完成: {len(results)} 個結果")
-                return results
-                
-        except Exception as e:
-            logger.error(f"相似性搜索失敗: {str(e)}")
-            raise VectorSearchError(str(e))
+        index_factory: str,
+        vectors: np.ndarray,
+        faiss_ids: np.ndarray
+    ) -> "faiss.Index":
+        """建立索引，需要時以取樣向量訓練，再加入所有向量"""
+        index = self._build_index(index_factory)
+        
+        if not index.is_trained:
+            sample = vectors
+            if len(vectors) > self.train_sample_size:
+                rng = np.random.default_rng(0)
+                sample = vectors[rng.choice(len(vectors), self.train_sample_size, replace=False)]
+            index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        
+        if len(faiss_ids):
+            index.add_with_ids(vectors, faiss_ids)
+        return index
     
-    async def get_vector_count(self) -> int:
-        """獲取向量總數"""
-        try:
-            if self.index is None:
-                return 0
-            
-            # 計算未刪除的向量數量
-            active_count = sum(
-                1 for metadata in self.metadata_map.values()
-                if not metadata.get('deleted', False)
-            )
-            
-            return active_count
-            
-        except Exception as e:
-            logger.error(f"獲取向量總數失敗: {str(e)}")
-            return 0
+    def _is_ann_index(self) -> bool:
+        """目前的索引是否已升級為近似最近鄰索引"""
+        if self.index is None or self.index_factory == "Flat":
+            return False
+        return not isinstance(faiss.downcast_index(self.index.index), faiss.IndexFlat)
     
-    async def get_statistics(self) -> Dict[str, Any]:
-        """獲取資料庫統計資訊"""
+    def _active_index_type(self) -> str:
+        """目前索引對應的工廠字符串"""
+        return self.index_factory if self._is_ann_index() else "Flat"
+    
+    @staticmethod
+    def _is_quantized_factory(index_factory: str) -> bool:
+        """工廠字符串是否以純量或乘積量化壓縮向量"""
+        return re.search(r"SQ|PQ", index_factory) is not None
+    
+    def _should_rescore(self) -> bool:
+        """目前索引為量化索引且保留原始向量時，以原始向量重算候選分數"""
+        return (
+            self.raw_vectors is not None
+            and self._is_ann_index()
+            and self._is_quantized_factory(self.index_factory)
+        )
+    
+    def _rescore(
+        self,
+        query_vectors: np.ndarray,
+        indices: np.ndarray,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        以原始向量精確重算候選分數並重新排序
+        
+        Args:
+            query_vectors: 已正規化的查詢矩陣 (n, dimension)
+            indices: 量化索引返回的候選 faiss_id (n, k')
+            k: 每個查詢保留的結果數
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 與 Faiss 相同度量的分數與 faiss_id (n, k)
+        """
+        found = indices >= 0
+        vectors = np.zeros(indices.shape + (self.dimension,), dtype=np.float32)
+        vectors[found] = self.raw_vectors.get(indices[found])
+        
+        if self.metric == "euclidean":
+            # 與 Faiss 一致使用平方 L2 距離，越小越相似
+            exact = ((vectors - query_vectors[:, None, :]) ** 2).sum(axis=2)
+            exact[~found] = np.inf
+            order = np.argsort(exact, axis=1, kind='stable')[:, :k]
+        else:
+            exact = np.einsum('nkd,nd->nk', vectors, query_vectors)
+            exact[~found] = -np.inf
+            order = np.argsort(-exact, axis=1, kind='stable')[:, :k]
+        
+        return np.take_along_axis(exact, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    def _bytes_per_vector(self) -> float:
+        """索引中每個向量佔用的記憶體（向量編碼，IVF 另含ID，HNSW 另含圖連結）"""
+        if self.index is None:
+            return 0.0
+        
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            storage = faiss.downcast_index(inner.storage)
+            links = inner.hnsw.neighbors.size() * 4 / max(inner.ntotal, 1)
+            return float(storage.code_size) + links
+        if isinstance(inner, faiss.IndexIVF):
+            return float(inner.code_size) + 8
+        return float(getattr(inner, 'code_size', self.dimension * 4))
+    
+    def _resident_bytes(self) -> int:
+        """常駐記憶體的估計值（索引編碼與圖連結、ID 映射、倒排位圖），供記憶體上限管理使用"""
+        if self.index is None:
+            return 0
+        per_vector = self._bytes_per_vector() + _ID_MAP_BYTES_PER_VECTOR
+        return int(self.index.ntotal * per_vector) + self._postings.nbytes
+    
+    def _is_busy(self) -> bool:
+        """是否有進行中的寫入、搜索或背景任務（此時不可逐出）"""
+        if self._lock.locked() or self._rebuild_lock.locked() or self._rw_lock.readers > 0:
+            return True
+        if not self._write_coalescer.idle:
+            return True
+        return any(
+            task is not None and not task.done()
+            for task in (self._promotion_task, self._compaction_task, self._tombstone_task, self._rebuild_task)
+        )
+    
+    def _ann_min_vectors(self) -> int:
+        """升級為近似最近鄰索引所需的最少向量數（含訓練樣本需求）"""
+        required = self.ann_promotion_threshold
+        
+        ivf = re.search(r"IVF(\d+)", self.index_factory)
+        if ivf:
+            required = max(required, int(ivf.group(1)) * _MIN_POINTS_PER_CENTROID)
+        
+        pq = re.search(r"PQ\d+(?:x(\d+))?", self.index_factory)
+        if pq:
+            nbits = int(pq.group(1) or 8)
+            required = max(required, (1 << nbits) * _MIN_POINTS_PER_CENTROID)
+        
+        return required
+    
+    def _maybe_schedule_promotion(self) -> None:
+        """向量數達到門檻時安排背景升級為近似最近鄰索引"""
+        if self.index_factory == "Flat" or self._is_ann_index():
+            return
+        
+        if self.index.ntotal < self._ann_min_vectors():
+            return
+        
+        if self._promotion_task is not None and not self._promotion_task.done():
+            return
+        
+        self._promotion_task = asyncio.create_task(self.promote_index())
+    
+    async def promote_index(self) -> bool:
+        """
+        將 Flat 索引升級為設定的近似最近鄰索引
+        
+        Returns:
+            bool: 是否完成升級
+        """
+        if self.index is None or self.index_factory == "Flat" or self._is_ann_index():
+            return False
+        return await self._rebuild(self.index_factory)
+    
+    async def rebuild_index(self, index_factory: Optional[str] = None, keep_previous: bool = True) -> bool:
+        """
+        以保留的原始向量離線重建索引，不需重新產生 Embedding
+        
+        新世代在背景建立，建立期間的寫入在切換前補上，搜索不會被阻塞
+        
+        Args:
+            index_factory: 新的索引工廠字符串，未指定時沿用目前的索引類型
+            keep_previous: 是否在記憶體中保留舊世代供 rollback_index 即時回滾
+            
+        Returns:
+            bool: 是否完成重建
+        """
+        if self.index is None:
+            return False
+        
+        target = re.sub(r"^IDMap2?,", "", index_factory) if index_factory else self._active_index_type()
+        if not await self._rebuild(target, keep_previous=keep_previous):
+            return False
+        
+        if index_factory:
+            self.index_factory = target
+        return True
+    
+    def start_rebuild(self, index_factory: Optional[str] = None, keep_previous: bool = True) -> bool:
+        """
+        在背景開始重建索引，進度以 get_rebuild_status 查詢
+        
+        Args:
+            index_factory: 新的索引工廠字符串，未指定時沿用目前的索引類型
+            keep_previous: 是否保留舊世代供回滾
+            
+        Returns:
+            bool: 是否已開始（已有重建進行中時返回False）
+        """
+        self._ensure_writable()
+        if self.index is None or (self._rebuild_task is not None and not self._rebuild_task.done()):
+            return False
+        
+        self._rebuild_task = asyncio.create_task(self.rebuild_index(index_factory, keep_previous))
+        return True
+    
+    def get_rebuild_status(self) -> Dict[str, Any]:
+        """
+        取得藍綠重建狀態
+        
+        Returns:
+            Dict[str, Any]: 是否重建中、上次背景重建結果、目前與可回滾的索引世代
+        """
+        task = self._rebuild_task
+        last_result = None
+        if task is not None and task.done() and not task.cancelled():
+            last_result = task.result()
+        
+        previous = self._previous_index
+        return {
+            'rebuilding': task is not None and not task.done(),
+            'last_rebuild_succeeded': last_result,
+            'index_generation': self._index_generation,
+            'active_index_type': self._active_index_type(),
+            'rollback_available': previous is not None,
+            'previous_index_generation': previous['generation'] if previous else None,
+            'previous_index_type': previous['index_type'] if previous else None
+        }
+    
+    async def rollback_index(self) -> bool:
+        """
+        切換回保留的上一個索引世代（再次呼叫可切換回來）
+        
+        舊世代先補上切換之後新增的向量，再以原子切換取代目前的索引
+        
+        Returns:
+            bool: 是否完成回滾（沒有保留舊世代時返回False）
+        """
+        try:
+            self._ensure_writable()
+            
+            async with self._rebuild_lock:
+                async with self._lock:
+                    previous = self._previous_index
+                    if self.index is None or previous is None:
+                        return False
+                    
+                    await self._catch_up(previous['index'], previous['next_id'])
+                    await self._swap_index(previous['index'], keep_previous=True, generation=previous['generation'])
+                    self.index_factory = previous['index_factory']
+            
+            await self.checkpoint()
+            
+            logger.info(f"索引已回滾至世代 {self._index_generation}: {self._active_index_type()}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"索引回滾失敗: {str(e)}")
+            return False
+    
+    def discard_previous_index(self) -> bool:
+        """
+        釋放保留的舊索引世代
+        
+        Returns:
+            bool: 是否有舊世代被釋放
+        """
+        discarded = self._previous_index is not None
+        self._previous_index = None
+        return discarded
+    
+    async def _catch_up(self, index: "faiss.Index", from_id: int) -> None:
+        """在已持有寫者鎖的情況下，將 from_id 之後新增且未刪除的向量補進尚未上線的索引"""
+        # 期間刪除的向量留作墓碑，由選擇器過濾並由墓碑壓實移除
+        new_ids = np.arange(from_id, self.next_id, dtype=np.int64)
+        new_ids = new_ids[~self.metadata_store.deleted_mask(new_ids)]
+        if len(new_ids):
+            await self._run_in_executor(index.add_with_ids, self._reconstruct(new_ids), new_ids)
+    
+    async def _swap_index(self, index: "faiss.Index", keep_previous: bool, generation: Optional[int] = None) -> None:
+        """
+        在已持有寫者鎖的情況下原子切換服務中的索引
+        
+        獨佔區段只替換索引指標與墓碑計數，搜索最多等待一次指標替換
+        """
+        previous = {
+            'index': self.index,
+            'index_factory': self.index_factory,
+            'index_type': self._active_index_type(),
+            'generation': self._index_generation,
+            'next_id': self.next_id
+        }
+        
+        if generation is None:
+            generation = self._index_generation + 1
+            if self._previous_index is not None:
+                generation = max(generation, self._previous_index['generation'] + 1)
+        
+        async with self._rw_lock.write():
+            self.index = index
+            self._index_generation = generation
+            self._previous_index = previous if keep_previous else None
+            self._refresh_tombstone_count()
+            self._bump_write_generation()
+    
+    async def _rebuild(self, index_factory: str, keep_previous: bool = False) -> bool:
+        """
+        以存活向量建立新索引世代並切換
+        
+        訓練與建立在背景執行緒進行，期間仍可讀寫；切換時補上建立期間新增的向量
+        """
+        try:
+            self._ensure_writable()
+            
+            async with self._rebuild_lock:
+                async with self._lock:
+                    if self.index is None:
+                        return False
+                    
+                    snapshot_next_id = self.next_id
+                    live_ids = np.flatnonzero(self._postings.filter_mask()).astype(np.int64)
+                    vectors = await self._run_in_executor(self._reconstruct, live_ids)
+                
+                # 長時間的訓練不佔用搜索執行緒池
+                rebuilt = await asyncio.to_thread(
+                    self._build_trained_index, index_factory, vectors, live_ids
+                )
+                
+                async with self._lock:
+                    if self.index is None:
+                        return False
+                    
+                    await self._catch_up(rebuilt, snapshot_next_id)
+                    await self._swap_index(rebuilt, keep_previous)
+            
+            await self.checkpoint()
+            
+            logger.info(f"索引已重建為 {index_factory}（世代 {self._index_generation}）: {self.index.ntotal} 個向量")
+            return True
+            
+        except Exception as e:
+            logger.error(f"索引重建失敗: {str(e)}")
+            return False
+    
+    def _ensure_id_map(self, index: "faiss.Index") -> "faiss.Index":
+        """將舊版以位置為 ID 的索引轉換為 ID 映射索引"""
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            return index
+        
+        id_mapped = self._build_index()
+        if index.ntotal:
+            id_mapped.add_with_ids(
+                index.reconstruct_n(0, index.ntotal),
+                np.arange(index.ntotal, dtype=np.int64)
+            )
+        logger.info(f"已將舊版索引轉換為 ID 映射索引: {index.ntotal} 個向量")
+        return id_mapped
+    
+    async def _create_new_index(self) -> None:
+        """創建新索引"""
+        try:
+            # 先驗證工廠字符串；需訓練的索引累積足夠向量前以 Flat 服務，
+            # 無需訓練的量化索引（如 SQfp16）直接使用以節省記憶體
+            configured = self._build_index(self.index_factory)
+            if configured.is_trained and self._is_quantized_factory(self.index_factory):
+                self.index = configured
+            else:
+                self.index = self._build_index()
+            
+            # 初始化數據結構
+            self.metadata_store.open(row_count=0, heap_bytes=0)
+            if self.raw_vectors is not None:
+                self.raw_vectors.open(row_count=0)
+            self.next_id = 0
+            self._tombstone_count = 0
+            self._postings.reset()
+            self._counters.reset()
+            self._documents.reset()
+            self._bump_write_generation()
+            
+            # 保存初始索引
+            await self._save_index()
+            
+        except Exception as e:
+            raise VectorStorageError(f"創建新索引失敗: {str(e)}")
+    
+    async def _save_index(self) -> None:
+        """在已持有寫者鎖的情況下寫入完整快照（快照持久化模式與創建索引時使用）"""
+        try:
+            snapshot = await self._run_in_executor(self._freeze_snapshot)
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+                
+        except Exception as e:
+            raise VectorStorageError(f"保存索引失敗: {str(e)}")
+    
+    def _freeze_snapshot(self) -> Dict[str, Any]:
+        """
+        在已持有寫者鎖的情況下凍結一個快照世代
+        
+        封存活動日誌段、序列化索引副本並記錄各儲存的水位，之後的寫入不影響此世代
+        
+        Returns:
+            Dict[str, Any]: 序列化的索引與清單
+        """
+        if self._wal is not None:
+            self._wal_checkpoint = self._wal.rotate()
+        
+        self._generation += 1
+        manifest = {
+            'generation': self._generation,
+            'dimension': self.dimension,
+            'metric': self.metric,
+            'next_id': self.next_id,
+            'wal_checkpoint': self._wal_checkpoint,
+            'metadata_rows': self.metadata_store.row_count,
+            'metadata_heap_bytes': self.metadata_store.heap_bytes,
+            'document_index_rows': self.metadata_store.row_count,
+            'field_index_rows': self.metadata_store.row_count,
+            'counters': self._counter_values()
+        }
+        if self.raw_vectors is not None:
+            manifest['raw_vector_rows'] = self.raw_vectors.row_count
+        
+        return {
+            'index_bytes': faiss.serialize_index(self.index),
+            'documents': self._documents.freeze(self.metadata_store.row_count),
+            'fields': self._postings.freeze_fields(self.metadata_store.row_count),
+            'manifest': manifest
+        }
+    
+    def _write_snapshot(self, snapshot: Dict[str, Any]) -> bool:
+        """
+        將凍結的世代寫入暫存文件、同步並以重新命名原子提交
+        
+        先落盤索引與清單的暫存文件，再依序替換索引與清單；清單替換即為提交點
+        
+        Returns:
+            bool: 是否提交（已有較新世代提交時捨棄）
+        """
+        try:
+            with self._snapshot_write_lock:
+                manifest = dict(snapshot['manifest'])
+                if manifest['generation'] <= self._committed_generation:
+                    return False
+                
+                # 元數據與原始向量儲存為僅追加文件，只需同步，水位記錄在清單中
+                self.metadata_store.flush()
+                if self.raw_vectors is not None:
+                    self.raw_vectors.flush()
+                
+                # 文件倒排索引在背景合併並剔除已刪除向量
+                documents_file = self._documents.index_file
+                tmp_documents_file = documents_file.with_name(documents_file.name + ".tmp")
+                self._documents.write(snapshot['documents'], self.metadata_store, tmp_documents_file)
+                manifest['document_index_checksum'] = _file_crc32(tmp_documents_file)
+                
+                # 元數據欄位索引：尚未建立的欄位在此背景解碼一次，之後重新開啟直接載入
+                tmp_fields_file = self.fields_file.with_name(self.fields_file.name + ".tmp")
+                VectorIdPostings.write_fields(snapshot['fields'], self.metadata_store, tmp_fields_file)
+                manifest['field_index_checksum'] = _file_crc32(tmp_fields_file)
+                
+                index_bytes = snapshot['index_bytes']
+                manifest['index_checksum'] = _crc32_hex(index_bytes)
+                manifest['index_bytes'] = len(index_bytes)
+                manifest['checksum'] = _manifest_checksum(manifest)
+                
+                tmp_index_file = self.index_file.with_name(self.index_file.name + ".tmp")
+                with open(tmp_index_file, 'wb') as f:
+                    f.write(memoryview(index_bytes))
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                tmp_manifest_file = self.manifest_file.with_name(self.manifest_file.name + ".tmp")
+                with open(tmp_manifest_file, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                # 已映射舊文件的唯讀程序不受替換影響
+                os.replace(tmp_index_file, self.index_file)
+                _fsync_dir(self.index_path)
+                os.replace(tmp_documents_file, documents_file)
+                os.replace(tmp_fields_file, self.fields_file)
+                _fsync_dir(self.metadata_dir)
+                os.replace(tmp_manifest_file, self.manifest_file)
+                _fsync_dir(self.index_path)
+                
+                self._committed_generation = manifest['generation']
+                self._snapshot_bytes = (
+                    len(index_bytes) + documents_file.stat().st_size + self.fields_file.stat().st_size
+                    + self.manifest_file.stat().st_size
+                )
+                return True
+                
+        except Exception as e:
+            raise VectorStorageError(f"保存索引失敗: {str(e)}")
+    
+    def _normalize_vector(self, embedding: List[float]) -> np.ndarray:
+        """正規化向量（用於餘弦相似度）"""
+        return self._normalize_vectors(np.array(embedding, dtype=np.float32).reshape(1, -1))
+    
+    def _normalize_vectors(self, vectors: np.ndarray, inplace: bool = False) -> np.ndarray:
+        """
+        逐列正規化向量矩陣（用於餘弦相似度）
+        
+        Args:
+            vectors: 向量矩陣 (n, dimension)
+            inplace: 輸入已是 C 連續 float32 陣列時直接就地正規化，不複製
+            
+        Returns:
+            np.ndarray: 正規化後的 float32 矩陣
+        """
+        if inplace:
+            matrix = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        else:
+            matrix = np.array(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        
+        if self.metric == "cosine":
+            # 正規化向量用於餘弦相似度計算，零向量保持不變
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=matrix, where=norms > 0)
+        
+        return matrix
+    
+    def _ensure_writable(self) -> None:
+        """唯讀模式下拒絕寫入"""
+        if self.read_only:
+            raise VectorStorageError("索引以唯讀模式開啟，無法寫入")
+    
+    async def reload(self) -> bool:
+        """
+        重新映射最新的索引快照（唯讀副本用於取得寫入程序的新快照）
+        
+        Returns:
+            bool: 是否成功重新加載
+        """
+        if not self.read_only:
+            logger.warning("只有唯讀模式的索引可以重新加載快照")
+            return False
+        
+        try:
+            async with self._lock, self._rw_lock.write():
+                if not await self._load_existing_index():
+                    return False
+            
+            async with self._indexes_lock:
+                for child in self._child_indexes.values():
+                    await child.reload()
+            
+            logger.info(f"已重新映射索引快照: {self.index.ntotal} 個向量")
+            return True
+            
+        except Exception as e:
+            logger.error(f"重新加載索引失敗: {str(e)}")
+            return False
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """取得專用執行緒池，首次使用時創建"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.search_workers,
+                thread_name_prefix="faiss"
+            )
+            self._owns_executor = True
+        return self._executor
+    
+    async def _run_in_executor(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在專用執行緒池中執行 Faiss 或磁盤操作（Faiss 計算時會釋放 GIL）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(func, *args))
+    
+    async def close(self) -> None:
+        """關閉向量資料庫連接"""
+        try:
+            # 先寫入合併中的單筆請求
+            await self._write_coalescer.drain()
+            
+            for task in (self._promotion_task, self._compaction_task, self._tombstone_task, self._rebuild_task):
+                if task is not None:
+                    await asyncio.gather(task, return_exceptions=True)
+            self._promotion_task = None
+            self._compaction_task = None
+            self._tombstone_task = None
+            self._rebuild_task = None
+            self._previous_index = None
+            
+            async with self._indexes_lock:
+                for index_name, child in self._child_indexes.items():
+                    await child.close()
+                    self._residency.remove(index_name)
+                self._child_indexes.clear()
+            if self._closing_indexes:
+                await asyncio.gather(*self._closing_indexes.values(), return_exceptions=True)
+            
+            if self.index is not None:
+                await self.checkpoint()
+            
+            async with self._lock:
+                # 等待進行中的搜索結束後再釋放資源
+                async with self._rw_lock.write():
+                    self.index = None
+                    
+                    if self._wal is not None:
+                        self._wal.close()
+                        self._wal = None
+                    
+                    self.metadata_store.close()
+                    if self.raw_vectors is not None:
+                        self.raw_vectors.close()
+            
+            if self._executor is not None and self._owns_executor:
+                self._executor.shutdown(wait=True)
+            self._executor = None
+            
+            logger.info("Faiss 索引已關閉")
+            
+        except Exception as e:
+            logger.error(f"關閉 Faiss 索引失敗: {str(e)}")
+    
+    async def _add_vectors_locked(
+        self,
+        vectors: np.ndarray,
+        records_metadata: List[Dict[str, Any]]
+    ) -> np.ndarray:
+        """
+        在已持有寫者鎖的情況下追加已正規化的向量
+        
+        日誌在獨佔區段之外寫入；記憶體中的索引與元數據只在短暫的寫鎖內發布，
+        搜索只會看到整批寫入之前或之後的狀態
+        """
+        faiss_ids = np.arange(self.next_id, self.next_id + len(vectors), dtype=np.int64)
+        
+        if self._wal is not None:
+            await self._run_in_executor(self._wal.append_add, faiss_ids, vectors, records_metadata)
+        
+        async with self._rw_lock.write():
+            await self._run_in_executor(self._publish_add, faiss_ids, vectors, records_metadata)
+        
+        self._maybe_schedule_promotion()
+        return faiss_ids
+    
+    def _publish_add(
+        self,
+        faiss_ids: np.ndarray,
+        vectors: np.ndarray,
+        records_metadata: List[Dict[str, Any]]
+    ) -> None:
+        """將連續 faiss_id 的向量加入索引、原始向量、元數據與倒排位圖"""
+        start_id = int(faiss_ids[0])
+        
+        self.index.add_with_ids(vectors, faiss_ids)
+        if self.raw_vectors is not None:
+            self.raw_vectors.append(start_id, vectors)
+        self.metadata_store.append(start_id, records_metadata)
+        self._postings.add(start_id, records_metadata)
+        self._counters.add(records_metadata)
+        self._documents.add(start_id, records_metadata)
+        
+        self.next_id = start_id + len(faiss_ids)
+        self._bump_write_generation()
+    
+    async def _delete_ids_locked(self, faiss_ids: np.ndarray) -> int:
+        """在已持有寫者鎖的情況下將向量標記為墓碑，累積到閾值後由背景任務從索引中移除"""
+        ids = np.asarray(faiss_ids, dtype=np.int64)
+        if len(ids) == 0:
+            return 0
+        
+        deleted_at = datetime.now().isoformat()
+        
+        if self._wal is not None:
+            # 同一筆記錄的所有ID共用刪除時間，只寫入一份
+            await self._run_in_executor(self._wal.append_delete, ids, [{'deleted_at': deleted_at}])
+        
+        async with self._rw_lock.write():
+            return self._mark_deleted(ids, deleted_at)
+    
+    def _mark_deleted(self, faiss_ids: np.ndarray, deleted_at: Optional[str]) -> int:
+        """標記墓碑並同步更新倒排位圖與計數，返回新標記的數量"""
+        ids = np.unique(np.asarray(faiss_ids, dtype=np.int64))
+        # 只計入原本有效的向量，重複刪除不影響計數
+        ids = ids[~self.metadata_store.deleted_mask(ids)]
+        
+        self._counters.remove(self.metadata_store, ids)
+        marked = self.metadata_store.mark_deleted(ids.tolist(), deleted_at)
+        self._tombstone_count += marked
+        self._postings.remove(ids)
+        if marked:
+            self._bump_write_generation()
+        return marked
+    
+    def _bump_write_generation(self) -> None:
+        """更新寫入世代，使依賴舊內容的快取失效"""
+        self._write_generation = next(_write_generations)
+    
+    def get_write_generation(self) -> Optional[int]:
+        """
+        取得寫入世代（寫入、刪除、重建或重新加載後改變）
+        
+        Returns:
+            Optional[int]: 寫入世代
+        """
+        return self._write_generation
+    
+    async def _persist_deletion(self) -> None:
+        """刪除後依持久化模式保存，並視墓碑比例安排背景移除"""
+        if self._wal is not None:
+            self._maybe_schedule_compaction()
+        else:
+            await self._save_index()
+        self._maybe_schedule_tombstone_compaction()
+    
+    async def store_vector(
+        self,
+        embedding: List[float],
+        document_id: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """儲存向量到資料庫（同時進行的呼叫會合併為一批寫入）"""
+        try:
+            self._ensure_writable()
+            
+            # 驗證向量維度
+            if len(embedding) != self.dimension:
+                raise VectorStorageError(f"向量維度不匹配: {len(embedding)} != {self.dimension}")
+            
+            # 複製一份，正規化不影響呼叫者的陣列
+            vector = np.array(embedding, dtype=np.float32)
+            if self.write_coalesce_max_batch <= 1:
+                vector_ids = await self._store_coalesced(vector.reshape(1, -1), [document_id], [metadata or {}])
+                return vector_ids[0]
+            
+            return await self._write_coalescer.submit(vector, document_id, metadata or {})
+                
+        except Exception as e:
+            logger.error(f"儲存向量失敗: {str(e)}")
+            raise VectorStorageError(str(e))
+    
+    def _new_vector_records(
+        self,
+        document_ids: List[str],
+        metadata_list: Optional[List[Dict[str, Any]]]
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """生成向量ID與要儲存的元數據記錄"""
+        vector_ids = [str(uuid.uuid4()) for _ in range(len(document_ids))]
+        created_at = datetime.now().isoformat()
+        records_metadata = [
+            {
+                'vector_id': vector_id,
+                'document_id': document_id,
+                'created_at': created_at,
+                'dimension': self.dimension,
+                **(metadata_list[i] if metadata_list else {})
+            }
+            for i, (vector_id, document_id) in enumerate(zip(vector_ids, document_ids))
+        ]
+        return vector_ids, records_metadata
+    
+    async def _store_coalesced(
+        self,
+        vectors: np.ndarray,
+        document_ids: List[str],
+        metadata_list: List[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        寫入一批合併的單筆請求
+        
+        與 store_vectors_batch 相同以一次鎖與一條日誌記錄寫入；快照模式仍沿用每 100 個向量
+        保存一次的策略，不因合併而每批重寫快照
+        
+        Args:
+            vectors: (n, dimension) float32 矩陣（已驗證維度，會被就地正規化）
+            document_ids: 文件ID列表
+            metadata_list: 元數據列表
+            
+        Returns:
+            List[str]: 向量ID列表（與輸入順序相同）
+        """
+        vectors = self._normalize_vectors(vectors, inplace=True)
+        vector_ids, records_metadata = self._new_vector_records(document_ids, metadata_list)
+        
+        async with self._lock:
+            previous_id = self.next_id
+            await self._add_vectors_locked(vectors, records_metadata)
+            
+            if self._wal is not None:
+                self._maybe_schedule_compaction()
+            elif self.next_id // 100 != previous_id // 100:
+                # 定期保存（每100個向量）
+                await self._save_index()
+        
+        logger.debug(f"成功儲存 {len(vector_ids)} 個向量")
+        return vector_ids
+    
+    async def store_vectors_batch(
+        self,
+        embeddings: Union[List[List[float]], np.ndarray],
+        document_ids: List[str],
+        metadata_list: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
+        """
+        批次儲存向量
+        
+        Args:
+            embeddings: 向量列表或 (n, dimension) 矩陣；C 連續的 float32 矩陣會被就地正規化，不再複製
+            document_ids: 文件ID列表
+            metadata_list: 元數據列表
+            
+        Returns:
+            List[str]: 向量ID列表
+        """
+        try:
+            self._ensure_writable()
+            
+            if len(embeddings) != len(document_ids):
+                raise VectorStorageError("embeddings 和 document_ids 長度不匹配")
+            
+            if metadata_list and len(metadata_list) != len(embeddings):
+                raise VectorStorageError("metadata_list 長度不匹配")
+            
+            # 驗證與正規化不需持有鎖
+            if isinstance(embeddings, np.ndarray):
+                if embeddings.ndim != 2 or embeddings.shape[1] != self.dimension:
+                    raise VectorStorageError(f"向量矩陣形狀不匹配: {embeddings.shape} != (n, {self.dimension})")
+            else:
+                for i, embedding in enumerate(embeddings):
+                    # 驗證向量維度
+                    if len(embedding) != self.dimension:
+                        raise VectorStorageError(f"向量 {i} 維度不匹配: {len(embedding)} != {self.dimension}")
+            
+            if len(embeddings) == 0:
+                return []
+            
+            # 一次轉換並正規化整個矩陣
+            vectors = self._normalize_vectors(
+                np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension),
+                inplace=True
+            )
+            
+            vector_ids, records_metadata = self._new_vector_records(document_ids, metadata_list)
+            
+            async with self._lock:
+                # 批次添加向量
+                if len(vectors):
+                    await self._add_vectors_locked(vectors, records_metadata)
+                    
+                    # 日誌模式下只在累積足夠時背景壓實，否則重寫快照
+                    if self._wal is not None:
+                        self._maybe_schedule_compaction()
+                    else:
+                        await self._save_index()
+                
+                logger.info(f"成功批次儲存 {len(vector_ids)} 個向量")
+                return vector_ids
+                
+        except Exception as e:
+            logger.error(f"批次儲存向量失敗: {str(e)}")
+            raise VectorStorageError(str(e))
+    
+    
+    def _vector_records(self, faiss_ids: np.ndarray) -> List[Optional[VectorRecord]]:
+        """由 faiss_id 組成向量記錄（-1 表示不存在）"""
+        found = faiss_ids >= 0
+        try:
+            vectors = self._reconstruct(faiss_ids[found])
+        except RuntimeError:
+            # 未保留原始向量且索引類型無法重建時只返回元數據
+            vectors = None
+        
+        records: List[Optional[VectorRecord]] = []
+        position = 0
+        for faiss_id in faiss_ids.tolist():
+            if faiss_id < 0:
+                records.append(None)
+                continue
+            
+            metadata = self.metadata_store.get(faiss_id)
+            embedding = vectors[position].tolist() if vectors is not None else []
+            position += 1
+            
+            records.append(VectorRecord(
+                vector_id=metadata['vector_id'],
+                document_id=metadata['document_id'],
+                embedding=embedding,
+                metadata=metadata,
+                created_at=datetime.fromisoformat(metadata['created_at'])
+            ))
+        
+        return records
+    
+    async def get_vector(self, vector_id: str) -> Optional[VectorRecord]:
+        """根據向量ID獲取向量記錄（餘弦度量時返回正規化後的向量）"""
+        try:
+            async with self._rw_lock.read():
+                faiss_id = self.metadata_store.find(vector_id)
+                if faiss_id is None:
+                    return None
+                
+                records = await self._run_in_executor(
+                    self._vector_records, np.array([faiss_id], dtype=np.int64)
+                )
+                return records[0]
+                
+        except Exception as e:
+            logger.error(f"獲取向量失敗: {vector_id} - {str(e)}")
+            return None
+    
+    async def get_vectors(self, vector_ids: List[str]) -> List[Optional[VectorRecord]]:
+        """
+        批次根據向量ID獲取向量記錄
+        
+        Args:
+            vector_ids: 向量ID列表
+            
+        Returns:
+            List[Optional[VectorRecord]]: 與輸入順序對應的向量記錄，不存在的為None
+        """
+        try:
+            async with self._rw_lock.read():
+                faiss_ids = self.metadata_store.find_many(vector_ids)
+                return await self._run_in_executor(self._vector_records, faiss_ids)
+                
+        except Exception as e:
+            logger.error(f"批次獲取向量失敗: {str(e)}")
+            return [None] * len(vector_ids)
+    
+    async def delete_vector(self, vector_id: str) -> bool:
+        """刪除向量"""
+        try:
+            self._ensure_writable()
+            
+            async with self._lock:
+                faiss_id = self.metadata_store.find(vector_id)
+                if faiss_id is None:
+                    return False
+                
+                await self._delete_ids_locked(np.array([faiss_id]))
+                await self._persist_deletion()
+                return True
+                
+        except Exception as e:
+            logger.error(f"刪除向量失敗: {vector_id} - {str(e)}")
+            return False
+    
+    async def delete_vectors_by_document(self, document_id: str) -> int:
+        """根據文件ID刪除所有相關向量"""
+        try:
+            self._ensure_writable()
+            
+            async with self._lock:
+                deleted_ids = self._find_document_ids(document_id)
+                deleted_count = await self._delete_ids_locked(deleted_ids)
+                
+                if deleted_count > 0:
+                    await self._persist_deletion()
+                
+                logger.info(f"標記刪除 {deleted_count} 個向量（文件ID: {document_id}）")
+                return deleted_count
+                
+        except Exception as e:
+            logger.error(f"按文件ID刪除向量失敗: {document_id} - {str(e)}")
+            return 0
+    
+    async def delete_vectors_by_document_path(self, document_path: str) -> int:
+        """
+        刪除同一文件路徑下的所有分塊向量（重新導入文件前使用）
+        
+        Args:
+            document_path: 文件路徑
+            
+        Returns:
+            int: 刪除的向量數量
+        """
+        try:
+            self._ensure_writable()
+            
+            async with self._lock:
+                deleted_ids = self._live_posting_ids(document_path_key(document_path))
+                deleted_count = await self._delete_ids_locked(deleted_ids)
+                
+                if deleted_count > 0:
+                    await self._persist_deletion()
+                
+                logger.info(f"標記刪除 {deleted_count} 個向量（文件路徑: {document_path}）")
+                return deleted_count
+                
+        except Exception as e:
+            logger.error(f"按文件路徑刪除向量失敗: {document_path} - {str(e)}")
+            return 0
+    
+    async def count_vectors_by_document_path(self, document_path: str) -> int:
+        """
+        計算文件路徑下的有效向量數量
+        
+        Args:
+            document_path: 文件路徑
+            
+        Returns:
+            int: 有效向量數量
+        """
+        async with self._rw_lock.read():
+            return len(self._live_posting_ids(document_path_key(document_path)))
+    
+    def _live_posting_ids(self, key: int) -> np.ndarray:
+        """從文件倒排索引取得鍵對應的有效 faiss_id"""
+        ids = self._documents.lookup(key)
+        return ids[~self.metadata_store.deleted_mask(ids)]
+    
+    def _find_document_ids(self, document_id: str) -> np.ndarray:
+        """以文件倒排索引查找文件的有效 faiss_id，並比對原始字串排除雜湊碰撞"""
+        ids = self._live_posting_ids(document_key(document_id))
+        return ids[self.metadata_store.match_document(ids, document_id)]
+    
+    async def similarity_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[VectorSearchResult]:
+        """
+        相似性搜索（知識庫與文件過濾以 ID 選擇器下推至索引）
+        
+        Args:
+            query_embedding: 查詢向量
+            top_k: 返回結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+            
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        try:
+            if len(query_embedding) != self.dimension:
+                raise VectorSearchError(f"查詢向量維度不匹配: {len(query_embedding)} != {self.dimension}")
+            
+            # 正規化查詢向量
+            query_vector = self._normalize_vector(query_embedding)
+            
+            # 搜索共享讀鎖並在執行緒池中執行，多個搜索可並行
+            async with self._rw_lock.read():
+                results = (await self._run_in_executor(
+                    self._search_results_locked, query_vector, top_k, similarity_threshold,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter), nprobe, ef_search
+                ))[0]
+            
+            logger.debug(f"相似性搜索完成: {len(results)} 個結果")
+            return results
+                
+        except Exception as e:
+            logger.error(f"相似性搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+    
+    async def similarity_search_batch(
+        self,
+        query_embeddings: Union[List[List[float]], np.ndarray],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[VectorSearchResult]]:
+        """
+        批次相似性搜索，所有查詢以單次 Faiss 搜索完成
+        
+        Args:
+            query_embeddings: 查詢向量矩陣 (n, dimension)
+            top_k: 每個查詢返回的結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+            
+        Returns:
+            List[List[VectorSearchResult]]: 與查詢順序對應的搜索結果列表
+        """
+        try:
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if queries.size == 0:
+                return []
+            if queries.ndim != 2 or queries.shape[1] != self.dimension:
+                raise VectorSearchError(f"查詢矩陣形狀不匹配: {queries.shape} != (n, {self.dimension})")
+            
+            query_vectors = self._normalize_vectors(queries)
+            
+            async with self._rw_lock.read():
+                results = await self._run_in_executor(
+                    self._search_results_locked, query_vectors, top_k, similarity_threshold,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter), nprobe, ef_search
+                )
+            
+            logger.debug(f"批次相似性搜索完成: {len(results)} 個查詢")
+            return results
+                
+        except Exception as e:
+            logger.error(f"批次相似性搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+    
+    async def range_search(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        max_results: Optional[int] = DEFAULT_RANGE_SEARCH_MAX_RESULTS,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[VectorSearchResult]:
+        """
+        範圍搜索，以 Faiss 原生 range_search 返回所有相似度不低於閾值的結果
+        
+        Flat 與 IVF 索引直接以半徑搜索；不支援範圍搜索的索引（HNSW、非 IVF 的量化索引）
+        以逐步加深的 top-k 搜索取得，直到最低分低於閾值或涵蓋所有候選
+        
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            max_results: 結果數量上限，超過時只保留相似度最高者（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+            
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        try:
+            query_vector = self._range_query_vector(query_embedding)
+            
+            async with self._rw_lock.read():
+                faiss_ids, scores = await self._run_in_executor(
+                    self._range_hits_locked, query_vector, similarity_threshold, max_results,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter), nprobe, ef_search
+                )
+                results = await self._run_in_executor(
+                    self._build_search_results, faiss_ids, scores, document_ids
+                )
+            
+            logger.debug(f"範圍搜索完成: {len(results)} 個結果")
+            return results
+                
+        except Exception as e:
+            logger.error(f"範圍搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+    
+    async def range_search_iter(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        batch_size: int = 1000,
+        max_results: Optional[int] = None,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> AsyncIterator[List[VectorSearchResult]]:
+        """
+        串流範圍搜索
+        
+        命中的 faiss_id 與分數先以緊湊陣列取得，結果物件與元數據逐批解碼；
+        每批各自取得讀鎖，批次之間寫入可以進行，期間被刪除的向量不會返回
+        
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            batch_size: 每批的結果數量
+            max_results: 結果數量上限（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+            
+        Yields:
+            List[VectorSearchResult]: 一批按相似度降序排列的搜索結果
+        """
+        try:
+            query_vector = self._range_query_vector(query_embedding)
+            
+            async with self._rw_lock.read():
+                faiss_ids, scores = await self._run_in_executor(
+                    self._range_hits_locked, query_vector, similarity_threshold, max_results,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter), nprobe, ef_search
+                )
+            
+            for start in range(0, len(faiss_ids), batch_size):
+                async with self._rw_lock.read():
+                    batch = await self._run_in_executor(
+                        self._build_search_results,
+                        faiss_ids[start:start + batch_size], scores[start:start + batch_size], document_ids
+                    )
+                if batch:
+                    yield batch
+                
+        except Exception as e:
+            logger.error(f"串流範圍搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+    
+    def _range_query_vector(self, query_embedding: List[float]) -> np.ndarray:
+        """驗證並正規化範圍搜索的查詢向量"""
+        if len(query_embedding) != self.dimension:
+            raise VectorSearchError(f"查詢向量維度不匹配: {len(query_embedding)} != {self.dimension}")
+        return self._normalize_vector(query_embedding)
+    
+    def _similarity_scores(self, distances: np.ndarray) -> np.ndarray:
+        """將 Faiss 距離轉換為相似度（L2 距離以 1/(1+d) 轉換，內積即為相似度）"""
+        distances = np.asarray(distances, dtype=np.float64)
+        if self.metric == "euclidean":
+            return 1.0 / (1.0 + distances)
+        return distances
+    
+    def _range_radius(self, similarity_threshold: float) -> Optional[float]:
+        """
+        相似度閾值對應的 Faiss 搜索半徑
+        
+        內積索引返回分數大於半徑者，L2 索引返回距離小於半徑者；
+        半徑向外移一個浮點數間距，使恰等於閾值的結果也被包含
+        
+        Returns:
+            Optional[float]: 搜索半徑，閾值不可能達到時為 None
+        """
+        if self.metric != "euclidean":
+            return float(np.nextafter(np.float32(similarity_threshold), np.float32(-np.inf)))
+        if similarity_threshold <= 0:
+            return float(np.finfo(np.float32).max)
+        if similarity_threshold > 1:
+            return None
+        return float(np.nextafter(np.float32(1.0 / similarity_threshold - 1.0), np.float32(np.inf)))
+    
+    def _range_hits_locked(
+        self,
+        query_vector: np.ndarray,
+        similarity_threshold: float,
+        max_results: Optional[int],
+        document_ids: Optional[List[str]],
+        knowledge_base_ids: Optional[List[str]],
+        conditions: Tuple[MetadataCondition, ...],
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        在已持有讀鎖的情況下取得範圍搜索的命中
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 依相似度降序排列的 faiss_id 與相似度
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        if max_results is not None and max_results <= 0:
+            return empty
+        
+        mask, candidates = self._filter_mask_locked(document_ids, knowledge_base_ids, conditions)
+        if candidates == 0:
+            return empty
+        
+        inner = faiss.downcast_index(self.index.index)
+        exact = self._use_exact_candidates(mask, candidates)
+        if exact:
+            distances, faiss_ids = self._candidate_distances(query_vector, mask)
+            distances = distances[0]
+        elif isinstance(inner, (faiss.IndexFlat, faiss.IndexIVF)):
+            radius = self._range_radius(similarity_threshold)
+            if radius is None:
+                return empty
+            faiss_ids, distances = self._native_range_search(inner, query_vector, radius, mask, nprobe)
+        else:
+            faiss_ids, distances = self._deepening_range_search(
+                query_vector, similarity_threshold, max_results, mask, candidates, nprobe, ef_search
+            )
+        
+        if not exact and self._should_rescore() and len(faiss_ids):
+            distances, faiss_ids = self._rescore(query_vector, faiss_ids[None, :], len(faiss_ids))
+            distances, faiss_ids = distances[0], faiss_ids[0]
+        
+        scores = self._similarity_scores(distances)
+        keep = (faiss_ids >= 0) & (scores >= similarity_threshold)
+        keep[keep] &= ~self.metadata_store.deleted_mask(faiss_ids[keep])
+        faiss_ids, scores = faiss_ids[keep], scores[keep]
+        
+        order = np.argsort(-scores, kind='stable')
+        if max_results is not None:
+            order = order[:max_results]
+        return faiss_ids[order], scores[order]
+    
+    def _native_range_search(
+        self,
+        inner: "faiss.Index",
+        query_vector: np.ndarray,
+        radius: float,
+        mask: Optional[np.ndarray],
+        nprobe: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """以內層索引的 range_search 搜索單個查詢，返回 faiss_id 與 Faiss 距離"""
+        id_map = self._id_map_view()
+        params_kwargs = {}
+        if mask is not None:
+            packed = self._position_bitmap(mask, id_map)
+            params_kwargs['sel'] = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))
+        
+        if isinstance(inner, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, **params_kwargs)
+        elif params_kwargs:
+            params = faiss.SearchParameters(**params_kwargs)
+        else:
+            params = None
+        
+        _, distances, positions = inner.range_search(query_vector, radius, params=params)
+        return id_map[positions], distances
+    
+    def _deepening_range_search(
+        self,
+        query_vector: np.ndarray,
+        similarity_threshold: float,
+        max_results: Optional[int],
+        mask: Optional[np.ndarray],
+        candidates: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        以逐步加深的 top-k 搜索模擬範圍搜索（用於不支援 range_search 的索引）
+        
+        每輪 k 加倍，直到最低分已低於閾值、命中數達到上限或已涵蓋所有候選
+        """
+        k = min(candidates, max(64, max_results or 0))
+        while True:
+            distances, faiss_ids = self._search(
+                query_vector, self._filtered_search_k(k, mask, candidates), mask, nprobe, ef_search
+            )
+            found = faiss_ids[0] >= 0
+            faiss_ids, distances = faiss_ids[0][found], distances[0][found]
+            
+            scores = self._similarity_scores(distances)
+            hits = int(np.count_nonzero(scores >= similarity_threshold))
+            if (
+                k >= candidates
+                or hits < len(scores)
+                or (max_results is not None and hits >= max_results)
+            ):
+                return faiss_ids, distances
+            k = min(k * 2, candidates)
+    
+    def _build_search_results(
+        self,
+        faiss_ids: np.ndarray,
+        scores: np.ndarray,
+        document_ids: Optional[List[str]]
+    ) -> List[VectorSearchResult]:
+        """由命中的 faiss_id 與相似度建立搜索結果，略過已刪除的向量與文件ID雜湊碰撞"""
+        deleted = self.metadata_store.deleted_mask(faiss_ids)
+        results = []
+        for faiss_id, score, is_deleted in zip(faiss_ids.tolist(), scores.tolist(), deleted):
+            if is_deleted:
+                continue
+            metadata = self.metadata_store.get(faiss_id)
+            if not metadata or (document_ids and metadata['document_id'] not in document_ids):
+                continue
+            results.append(VectorSearchResult(
+                vector_id=metadata['vector_id'],
+                document_id=metadata['document_id'],
+                similarity_score=float(score),
+                metadata=metadata
+            ))
+        return results
+    
+    def _search_results_locked(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int,
+        similarity_threshold: float,
+        document_ids: Optional[List[str]],
+        knowledge_base_ids: Optional[List[str]],
+        conditions: Tuple[MetadataCondition, ...],
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> List[List[VectorSearchResult]]:
+        """在已持有讀鎖的情況下搜索已正規化的查詢矩陣，返回每個查詢的結果"""
+        mask, candidates = self._filter_mask_locked(document_ids, knowledge_base_ids, conditions)
+        search_k = min(top_k, candidates)
+        if search_k == 0:
+            return [[] for _ in range(len(query_vectors))]
+        
+        if self._use_exact_candidates(mask, candidates):
+            scores, indices = self._exact_candidate_top_k(query_vectors, mask, search_k)
+        elif self._should_rescore():
+            # 量化編碼只用於挑選候選，最終分數以原始向量精確計算
+            rescore_k = min(search_k * self.rescore_factor, candidates)
+            _, candidate_ids = self._search(
+                query_vectors, self._filtered_search_k(rescore_k, mask, candidates), mask, nprobe, ef_search
+            )
+            scores, indices = self._rescore(query_vectors, candidate_ids, search_k)
+        else:
+            scores, indices = self._search(
+                query_vectors, self._filtered_search_k(search_k, mask, candidates), mask, nprobe, ef_search
+            )
+        
+        # 只對命中結果解碼元數據，多個查詢命中同一向量時共用
+        deleted = self.metadata_store.deleted_mask(indices.ravel()).reshape(indices.shape)
+        metadata_cache: Dict[int, Optional[Dict[str, Any]]] = {}
+        
+        all_results = []
+        for row_scores, row_ids, row_deleted in zip(scores, indices, deleted):
+            results = []
+            for score, faiss_id, is_deleted in zip(row_scores, row_ids, row_deleted):
+                if faiss_id == -1 or is_deleted:  # 無效或已刪除
+                    continue
+                
+                faiss_id = int(faiss_id)
+                if faiss_id not in metadata_cache:
+                    metadata_cache[faiss_id] = self.metadata_store.get(faiss_id)
+                metadata = metadata_cache[faiss_id]
+                if not metadata:
+                    continue
+                
+                # 文件ID過濾
+                if document_ids and metadata['document_id'] not in document_ids:
+                    continue
+                
+                # 轉換相似度分數
+                if self.metric == "cosine":
+                    similarity_score = float(score)  # 內積結果已經是餘弦相似度
+                elif self.metric == "euclidean":
+                    # L2距離轉換為相似度
+                    similarity_score = 1.0 / (1.0 + float(score))
+                else:
+                    similarity_score = float(score)
+                
+                # 相似度閾值過濾
+                if similarity_score < similarity_threshold:
+                    continue
+                
+                results.append(VectorSearchResult(
+                    vector_id=metadata['vector_id'],
+                    document_id=metadata['document_id'],
+                    similarity_score=similarity_score,
+                    metadata=metadata
+                ))
+                
+                if len(results) >= top_k:
+                    break
+            
+            # 按相似度降序排序
+            results.sort(key=lambda x: x.similarity_score, reverse=True)
+            all_results.append(results)
+        
+        return all_results
+    
+    def _filter_mask_locked(
+        self,
+        document_ids: Optional[List[str]],
+        knowledge_base_ids: Optional[List[str]],
+        conditions: Tuple[MetadataCondition, ...] = ()
+    ) -> Tuple[Optional[np.ndarray], int]:
+        """
+        有過濾條件或墓碑時，建立只含符合條件有效向量的 faiss_id 位圖
+        
+        Returns:
+            Tuple[Optional[np.ndarray], int]: 位圖（無需過濾時為 None）與可搜索的向量數
+        """
+        if not (knowledge_base_ids or document_ids or conditions or self._tombstone_count):
+            return None, self.index.ntotal
+        
+        document_faiss_ids = None
+        if document_ids:
+            document_faiss_ids = self._documents.lookup_many(document_key(d) for d in document_ids)
+        mask = self._postings.filter_mask(knowledge_base_ids or None, document_faiss_ids, conditions)
+        return mask, int(np.count_nonzero(mask))
+    
+    def _use_exact_candidates(self, mask: Optional[np.ndarray], candidates: int) -> bool:
+        """過濾後只剩少量候選且保留原始向量時，以精確計算取代索引搜索"""
+        return (
+            mask is not None
+            and self.raw_vectors is not None
+            and candidates <= _EXACT_FILTER_MAX_CANDIDATES
+            and candidates <= self.index.ntotal * _EXACT_FILTER_MAX_FRACTION
+        )
+    
+    def _candidate_distances(self, query_vectors: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        以原始向量精確計算查詢與所有候選的距離
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 與 Faiss 相同度量的距離 (n, c) 與候選 faiss_id (c,)
+        """
+        candidate_ids = np.flatnonzero(mask).astype(np.int64)
+        vectors = self.raw_vectors.get(candidate_ids)
+        distances = query_vectors @ vectors.T
+        if self.metric == "euclidean":
+            # 與 Faiss 一致使用平方 L2 距離
+            distances = (
+                (query_vectors ** 2).sum(axis=1)[:, None] - 2 * distances + (vectors ** 2).sum(axis=1)[None, :]
+            )
+            np.maximum(distances, 0, out=distances)
+        return distances, candidate_ids
+    
+    def _exact_candidate_top_k(
+        self,
+        query_vectors: np.ndarray,
+        mask: np.ndarray,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """精確計算候選距離並取每個查詢的 top-k，返回與 Faiss 搜索相同形式的距離與 faiss_id (n, k)"""
+        distances, candidate_ids = self._candidate_distances(query_vectors, mask)
+        order = distances if self.metric == "euclidean" else -distances
+        top = np.argsort(order, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, top, axis=1), candidate_ids[top]
+    
+    def _filtered_search_k(self, k: int, mask: Optional[np.ndarray], candidates: int) -> int:
+        """
+        過濾搜索近似索引時的搜索深度
+        
+        圖索引遍歷時被選擇器排除的節點也佔用 k 個名額，依選擇率放大 k
+        才不會在符合條件的向量足夠時返回過少結果；精確索引不受影響
+        """
+        if mask is None or not self._is_ann_index():
+            return k
+        total = self.index.ntotal
+        return min(total, -(-k * total // max(candidates, 1)))
+    
+    def _search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        執行搜索，以 faiss_id 位圖作為 ID 選擇器並套用索引類型的搜索參數
+        
+        IDMap 包裝層不接受搜索參數，因此改為直接搜索內層索引：
+        位圖依 id_map 轉換為內層位置，結果位置再映射回 faiss_id
+        """
+        params_kwargs = {}
+        inner = faiss.downcast_index(self.index.index)
+        id_map = self._id_map_view()
+        
+        if mask is not None:
+            packed = self._position_bitmap(mask, id_map)
+            params_kwargs['sel'] = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))
+        
+        if self._is_ann_index():
+            if isinstance(inner, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, **params_kwargs)
+            elif isinstance(inner, faiss.IndexHNSW):
+                params = faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search, **params_kwargs)
+            else:
+                params = faiss.SearchParameters(**params_kwargs)
+        elif params_kwargs:
+            params = faiss.SearchParameters(**params_kwargs)
+        else:
+            return self.index.search(query_vector, k)
+        
+        scores, positions = inner.search(query_vector, k, params=params)
+        return scores, np.where(positions >= 0, id_map[np.maximum(positions, 0)], -1)
+    
+    @staticmethod
+    def _position_bitmap(mask: np.ndarray, id_map: np.ndarray) -> np.ndarray:
+        """將 faiss_id 位圖轉換為內層索引位置的壓縮位圖（供 IDSelectorBitmap 使用）"""
+        position_mask = np.zeros(len(id_map), dtype=bool)
+        in_range = id_map < len(mask)
+        position_mask[in_range] = mask[id_map[in_range]]
+        return np.packbits(position_mask, bitorder='little')
+    
+    def _id_map_view(self) -> np.ndarray:
+        """IDMap 內層位置到 faiss_id 的映射（共享記憶體，不複製）"""
+        size = self.index.id_map.size()
+        if size == 0:
+            return np.zeros(0, dtype=np.int64)
+        return faiss.rev_swig_ptr(self.index.id_map.data(), size)
+    
+    async def get_vector_count(self) -> int:
+        """獲取向量總數"""
+        try:
+            if self.index is None:
+                return 0
+            
+            # 未刪除的向量數量由寫入與刪除時增量維護
+            return self._counters.active
+            
+        except Exception as e:
+            logger.error(f"獲取向量總數失敗: {str(e)}")
+            return 0
+    
+    async def get_statistics(self) -> Dict[str, Any]:
+        """獲取資料庫統計資訊"""
         try:
             total_vectors = self.index.ntotal if self.index else 0
             active_vectors = await self.get_vector_count()
-            deleted_vectors = total_vectors - active_vectors
+            deleted_vectors = self._counters.total - active_vectors
             
-            # 計算文件統計
-            document_counts = {}
-            for metadata in self.metadata_map.values():
-                if not metadata.get('deleted', False):
-                    doc_id = metadata['document_id']
-                    document_counts[doc_id] = document_counts.get(doc_id, 0) + 1
+            # 量化索引相對於 float32 Flat 編碼的記憶體節省比例
+            float32_bytes = self.dimension * 4
+            bytes_per_vector = self._bytes_per_vector()
             
             return {
                 'total_vectors': total_vectors,
                 'active_vectors': active_vectors,
                 'deleted_vectors': deleted_vectors,
-                'unique_documents': len(document_counts),
+                'tombstoned_vectors': self._tombstone_count,
+                'delete_ratio': round(self.delete_ratio, 4),
+                'unique_documents': self._counters.document_count,
+                'knowledge_bases': self._counters.knowledge_base_counts,
                 'dimension': self.dimension,
                 'metric': self.metric,
                 'index_type': self.index_factory,
+                'active_index_type': self._active_index_type(),
+                'index_generation': self._index_generation,
+                'rollback_available': self._previous_index is not None,
+                'raw_vector_dtype': str(self.raw_vectors.dtype) if self.raw_vectors is not None else None,
+                'read_only': self.read_only,
+                'bytes_per_vector': round(bytes_per_vector, 2),
+                'float32_bytes_per_vector': float32_bytes,
+                'memory_savings': round(1 - bytes_per_vector / float32_bytes, 4),
+                'rescoring': self._should_rescore(),
                 'index_path': str(self.index_path),
-                'storage_size_mb': self._get_storage_size_mb()
+                'storage_size_mb': self._get_storage_size_mb(),
+                'index_residency': self.get_index_residency(),
+                'coalesced_write_batches': self._write_coalescer.batches,
+                'coalesced_writes': self._write_coalescer.coalesced_writes
             }
             
         except Exception as e:
             logger.error(f"獲取統計資訊失敗: {str(e)}")
             return {}
     
+    def get_index_residency(self) -> Dict[str, Any]:
+        """
+        取得命名空間索引的常駐記憶體、逐出與加載延遲統計
+        
+        Returns:
+            Dict[str, Any]: 記憶體上限、常駐位元組（合計與各索引）、固定數、加載與逐出次數、加載延遲
+        """
+        return self._residency.metrics()
+    
+    async def get_counters(self) -> Dict[str, Any]:
+        """
+        取得增量維護的即時計數（O(1)，不掃描元數據也不 stat 文件，適合頻繁輪詢）
+        
+        Returns:
+            Dict[str, Any]: 總數、有效數、刪除數、墓碑數、文件數、各知識庫向量數與磁盤用量
+        """
+        return self._counter_values()
+    
+    def _counter_values(self) -> Dict[str, Any]:
+        """目前的計數（亦隨快照清單持久化，供未加載時讀取）"""
+        return {
+            'total_vectors': self._counters.total,
+            'active_vectors': self._counters.active,
+            'deleted_vectors': self._counters.deleted,
+            'tombstoned_vectors': self._tombstone_count,
+            'unique_documents': self._counters.document_count,
+            'knowledge_bases': self._counters.knowledge_base_counts,
+            'storage_bytes': self._storage_bytes()
+        }
+    
+    async def get_document_vector_count(self, document_id: str) -> int:
+        """
+        取得單個文件的有效向量數量（O(1)）
+        
+        Args:
+            document_id: 文件ID
+            
+        Returns:
+            int: 有效向量數量
+        """
+        return self._counters.document_vectors(document_id)
+    
+    def _storage_bytes(self) -> int:
+        """根據已知的文件水位計算磁盤用量（位元組）"""
+        total = self._snapshot_bytes + self.metadata_store.storage_bytes
+        if self.raw_vectors is not None:
+            total += self.raw_vectors.storage_bytes
+        if self._wal is not None:
+            total += self._wal.pending_bytes
+        return total
+    
     def _get_storage_size_mb(self) -> float:
         """計算儲存大小（MB）"""
         try:
             total_size = 0
-            for file_path in [self.index_file, self.metadata_file, self.id_map_file]:
+            raw_files = self.raw_vectors.storage_files if self.raw_vectors is not None else []
+            for file_path in [self.index_file, self.manifest_file, *self.metadata_store.storage_files, *raw_files]:
                 if file_path.exists():
                     total_size += file_path.stat().st_size
             
+            if self.wal_dir.exists():
+                total_size += sum(p.stat().st_size for p in self.wal_dir.iterdir() if p.is_file())
+            
             return round(total_size / (1024 * 1024), 2)
             
         except Exception:
@@ -570,24 +2385,361 @@ class FaissVectorDatabase(VectorDatabaseInterface):
             logger.error(f"健康檢查失敗: {str(e)}")
             return False
     
+    def _index_dir(self, index_name: str) -> Optional[Path]:
+        """命名空間索引的目錄，名稱不合法時返回None"""
+        if index_name == DEFAULT_INDEX_NAME or not _INDEX_NAME_PATTERN.match(index_name):
+            return None
+        return self.indexes_dir / index_name
+    
+    async def _open_child_index(
+        self,
+        index_name: str,
+        dimension: Optional[int] = None,
+        metric: Optional[str] = None
+    ) -> "FaissVectorDatabase":
+        """開啟（或創建）命名空間索引，沿用本資料庫的持久化設定"""
+        index_dir = self._index_dir(index_name)
+        manifest_file = index_dir / self.manifest_file.name
+        
+        if manifest_file.exists():
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            dimension = manifest.get('dimension', dimension)
+            metric = manifest.get('metric', metric)
+        
+        child = FaissVectorDatabase(
+            str(index_dir),
+            dimension=dimension or self.dimension,
+            metric=metric or self.metric,
+            index_factory=self.index_factory,
+            persistence_mode=self.persistence_mode,
+            wal_segment_max_bytes=self.wal_segment_max_bytes,
+            wal_compaction_bytes=self.wal_compaction_bytes,
+            tombstone_compaction_ratio=self.tombstone_compaction_ratio,
+            nprobe=self.nprobe,
+            ef_search=self.ef_search,
+            ann_promotion_threshold=self.ann_promotion_threshold,
+            train_sample_size=self.train_sample_size,
+            raw_vector_dtype=self.raw_vector_dtype,
+            search_workers=self.search_workers,
+            read_only=self.read_only,
+            rescore_factor=self.rescore_factor,
+            verify_snapshot=self.verify_snapshot,
+            write_coalesce_max_batch=self.write_coalesce_max_batch,
+            write_coalesce_delay=self.write_coalesce_delay
+        )
+        # 所有命名空間共用同一個執行緒池
+        child._executor = self._get_executor()
+        child._owns_executor = False
+        started = time.perf_counter()
+        if not await child.initialize():
+            raise VectorStorageError(f"無法開啟索引: {index_name}")
+        
+        self._child_indexes[index_name] = child
+        self._residency.record_load(index_name, child._resident_bytes(), time.perf_counter() - started)
+        return child
+    
+    async def _evict_over_budget(self, protected: str) -> None:
+        """
+        常駐量超過記憶體上限時，依最久未使用的順序逐出子索引（需持有索引鎖）
+        
+        被固定、有進行中操作或正在取得的索引不會被逐出；逐出的索引在索引鎖外於背景關閉
+        （將日誌併入快照），不阻塞其他索引的取得，之後再次取得時等待關閉完成再由磁盤重新加載
+        """
+        if self._residency.budget_bytes is None:
+            return
+        
+        for index_name, child in self._child_indexes.items():
+            self._residency.update_bytes(index_name, child._resident_bytes())
+        
+        candidates = self._residency.eviction_candidates(
+            lambda index_name: index_name == protected or self._child_indexes[index_name]._is_busy()
+        )
+        for index_name in candidates:
+            child = self._child_indexes.pop(index_name)
+            self._residency.record_eviction(index_name)
+            self._evicted_generations[index_name] = child.get_write_generation()
+            self._closing_indexes[index_name] = asyncio.create_task(self._close_evicted(index_name, child))
+            logger.info(f"記憶體上限已滿，逐出索引: {index_name}")
+        
+        if self._residency.resident_bytes > self._residency.budget_bytes:
+            logger.warning(
+                f"索引常駐記憶體 {self._residency.resident_bytes} 字節超過上限 "
+                f"{self._residency.budget_bytes}，其餘索引使用中無法逐出"
+            )
+    
+    async def _close_evicted(self, index_name: str, child: "FaissVectorDatabase") -> None:
+        """在索引鎖外關閉被逐出的子索引"""
+        try:
+            await child.close()
+        finally:
+            self._closing_indexes.pop(index_name, None)
+    
+    @asynccontextmanager
+    async def _index_slot(self, index_name: str) -> AsyncIterator[None]:
+        """持有索引鎖，且該索引沒有進行中的逐出關閉（關閉中時先在鎖外等待）"""
+        while True:
+            closing = self._closing_indexes.get(index_name)
+            if closing is not None:
+                await asyncio.gather(closing, return_exceptions=True)
+                continue
+            
+            async with self._indexes_lock:
+                # 等待鎖期間可能又被逐出
+                if index_name not in self._closing_indexes:
+                    yield
+                    return
+    
+    async def _move_into_child(self, index_name: str, child: "FaissVectorDatabase") -> int:
+        """將預設索引中屬於該知識庫的向量搬移到其命名空間索引"""
+        if self.index is None:
+            return 0
+        
+        async with self._lock:
+            faiss_ids = np.flatnonzero(self._postings.filter_mask([index_name]))
+            if len(faiss_ids) == 0:
+                return 0
+            
+            vectors = self._reconstruct(faiss_ids)
+            records_metadata = [self.metadata_store.get(int(faiss_id)) for faiss_id in faiss_ids]
+            
+            async with child._lock:
+                await child._add_vectors_locked(vectors, records_metadata)
+            await child.checkpoint()
+            
+            await self._delete_ids_locked(faiss_ids)
+            await self._persist_deletion()
+        
+        logger.info(f"已將 {len(faiss_ids)} 個向量從預設索引搬移至索引 {index_name}")
+        return len(faiss_ids)
+    
+    async def get_index(
+        self,
+        index_name: str,
+        create: bool = False
+    ) -> Optional["FaissVectorDatabase"]:
+        """
+        取得命名空間索引（每個知識庫一個獨立目錄），按需加載
+        
+        Args:
+            index_name: 索引名稱，通常為知識庫ID
+            create: 索引不存在時是否創建
+            
+        Returns:
+            Optional[FaissVectorDatabase]: 索引實例，不存在且未要求創建時返回None
+        
+        設定記憶體上限時，加載新索引可能逐出最久未使用的其他索引；
+        需要長時間持有索引時請使用 use_index 固定
+        """
+        return await self._acquire_index(index_name, create)
+    
+    @asynccontextmanager
+    async def use_index(
+        self,
+        index_name: str,
+        create: bool = False
+    ) -> AsyncIterator[Optional["FaissVectorDatabase"]]:
+        """
+        取得命名空間索引並在區塊內固定，期間不會因記憶體上限被逐出
+        
+        Args:
+            index_name: 索引名稱，通常為知識庫ID
+            create: 索引不存在時是否創建
+            
+        Yields:
+            Optional[FaissVectorDatabase]: 索引實例，不存在且未要求創建時為None
+        """
+        index = await self._acquire_index(index_name, create, pin=True)
+        pinned = index is not None and index is not self
+        try:
+            yield index
+        finally:
+            if pinned:
+                self._residency.unpin(index_name)
+    
+    async def get_index_counters(self, index_name: str) -> Optional[Dict[str, Any]]:
+        """
+        取得命名空間索引的計數，不加載索引也不標記為最近使用
+        
+        未常駐的索引讀取快照清單中持久化的計數（逐出時關閉會寫入快照）；
+        尚未搬移到命名空間的舊向量只能提供有效向量數
+        
+        Args:
+            index_name: 索引名稱，通常為知識庫ID
+            
+        Returns:
+            Optional[Dict[str, Any]]: 計數資訊與是否常駐，索引不存在時返回None
+        """
+        if index_name == DEFAULT_INDEX_NAME:
+            return {**self._counter_values(), 'resident': True}
+        
+        index_dir = self._index_dir(index_name)
+        if index_dir is None:
+            return None
+        
+        child = self._child_indexes.get(index_name)
+        if child is not None:
+            return {**child._counter_values(), 'resident': True}
+        
+        # 關閉中的索引等待其快照寫入，避免讀到逐出前的舊計數
+        closing = self._closing_indexes.get(index_name)
+        if closing is not None:
+            await asyncio.gather(closing, return_exceptions=True)
+        
+        manifest_file = index_dir / self.manifest_file.name
+        if manifest_file.exists():
+            manifest = await asyncio.to_thread(self._read_manifest, manifest_file)
+            return {**manifest.get('counters', {}), 'resident': False}
+        
+        legacy = self._counters.knowledge_base_counts.get(index_name, 0) if self.index is not None else 0
+        if legacy:
+            return {'active_vectors': legacy, 'resident': False}
+        return None
+    
+    async def get_index_write_generation(self, index_name: str) -> Optional[int]:
+        """
+        取得命名空間索引的寫入世代，不加載索引也不標記為最近使用
+        
+        已逐出的索引沿用逐出時的世代（再次加載後改變）；從未加載的索引無法追蹤，返回None
+        
+        Args:
+            index_name: 索引名稱，通常為知識庫ID
+            
+        Returns:
+            Optional[int]: 寫入世代
+        """
+        if index_name == DEFAULT_INDEX_NAME:
+            return self._write_generation
+        
+        child = self._child_indexes.get(index_name)
+        if child is not None:
+            return child.get_write_generation()
+        return self._evicted_generations.get(index_name)
+    
+    async def _acquire_index(
+        self,
+        index_name: str,
+        create: bool,
+        pin: bool = False
+    ) -> Optional["FaissVectorDatabase"]:
+        """取得（必要時加載）命名空間索引，標記為最近使用並逐出超過記憶體上限的索引"""
+        if index_name == DEFAULT_INDEX_NAME:
+            return self
+        
+        index_dir = self._index_dir(index_name)
+        if index_dir is None:
+            logger.warning(f"不合法的索引名稱: {index_name}")
+            return None
+        
+        async with self._index_slot(index_name):
+            child = await self._load_child_locked(index_name, index_dir, create)
+            if child is None:
+                return None
+            
+            if pin:
+                self._residency.pin(index_name)
+            self._residency.touch(index_name, child._resident_bytes())
+            await self._evict_over_budget(index_name)
+            return child
+    
+    async def _load_child_locked(
+        self,
+        index_name: str,
+        index_dir: Path,
+        create: bool
+    ) -> Optional["FaissVectorDatabase"]:
+        """取得已加載的子索引，或由磁盤加載（需持有索引鎖）"""
+        child = self._child_indexes.get(index_name)
+        if child is not None:
+            return child
+        
+        exists = index_dir.exists()
+        # 預設索引中仍有該知識庫的舊向量時，建立命名空間並搬移（唯讀模式不搬移）
+        has_legacy = (
+            not self.read_only
+            and self.index is not None
+            and self._postings.filter_mask([index_name]).any()
+        )
+        if not exists and (self.read_only or not create) and not has_legacy:
+            return None
+        
+        child = await self._open_child_index(index_name)
+        if has_legacy:
+            await self._move_into_child(index_name, child)
+        return child
+    
     async def create_index(
         self,
         index_name: str,
         dimension: int,
         metric: str = "cosine"
     ) -> bool:
-        """創建索引（當前實作不支援多索引）"""
-        logger.warning("當前 Faiss 實作不支援多索引管理")
-        return False
+        """創建命名空間索引"""
+        try:
+            index_dir = self._index_dir(index_name)
+            if index_dir is None:
+                logger.warning(f"不合法的索引名稱: {index_name}")
+                return False
+            
+            async with self._index_slot(index_name):
+                if index_name in self._child_indexes or index_dir.exists():
+                    logger.warning(f"索引已存在: {index_name}")
+                    return False
+                
+                await self._open_child_index(index_name, dimension, metric)
+                await self._evict_over_budget(index_name)
+            
+            logger.info(f"創建索引: {index_name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"創建索引失敗: {index_name} - {str(e)}")
+            return False
     
     async def drop_index(self, index_name: str) -> bool:
-        """刪除索引（當前實作不支援多索引）"""
-        logger.warning("當前 Faiss 實作不支援多索引管理")
-        return False
+        """刪除命名空間索引（直接移除其目錄）"""
+        try:
+            self._ensure_writable()
+            
+            index_dir = self._index_dir(index_name)
+            if index_dir is None:
+                logger.warning(f"無法刪除索引: {index_name}")
+                return False
+            
+            async with self._index_slot(index_name):
+                child = self._child_indexes.pop(index_name, None)
+                if child is not None:
+                    await child.close()
+                self._residency.remove(index_name)
+                self._evicted_generations.pop(index_name, None)
+                
+                existed = index_dir.exists()
+                if existed:
+                    shutil.rmtree(index_dir)
+            
+            # 清除預設索引中尚未搬移的舊向量
+            legacy_deleted = 0
+            if self.index is not None:
+                async with self._lock:
+                    legacy_deleted = await self._delete_ids_locked(
+                        np.flatnonzero(self._postings.filter_mask([index_name]))
+                    )
+                    if legacy_deleted:
+                        await self._persist_deletion()
+            
+            logger.info(f"刪除索引: {index_name}")
+            return existed or legacy_deleted > 0
+            
+        except Exception as e:
+            logger.error(f"刪除索引失敗: {index_name} - {str(e)}")
+            return False
     
     async def list_indexes(self) -> List[str]:
         """列出所有索引"""
-        return ["default"]  # 當前只有一個預設索引
+        names = set(self._child_indexes)
+        if self.indexes_dir.exists():
+            names.update(p.name for p in self.indexes_dir.iterdir() if p.is_dir())
+        return [DEFAULT_INDEX_NAME] + sorted(names)
     
     async def backup_index(
         self,
@@ -596,20 +2748,18 @@ class FaissVectorDatabase(VectorDatabaseInterface):
     ) -> bool:
         """備份索引"""
         try:
+            if index_name != DEFAULT_INDEX_NAME:
+                async with self.use_index(index_name) as child:
+                    return child is not None and await child.backup_index(DEFAULT_INDEX_NAME, backup_path)
+            
             backup_dir = Path(backup_path)
             backup_dir.mkdir(parents=True, exist_ok=True)
             
-            # 複製索引文件
-            import shutil
-            
-            if self.index_file.exists():
-                shutil.copy2(self.index_file, backup_dir / self.index_file.name)
-            
-            if self.metadata_file.exists():
-                shutil.copy2(self.metadata_file, backup_dir / self.metadata_file.name)
+            # 先將日誌併入快照，確保備份文件完整
+            if self._wal is not None:
+                await self.checkpoint()
             
-            if self.id_map_file.exists():
-                shutil.copy2(self.id_map_file, backup_dir / self.id_map_file.name)
+            await asyncio.to_thread(self._copy_snapshot_files, backup_dir)
             
             logger.info(f"索引備份完成: {backup_path}")
             return True
@@ -618,6 +2768,20 @@ class FaissVectorDatabase(VectorDatabaseInterface):
             logger.error(f"索引備份失敗: {str(e)}")
             return False
     
+    def _copy_snapshot_files(self, backup_dir: Path) -> None:
+        """複製目前已提交的快照文件（期間不會有新世代提交）"""
+        with self._snapshot_write_lock:
+            # 複製索引文件
+            if self.index_file.exists():
+                shutil.copy2(self.index_file, backup_dir / self.index_file.name)
+            
+            if self.manifest_file.exists():
+                shutil.copy2(self.manifest_file, backup_dir / self.manifest_file.name)
+            
+            for data_dir in (self.metadata_dir, self.vectors_dir):
+                if data_dir.exists():
+                    shutil.copytree(data_dir, backup_dir / data_dir.name, dirs_exist_ok=True)
+    
     async def restore_index(
         self,
         index_name: str,
@@ -625,29 +2789,47 @@ class FaissVectorDatabase(VectorDatabaseInterface):
     ) -> bool:
         """恢復索引"""
         try:
+            self._ensure_writable()
+            
+            if index_name != DEFAULT_INDEX_NAME:
+                async with self.use_index(index_name, create=True) as child:
+                    return child is not None and await child.restore_index(DEFAULT_INDEX_NAME, backup_path)
+            
             backup_dir = Path(backup_path)
             
             if not backup_dir.exists():
                 raise VectorStorageError(f"備份目錄不存在: {backup_path}")
             
             # 恢復索引文件
-            import shutil
-            
             backup_index = backup_dir / self.index_file.name
-            backup_metadata = backup_dir / self.metadata_file.name
-            backup_id_map = backup_dir / self.id_map_file.name
-            
-            if backup_index.exists():
-                shutil.copy2(backup_index, self.index_file)
+            backup_manifest = backup_dir / self.manifest_file.name
+            backup_metadata = backup_dir / self.metadata_dir.name
+            backup_vectors = backup_dir / self.vectors_dir.name
             
-            if backup_metadata.exists():
-                shutil.copy2(backup_metadata, self.metadata_file)
-            
-            if backup_id_map.exists():
-                shutil.copy2(backup_id_map, self.id_map_file)
-            
-            # 重新加載索引
-            await self._load_existing_index()
+            # 恢復期間暫停寫入與搜索
+            async with self._lock, self._rw_lock.write():
+                self.metadata_store.close()
+                if self.raw_vectors is not None:
+                    self.raw_vectors.close()
+                
+                if backup_index.exists():
+                    shutil.copy2(backup_index, self.index_file)
+                
+                if backup_manifest.exists():
+                    shutil.copy2(backup_manifest, self.manifest_file)
+                
+                if backup_metadata.exists():
+                    shutil.copytree(backup_metadata, self.metadata_dir, dirs_exist_ok=True)
+                
+                if backup_vectors.exists():
+                    shutil.copytree(backup_vectors, self.vectors_dir, dirs_exist_ok=True)
+                
+                # 重新加載索引
+                await self._load_existing_index()
+                
+                # 現有日誌屬於恢復前的狀態，需要捨棄
+                if self._wal is not None:
+                    self._wal.reset(self._wal_checkpoint)
             
             logger.info(f"索引恢復完成: {backup_path}")
             return True
@@ -0,0 +1,1030 @@
+"""
+NumPy 向量資料庫實作
+不依賴 Faiss：向量存放在記憶體映射的 float32/float16 矩陣中，以分塊矩陣乘法與 argpartition 取 top-k，
+適用於小型知識庫與精簡容器
+"""
+
+import re
+import json
+import uuid
+import shutil
+import asyncio
+import logging
+import itertools
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, Any, Union, Iterator, AsyncIterator
+from datetime import datetime
+
+from ..interfaces.vector_database_interface import (
+    VectorDatabaseInterface,
+    VectorRecord,
+    VectorSearchResult,
+    DEFAULT_RANGE_SEARCH_MAX_RESULTS
+)
+from .faiss_vector_database import VectorStorageError, VectorSearchError, DEFAULT_INDEX_NAME
+from .vector_metadata_store import VectorMetadataStore
+from .vector_id_postings import VectorIdPostings
+from .vector_metadata_filter import MetadataCondition, parse_metadata_filter
+from .vector_store_counters import VectorStoreCounters
+from .vector_document_index import VectorDocumentIndex, document_key, document_path_key
+from .vector_raw_store import RawVectorStore
+from .async_rw_lock import AsyncReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+_INDEX_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+_SUPPORTED_METRICS = ("cosine", "euclidean", "dot_product")
+
+# 程序內全域遞增的寫入世代
+_write_generations = itertools.count(1)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """以 argpartition 逐列取分數最高的 k 個位置（未排序）"""
+    if k >= scores.shape[1]:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+class NumpyVectorDatabase(VectorDatabaseInterface):
+    """以記憶體映射矩陣與精確搜索實作的向量資料庫"""
+
+    def __init__(
+        self,
+        index_path: str,
+        dimension: int = 384,
+        metric: str = "cosine",
+        vector_dtype: str = "float32",
+        block_size: int = 65536,
+        read_only: bool = False
+    ):
+        """
+        初始化 NumPy 向量資料庫
+
+        Args:
+            index_path: 資料目錄
+            dimension: 向量維度
+            metric: 距離度量方法（"cosine"、"euclidean"、"dot_product"）
+            vector_dtype: 向量儲存精度（"float32" 或 "float16"）
+            block_size: 每次矩陣乘法處理的向量列數，限制搜索時的暫存記憶體
+            read_only: 唯讀模式，只映射現有資料
+        """
+        if metric not in _SUPPORTED_METRICS:
+            raise VectorStorageError(f"不支援的度量方法: {metric}")
+
+        self.index_path = Path(index_path)
+        self.dimension = dimension
+        self.metric = metric
+        self.vector_dtype = vector_dtype
+        self.block_size = max(1, block_size)
+        self.read_only = read_only
+
+        self.manifest_file = self.index_path / "manifest.json"
+        self.metadata_dir = self.index_path / "metadata"
+        self.vectors_dir = self.index_path / "vectors"
+        self.indexes_dir = self.index_path / "indexes"
+
+        self.vectors: Optional[RawVectorStore] = None
+        self.metadata_store = VectorMetadataStore(self.metadata_dir)
+        self._postings = VectorIdPostings()
+        self._counters = VectorStoreCounters()
+        self._documents = VectorDocumentIndex(self.metadata_dir / "documents.npy")
+
+        self.next_id = 0
+        # 寫者鎖序列化寫入；讀寫鎖讓搜索共享，寫者只在發布變更時短暫獨佔
+        self._lock = asyncio.Lock()
+        self._rw_lock = AsyncReadWriteLock()
+        self._write_generation = 0
+
+        self._child_indexes: Dict[str, "NumpyVectorDatabase"] = {}
+        self._indexes_lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    async def initialize(self) -> bool:
+        """初始化向量資料庫"""
+        try:
+            async with self._lock:
+                await asyncio.to_thread(self._open_stores)
+            logger.info(f"NumPy 向量資料庫已開啟: {self.index_path}, 向量數: {self.next_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"NumPy 向量資料庫初始化失敗: {str(e)}")
+            return False
+
+    def _open_stores(self) -> None:
+        """開啟向量與元數據儲存，並截斷到兩者一致的水位"""
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.dimension = manifest.get('dimension', self.dimension)
+            self.metric = manifest.get('metric', self.metric)
+            self.vector_dtype = manifest.get('vector_dtype', self.vector_dtype)
+        elif self.read_only:
+            raise VectorStorageError(f"唯讀模式下找不到資料: {self.index_path}")
+        else:
+            self.index_path.mkdir(parents=True, exist_ok=True)
+            with open(self.manifest_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'dimension': self.dimension,
+                    'metric': self.metric,
+                    'vector_dtype': self.vector_dtype
+                }, f)
+
+        self.vectors = RawVectorStore(self.vectors_dir, self.dimension, self.vector_dtype)
+        self.vectors.open(read_only=self.read_only)
+        self.metadata_store.open(read_only=self.read_only)
+
+        # 向量先於元數據寫入，元數據列存在即代表向量完整；中斷的寫入截斷到較小的水位
+        row_count = min(self.vectors.row_count, self.metadata_store.row_count)
+        if row_count != self.vectors.row_count or row_count != self.metadata_store.row_count:
+            logger.warning(f"截斷未完成的寫入: {self.index_path} -> {row_count} 列")
+            self.vectors.open(row_count=row_count, read_only=self.read_only)
+            self.metadata_store.open(row_count=row_count, read_only=self.read_only)
+
+        self.next_id = row_count
+        self._postings.rebuild(self.metadata_store)
+        self._counters.rebuild(self.metadata_store)
+        self._documents.rebuild(self.metadata_store)
+        self._bump_write_generation()
+
+    async def close(self) -> None:
+        """關閉向量資料庫"""
+        try:
+            async with self._indexes_lock:
+                for child in self._child_indexes.values():
+                    await child.close()
+                self._child_indexes.clear()
+
+            async with self._lock:
+                async with self._rw_lock.write():
+                    if self.vectors is not None:
+                        if not self.read_only:
+                            self.vectors.flush()
+                            self.metadata_store.flush()
+                        self.vectors.close()
+                        self.vectors = None
+                    self.metadata_store.close()
+
+            logger.info("NumPy 向量資料庫已關閉")
+
+        except Exception as e:
+            logger.error(f"關閉 NumPy 向量資料庫失敗: {str(e)}")
+
+    def _ensure_writable(self) -> None:
+        """唯讀模式下拒絕寫入"""
+        if self.read_only:
+            raise VectorStorageError("資料以唯讀模式開啟，無法寫入")
+
+    def _ensure_open(self) -> RawVectorStore:
+        if self.vectors is None:
+            raise VectorStorageError("向量資料庫未初始化")
+        return self.vectors
+
+    def _bump_write_generation(self) -> None:
+        """更新寫入世代，使依賴舊內容的快取失效"""
+        self._write_generation = next(_write_generations)
+
+    def get_write_generation(self) -> Optional[int]:
+        """取得寫入世代（寫入、刪除或重新開啟後改變）"""
+        return self._write_generation
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def _normalize_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """驗證形狀並轉為 float32 矩陣，餘弦度量時逐列正規化"""
+        matrix = np.array(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if matrix.ndim != 2 or matrix.shape[1] != self.dimension:
+            raise VectorStorageError(f"向量矩陣形狀不匹配: {matrix.shape} != (n, {self.dimension})")
+
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    async def _add_vectors_locked(self, vectors: np.ndarray, records_metadata: List[Dict[str, Any]]) -> None:
+        """
+        在已持有寫者鎖的情況下追加向量
+
+        向量先於元數據寫入（元數據列存在即代表向量完整），搜索只會看到整批寫入之前或之後的狀態
+        """
+        vector_store = self._ensure_open()
+        start_id = self.next_id
+
+        async with self._rw_lock.write():
+            await asyncio.to_thread(vector_store.append, start_id, vectors)
+            await asyncio.to_thread(self.metadata_store.append, start_id, records_metadata)
+            self._postings.add(start_id, records_metadata)
+            self._counters.add(records_metadata)
+            self._documents.add(start_id, records_metadata)
+            self.next_id = start_id + len(vectors)
+            self._bump_write_generation()
+
+    async def store_vector(
+        self,
+        embedding: List[float],
+        document_id: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """儲存向量到資料庫"""
+        vector_ids = await self.store_vectors_batch([embedding], [document_id], [metadata or {}])
+        return vector_ids[0]
+
+    async def store_vectors_batch(
+        self,
+        embeddings: Union[List[List[float]], np.ndarray],
+        document_ids: List[str],
+        metadata_list: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
+        """
+        批次儲存向量
+
+        Args:
+            embeddings: 向量列表或 (n, dimension) 矩陣
+            document_ids: 文件ID列表
+            metadata_list: 元數據列表
+
+        Returns:
+            List[str]: 向量ID列表
+        """
+        try:
+            self._ensure_writable()
+
+            if len(embeddings) != len(document_ids):
+                raise VectorStorageError("embeddings 和 document_ids 長度不匹配")
+
+            if metadata_list and len(metadata_list) != len(embeddings):
+                raise VectorStorageError("metadata_list 長度不匹配")
+
+            if len(embeddings) == 0:
+                return []
+
+            vectors = self._normalize_vectors(embeddings)
+
+            vector_ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+            created_at = datetime.now().isoformat()
+            records_metadata = [
+                {
+                    'vector_id': vector_id,
+                    'document_id': document_id,
+                    'created_at': created_at,
+                    'dimension': self.dimension,
+                    **(metadata_list[i] if metadata_list else {})
+                }
+                for i, (vector_id, document_id) in enumerate(zip(vector_ids, document_ids))
+            ]
+
+            async with self._lock:
+                await self._add_vectors_locked(vectors, records_metadata)
+
+            logger.info(f"成功批次儲存 {len(vector_ids)} 個向量")
+            return vector_ids
+
+        except Exception as e:
+            logger.error(f"批次儲存向量失敗: {str(e)}")
+            raise VectorStorageError(str(e))
+
+    # ------------------------------------------------------------------
+    # 讀取與刪除
+    # ------------------------------------------------------------------
+
+    def _vector_records(self, ids: np.ndarray) -> List[Optional[VectorRecord]]:
+        """由列號組成向量記錄（-1 表示不存在）"""
+        vector_store = self._ensure_open()
+        found = ids >= 0
+        vectors = vector_store.get(ids[found])
+
+        records: List[Optional[VectorRecord]] = []
+        position = 0
+        for row_id in ids.tolist():
+            if row_id < 0:
+                records.append(None)
+                continue
+
+            metadata = self.metadata_store.get(row_id)
+            records.append(VectorRecord(
+                vector_id=metadata['vector_id'],
+                document_id=metadata['document_id'],
+                embedding=vectors[position].tolist(),
+                metadata=metadata,
+                created_at=datetime.fromisoformat(metadata['created_at'])
+            ))
+            position += 1
+
+        return records
+
+    async def get_vector(self, vector_id: str) -> Optional[VectorRecord]:
+        """根據向量ID獲取向量記錄"""
+        records = await self.get_vectors([vector_id])
+        return records[0]
+
+    async def get_vectors(self, vector_ids: List[str]) -> List[Optional[VectorRecord]]:
+        """批次根據向量ID獲取向量記錄"""
+        try:
+            async with self._rw_lock.read():
+                ids = self.metadata_store.find_many(vector_ids)
+                return await asyncio.to_thread(self._vector_records, ids)
+
+        except Exception as e:
+            logger.error(f"批次獲取向量失敗: {str(e)}")
+            return [None] * len(vector_ids)
+
+    async def _delete_ids(self, ids: np.ndarray) -> int:
+        """標記刪除並同步更新倒排位圖與計數，返回新刪除的數量"""
+        self._ensure_writable()
+
+        async with self._lock:
+            ids = np.unique(np.asarray(ids, dtype=np.int64))
+            ids = ids[~self.metadata_store.deleted_mask(ids)]
+            if len(ids) == 0:
+                return 0
+
+            async with self._rw_lock.write():
+                self._counters.remove(self.metadata_store, ids)
+                marked = self.metadata_store.mark_deleted(ids.tolist())
+                self._postings.remove(ids)
+                self._bump_write_generation()
+            return marked
+
+    async def delete_vector(self, vector_id: str) -> bool:
+        """刪除向量"""
+        try:
+            row_id = self.metadata_store.find(vector_id)
+            if row_id is None:
+                return False
+            return await self._delete_ids(np.array([row_id])) > 0
+
+        except Exception as e:
+            logger.error(f"刪除向量失敗: {vector_id} - {str(e)}")
+            return False
+
+    def _live_posting_ids(self, key: int) -> np.ndarray:
+        """從文件倒排索引取得鍵對應的有效列號"""
+        ids = self._documents.lookup(key)
+        return ids[~self.metadata_store.deleted_mask(ids)]
+
+    async def delete_vectors_by_document(self, document_id: str) -> int:
+        """根據文件ID刪除所有相關向量"""
+        try:
+            ids = self._live_posting_ids(document_key(document_id))
+            ids = ids[self.metadata_store.match_document(ids, document_id)]
+            deleted_count = await self._delete_ids(ids)
+            logger.info(f"刪除 {deleted_count} 個向量（文件ID: {document_id}）")
+            return deleted_count
+
+        except Exception as e:
+            logger.error(f"按文件ID刪除向量失敗: {document_id} - {str(e)}")
+            return 0
+
+    async def delete_vectors_by_document_path(self, document_path: str) -> int:
+        """刪除同一文件路徑下的所有分塊向量"""
+        try:
+            deleted_count = await self._delete_ids(self._live_posting_ids(document_path_key(document_path)))
+            logger.info(f"刪除 {deleted_count} 個向量（文件路徑: {document_path}）")
+            return deleted_count
+
+        except Exception as e:
+            logger.error(f"按文件路徑刪除向量失敗: {document_path} - {str(e)}")
+            return 0
+
+    async def count_vectors_by_document_path(self, document_path: str) -> int:
+        """計算文件路徑下的有效向量數量"""
+        async with self._rw_lock.read():
+            return len(self._live_posting_ids(document_path_key(document_path)))
+
+    # ------------------------------------------------------------------
+    # 搜索
+    # ------------------------------------------------------------------
+
+    def _block_scores(
+        self,
+        query_vectors: np.ndarray,
+        mask: np.ndarray
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        逐塊計算查詢與可被搜索列的排序分數
+
+        Args:
+            query_vectors: 已正規化的查詢矩陣 (n, dimension)
+            mask: 可被搜索的列（長度為目前列數）
+
+        Yields:
+            Tuple[np.ndarray, np.ndarray]: 區塊內的列號與分數 (n, 區塊列數)，越大越相似
+        """
+        vector_store = self._ensure_open()
+        row_count = len(mask)
+        query_norms = (query_vectors ** 2).sum(axis=1)
+
+        for start in range(0, row_count, self.block_size):
+            end = min(start + self.block_size, row_count)
+            block_ids = np.flatnonzero(mask[start:end]) + start
+            if len(block_ids) == 0:
+                continue
+
+            # 連續區塊直接切片映射，避免花式索引複製整塊
+            if len(block_ids) == end - start:
+                block = vector_store.get_range(start, end)
+            else:
+                block = vector_store.get(block_ids)
+
+            scores = query_vectors @ block.T
+            if self.metric == "euclidean":
+                # 以負的平方 L2 距離排序，與 Faiss 一致越大越相似
+                scores = 2 * scores - (block ** 2).sum(axis=1)[None, :] - query_norms[:, None]
+            yield block_ids, scores
+
+    def _exact_top_k(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        分塊計算分數並以 argpartition 合併每塊的候選，得到每個查詢的精確 top-k
+
+        Args:
+            query_vectors: 已正規化的查詢矩陣 (n, dimension)
+            k: 每個查詢保留的結果數
+            mask: 可被搜索的列（長度為目前列數）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 依分數降序排列的分數與列號 (n, k)，不足處列號為 -1
+        """
+        n_queries = len(query_vectors)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_ids = np.full((n_queries, 0), -1, dtype=np.int64)
+
+        for block_ids, scores in self._block_scores(query_vectors, mask):
+            block_k = min(k, len(block_ids))
+            top = _top_k(scores, block_k)
+            candidate_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            candidate_ids = np.concatenate([best_ids, block_ids[top]], axis=1)
+
+            keep = _top_k(candidate_scores, min(k, candidate_scores.shape[1]))
+            best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+            best_ids = np.take_along_axis(candidate_ids, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+    def _similarities(self, scores: np.ndarray) -> np.ndarray:
+        """將排序分數陣列轉換為相似度"""
+        scores = np.asarray(scores, dtype=np.float64)
+        if self.metric == "euclidean":
+            return 1.0 / (1.0 + np.maximum(0.0, -scores))
+        return scores
+
+    def _range_hits_locked(
+        self,
+        query_vector: np.ndarray,
+        similarity_threshold: float,
+        max_results: Optional[int],
+        document_ids: Optional[List[str]],
+        knowledge_base_ids: Optional[List[str]],
+        conditions: Tuple[MetadataCondition, ...] = ()
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        在已持有讀鎖的情況下分塊掃描，只保留相似度不低於閾值的命中
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 依相似度降序排列的列號與相似度
+        """
+        if max_results is not None and max_results <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        mask = self._filter_mask_locked(document_ids, knowledge_base_ids, conditions)
+        hit_ids, hit_scores = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.float64)]
+        for block_ids, scores in self._block_scores(query_vector, mask):
+            similarities = self._similarities(scores[0])
+            keep = similarities >= similarity_threshold
+            hit_ids.append(block_ids[keep])
+            hit_scores.append(similarities[keep])
+
+        row_ids, similarities = np.concatenate(hit_ids), np.concatenate(hit_scores)
+        order = np.argsort(-similarities, kind='stable')
+        if max_results is not None:
+            order = order[:max_results]
+        return row_ids[order], similarities[order]
+
+    def _build_search_results(
+        self,
+        row_ids: np.ndarray,
+        similarities: np.ndarray,
+        document_ids: Optional[List[str]]
+    ) -> List[VectorSearchResult]:
+        """由命中的列號與相似度建立搜索結果，略過已刪除的向量與文件ID雜湊碰撞"""
+        deleted = self.metadata_store.deleted_mask(row_ids)
+        results = []
+        for row_id, similarity_score, is_deleted in zip(row_ids.tolist(), similarities.tolist(), deleted):
+            if is_deleted:
+                continue
+            metadata = self.metadata_store.get(row_id)
+            if not metadata or (document_ids and metadata['document_id'] not in document_ids):
+                continue
+            results.append(VectorSearchResult(
+                vector_id=metadata['vector_id'],
+                document_id=metadata['document_id'],
+                similarity_score=similarity_score,
+                metadata=metadata
+            ))
+        return results
+
+    def _filter_mask_locked(
+        self,
+        document_ids: Optional[List[str]],
+        knowledge_base_ids: Optional[List[str]],
+        conditions: Tuple[MetadataCondition, ...] = ()
+    ) -> np.ndarray:
+        """建立只含符合過濾條件之有效列的位圖"""
+        document_row_ids = None
+        if document_ids:
+            document_row_ids = self._documents.lookup_many(document_key(d) for d in document_ids)
+        return self._postings.filter_mask(knowledge_base_ids or None, document_row_ids, conditions)
+
+    def _similarity(self, score: float) -> float:
+        """將排序分數轉換為相似度（與 Faiss 實作一致）"""
+        if self.metric == "euclidean":
+            return 1.0 / (1.0 + max(0.0, -float(score)))
+        return float(score)
+
+    def _search_results_locked(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int,
+        similarity_threshold: float,
+        document_ids: Optional[List[str]],
+        knowledge_base_ids: Optional[List[str]],
+        conditions: Tuple[MetadataCondition, ...] = ()
+    ) -> List[List[VectorSearchResult]]:
+        """在已持有讀鎖的情況下搜索已正規化的查詢矩陣"""
+        mask = self._filter_mask_locked(document_ids, knowledge_base_ids, conditions)
+
+        k = min(top_k, int(np.count_nonzero(mask)))
+        if k == 0:
+            return [[] for _ in range(len(query_vectors))]
+
+        scores, ids = self._exact_top_k(query_vectors, k, mask)
+
+        metadata_cache: Dict[int, Optional[Dict[str, Any]]] = {}
+        all_results = []
+        for row_scores, row_ids in zip(scores, ids):
+            results = []
+            for score, row_id in zip(row_scores.tolist(), row_ids.tolist()):
+                if row_id < 0:
+                    continue
+
+                similarity_score = self._similarity(score)
+                if similarity_score < similarity_threshold:
+                    continue
+
+                if row_id not in metadata_cache:
+                    metadata_cache[row_id] = self.metadata_store.get(row_id)
+                metadata = metadata_cache[row_id]
+                if not metadata or (document_ids and metadata['document_id'] not in document_ids):
+                    continue
+
+                results.append(VectorSearchResult(
+                    vector_id=metadata['vector_id'],
+                    document_id=metadata['document_id'],
+                    similarity_score=similarity_score,
+                    metadata=metadata
+                ))
+            all_results.append(results)
+
+        return all_results
+
+    def _normalize_queries(self, query_embeddings: Union[List[List[float]], np.ndarray]) -> np.ndarray:
+        """驗證並正規化查詢矩陣"""
+        try:
+            return self._normalize_vectors(query_embeddings)
+        except VectorStorageError as e:
+            raise VectorSearchError(str(e))
+
+    async def similarity_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[VectorSearchResult]:
+        """
+        精確相似性搜索（知識庫與文件過濾在計算距離前以位圖套用）
+
+        Args:
+            query_embedding: 查詢向量
+            top_k: 返回結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        try:
+            if len(query_embedding) != self.dimension:
+                raise VectorSearchError(f"查詢向量維度不匹配: {len(query_embedding)} != {self.dimension}")
+
+            results = await self.similarity_search_batch(
+                [query_embedding], top_k, similarity_threshold, document_ids, knowledge_base_ids, metadata_filter
+            )
+            return results[0]
+
+        except Exception as e:
+            logger.error(f"相似性搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    async def similarity_search_batch(
+        self,
+        query_embeddings: Union[List[List[float]], np.ndarray],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[VectorSearchResult]]:
+        """
+        批次精確相似性搜索，每個向量區塊只讀取一次並與所有查詢相乘
+
+        Args:
+            query_embeddings: 查詢向量矩陣 (n, dimension)
+            top_k: 每個查詢返回的結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+
+        Returns:
+            List[List[VectorSearchResult]]: 與查詢順序對應的搜索結果列表
+        """
+        try:
+            if len(query_embeddings) == 0:
+                return []
+            query_vectors = self._normalize_queries(query_embeddings)
+
+            async with self._rw_lock.read():
+                results = await asyncio.to_thread(
+                    self._search_results_locked, query_vectors, top_k, similarity_threshold,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter)
+                )
+
+            logger.debug(f"批次相似性搜索完成: {len(results)} 個查詢")
+            return results
+
+        except Exception as e:
+            logger.error(f"批次相似性搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    async def range_search(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        max_results: Optional[int] = DEFAULT_RANGE_SEARCH_MAX_RESULTS,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[VectorSearchResult]:
+        """
+        精確範圍搜索，分塊掃描並返回所有相似度不低於閾值的結果
+
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            max_results: 結果數量上限，超過時只保留相似度最高者（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        try:
+            query_vector = self._normalize_queries([query_embedding])
+
+            async with self._rw_lock.read():
+                row_ids, similarities = await asyncio.to_thread(
+                    self._range_hits_locked, query_vector, similarity_threshold, max_results,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter)
+                )
+                results = await asyncio.to_thread(self._build_search_results, row_ids, similarities, document_ids)
+
+            logger.debug(f"範圍搜索完成: {len(results)} 個結果")
+            return results
+
+        except Exception as e:
+            logger.error(f"範圍搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    async def range_search_iter(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        batch_size: int = 1000,
+        max_results: Optional[int] = None,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[List[VectorSearchResult]]:
+        """
+        串流範圍搜索：命中以緊湊陣列取得，結果物件逐批建立，每批各自取得讀鎖
+
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            batch_size: 每批的結果數量
+            max_results: 結果數量上限（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），於距離計算前以位圖求值
+
+        Yields:
+            List[VectorSearchResult]: 一批按相似度降序排列的搜索結果
+        """
+        try:
+            query_vector = self._normalize_queries([query_embedding])
+
+            async with self._rw_lock.read():
+                row_ids, similarities = await asyncio.to_thread(
+                    self._range_hits_locked, query_vector, similarity_threshold, max_results,
+                    document_ids, knowledge_base_ids, parse_metadata_filter(metadata_filter)
+                )
+
+            for start in range(0, len(row_ids), batch_size):
+                async with self._rw_lock.read():
+                    batch = await asyncio.to_thread(
+                        self._build_search_results,
+                        row_ids[start:start + batch_size], similarities[start:start + batch_size], document_ids
+                    )
+                if batch:
+                    yield batch
+
+        except Exception as e:
+            logger.error(f"串流範圍搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    # ------------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------------
+
+    async def get_vector_count(self) -> int:
+        """獲取有效向量數量"""
+        return self._counters.active
+
+    async def get_counters(self) -> Dict[str, Any]:
+        """取得增量維護的即時計數"""
+        return {
+            'total_vectors': self._counters.total,
+            'active_vectors': self._counters.active,
+            'deleted_vectors': self._counters.deleted,
+            'tombstoned_vectors': self._counters.deleted,
+            'unique_documents': self._counters.document_count,
+            'knowledge_bases': self._counters.knowledge_base_counts,
+            'storage_bytes': self._storage_bytes()
+        }
+
+    async def get_document_vector_count(self, document_id: str) -> int:
+        """取得單個文件的有效向量數量（O(1)）"""
+        return self._counters.document_vectors(document_id)
+
+    def _storage_bytes(self) -> int:
+        total = self.metadata_store.storage_bytes
+        if self.vectors is not None:
+            total += self.vectors.storage_bytes
+        return total
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        """獲取資料庫統計資訊"""
+        try:
+            float32_bytes = self.dimension * 4
+            bytes_per_vector = self.dimension * np.dtype(self.vector_dtype).itemsize
+            return {
+                'total_vectors': self._counters.total,
+                'active_vectors': self._counters.active,
+                'deleted_vectors': self._counters.deleted,
+                'unique_documents': self._counters.document_count,
+                'knowledge_bases': self._counters.knowledge_base_counts,
+                'dimension': self.dimension,
+                'metric': self.metric,
+                'index_type': "NumpyFlat",
+                'active_index_type': "NumpyFlat",
+                'raw_vector_dtype': self.vector_dtype,
+                'read_only': self.read_only,
+                'bytes_per_vector': bytes_per_vector,
+                'float32_bytes_per_vector': float32_bytes,
+                'memory_savings': round(1 - bytes_per_vector / float32_bytes, 4),
+                'block_size': self.block_size,
+                'index_path': str(self.index_path),
+                'storage_size_mb': round(self._storage_bytes() / (1024 * 1024), 2)
+            }
+
+        except Exception as e:
+            logger.error(f"獲取統計資訊失敗: {str(e)}")
+            return {}
+
+    async def health_check(self) -> bool:
+        """健康檢查"""
+        return self.vectors is not None
+
+    # ------------------------------------------------------------------
+    # 命名空間索引
+    # ------------------------------------------------------------------
+
+    def _index_dir(self, index_name: str) -> Optional[Path]:
+        """命名空間索引的目錄，名稱不合法時返回None"""
+        if index_name == DEFAULT_INDEX_NAME or not _INDEX_NAME_PATTERN.match(index_name):
+            return None
+        return self.indexes_dir / index_name
+
+    async def _open_child_index(
+        self,
+        index_name: str,
+        dimension: Optional[int] = None,
+        metric: Optional[str] = None
+    ) -> "NumpyVectorDatabase":
+        """開啟（或創建）命名空間索引，沿用本資料庫的設定"""
+        child = NumpyVectorDatabase(
+            str(self._index_dir(index_name)),
+            dimension=dimension or self.dimension,
+            metric=metric or self.metric,
+            vector_dtype=self.vector_dtype,
+            block_size=self.block_size,
+            read_only=self.read_only
+        )
+        if not await child.initialize():
+            raise VectorStorageError(f"無法開啟索引: {index_name}")
+
+        self._child_indexes[index_name] = child
+        return child
+
+    async def get_index(
+        self,
+        index_name: str,
+        create: bool = False
+    ) -> Optional["NumpyVectorDatabase"]:
+        """
+        取得命名空間索引（每個知識庫一個獨立目錄），按需加載
+
+        Args:
+            index_name: 索引名稱，通常為知識庫ID
+            create: 索引不存在時是否創建
+
+        Returns:
+            Optional[NumpyVectorDatabase]: 索引實例，不存在且未要求創建時返回None
+        """
+        if index_name == DEFAULT_INDEX_NAME:
+            return self
+
+        index_dir = self._index_dir(index_name)
+        if index_dir is None:
+            logger.warning(f"不合法的索引名稱: {index_name}")
+            return None
+
+        async with self._indexes_lock:
+            child = self._child_indexes.get(index_name)
+            if child is not None:
+                return child
+
+            if not index_dir.exists() and (self.read_only or not create):
+                return None
+            return await self._open_child_index(index_name)
+
+    async def create_index(
+        self,
+        index_name: str,
+        dimension: int,
+        metric: str = "cosine"
+    ) -> bool:
+        """創建命名空間索引"""
+        try:
+            self._ensure_writable()
+            index_dir = self._index_dir(index_name)
+            if index_dir is None:
+                logger.warning(f"不合法的索引名稱: {index_name}")
+                return False
+
+            async with self._indexes_lock:
+                if index_name in self._child_indexes or index_dir.exists():
+                    logger.warning(f"索引已存在: {index_name}")
+                    return False
+                await self._open_child_index(index_name, dimension, metric)
+
+            logger.info(f"創建索引: {index_name}")
+            return True
+
+        except Exception as e:
+            logger.error(f"創建索引失敗: {index_name} - {str(e)}")
+            return False
+
+    async def drop_index(self, index_name: str) -> bool:
+        """刪除命名空間索引（直接移除其目錄）"""
+        try:
+            self._ensure_writable()
+            index_dir = self._index_dir(index_name)
+            if index_dir is None:
+                logger.warning(f"無法刪除索引: {index_name}")
+                return False
+
+            async with self._indexes_lock:
+                child = self._child_indexes.pop(index_name, None)
+                if child is not None:
+                    await child.close()
+
+                existed = index_dir.exists()
+                if existed:
+                    await asyncio.to_thread(shutil.rmtree, index_dir)
+
+            logger.info(f"刪除索引: {index_name}")
+            return existed
+
+        except Exception as e:
+            logger.error(f"刪除索引失敗: {index_name} - {str(e)}")
+            return False
+
+    async def list_indexes(self) -> List[str]:
+        """列出所有索引"""
+        names = set(self._child_indexes)
+        if self.indexes_dir.exists():
+            names.update(p.name for p in self.indexes_dir.iterdir() if p.is_dir())
+        return [DEFAULT_INDEX_NAME] + sorted(names)
+
+    async def backup_index(
+        self,
+        index_name: str,
+        backup_path: str
+    ) -> bool:
+        """備份索引（複製清單、元數據與向量文件）"""
+        try:
+            if index_name != DEFAULT_INDEX_NAME:
+                child = await self.get_index(index_name)
+                return child is not None and await child.backup_index(DEFAULT_INDEX_NAME, backup_path)
+
+            backup_dir = Path(backup_path)
+            backup_dir.mkdir(parents=True, exist_ok=True)
+
+            # 持有寫者鎖，確保複製的向量與元數據水位一致
+            async with self._lock:
+                self._ensure_open()
+                if not self.read_only:
+                    self.vectors.flush()
+                    self.metadata_store.flush()
+                await asyncio.to_thread(self._copy_files, self.index_path, backup_dir)
+
+            logger.info(f"索引備份完成: {backup_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"索引備份失敗: {str(e)}")
+            return False
+
+    def _copy_files(self, source: Path, target: Path) -> None:
+        """複製清單、元數據與向量目錄"""
+        shutil.copy2(source / self.manifest_file.name, target / self.manifest_file.name)
+        for name in (self.metadata_dir.name, self.vectors_dir.name):
+            if (source / name).exists():
+                shutil.copytree(source / name, target / name, dirs_exist_ok=True)
+
+    async def restore_index(
+        self,
+        index_name: str,
+        backup_path: str
+    ) -> bool:
+        """恢復索引"""
+        try:
+            self._ensure_writable()
+
+            if index_name != DEFAULT_INDEX_NAME:
+                child = await self.get_index(index_name, create=True)
+                return child is not None and await child.restore_index(DEFAULT_INDEX_NAME, backup_path)
+
+            backup_dir = Path(backup_path)
+            if not (backup_dir / self.manifest_file.name).exists():
+                raise VectorStorageError(f"備份目錄不存在: {backup_path}")
+
+            # 恢復期間暫停寫入與搜索
+            async with self._lock, self._rw_lock.write():
+                if self.vectors is not None:
+                    self.vectors.close()
+                self.metadata_store.close()
+
+                for name in (self.metadata_dir.name, self.vectors_dir.name):
+                    if (self.index_path / name).exists():
+                        shutil.rmtree(self.index_path / name)
+                await asyncio.to_thread(self._copy_files, backup_dir, self.index_path)
+                self._open_stores()
+
+            logger.info(f"索引恢復完成: {backup_path}")
+            return True
+
+        except Exception as e:
+            logger.error(f"索引恢復失敗: {str(e)}")
+            return False
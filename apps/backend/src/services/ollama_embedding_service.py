@@ -8,12 +8,16 @@ import httpx
 import json
 import logging
 import asyncio
+import numpy as np
 from typing import List, Optional, Dict, Any
 from dataclasses import dataclass
 from ..core.exceptions import BaseAppException
 
 logger = logging.getLogger(__name__)
 
+# all-minilm:l6-v2 模型的向量維度
+EMBEDDING_DIMENSION = 384
+
 
 @dataclass
 class EmbeddingConfig:
@@ -31,7 +35,7 @@ class OllamaConnectionError(BaseAppException):
         super().__init__(
             status_code=503,
             message=f"Ollama 服務連線失敗: {message}",
-            error_code="OLLAMA_CONNECTION_FAILED",
+            code="OLLAMA_CONNECTION_FAILED",
             details=details
         )
 
@@ -42,7 +46,7 @@ class EmbeddingGenerationError(BaseAppException):
         super().__init__(
             status_code=500,
             message=f"Embedding 生成失敗: {message}",
-            error_code="EMBEDDING_GENERATION_FAILED",
+            code="EMBEDDING_GENERATION_FAILED",
             details=details
         )
 
@@ -161,12 +165,12 @@ class OllamaEmbeddingService:
                 
                 if embedding and isinstance(embedding, list):
                     # 驗證向量維度
-                    if len(embedding) == 384:
-                        logger.debug(f"成功生成 384 維 Embedding")
+                    if len(embedding) == EMBEDDING_DIMENSION:
+                        logger.debug(f"成功生成 {EMBEDDING_DIMENSION} 維 Embedding")
                         return embedding
                     else:
                         raise EmbeddingGenerationError(
-                            f"向量維度不正確: {len(embedding)}，預期: 384"
+                            f"向量維度不正確: {len(embedding)}，預期: {EMBEDDING_DIMENSION}"
                         )
                 else:
                     raise EmbeddingGenerationError("回應中缺少 embedding 資料")
@@ -253,6 +257,54 @@ class OllamaEmbeddingService:
         logger.info(f"完成批次處理，總共生成 {len(results)} 個 Embedding")
         return results
     
+    async def generate_embeddings_array(
+        self,
+        texts: List[str],
+        batch_size: int = 10
+    ) -> np.ndarray:
+        """
+        批次生成 Embedding，直接寫入預先配置的 float32 矩陣
+        
+        每個回應解碼後立即複製到對應列，不累積巢狀的 Python 浮點數列表
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批次大小
+            
+        Returns:
+            np.ndarray: (len(texts), 384) 的 C 連續 float32 矩陣
+        """
+        embeddings = np.empty((len(texts), EMBEDDING_DIMENSION), dtype=np.float32)
+        
+        # 分批處理以避免過度負載
+        for i in range(0, len(texts), batch_size):
+            batch_texts = texts[i:i + batch_size]
+            
+            logger.info(f"處理批次 {i//batch_size + 1}，包含 {len(batch_texts)} 個文本")
+            
+            # 並行處理批次中的文本，各自寫入對應的列
+            tasks = [
+                self._generate_embedding_into(text, embeddings, i + j)
+                for j, text in enumerate(batch_texts)
+            ]
+            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            for j, result in enumerate(batch_results):
+                if isinstance(result, Exception):
+                    logger.error(f"批次中第 {j+1} 個文本處理失敗: {str(result)}")
+                    raise result
+            
+            # 批次間稍作停頓以避免過載
+            if i + batch_size < len(texts):
+                await asyncio.sleep(0.1)
+        
+        logger.info(f"完成批次處理，總共生成 {len(embeddings)} 個 Embedding")
+        return embeddings
+    
+    async def _generate_embedding_into(self, text: str, out: np.ndarray, row: int) -> None:
+        """生成單一 Embedding 並寫入矩陣的指定列"""
+        out[row] = await self.generate_embedding(text)
+    
     async def get_model_info(self) -> Dict[str, Any]:
         """
         獲取模型資訊
@@ -0,0 +1,161 @@
+"""
+搜索結果快取
+以 (正規化查詢, 知識庫, top_k, 閾值, 模式) 為鍵的 LRU 快取，條目記錄寫入世代，索引寫入後自動失效
+"""
+
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Optional, Any, Tuple, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query_text: str) -> str:
+    """正規化查詢文本：合併空白並忽略大小寫"""
+    return " ".join(query_text.split()).casefold()
+
+
+class SearchResultCache:
+    """以寫入世代失效的 LRU 搜索結果快取"""
+
+    def __init__(self, max_entries: int = 1024, max_total_results: int = 20000):
+        """
+        初始化快取
+
+        Args:
+            max_entries: 最多快取的查詢數量（0 表示停用）
+            max_total_results: 所有條目合計最多保留的結果筆數
+        """
+        self.max_entries = max_entries
+        self.max_total_results = max_total_results
+
+        self._entries: "OrderedDict[Tuple, Tuple[Hashable, List[Dict[str, Any]]]]" = OrderedDict()
+        self._total_results = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否啟用快取"""
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(
+        query_text: str,
+        knowledge_base_id: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        search_mode: str,
+        filter_conditions: Tuple = ()
+    ) -> Tuple:
+        """
+        建立快取鍵
+
+        Args:
+            query_text: 查詢文本
+            knowledge_base_id: 知識庫ID
+            top_k: 返回結果數量
+            similarity_threshold: 相似度閾值
+            search_mode: 搜索模式
+            filter_conditions: 已解析的元數據過濾條件（可雜湊）
+
+        Returns:
+            Tuple: 快取鍵
+        """
+        return (
+            normalize_query(query_text), knowledge_base_id, top_k, float(similarity_threshold), search_mode,
+            filter_conditions
+        )
+
+    def get(self, key: Tuple, generation: Hashable) -> Optional[List[Dict[str, Any]]]:
+        """
+        取得快取結果，世代不符時視為失效
+
+        Args:
+            key: 快取鍵
+            generation: 目前的寫入世代
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: 結果副本，未命中時返回None
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] != generation:
+            self._remove(key)
+            self.invalidations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [dict(result) for result in entry[1]]
+
+    def put(self, key: Tuple, generation: Hashable, results: List[Dict[str, Any]]) -> None:
+        """
+        寫入快取結果，超出限制時淘汰最久未使用的條目
+
+        Args:
+            key: 快取鍵
+            generation: 計算結果時的寫入世代
+            results: 搜索結果
+        """
+        if not self.enabled or len(results) > self.max_total_results:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (generation, [dict(result) for result in results])
+        self._total_results += len(results)
+
+        while len(self._entries) > self.max_entries or self._total_results > self.max_total_results:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_knowledge_base(self, knowledge_base_id: str) -> int:
+        """
+        移除指定知識庫的所有條目（寫入世代無法涵蓋的變更，例如 BM25 索引重建）
+
+        Args:
+            knowledge_base_id: 知識庫ID
+
+        Returns:
+            int: 移除的條目數量
+        """
+        keys = [key for key in self._entries if key[1] == knowledge_base_id]
+        for key in keys:
+            self._remove(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空快取"""
+        self._entries.clear()
+        self._total_results = 0
+
+    def _remove(self, key: Tuple) -> None:
+        """移除條目並更新結果計數"""
+        _, results = self._entries.pop(key)
+        self._total_results -= len(results)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """命中率與容量統計"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'cached_results': self._total_results,
+            'max_total_results': self.max_total_results,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,957 @@
+"""
+分片向量資料庫
+依文件ID雜湊將向量分散到多個本機工作程序，每個程序擁有一個 Faiss 分片；
+查詢經由 Unix socket 管道分發到所有分片，再合併各分片的 top-k 結果
+"""
+
+import json
+import time
+import shutil
+import zlib
+import heapq
+import asyncio
+import logging
+import threading
+import itertools
+import multiprocessing
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Union, Tuple
+from multiprocessing.connection import Connection
+
+from ..interfaces.vector_database_interface import (
+    VectorDatabaseInterface,
+    VectorRecord,
+    VectorSearchResult,
+    DEFAULT_RANGE_SEARCH_MAX_RESULTS
+)
+from .faiss_vector_database import (
+    FaissVectorDatabase,
+    VectorStorageError,
+    VectorSearchError,
+    DEFAULT_INDEX_NAME,
+    _INDEX_NAME_PATTERN
+)
+
+logger = logging.getLogger(__name__)
+
+# 分片程序可被呼叫的方法（其餘請求一律拒絕）
+_SHARD_METHODS = frozenset({
+    'store_vector', 'store_vectors_batch', 'get_vector', 'get_vectors',
+    'delete_vector', 'delete_vectors_by_document', 'delete_vectors_by_document_path',
+    'count_vectors_by_document_path', 'similarity_search', 'similarity_search_batch', 'range_search',
+    'get_vector_count', 'get_statistics', 'get_counters', 'get_document_vector_count',
+    'health_check', 'checkpoint', 'create_index', 'drop_index', 'list_indexes',
+    'backup_index', 'restore_index', 'open_index', 'get_index_counters'
+})
+
+# 作用於分片根資料庫本身（以參數指定索引名稱）的方法
+_ROOT_METHODS = frozenset({'create_index', 'drop_index', 'list_indexes', 'open_index', 'get_index_counters'})
+
+# 程序內全域遞增的寫入世代
+_write_generations = itertools.count(1)
+
+
+def shard_for_document(document_id: str, num_shards: int) -> int:
+    """
+    以文件ID的 CRC32 決定所屬分片（不受程序雜湊種子影響）
+
+    服務層的文件ID以分塊為單位（知識庫_路徑_分塊序號），同一文件的分塊會分散到不同分片；
+    按文件路徑刪除與計數因此廣播到所有分片
+    """
+    return zlib.crc32(document_id.encode('utf-8')) % num_shards
+
+
+def _shard_worker(
+    conn: Connection,
+    shard_path: str,
+    dimension: int,
+    metric: str,
+    options: Dict[str, Any]
+) -> None:
+    """分片工作程序入口"""
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve_shard(conn, shard_path, dimension, metric, options))
+
+
+async def _serve_shard(
+    conn: Connection,
+    shard_path: str,
+    dimension: int,
+    metric: str,
+    options: Dict[str, Any]
+) -> None:
+    """
+    在分片程序中服務請求，直到收到關閉訊息或管道中斷
+
+    請求格式為 (請求ID, 索引名稱, 方法, args, kwargs)，回應為 (請求ID, 是否成功, 結果或錯誤訊息)；
+    每個請求在獨立任務中執行，同一分片上的多個搜索可以並行
+    """
+    db = FaissVectorDatabase(shard_path, dimension=dimension, metric=metric, **options)
+    ready = await db.initialize()
+    conn.send(ready)
+    if not ready:
+        conn.close()
+        return
+
+    send_lock = threading.Lock()
+    tasks = set()
+
+    def send(response: Tuple) -> None:
+        with send_lock:
+            conn.send(response)
+
+    async def handle(request_id: int, index_name: str, method: str, args: Tuple, kwargs: Dict) -> None:
+        try:
+            if method not in _SHARD_METHODS:
+                raise VectorStorageError(f"分片不支援的方法: {method}")
+
+            if method == 'open_index':
+                result = await db.get_index(*args, **kwargs) is not None
+            elif method in _ROOT_METHODS or index_name == DEFAULT_INDEX_NAME:
+                result = await getattr(db, method)(*args, **kwargs)
+            else:
+                # 固定索引直到操作完成，避免同時處理的請求因記憶體上限將其逐出
+                async with db.use_index(index_name, create=True) as target:
+                    if target is None:
+                        raise VectorStorageError(f"無法開啟索引: {index_name}")
+                    result = await getattr(target, method)(*args, **kwargs)
+            response = (request_id, True, result)
+        except Exception as e:
+            response = (request_id, False, str(e))
+
+        try:
+            await asyncio.to_thread(send, response)
+        except (OSError, EOFError):
+            pass
+
+    try:
+        while True:
+            try:
+                message = await asyncio.to_thread(conn.recv)
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+
+            task = asyncio.create_task(handle(*message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await db.close()
+        conn.close()
+
+
+class _ShardClient:
+    """主程序端的分片連線，以請求ID對應回應，允許同時有多個請求在途"""
+
+    def __init__(self, shard_id: int, process: multiprocessing.Process, conn: Connection):
+        self.shard_id = shard_id
+        self.process = process
+        self.conn = conn
+        self._request_ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._send_lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 搜索量與累計耗時，用於衡量每個核心的吞吐量
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """啟動回應讀取執行緒"""
+        self._loop = loop
+        self._reader = threading.Thread(
+            target=self._read_responses, name=f"faiss-shard-{self.shard_id}-reader", daemon=True
+        )
+        self._reader.start()
+
+    def _read_responses(self) -> None:
+        """持續讀取回應並在事件迴圈中完成對應的 Future"""
+        while True:
+            try:
+                request_id, ok, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            self._notify(self._resolve, request_id, ok, payload)
+        self._notify(self._fail_pending)
+
+    def _notify(self, callback: Any, *args: Any) -> None:
+        """在事件迴圈中執行回呼（事件迴圈已關閉時忽略）"""
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass
+
+    def _resolve(self, request_id: int, ok: bool, payload: Any) -> None:
+        future = self._pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(payload)
+        else:
+            future.set_exception(VectorStorageError(f"分片 {self.shard_id}: {payload}"))
+
+    def _fail_pending(self) -> None:
+        """分片程序結束時讓所有等待中的請求失敗"""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(VectorStorageError(f"分片 {self.shard_id} 已停止"))
+
+    def _send(self, message: Any) -> None:
+        with self._send_lock:
+            self.conn.send(message)
+
+    async def call(self, index_name: str, method: str, *args: Any, **kwargs: Any) -> Any:
+        """呼叫分片上的方法並等待結果"""
+        if not self.process.is_alive():
+            raise VectorStorageError(f"分片 {self.shard_id} 已停止")
+
+        request_id = next(self._request_ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = future
+        try:
+            await asyncio.to_thread(self._send, (request_id, index_name, method, args, kwargs))
+        except Exception:
+            self._pending.pop(request_id, None)
+            raise
+        return await future
+
+    async def search(self, index_name: str, method: str, *args: Any, **kwargs: Any) -> Any:
+        """呼叫分片上的搜索方法並累計耗時"""
+        started = time.perf_counter()
+        result = await self.call(index_name, method, *args, **kwargs)
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return result
+
+    async def shutdown(self, timeout: float) -> None:
+        """通知分片程序關閉並等待結束，逾時則強制終止"""
+        try:
+            if self.process.is_alive():
+                await asyncio.to_thread(self._send, None)
+        except (OSError, EOFError):
+            pass
+
+        await asyncio.to_thread(self.process.join, timeout)
+        if self.process.is_alive():
+            logger.warning(f"分片 {self.shard_id} 未在時限內結束，強制終止")
+            self.process.terminate()
+            await asyncio.to_thread(self.process.join, timeout)
+
+        self.conn.close()
+        if self._reader is not None:
+            await asyncio.to_thread(self._reader.join, timeout)
+
+
+class ShardedVectorDatabase(VectorDatabaseInterface):
+    """分片向量資料庫：向量依文件ID雜湊分散到多個 Faiss 工作程序，查詢分發後合併 top-k"""
+
+    def __init__(
+        self,
+        index_path: str,
+        num_shards: int = 2,
+        dimension: int = 384,
+        metric: str = "cosine",
+        shard_options: Optional[Dict[str, Any]] = None,
+        startup_timeout: float = 60.0,
+        shutdown_timeout: float = 30.0
+    ):
+        """
+        初始化分片向量資料庫
+
+        Args:
+            index_path: 索引根目錄，每個分片使用其下的 shard_XXX 子目錄
+            num_shards: 分片（工作程序）數量，建立後不可變更
+            dimension: 向量維度
+            metric: 距離度量方法
+            shard_options: 傳給每個分片 FaissVectorDatabase 的其他參數
+            startup_timeout: 等待分片程序就緒的秒數
+            shutdown_timeout: 等待分片程序結束的秒數
+        """
+        if num_shards < 1:
+            raise VectorStorageError(f"分片數量必須為正數: {num_shards}")
+
+        self.index_path = Path(index_path)
+        self.num_shards = num_shards
+        self.dimension = dimension
+        self.metric = metric
+        self.shard_options = dict(shard_options or {})
+        self.startup_timeout = startup_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.layout_file = self.index_path / "shards.json"
+
+        self.index_name = DEFAULT_INDEX_NAME
+        self._shards: List[_ShardClient] = []
+        self._views: Dict[str, "ShardedVectorDatabase"] = {}
+        self._owns_shards = True
+        self._write_generation = next(_write_generations)
+
+    def _view(self, index_name: str) -> "ShardedVectorDatabase":
+        """建立共用分片程序、作用於命名空間索引的視圖"""
+        view = ShardedVectorDatabase.__new__(ShardedVectorDatabase)
+        view.__dict__.update(self.__dict__)
+        view.index_name = index_name
+        view._views = {}
+        view._owns_shards = False
+        view._write_generation = next(_write_generations)
+        return view
+
+    def _check_layout(self) -> None:
+        """確認磁盤上的分片配置與設定一致（不支援重新分片）"""
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        if self.layout_file.exists():
+            with open(self.layout_file, 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+            if layout.get('num_shards') != self.num_shards:
+                raise VectorStorageError(
+                    f"分片數量與現有配置不符: {self.num_shards} != {layout.get('num_shards')}"
+                )
+            return
+
+        with open(self.layout_file, 'w', encoding='utf-8') as f:
+            json.dump({'num_shards': self.num_shards, 'dimension': self.dimension, 'metric': self.metric}, f)
+
+    def _shard_path(self, shard_id: int) -> Path:
+        return self.index_path / f"shard_{shard_id:03d}"
+
+    async def _start_shard(self, context: Any, shard_id: int) -> _ShardClient:
+        """啟動分片程序並等待其完成初始化"""
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_shard_worker,
+            args=(child_conn, str(self._shard_path(shard_id)), self.dimension, self.metric, self.shard_options),
+            name=f"faiss-shard-{shard_id}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        client = _ShardClient(shard_id, process, parent_conn)
+        ready = False
+        if await asyncio.to_thread(parent_conn.poll, self.startup_timeout):
+            try:
+                ready = await asyncio.to_thread(parent_conn.recv)
+            except (EOFError, OSError):
+                ready = False
+        if not ready:
+            await client.shutdown(self.shutdown_timeout)
+            raise VectorStorageError(f"分片 {shard_id} 初始化失敗")
+
+        client.start(asyncio.get_running_loop())
+        return client
+
+    async def initialize(self) -> bool:
+        """啟動所有分片程序"""
+        try:
+            if self._shards:
+                return True
+
+            self._check_layout()
+
+            # 分片程序擁有自己的 Faiss 執行緒與事件迴圈，以 spawn 啟動避免繼承父程序的鎖狀態
+            context = multiprocessing.get_context("spawn")
+            results = await asyncio.gather(
+                *(self._start_shard(context, shard_id) for shard_id in range(self.num_shards)),
+                return_exceptions=True
+            )
+            clients = [result for result in results if isinstance(result, _ShardClient)]
+            if len(clients) != self.num_shards:
+                for client in clients:
+                    await client.shutdown(self.shutdown_timeout)
+                errors = [str(result) for result in results if isinstance(result, BaseException)]
+                raise VectorStorageError("; ".join(errors))
+
+            self._shards = clients
+            logger.info(f"分片向量資料庫已啟動: {self.index_path}, 分片數: {self.num_shards}")
+            return True
+
+        except Exception as e:
+            logger.error(f"分片向量資料庫初始化失敗: {str(e)}")
+            return False
+
+    async def close(self) -> None:
+        """關閉所有分片程序（命名空間視圖不擁有分片程序，不做任何事）"""
+        if not self._owns_shards:
+            return
+
+        try:
+            await asyncio.gather(*(shard.shutdown(self.shutdown_timeout) for shard in self._shards))
+            self._shards = []
+            self._views.clear()
+            logger.info("分片向量資料庫已關閉")
+
+        except Exception as e:
+            logger.error(f"關閉分片向量資料庫失敗: {str(e)}")
+
+    def _require_shards(self) -> List[_ShardClient]:
+        if not self._shards:
+            raise VectorStorageError("分片向量資料庫未初始化")
+        return self._shards
+
+    def _shard_of(self, document_id: str) -> _ShardClient:
+        shards = self._require_shards()
+        return shards[shard_for_document(document_id, self.num_shards)]
+
+    async def _broadcast(self, method: str, *args: Any, **kwargs: Any) -> List[Any]:
+        """在所有分片上並行呼叫方法，返回與分片順序對應的結果"""
+        return list(await asyncio.gather(
+            *(shard.call(self.index_name, method, *args, **kwargs) for shard in self._require_shards())
+        ))
+
+    def _bump_write_generation(self) -> None:
+        self._write_generation = next(_write_generations)
+
+    def get_write_generation(self) -> Optional[int]:
+        """取得寫入世代（經由本實例寫入或刪除後改變）"""
+        return self._write_generation
+
+    async def store_vector(
+        self,
+        embedding: List[float],
+        document_id: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """儲存向量到文件所屬的分片"""
+        try:
+            vector_id = await self._shard_of(document_id).call(
+                self.index_name, 'store_vector', embedding, document_id, metadata
+            )
+            self._bump_write_generation()
+            return vector_id
+
+        except Exception as e:
+            logger.error(f"儲存向量失敗: {str(e)}")
+            raise VectorStorageError(str(e))
+
+    async def store_vectors_batch(
+        self,
+        embeddings: Union[List[List[float]], np.ndarray],
+        document_ids: List[str],
+        metadata_list: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
+        """
+        批次儲存向量，依文件ID分組後並行寫入各分片
+
+        Args:
+            embeddings: 向量列表或 (n, dimension) 矩陣
+            document_ids: 文件ID列表
+            metadata_list: 元數據列表
+
+        Returns:
+            List[str]: 與輸入順序對應的向量ID列表
+        """
+        try:
+            if len(embeddings) != len(document_ids):
+                raise VectorStorageError("embeddings 和 document_ids 長度不匹配")
+
+            if metadata_list and len(metadata_list) != len(embeddings):
+                raise VectorStorageError("metadata_list 長度不匹配")
+
+            if len(embeddings) == 0:
+                return []
+
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+                raise VectorStorageError(f"向量矩陣形狀不匹配: {vectors.shape} != (n, {self.dimension})")
+
+            shard_ids = np.fromiter(
+                (shard_for_document(document_id, self.num_shards) for document_id in document_ids),
+                dtype=np.int64, count=len(document_ids)
+            )
+            shards = self._require_shards()
+
+            groups = []
+            calls = []
+            for shard_id in np.unique(shard_ids):
+                positions = np.flatnonzero(shard_ids == shard_id)
+                groups.append(positions)
+                calls.append(shards[shard_id].call(
+                    self.index_name, 'store_vectors_batch',
+                    np.ascontiguousarray(vectors[positions]),
+                    [document_ids[i] for i in positions],
+                    [metadata_list[i] for i in positions] if metadata_list else None
+                ))
+
+            results = await asyncio.gather(*calls)
+            self._bump_write_generation()
+
+            vector_ids: List[Optional[str]] = [None] * len(document_ids)
+            for positions, shard_vector_ids in zip(groups, results):
+                for position, vector_id in zip(positions.tolist(), shard_vector_ids):
+                    vector_ids[position] = vector_id
+
+            logger.info(f"成功批次儲存 {len(vector_ids)} 個向量至 {len(groups)} 個分片")
+            return vector_ids
+
+        except Exception as e:
+            logger.error(f"批次儲存向量失敗: {str(e)}")
+            raise VectorStorageError(str(e))
+
+    async def get_vector(self, vector_id: str) -> Optional[VectorRecord]:
+        """根據向量ID獲取向量記錄（向量ID不含分片資訊，向所有分片查詢）"""
+        try:
+            for record in await self._broadcast('get_vector', vector_id):
+                if record is not None:
+                    return record
+            return None
+
+        except Exception as e:
+            logger.error(f"獲取向量失敗: {vector_id} - {str(e)}")
+            return None
+
+    async def get_vectors(self, vector_ids: List[str]) -> List[Optional[VectorRecord]]:
+        """批次根據向量ID獲取向量記錄"""
+        try:
+            records: List[Optional[VectorRecord]] = [None] * len(vector_ids)
+            for shard_records in await self._broadcast('get_vectors', vector_ids):
+                for i, record in enumerate(shard_records):
+                    if record is not None:
+                        records[i] = record
+            return records
+
+        except Exception as e:
+            logger.error(f"批次獲取向量失敗: {str(e)}")
+            return [None] * len(vector_ids)
+
+    async def delete_vector(self, vector_id: str) -> bool:
+        """刪除向量"""
+        try:
+            deleted = any(await self._broadcast('delete_vector', vector_id))
+            if deleted:
+                self._bump_write_generation()
+            return deleted
+
+        except Exception as e:
+            logger.error(f"刪除向量失敗: {vector_id} - {str(e)}")
+            return False
+
+    async def delete_vectors_by_document(self, document_id: str) -> int:
+        """根據文件ID刪除所有相關向量（只需要文件所屬的分片）"""
+        try:
+            deleted_count = await self._shard_of(document_id).call(
+                self.index_name, 'delete_vectors_by_document', document_id
+            )
+            if deleted_count:
+                self._bump_write_generation()
+            return deleted_count
+
+        except Exception as e:
+            logger.error(f"按文件ID刪除向量失敗: {document_id} - {str(e)}")
+            return 0
+
+    async def delete_vectors_by_document_path(self, document_path: str) -> int:
+        """刪除同一文件路徑下的所有分塊向量"""
+        try:
+            deleted_count = sum(await self._broadcast('delete_vectors_by_document_path', document_path))
+            if deleted_count:
+                self._bump_write_generation()
+            return deleted_count
+
+        except Exception as e:
+            logger.error(f"按文件路徑刪除向量失敗: {document_path} - {str(e)}")
+            return 0
+
+    async def count_vectors_by_document_path(self, document_path: str) -> int:
+        """計算文件路徑下的有效向量數量"""
+        return sum(await self._broadcast('count_vectors_by_document_path', document_path))
+
+    @staticmethod
+    def _merge_results(shard_results: List[List[VectorSearchResult]], top_k: int) -> List[VectorSearchResult]:
+        """合併各分片已排序的結果，取全域 top-k"""
+        return heapq.nlargest(
+            top_k, itertools.chain.from_iterable(shard_results), key=lambda result: result.similarity_score
+        )
+
+    def _search_shards(self, document_ids: Optional[List[str]]) -> List[_ShardClient]:
+        """搜索需要查詢的分片：文件只存在於其所屬分片，有文件過濾時只查詢這些分片"""
+        shards = self._require_shards()
+        if not document_ids:
+            return shards
+        targets = {shard_for_document(document_id, self.num_shards) for document_id in document_ids}
+        return [shards[shard_id] for shard_id in sorted(targets)]
+
+    async def similarity_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[VectorSearchResult]:
+        """
+        相似性搜索：查詢分發到所有分片，合併各分片的 top-k
+
+        Args:
+            query_embedding: 查詢向量
+            top_k: 返回結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），由各分片求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        try:
+            if len(query_embedding) != self.dimension:
+                raise VectorSearchError(f"查詢向量維度不匹配: {len(query_embedding)} != {self.dimension}")
+
+            shards = self._search_shards(document_ids)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            shard_results = await asyncio.gather(*(
+                shard.search(
+                    self.index_name, 'similarity_search', query,
+                    top_k=top_k,
+                    similarity_threshold=similarity_threshold,
+                    document_ids=document_ids,
+                    knowledge_base_ids=knowledge_base_ids,
+                    metadata_filter=metadata_filter,
+                    nprobe=nprobe,
+                    ef_search=ef_search
+                )
+                for shard in shards
+            ))
+            return self._merge_results(shard_results, top_k)
+
+        except Exception as e:
+            logger.error(f"相似性搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    async def range_search(
+        self,
+        query_embedding: List[float],
+        similarity_threshold: float = 0.7,
+        max_results: Optional[int] = DEFAULT_RANGE_SEARCH_MAX_RESULTS,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[VectorSearchResult]:
+        """
+        範圍搜索：每個分片以相同上限執行範圍搜索，合併後再套用上限
+
+        Args:
+            query_embedding: 查詢向量
+            similarity_threshold: 相似度閾值
+            max_results: 結果數量上限，超過時只保留相似度最高者（None 為不限）
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），由各分片求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+
+        Returns:
+            List[VectorSearchResult]: 搜索結果列表，按相似度降序排列
+        """
+        try:
+            if len(query_embedding) != self.dimension:
+                raise VectorSearchError(f"查詢向量維度不匹配: {len(query_embedding)} != {self.dimension}")
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            shard_results = await asyncio.gather(*(
+                shard.search(
+                    self.index_name, 'range_search', query,
+                    similarity_threshold=similarity_threshold,
+                    max_results=max_results,
+                    document_ids=document_ids,
+                    knowledge_base_ids=knowledge_base_ids,
+                    metadata_filter=metadata_filter,
+                    nprobe=nprobe,
+                    ef_search=ef_search
+                )
+                for shard in self._search_shards(document_ids)
+            ))
+            if max_results is None:
+                max_results = sum(len(results) for results in shard_results)
+            return self._merge_results(shard_results, max_results)
+
+        except Exception as e:
+            logger.error(f"範圍搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    async def similarity_search_batch(
+        self,
+        query_embeddings: Union[List[List[float]], np.ndarray],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        document_ids: Optional[List[str]] = None,
+        knowledge_base_ids: Optional[List[str]] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> List[List[VectorSearchResult]]:
+        """
+        批次相似性搜索：整個查詢矩陣送往每個分片，逐查詢合併結果
+
+        Args:
+            query_embeddings: 查詢向量矩陣 (n, dimension)
+            top_k: 每個查詢返回的結果數量
+            similarity_threshold: 相似度閾值
+            document_ids: 限制搜索的文件ID列表
+            knowledge_base_ids: 限制搜索的知識庫ID列表
+            metadata_filter: 元數據過濾表達式（等值、IN 與前綴條件），由各分片求值
+            nprobe: 覆寫 IVF 索引本次搜索的倒排列表數
+            ef_search: 覆寫 HNSW 索引本次搜索的搜索寬度
+
+        Returns:
+            List[List[VectorSearchResult]]: 與查詢順序對應的搜索結果列表
+        """
+        try:
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if queries.size == 0:
+                return []
+            if queries.ndim != 2 or queries.shape[1] != self.dimension:
+                raise VectorSearchError(f"查詢矩陣形狀不匹配: {queries.shape} != (n, {self.dimension})")
+
+            shard_results = await asyncio.gather(*(
+                shard.search(
+                    self.index_name, 'similarity_search_batch', queries,
+                    top_k=top_k,
+                    similarity_threshold=similarity_threshold,
+                    document_ids=document_ids,
+                    knowledge_base_ids=knowledge_base_ids,
+                    metadata_filter=metadata_filter,
+                    nprobe=nprobe,
+                    ef_search=ef_search
+                )
+                for shard in self._require_shards()
+            ))
+            return [self._merge_results(list(per_query), top_k) for per_query in zip(*shard_results)]
+
+        except Exception as e:
+            logger.error(f"批次相似性搜索失敗: {str(e)}")
+            raise VectorSearchError(str(e))
+
+    async def get_vector_count(self) -> int:
+        """獲取向量總數"""
+        try:
+            return sum(await self._broadcast('get_vector_count'))
+        except Exception as e:
+            logger.error(f"獲取向量總數失敗: {str(e)}")
+            return 0
+
+    @staticmethod
+    def _sum_counters(shard_counters: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """加總各分片的計數，知識庫計數逐鍵相加"""
+        totals: Dict[str, Any] = {}
+        knowledge_bases: Dict[str, int] = {}
+        for counters in shard_counters:
+            for key, value in counters.items():
+                if key == 'knowledge_bases':
+                    for knowledge_base_id, count in value.items():
+                        knowledge_bases[knowledge_base_id] = knowledge_bases.get(knowledge_base_id, 0) + count
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+        totals['knowledge_bases'] = knowledge_bases
+        return totals
+
+    async def get_counters(self) -> Dict[str, Any]:
+        """取得各分片增量維護計數的總和"""
+        return self._sum_counters(await self._broadcast('get_counters'))
+
+    async def get_document_vector_count(self, document_id: str) -> int:
+        """取得單個文件的有效向量數量"""
+        return await self._shard_of(document_id).call(self.index_name, 'get_document_vector_count', document_id)
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        """獲取資料庫統計資訊（各分片加總與每個分片的搜索吞吐量）"""
+        try:
+            shard_stats = await self._broadcast('get_statistics')
+            totals = self._sum_counters([
+                {key: stats.get(key, 0) for key in (
+                    'total_vectors', 'active_vectors', 'deleted_vectors', 'tombstoned_vectors',
+                    'unique_documents', 'storage_size_mb'
+                )} | {'knowledge_bases': stats.get('knowledge_bases', {})}
+                for stats in shard_stats
+            ])
+
+            shards = []
+            for shard, stats in zip(self._shards, shard_stats):
+                shards.append({
+                    'shard_id': shard.shard_id,
+                    'pid': shard.process.pid,
+                    'active_vectors': stats.get('active_vectors', 0),
+                    'searches': shard.searches,
+                    'search_seconds': round(shard.search_seconds, 4),
+                    'mean_search_ms': (
+                        round(shard.search_seconds * 1000 / shard.searches, 3) if shard.searches else 0.0
+                    ),
+                    'index_residency': stats.get('index_residency')
+                })
+
+            return {
+                **totals,
+                'dimension': self.dimension,
+                'metric': self.metric,
+                'index_type': shard_stats[0].get('index_type') if shard_stats else None,
+                'num_shards': self.num_shards,
+                'index_path': str(self.index_path),
+                'shards': shards
+            }
+
+        except Exception as e:
+            logger.error(f"獲取統計資訊失敗: {str(e)}")
+            return {}
+
+    async def health_check(self) -> bool:
+        """健康檢查：所有分片程序存活且健康"""
+        try:
+            if not self._shards or not all(shard.process.is_alive() for shard in self._shards):
+                return False
+            return all(await self._broadcast('health_check'))
+
+        except Exception as e:
+            logger.error(f"健康檢查失敗: {str(e)}")
+            return False
+
+    async def create_index(
+        self,
+        index_name: str,
+        dimension: int,
+        metric: str = "cosine"
+    ) -> bool:
+        """在所有分片上創建命名空間索引"""
+        try:
+            return all(await self._broadcast('create_index', index_name, dimension, metric))
+        except Exception as e:
+            logger.error(f"創建索引失敗: {index_name} - {str(e)}")
+            return False
+
+    async def drop_index(self, index_name: str) -> bool:
+        """在所有分片上刪除命名空間索引，分片程序未啟動時直接移除各分片的索引目錄"""
+        try:
+            self._views.pop(index_name, None)
+            if self._shards:
+                dropped = any(await self._broadcast('drop_index', index_name))
+            else:
+                dropped = await asyncio.to_thread(self._remove_index_dirs, index_name)
+            self._bump_write_generation()
+            return dropped
+
+        except Exception as e:
+            logger.error(f"刪除索引失敗: {index_name} - {str(e)}")
+            return False
+
+    def _remove_index_dirs(self, index_name: str) -> bool:
+        """移除各分片目錄下的命名空間索引（僅在沒有分片程序使用時呼叫）"""
+        if index_name == DEFAULT_INDEX_NAME or not _INDEX_NAME_PATTERN.match(index_name):
+            logger.warning(f"無法刪除索引: {index_name}")
+            return False
+
+        removed = False
+        for shard_id in range(self.num_shards):
+            index_dir = self._shard_path(shard_id) / "indexes" / index_name
+            if index_dir.exists():
+                shutil.rmtree(index_dir)
+                removed = True
+        return removed
+
+    async def list_indexes(self) -> List[str]:
+        """列出所有分片上的索引"""
+        names = set()
+        for shard_names in await self._broadcast('list_indexes'):
+            names.update(shard_names)
+        names.discard(DEFAULT_INDEX_NAME)
+        return [DEFAULT_INDEX_NAME] + sorted(names)
+
+    async def get_index(
+        self,
+        index_name: str,
+        create: bool = False
+    ) -> Optional["ShardedVectorDatabase"]:
+        """
+        取得命名空間索引的視圖，與本資料庫共用分片程序
+
+        Args:
+            index_name: 索引名稱，通常為知識庫ID
+            create: 索引不存在時是否創建
+
+        Returns:
+            Optional[ShardedVectorDatabase]: 索引視圖，不存在且未要求創建時返回None
+        """
+        if index_name == self.index_name or index_name == DEFAULT_INDEX_NAME:
+            return self
+
+        view = self._views.get(index_name)
+        if view is not None:
+            return view
+
+        if not any(await self._broadcast('open_index', index_name, create=create)):
+            return None
+
+        view = self._views.setdefault(index_name, self._view(index_name))
+        return view
+
+    async def get_index_counters(self, index_name: str) -> Optional[Dict[str, Any]]:
+        """取得各分片上該索引計數的總和，分片程序不加載未常駐的索引"""
+        shard_counters = [
+            counters for counters in await self._broadcast('get_index_counters', index_name)
+            if counters is not None
+        ]
+        return self._sum_counters(shard_counters) if shard_counters else None
+
+    async def get_index_write_generation(self, index_name: str) -> Optional[int]:
+        """取得索引視圖的寫入世代，尚未開啟視圖時返回None（不觸發分片加載）"""
+        if index_name == self.index_name or index_name == DEFAULT_INDEX_NAME:
+            return self._write_generation
+        view = self._views.get(index_name)
+        return None if view is None else view.get_write_generation()
+
+    def _resolve_index_name(self, index_name: str) -> str:
+        """命名空間視圖中的預設名稱指向視圖本身的索引"""
+        return self.index_name if index_name == DEFAULT_INDEX_NAME else index_name
+
+    async def backup_index(
+        self,
+        index_name: str,
+        backup_path: str
+    ) -> bool:
+        """備份索引，每個分片寫入備份目錄下對應的子目錄"""
+        try:
+            index_name = self._resolve_index_name(index_name)
+            results = await asyncio.gather(*(
+                shard.call(
+                    DEFAULT_INDEX_NAME, 'backup_index',
+                    index_name, str(Path(backup_path) / self._shard_path(shard.shard_id).name)
+                )
+                for shard in self._require_shards()
+            ))
+            return all(results)
+
+        except Exception as e:
+            logger.error(f"索引備份失敗: {str(e)}")
+            return False
+
+    async def restore_index(
+        self,
+        index_name: str,
+        backup_path: str
+    ) -> bool:
+        """從各分片的備份子目錄恢復索引"""
+        try:
+            index_name = self._resolve_index_name(index_name)
+            results = await asyncio.gather(*(
+                shard.call(
+                    DEFAULT_INDEX_NAME, 'restore_index',
+                    index_name, str(Path(backup_path) / self._shard_path(shard.shard_id).name)
+                )
+                for shard in self._require_shards()
+            ))
+            self._bump_write_generation()
+            return all(results)
+
+        except Exception as e:
+            logger.error(f"索引恢復失敗: {str(e)}")
+            return False
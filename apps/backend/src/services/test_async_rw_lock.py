@@ -0,0 +1,73 @@
+"""
+非同步讀寫鎖測試
+"""
+
+import pytest
+import asyncio
+
+from .async_rw_lock import AsyncReadWriteLock
+
+
+class TestAsyncReadWriteLock:
+    """非同步讀寫鎖測試類別"""
+
+    @pytest.mark.asyncio
+    async def test_readers_share_lock(self):
+        """測試多個讀者可同時持有"""
+        lock = AsyncReadWriteLock()
+        entered = asyncio.Event()
+
+        async def reader():
+            async with lock.read():
+                if lock.readers == 2:
+                    entered.set()
+                await asyncio.wait_for(entered.wait(), timeout=1)
+
+        await asyncio.gather(reader(), reader())
+        assert lock.readers == 0
+
+    @pytest.mark.asyncio
+    async def test_writer_excludes_readers(self):
+        """測試寫者獨佔且等待中的寫者優先於新讀者"""
+        lock = AsyncReadWriteLock()
+        order = []
+
+        async def writer():
+            async with lock.write():
+                order.append('write')
+
+        async def reader():
+            async with lock.read():
+                order.append('read')
+
+        async with lock.read():
+            write_task = asyncio.create_task(writer())
+            await asyncio.sleep(0)
+            read_task = asyncio.create_task(reader())
+            await asyncio.sleep(0)
+            assert order == []
+
+        await asyncio.gather(write_task, read_task)
+        assert order == ['write', 'read']
+
+    @pytest.mark.asyncio
+    async def test_cancelled_writer_releases_readers(self):
+        """測試取消等待中的寫者後讀者可繼續"""
+        lock = AsyncReadWriteLock()
+
+        async def writer():
+            async with lock.write():
+                pass
+
+        async with lock.read():
+            write_task = asyncio.create_task(writer())
+            await asyncio.sleep(0)
+            write_task.cancel()
+            await asyncio.gather(write_task, return_exceptions=True)
+
+        async with lock.read():
+            assert lock.readers == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,109 @@
+"""
+BM25 詞彙索引測試
+"""
+
+import pytest
+import tempfile
+import shutil
+from pathlib import Path
+
+from .bm25_index import Bm25Index, tokenize
+
+
+class TestTokenize:
+    """詞彙切分測試類別"""
+
+    def test_identifiers_keep_full_form_and_subwords(self):
+        """測試識別碼保留完整形式並加入子詞"""
+        tokens = tokenize("raise ValueError in parse_config")
+
+        assert "valueerror" in tokens
+        assert {"value", "error"} <= set(tokens)
+        assert {"parse_config", "parse", "config"} <= set(tokens)
+
+    def test_compound_codes(self):
+        """測試錯誤碼與點分路徑"""
+        tokens = tokenize("ORA-00942 at os.path.join")
+
+        assert {"ora-00942", "ora", "00942", "os.path.join", "join"} <= set(tokens)
+
+    def test_cjk_bigrams(self):
+        """測試中文以雙字組切分"""
+        assert tokenize("向量資料") == ["向量", "量資", "資料"]
+
+
+class TestBm25Index:
+    """BM25 詞彙索引測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_file = Path(self.temp_dir) / "kb.bm25.npz"
+        self.chunks = [
+            {'document_id': 'kb_a.py_0', 'document_path': 'a.py', 'chunk_index': 0,
+             'content': 'def load_settings(path):\n    return parse_config(path)'},
+            {'document_id': 'kb_b.log_0', 'document_path': 'b.log', 'chunk_index': 0,
+             'content': 'ERROR ORA-00942: table or view does not exist'},
+            {'document_id': 'kb_c.md_0', 'document_path': 'c.md', 'chunk_index': 0,
+             'content': 'The config file controls settings for the table view'},
+        ]
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_exact_identifier_ranks_first(self):
+        """測試精確識別碼排在最前"""
+        index = Bm25Index.build(self.index_file, self.chunks)
+
+        assert index.search("ORA-00942")[0].document_id == 'kb_b.log_0'
+        assert index.search("parse_config")[0].document_id == 'kb_a.py_0'
+        assert index.search("nonexistent_symbol") == []
+
+    def test_save_and_load_round_trip(self):
+        """測試保存後載入的搜索結果一致"""
+        index = Bm25Index.build(self.index_file, self.chunks, k1=1.5, b=0.5)
+        index.save()
+
+        loaded = Bm25Index(self.index_file)
+        assert loaded.load()
+        assert (loaded.k1, loaded.b) == (1.5, 0.5)
+        assert loaded.document_count == 3
+        assert loaded.search("table view", top_k=2) == index.search("table view", top_k=2)
+        assert not self.index_file.with_name(self.index_file.name + ".tmp").exists()
+
+    def test_top_k_limits_results(self):
+        """測試返回數量限制與分數排序"""
+        index = Bm25Index.build(self.index_file, self.chunks)
+
+        results = index.search("table config settings", top_k=2)
+
+        assert len(results) == 2
+        assert results[0].score >= results[1].score
+
+    def test_without_paths_matches_rebuild(self):
+        """測試移除文件路徑後的索引與從其餘分塊重建的結果一致"""
+        index = Bm25Index.build(self.index_file, self.chunks)
+        rebuilt = Bm25Index.build(self.index_file, self.chunks[1:])
+
+        filtered = index.without_paths(['a.py'])
+
+        assert filtered.document_count == 2
+        assert filtered.term_count == rebuilt.term_count
+        for query in ("table view", "config settings", "ORA-00942", "parse_config"):
+            assert filtered.search(query) == rebuilt.search(query)
+        assert index.search("parse_config")[0].document_path == 'a.py'
+        assert index.without_paths(['a.py', 'b.log', 'c.md']).search("table") == []
+
+    def test_empty_index(self):
+        """測試空索引"""
+        index = Bm25Index.build(self.index_file, [])
+        index.save()
+
+        loaded = Bm25Index(self.index_file)
+        assert loaded.load()
+        assert loaded.search("anything") == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,78 @@
+"""
+分塊去重測試
+"""
+
+import pytest
+import numpy as np
+
+from .chunk_deduplicator import ChunkDeduplicator, content_digest, simhash
+
+
+class TestChunkDeduplicator:
+    """分塊去重測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        rng = np.random.default_rng(0)
+        self.words = [f"token{n}" for n in rng.integers(0, 5000, size=600)]
+        self.base = " ".join(self.words[:150])
+        self.edited = " ".join(self.words[:40] + ["changed"] + self.words[41:150])
+        self.unrelated = " ".join(self.words[300:450])
+        self.vector = rng.standard_normal(16).astype(np.float32)
+
+    def test_content_digest_ignores_whitespace(self):
+        """測試內容雜湊忽略空白差異"""
+        assert content_digest("def f():\n    return 1") == content_digest("def f():  return 1 ")
+        assert content_digest("return 1") != content_digest("return 2")
+
+    def test_simhash_distance_reflects_similarity(self):
+        """測試相近內容的 SimHash 只差少數位元"""
+        near = bin(simhash(self.base) ^ simhash(self.edited)).count("1")
+        far = bin(simhash(self.base) ^ simhash(self.unrelated)).count("1")
+        assert near <= 5
+        assert far > 15
+        assert simhash("") == simhash("")
+
+    def test_exact_duplicates_resolved_to_first_chunk(self):
+        """測試完全重複的分塊指向第一個出現的分塊"""
+        deduplicator = ChunkDeduplicator()
+        assert deduplicator.exact_duplicate(0, self.base) is None
+        assert deduplicator.exact_duplicate(1, self.unrelated) is None
+        assert deduplicator.exact_duplicate(2, self.base + "\n") == 0
+        assert deduplicator.representative(2) == 0
+        assert deduplicator.representative(1) == 1
+        assert deduplicator.exact_duplicates == 1
+
+    def test_near_duplicate_requires_vector_agreement(self):
+        """測試近似重複需 SimHash 接近且向量相似度達到門檻"""
+        deduplicator = ChunkDeduplicator(vector_threshold=0.95)
+        assert deduplicator.near_duplicate(0, self.base, self.vector) is None
+
+        # 文字相近但向量不同：不視為重複
+        assert deduplicator.near_duplicate(1, self.edited, -self.vector) is None
+        # 文字相近且向量相近
+        assert deduplicator.near_duplicate(2, self.edited, self.vector * 2 + 0.01) == 0
+        # 向量相同但文字無關：不是候選
+        assert deduplicator.near_duplicate(3, self.unrelated, self.vector) is None
+
+        assert deduplicator.near_duplicates == 1
+        assert deduplicator.duplicates == 1
+
+    def test_exact_duplicate_of_near_duplicate_follows_chain(self):
+        """測試完全重複於近似重複分塊時解析到最終代表分塊"""
+        deduplicator = ChunkDeduplicator()
+        deduplicator.exact_duplicate(0, self.base)
+        deduplicator.near_duplicate(0, self.base, self.vector)
+        deduplicator.exact_duplicate(1, self.edited)
+        deduplicator.exact_duplicate(2, self.edited)
+        assert deduplicator.near_duplicate(1, self.edited, self.vector) == 0
+        assert deduplicator.representative(2) == 0
+
+    def test_invalid_distance_rejected(self):
+        """測試漢明距離上限超出範圍時拒絕"""
+        with pytest.raises(ValueError):
+            ChunkDeduplicator(max_hamming_distance=16)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
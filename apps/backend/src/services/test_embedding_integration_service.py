@@ -4,6 +4,9 @@ Embedding 整合服務測試
 
 import pytest
 import asyncio
+import tempfile
+import numpy as np
+from functools import partial
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 from datetime import datetime
 
@@ -15,9 +18,9 @@ from .embedding_integration_service import (
 )
 from .document_processing_service import DocumentProcessingService, DocumentMetadata
 from .ollama_embedding_service import OllamaEmbeddingService, EmbeddingConfig
-from .faiss_vector_database import FaissVectorDatabase
-from ..interfaces.vector_database_interface import VectorSearchResult
-from ..models.knowledge_base import KnowledgeBase, KnowledgeBaseStatus
+from .faiss_vector_database import FaissVectorDatabase, FAISS_AVAILABLE
+from ..interfaces.vector_database_interface import VectorDatabaseInterface, VectorSearchResult, VectorRecord
+from ..models.knowledge_base import KnowledgeBase, KnowledgeBaseStatus, DocumentChunk
 
 
 class TestEmbeddingIntegrationService:
@@ -29,6 +32,17 @@ class TestEmbeddingIntegrationService:
         self.mock_document_service = Mock(spec=DocumentProcessingService)
         self.mock_embedding_service = Mock(spec=OllamaEmbeddingService)
         self.mock_vector_database = Mock(spec=FaissVectorDatabase)
+        self.mock_vector_database.get_index = AsyncMock(return_value=self.mock_vector_database)
+        # 以介面的預設實作經由 get_index 取得索引
+        self.mock_vector_database.use_index = partial(VectorDatabaseInterface.use_index, self.mock_vector_database)
+        self.mock_vector_database.get_index_counters = partial(
+            VectorDatabaseInterface.get_index_counters, self.mock_vector_database
+        )
+        self.mock_vector_database.get_index_write_generation = partial(
+            VectorDatabaseInterface.get_index_write_generation, self.mock_vector_database
+        )
+        self.mock_vector_database.get_write_generation = Mock(return_value=1)
+        self.mock_vector_database.list_indexes = AsyncMock(return_value=["default"])
         self.mock_db_session = Mock()
         
         # 創建服務實例
@@ -151,14 +165,14 @@ class TestEmbeddingIntegrationService:
         ]
         
         # Mock Embeddings
-        mock_embeddings = [[0.1] * 384]
+        mock_embeddings = np.full((1, 384), 0.1, dtype=np.float32)
         mock_vector_ids = ["vector_1"]
         
         # 設置 Mock 行為
         self.mock_document_service.scan_directory = AsyncMock(return_value=mock_files)
         self.mock_document_service.extract_text_content = AsyncMock(return_value=("測試內容", "utf-8"))
         self.mock_document_service.create_text_chunks = Mock(return_value=mock_chunks)
-        self.mock_embedding_service.generate_embeddings_batch = AsyncMock(return_value=mock_embeddings)
+        self.mock_embedding_service.generate_embeddings_array = AsyncMock(return_value=mock_embeddings)
         self.mock_vector_database.store_vectors_batch = AsyncMock(return_value=mock_vector_ids)
         
         # Mock 資料庫操作
@@ -179,12 +193,201 @@ class TestEmbeddingIntegrationService:
         # 驗證方法調用
         self.mock_document_service.scan_directory.assert_called_once()
         self.mock_document_service.extract_text_content.assert_called_once()
-        self.mock_embedding_service.generate_embeddings_batch.assert_called_once()
+        self.mock_embedding_service.generate_embeddings_array.assert_called_once()
         self.mock_vector_database.store_vectors_batch.assert_called_once()
+        self.mock_vector_database.delete_vectors_by_document_path.assert_awaited_once_with('file1.txt')
         
         # 驗證知識庫狀態更新
         mock_kb.update_status.assert_called_with(KnowledgeBaseStatus.READY)
     
+    @pytest.mark.asyncio
+    async def test_process_knowledge_base_deduplicates_chunks(self):
+        """測試去重時重複分塊不重複寫入向量，分塊記錄引用代表分塊的向量ID"""
+        words = [f"token{n}" for n in np.random.default_rng(0).integers(0, 5000, size=400)]
+        license_text = "Licensed under the Apache License, Version 2.0 " + " ".join(words[:60])
+        code = " ".join(words[100:250])
+        edited_code = " ".join(words[100:140] + ["renamed"] + words[141:250])
+        other_code = " ".join(words[250:400])
+        
+        def chunk(path, index, content):
+            return {'chunk_index': index, 'content': content, 'document_path': path,
+                    'chunk_size': len(content), 'language': 'python', 'file_type': '.py', 'encoding': 'utf-8'}
+        
+        files = {
+            'a.py': [chunk('a.py', 0, license_text), chunk('a.py', 1, code)],
+            'b.py': [chunk('b.py', 0, license_text), chunk('b.py', 1, edited_code), chunk('b.py', 2, other_code)],
+        }
+        base_vectors = np.random.default_rng(1).standard_normal((3, 384)).astype(np.float32)
+        vector_of = {license_text: base_vectors[0], code: base_vectors[1], edited_code: base_vectors[1] + 0.001,
+                     other_code: base_vectors[2]}
+        
+        self.mock_document_service.scan_directory = AsyncMock(return_value=[
+            DocumentMetadata(file_path=f"/kb/{name}", relative_path=name, file_size=100, file_type=".py",
+                             mime_type="text/x-python", modified_time=datetime.now())
+            for name in files
+        ])
+        self.mock_document_service.extract_text_content = AsyncMock(return_value=("", "utf-8"))
+        self.mock_document_service.create_text_chunks = Mock(side_effect=lambda content, meta: files[meta.relative_path])
+        self.mock_embedding_service.generate_embeddings_array = AsyncMock(
+            side_effect=lambda texts, batch_size: np.stack([vector_of[t] for t in texts])
+        )
+        stored = []
+        
+        async def store_vectors_batch(embeddings, document_ids, metadata_list):
+            assert len(embeddings) == len(document_ids) == len(metadata_list)
+            stored.extend(document_ids)
+            return [f"vector_{len(stored) - len(document_ids) + k}" for k in range(len(document_ids))]
+        
+        self.mock_vector_database.store_vectors_batch = AsyncMock(side_effect=store_vectors_batch)
+        self.mock_vector_database.delete_vectors_by_document_path = AsyncMock(return_value=0)
+        # 首次導入，沒有先前的分塊記錄
+        self.mock_db_session.query.return_value.filter.return_value.all.return_value = []
+        
+        service = EmbeddingIntegrationService(
+            document_service=self.mock_document_service,
+            embedding_service=self.mock_embedding_service,
+            vector_database=self.mock_vector_database,
+            dedup_enabled=True
+        )
+        mock_kb = Mock(spec=KnowledgeBase)
+        mock_kb.id = "kb"
+        mock_kb.name = "去重知識庫"
+        mock_kb.path = "/kb"
+        
+        result = await service.process_knowledge_base_with_embeddings(mock_kb, self.mock_db_session, batch_size=3)
+        
+        assert result.status == EmbeddingProcessingStatus.COMPLETED
+        assert result.total_chunks == 5
+        assert result.embedded_chunks == 4
+        assert result.stored_vectors == 3
+        assert result.duplicate_chunks == 2
+        assert result.saved_vector_bytes == 2 * 384 * 4
+        assert stored == ["kb_a.py_0", "kb_a.py_1", "kb_b.py_2"]
+        
+        records = [c.args[0] for c in self.mock_db_session.add.call_args_list]
+        assert [(r.document_path, r.vector_id) for r in records] == [
+            ('a.py', 'vector_0'), ('a.py', 'vector_1'), ('b.py', 'vector_0'), ('b.py', 'vector_1'), ('b.py', 'vector_2')
+        ]
+        assert self.mock_vector_database.delete_vectors_by_document_path.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_delete_document_promotes_duplicate(self):
+        """測試刪除代表分塊所屬的文件後，共用向量的重複分塊被提升且仍可搜索"""
+        from .numpy_vector_database import NumpyVectorDatabase
+        
+        shared_text = "Licensed under the Apache License, Version 2.0"
+        files = {
+            'a.py': [(0, shared_text), (1, "def connect(): pass")],
+            'b.py': [(0, shared_text)],
+        }
+        vectors = np.random.default_rng(2).standard_normal((2, 8)).astype(np.float32)
+        vector_of = {shared_text: vectors[0], "def connect(): pass": vectors[1]}
+        
+        self.mock_document_service.scan_directory = AsyncMock(return_value=[
+            DocumentMetadata(file_path=f"/kb/{name}", relative_path=name, file_size=100, file_type=".py",
+                             mime_type="text/x-python", modified_time=datetime.now())
+            for name in files
+        ])
+        self.mock_document_service.extract_text_content = AsyncMock(return_value=("", "utf-8"))
+        self.mock_document_service.create_text_chunks = Mock(side_effect=lambda content, meta: [
+            {'chunk_index': index, 'content': text, 'document_path': meta.relative_path, 'chunk_size': len(text),
+             'language': 'python', 'file_type': '.py', 'encoding': 'utf-8'}
+            for index, text in files[meta.relative_path]
+        ])
+        self.mock_embedding_service.generate_embeddings_array = AsyncMock(
+            side_effect=lambda texts, batch_size: np.stack([vector_of[t] for t in texts])
+        )
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_database = NumpyVectorDatabase(temp_dir, dimension=8)
+            await vector_database.initialize()
+            service = EmbeddingIntegrationService(
+                document_service=self.mock_document_service,
+                embedding_service=self.mock_embedding_service,
+                vector_database=vector_database,
+                lexical_index_path=f"{temp_dir}/lexical",
+                dedup_enabled=True
+            )
+            mock_kb = Mock(spec=KnowledgeBase)
+            mock_kb.id = "kb"
+            mock_kb.name = "去重知識庫"
+            mock_kb.path = "/kb"
+            self.mock_db_session.query.return_value.filter.return_value.all.return_value = []
+            
+            result = await service.process_knowledge_base_with_embeddings(mock_kb, self.mock_db_session)
+            assert result.stored_vectors == 2
+            
+            # 詞彙搜索涵蓋每個分塊，結果進入快取
+            lexical = await service.search_similar_chunks("connect", knowledge_base_id="kb", search_mode="lexical")
+            assert [r['document_path'] for r in lexical] == ['a.py']
+            
+            records = [c.args[0] for c in self.mock_db_session.add.call_args_list]
+            a_records = [r for r in records if r.document_path == 'a.py']
+            b_record = next(r for r in records if r.document_path == 'b.py')
+            assert b_record.vector_id == a_records[0].vector_id
+            
+            # 刪除 a.py：先查詢其分塊記錄，再查詢共用其向量的其他分塊記錄
+            delete_session = Mock()
+            delete_session.query.return_value.filter.return_value.all.return_value = a_records
+            delete_session.query.return_value.filter.return_value.order_by.return_value.all.return_value = [b_record]
+            
+            assert await service.delete_document_vectors("kb", "a.py", delete_session) == 2
+            delete_session.commit.assert_called_once()
+            assert b_record.vector_id not in {r.vector_id for r in a_records}
+            
+            kb_index = await vector_database.get_index("kb")
+            results = await kb_index.similarity_search(vectors[0].tolist(), top_k=5, similarity_threshold=0.5)
+            assert [(r.vector_id, r.metadata['document_path']) for r in results] == [(b_record.vector_id, 'b.py')]
+            assert await kb_index.count_vectors_by_document_path('a.py') == 0
+            
+            # BM25 索引移除 a.py 的分塊並保存，詞彙搜索的快取失效
+            assert await service.search_similar_chunks("connect", knowledge_base_id="kb", search_mode="lexical") == []
+            licensed = await service.search_similar_chunks("Apache", knowledge_base_id="kb", search_mode="lexical")
+            assert [r['document_path'] for r in licensed] == ['b.py']
+            service._lexical_indexes.clear()
+            service._search_cache.invalidate_knowledge_base("kb")
+            reloaded = await service.search_similar_chunks("Apache", knowledge_base_id="kb", search_mode="lexical")
+            assert [r['document_path'] for r in reloaded] == ['b.py']
+            await vector_database.close()
+    
+    @pytest.mark.asyncio
+    async def test_promote_duplicates_regenerates_missing_embedding(self):
+        """測試共用向量無法取回原始向量時，由代表分塊內容重新生成後再儲存"""
+        removed = DocumentChunk(document_path='a.py', chunk_index=0, content="shared", vector_id="v_shared")
+        survivor = DocumentChunk(document_path='b.py', chunk_index=3, content="shared", file_size=6,
+                                 language='python', file_type='.py', encoding='utf-8', vector_id="v_shared")
+        db = Mock()
+        db.query.return_value.filter.return_value.all.return_value = [removed]
+        db.query.return_value.filter.return_value.order_by.return_value.all.return_value = [survivor]
+        
+        vector_index = Mock(spec=FaissVectorDatabase)
+        # 未保留原始向量且索引無法重建時只返回元數據
+        vector_index.get_vectors = AsyncMock(return_value=[
+            VectorRecord("v_shared", "kb_a.py_0", [], {'document_path': 'a.py'}, datetime.now())
+        ])
+        vector_index.store_vectors_batch = AsyncMock(return_value=["v_new"])
+        self.mock_embedding_service.generate_embeddings_array = AsyncMock(
+            return_value=np.ones((1, 384), dtype=np.float32)
+        )
+        
+        assert await self.service._promote_duplicates(vector_index, "kb", "a.py", db) == 1
+        
+        self.mock_embedding_service.generate_embeddings_array.assert_awaited_once_with(["shared"], batch_size=1)
+        embeddings, document_ids, metadata_list = vector_index.store_vectors_batch.call_args.args
+        assert embeddings.shape == (1, 384)
+        assert document_ids == ["kb_b.py_3"]
+        assert metadata_list[0]['document_path'] == 'b.py'
+        assert survivor.vector_id == "v_new"
+        
+        # 無法重新生成時略過，不以空矩陣寫入
+        survivor.vector_id = "v_shared"
+        vector_index.store_vectors_batch.reset_mock()
+        self.mock_embedding_service.generate_embeddings_array = AsyncMock(side_effect=Exception("服務不可用"))
+        
+        assert await self.service._promote_duplicates(vector_index, "kb", "a.py", db) == 0
+        vector_index.store_vectors_batch.assert_not_called()
+        assert survivor.vector_id == "v_shared"
+    
     @pytest.mark.asyncio
     async def test_process_knowledge_base_no_files(self):
         """測試處理沒有文件的知識庫"""
@@ -243,7 +446,7 @@ class TestEmbeddingIntegrationService:
         self.mock_document_service.create_text_chunks = Mock(return_value=mock_chunks)
         
         # Mock Embedding 失敗
-        self.mock_embedding_service.generate_embeddings_batch = AsyncMock(
+        self.mock_embedding_service.generate_embeddings_array = AsyncMock(
             side_effect=Exception("Embedding 生成失敗")
         )
         
@@ -292,6 +495,84 @@ class TestEmbeddingIntegrationService:
         self.mock_embedding_service.generate_embedding.assert_called_once_with(query_text)
         self.mock_vector_database.similarity_search.assert_called_once()
     
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_unscoped_search_covers_knowledge_base_indexes(self):
+        """測試未指定知識庫時搜索所有知識庫索引並合併 top-k，寫入任一索引後快取失效"""
+        vectors = np.random.default_rng(4).standard_normal((10, 8)).astype(np.float32)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vector_database = FaissVectorDatabase(temp_dir, dimension=8)
+            await vector_database.initialize()
+            for name, rows in (("kb1", range(0, 5)), ("kb2", range(5, 10))):
+                async with vector_database.use_index(name, create=True) as index:
+                    await index.store_vectors_batch(
+                        vectors[list(rows)], [f"{name}_{i}" for i in rows],
+                        [{'knowledge_base_id': name, 'document_path': f"{name}.py", 'chunk_index': i} for i in rows]
+                    )
+            
+            service = EmbeddingIntegrationService(
+                document_service=self.mock_document_service,
+                embedding_service=self.mock_embedding_service,
+                vector_database=vector_database
+            )
+            self.mock_embedding_service.generate_embedding = AsyncMock(return_value=vectors[7].tolist())
+            
+            results = await service.search_similar_chunks("查詢", top_k=3, similarity_threshold=-1.0)
+            assert len(results) == 3
+            assert results[0]['document_id'] == "kb2_7"
+            scores = [r['similarity_score'] for r in results]
+            assert scores == sorted(scores, reverse=True)
+            
+            everything = await service.search_similar_chunks("查詢", top_k=20, similarity_threshold=-1.0)
+            assert sorted(r['document_id'] for r in everything) == sorted(
+                [f"kb1_{i}" for i in range(5)] + [f"kb2_{i}" for i in range(5, 10)]
+            )
+            
+            # 寫入知識庫索引後，未指定知識庫的快取結果失效
+            kb1 = await vector_database.get_index("kb1")
+            await kb1.store_vector(vectors[7], "kb1_copy", {'knowledge_base_id': 'kb1'})
+            results = await service.search_similar_chunks("查詢", top_k=20, similarity_threshold=-1.0)
+            assert "kb1_copy" in {r['document_id'] for r in results}
+            await vector_database.close()
+    
+    @pytest.mark.asyncio
+    async def test_search_similar_chunks_uses_knowledge_base_index(self):
+        """測試知識庫有獨立索引時只搜索該索引"""
+        kb_index = Mock(spec=FaissVectorDatabase)
+        kb_index.similarity_search = AsyncMock(return_value=[])
+        self.mock_vector_database.get_index = AsyncMock(return_value=kb_index)
+        self.mock_vector_database.similarity_search = AsyncMock(return_value=[])
+        self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+        
+        await self.service.search_similar_chunks("查詢", knowledge_base_id="kb_1")
+        
+        # 快取世代與搜索都取用同一個知識庫索引
+        assert all(c.args == ("kb_1",) for c in self.mock_vector_database.get_index.call_args_list)
+        kb_index.similarity_search.assert_called_once()
+        assert kb_index.similarity_search.call_args.kwargs['knowledge_base_ids'] is None
+        self.mock_vector_database.similarity_search.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_search_similar_chunks_unknown_knowledge_base(self):
+        """測試知識庫尚無索引時返回空結果"""
+        self.mock_vector_database.get_index = AsyncMock(return_value=None)
+        self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+        
+        assert await self.service.search_similar_chunks("查詢", knowledge_base_id="kb_1") == []
+    
+    @pytest.mark.asyncio
+    async def test_search_similar_chunks_scoped_to_knowledge_base(self):
+        """測試指定知識庫時以知識庫ID過濾搜索"""
+        self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+        self.mock_vector_database.similarity_search = AsyncMock(return_value=[])
+        
+        await self.service.search_similar_chunks("查詢", knowledge_base_id="kb_1", top_k=3)
+        
+        call_kwargs = self.mock_vector_database.similarity_search.call_args.kwargs
+        assert call_kwargs['knowledge_base_ids'] == ["kb_1"]
+        assert 'document_ids' not in call_kwargs
+    
     @pytest.mark.asyncio
     async def test_search_similar_chunks_no_vector_database(self):
         """測試沒有向量資料庫時的搜索"""
@@ -324,6 +605,128 @@ class TestEmbeddingIntegrationService:
         
         assert "相似性搜索失敗" in str(exc_info.value)
     
+    def _hybrid_service(self, lexical_index_path: str) -> EmbeddingIntegrationService:
+        """建立帶有 BM25 索引的服務"""
+        return EmbeddingIntegrationService(
+            document_service=self.mock_document_service,
+            embedding_service=self.mock_embedding_service,
+            vector_database=self.mock_vector_database,
+            lexical_index_path=lexical_index_path
+        )
+    
+    async def _build_lexical_index(self, service: EmbeddingIntegrationService) -> None:
+        """以兩個分塊建立 kb_1 的 BM25 索引"""
+        await service._build_lexical_index("kb_1", [
+            {'document_path': 'db.log', 'chunk_index': 0, 'content': 'ORA-00942 table does not exist'},
+            {'document_path': 'app.py', 'chunk_index': 0, 'content': 'def connect(): pass'},
+        ])
+    
+    @pytest.mark.asyncio
+    async def test_search_similar_chunks_hybrid_fusion(self):
+        """測試混合搜索以倒數排名融合向量與詞彙結果"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service = self._hybrid_service(temp_dir)
+            await self._build_lexical_index(service)
+            
+            self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+            self.mock_vector_database.similarity_search = AsyncMock(return_value=[
+                VectorSearchResult("v1", "kb_1_app.py_0", 0.9, {'document_path': 'app.py', 'chunk_index': 0}),
+                VectorSearchResult("v2", "kb_1_other.py_0", 0.8, {'document_path': 'other.py', 'chunk_index': 0}),
+            ])
+            
+            results = await service.search_similar_chunks("ORA-00942", knowledge_base_id="kb_1", top_k=2)
+        
+        assert [r['document_id'] for r in results] == ["kb_1_app.py_0", "kb_1_db.log_0"]
+        assert results[1]['vector_id'] is None
+        assert results[1]['lexical_score'] > 0
+        assert self.mock_vector_database.similarity_search.call_args.kwargs['top_k'] == 6
+    
+    @pytest.mark.asyncio
+    async def test_search_similar_chunks_lexical_fallback(self):
+        """測試 Embedding 服務不可用時退回純詞彙搜索"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service = self._hybrid_service(temp_dir)
+            await self._build_lexical_index(service)
+            self.mock_embedding_service.generate_embedding = AsyncMock(side_effect=Exception("Ollama 無法連線"))
+            
+            # 重新建立服務確認索引由磁盤加載
+            reloaded = self._hybrid_service(temp_dir)
+            results = await reloaded.search_similar_chunks("ORA-00942", knowledge_base_id="kb_1")
+            lexical_only = await reloaded.search_similar_chunks(
+                "connect", knowledge_base_id="kb_1", search_mode="lexical"
+            )
+        
+        assert [r['document_id'] for r in results] == ["kb_1_db.log_0"]
+        assert [r['document_path'] for r in lexical_only] == ["app.py"]
+        self.mock_embedding_service.generate_embedding.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_search_similar_chunks_metadata_filter(self):
+        """測試元數據過濾傳入向量搜索，且混合模式不使用詞彙索引"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service = self._hybrid_service(temp_dir)
+            await self._build_lexical_index(service)
+            
+            self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+            self.mock_vector_database.similarity_search = AsyncMock(return_value=[
+                VectorSearchResult("v1", "kb_1_app.py_0", 0.9, {'document_path': 'app.py', 'chunk_index': 0}),
+            ])
+            
+            metadata_filter = {'file_type': '.py'}
+            results = await service.search_similar_chunks(
+                "ORA-00942", knowledge_base_id="kb_1", top_k=2, metadata_filter=metadata_filter
+            )
+            
+            assert [r['document_id'] for r in results] == ["kb_1_app.py_0"]
+            call_kwargs = self.mock_vector_database.similarity_search.call_args.kwargs
+            assert call_kwargs['metadata_filter'] == metadata_filter
+            assert call_kwargs['top_k'] == 2
+            
+            with pytest.raises(Exception) as exc_info:
+                await service.search_similar_chunks("connect", knowledge_base_id="kb_1", metadata_filter={'encoding': 'utf-8'})
+            assert "元數據過濾表達式不合法" in str(exc_info.value)
+            
+            with pytest.raises(Exception) as exc_info:
+                await service.search_similar_chunks(
+                    "connect", knowledge_base_id="kb_1", search_mode="lexical", metadata_filter=metadata_filter
+                )
+            assert "純詞彙搜索不支援元數據過濾" in str(exc_info.value)
+    
+    @pytest.mark.asyncio
+    async def test_search_results_cached_until_write(self):
+        """測試重複查詢命中快取，索引寫入世代改變後重新搜索"""
+        self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+        self.mock_vector_database.similarity_search = AsyncMock(return_value=[
+            VectorSearchResult("v1", "doc_1", 0.9, {'document_path': 'a.py', 'chunk_index': 0})
+        ])
+        
+        first = await self.service.search_similar_chunks("  Connect  Database ", knowledge_base_id="kb_1")
+        first[0]['similarity_score'] = 0.0
+        second = await self.service.search_similar_chunks("connect database", knowledge_base_id="kb_1")
+        
+        assert second[0]['similarity_score'] == 0.9
+        assert self.mock_embedding_service.generate_embedding.call_count == 1
+        
+        await self.service.search_similar_chunks("connect database", knowledge_base_id="kb_1", top_k=5)
+        self.mock_vector_database.get_write_generation.return_value = 2
+        await self.service.search_similar_chunks("connect database", knowledge_base_id="kb_1")
+        
+        assert self.mock_embedding_service.generate_embedding.call_count == 3
+        stats = self.service._search_cache.stats
+        assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 3, 1)
+    
+    @pytest.mark.asyncio
+    async def test_search_not_cached_without_write_generation(self):
+        """測試向量資料庫不追蹤寫入世代時不快取"""
+        self.mock_vector_database.get_write_generation = Mock(return_value=None)
+        self.mock_embedding_service.generate_embedding = AsyncMock(return_value=[0.1] * 384)
+        self.mock_vector_database.similarity_search = AsyncMock(return_value=[])
+        
+        await self.service.search_similar_chunks("查詢")
+        await self.service.search_similar_chunks("查詢")
+        
+        assert self.mock_embedding_service.generate_embedding.call_count == 2
+    
     def test_get_processing_status(self):
         """測試獲取處理狀態"""
         knowledge_base_id = "test-kb-id"
@@ -367,6 +770,40 @@ class TestEmbeddingIntegrationService:
         assert stats['embedding_service']['healthy'] is True
         assert stats['vector_database'] == mock_vector_stats
     
+    @pytest.mark.asyncio
+    async def test_get_vector_counters(self):
+        """測試讀取知識庫索引計數時不經由 get_index 加載索引"""
+        self.mock_vector_database.get_index_counters = AsyncMock(
+            return_value={'active_vectors': 7, 'total_vectors': 9, 'resident': False}
+        )
+        
+        counters = await self.service.get_vector_counters("kb_1")
+        
+        assert counters == {'active_vectors': 7, 'total_vectors': 9, 'resident': False}
+        self.mock_vector_database.get_index_counters.assert_called_once_with("kb_1")
+        self.mock_vector_database.get_index.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_search_generation_does_not_load_index(self):
+        """測試快取探測以不加載索引的方式取得知識庫寫入世代"""
+        self.mock_vector_database.get_index_write_generation = AsyncMock(return_value=None)
+        
+        assert await self.service._search_generation("kb_1", "vector") is None
+        
+        self.mock_vector_database.get_index_write_generation.assert_called_once_with("kb_1")
+        self.mock_vector_database.get_index.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_get_vector_counters_shared_index(self):
+        """測試不支援多索引時只返回該知識庫的有效向量數"""
+        self.mock_vector_database.get_counters = AsyncMock(
+            return_value={'active_vectors': 10, 'knowledge_bases': {'kb_1': 4, 'kb_2': 6}}
+        )
+        
+        counters = await self.service.get_vector_counters("kb_1")
+        
+        assert counters == {'active_vectors': 4}
+    
     @pytest.mark.asyncio
     async def test_process_knowledge_base_with_progress_callback(self):
         """測試帶進度回調的知識庫處理"""
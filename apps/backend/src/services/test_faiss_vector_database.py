@@ -2,8 +2,12 @@
 Faiss 向量資料庫測試
 """
 
+import os
+import json
 import pytest
+import asyncio
 import tempfile
+import threading
 import shutil
 import numpy as np
 from pathlib import Path
@@ -30,6 +34,7 @@ from .faiss_vector_database import (
     VectorStorageError,
     VectorSearchError
 )
+from .vector_write_ahead_log import WAL_OP_DELETE
 from ..interfaces.vector_database_interface import VectorRecord, VectorSearchResult
 
 
@@ -44,7 +49,7 @@ class TestFaissVectorDatabase:
         # Mock 索引
         self.mock_index = Mock()
         self.mock_index.ntotal = 0
-        self.mock_index.add = Mock()
+        self.mock_index.add_with_ids = Mock()
         self.mock_index.search = Mock()
         
     def teardown_method(self):
@@ -95,8 +100,8 @@ class TestFaissVectorDatabase:
             result = await db.initialize()
             
             assert result is True
-            assert len(db.metadata_map) == 1
-            assert "test" in db.vector_id_map
+            assert db.metadata_store.row_count == 1
+            assert db.metadata_store.find("test") == 0
     
     @pytest.mark.asyncio
     async def test_store_vector_success(self):
@@ -115,8 +120,8 @@ class TestFaissVectorDatabase:
             
             assert vector_id is not None
             assert len(vector_id) > 0
-            assert vector_id in db.vector_id_map
-            self.mock_index.add.assert_called_once()
+            assert db.metadata_store.find(vector_id) == 0
+            self.mock_index.add_with_ids.assert_called_once()
     
     @pytest.mark.asyncio
     async def test_store_vector_wrong_dimension(self):
@@ -151,8 +156,8 @@ class TestFaissVectorDatabase:
             vector_ids = await db.store_vectors_batch(embeddings, document_ids, metadata_list)
             
             assert len(vector_ids) == 3
-            assert all(vid in db.vector_id_map for vid in vector_ids)
-            self.mock_index.add.assert_called_once()
+            assert all(db.metadata_store.find(vid) is not None for vid in vector_ids)
+            self.mock_index.add_with_ids.assert_called_once()
     
     @pytest.mark.asyncio
     async def test_store_vectors_batch_dimension_mismatch(self):
@@ -199,13 +204,11 @@ class TestFaissVectorDatabase:
             
             # 模擬已儲存的向量
             vector_id = "test_vector_id"
-            faiss_id = 0
-            db.vector_id_map[vector_id] = faiss_id
-            db.metadata_map[faiss_id] = {
+            db.metadata_store.append(0, [{
                 'vector_id': vector_id,
                 'document_id': 'test_doc',
                 'created_at': datetime.now().isoformat()
-            }
+            }])
             
             record = await db.get_vector(vector_id)
             
@@ -238,17 +241,16 @@ class TestFaissVectorDatabase:
             # 模擬已儲存的向量
             vector_id = "test_vector_id"
             faiss_id = 0
-            db.vector_id_map[vector_id] = faiss_id
-            db.metadata_map[faiss_id] = {
+            db.metadata_store.append(faiss_id, [{
                 'vector_id': vector_id,
                 'document_id': 'test_doc',
                 'created_at': datetime.now().isoformat()
-            }
+            }])
             
             result = await db.delete_vector(vector_id)
             
             assert result is True
-            assert db.metadata_map[faiss_id]['deleted'] is True
+            assert db.metadata_store.get(faiss_id)['deleted'] is True
     
     @pytest.mark.asyncio
     async def test_delete_vector_not_found(self):
@@ -273,20 +275,21 @@ class TestFaissVectorDatabase:
             await db.initialize()
             
             # 模擬多個向量
-            for i in range(3):
-                faiss_id = i
-                db.metadata_map[faiss_id] = {
+            db.metadata_store.append(0, [
+                {
                     'vector_id': f'vector_{i}',
                     'document_id': 'test_doc' if i < 2 else 'other_doc',
                     'created_at': datetime.now().isoformat()
                 }
+                for i in range(3)
+            ])
             
             deleted_count = await db.delete_vectors_by_document('test_doc')
             
             assert deleted_count == 2
-            assert db.metadata_map[0]['deleted'] is True
-            assert db.metadata_map[1]['deleted'] is True
-            assert 'deleted' not in db.metadata_map[2]
+            assert db.metadata_store.get(0)['deleted'] is True
+            assert db.metadata_store.get(1)['deleted'] is True
+            assert 'deleted' not in db.metadata_store.get(2)
     
     @pytest.mark.asyncio
     async def test_similarity_search_success(self):
@@ -304,15 +307,14 @@ class TestFaissVectorDatabase:
             await db.initialize()
             
             # 模擬已儲存的向量
-            for i in range(3):
-                vector_id = f'vector_{i}'
-                db.vector_id_map[vector_id] = i
-                db.reverse_id_map[i] = vector_id
-                db.metadata_map[i] = {
-                    'vector_id': vector_id,
+            db.metadata_store.append(0, [
+                {
+                    'vector_id': f'vector_{i}',
                     'document_id': f'doc_{i}',
                     'created_at': datetime.now().isoformat()
                 }
+                for i in range(3)
+            ])
             
             query_embedding = [0.1] * 384
             results = await db.similarity_search(query_embedding, top_k=3)
@@ -353,15 +355,14 @@ class TestFaissVectorDatabase:
             await db.initialize()
             
             # 模擬已儲存的向量
-            for i in range(3):
-                vector_id = f'vector_{i}'
-                db.vector_id_map[vector_id] = i
-                db.reverse_id_map[i] = vector_id
-                db.metadata_map[i] = {
-                    'vector_id': vector_id,
+            db.metadata_store.append(0, [
+                {
+                    'vector_id': f'vector_{i}',
                     'document_id': f'doc_{i}',
                     'created_at': datetime.now().isoformat()
                 }
+                for i in range(3)
+            ])
             
             query_embedding = [0.1] * 384
             results = await db.similarity_search(
@@ -388,12 +389,14 @@ class TestFaissVectorDatabase:
             await db.initialize()
             
             # 模擬一些向量，其中一些被刪除
-            for i in range(5):
-                db.metadata_map[i] = {
+            db.metadata_store.append(0, [
+                {
                     'vector_id': f'vector_{i}',
                     'document_id': f'doc_{i}',
                     'deleted': i >= 3  # 後兩個被刪除
                 }
+                for i in range(5)
+            ])
             
             count = await db.get_vector_count()
             
@@ -410,12 +413,14 @@ class TestFaissVectorDatabase:
             await db.initialize()
             
             # 模擬一些向量
-            for i in range(5):
-                db.metadata_map[i] = {
+            db.metadata_store.append(0, [
+                {
                     'vector_id': f'vector_{i}',
                     'document_id': f'doc_{i % 2}',  # 2個不同的文件
                     'deleted': i >= 3
                 }
+                for i in range(5)
+            ])
             
             stats = await db.get_statistics()
             
@@ -461,8 +466,6 @@ class TestFaissVectorDatabase:
             
             # 創建一些測試文件
             db.index_file.touch()
-            db.metadata_file.write_text('{"test": "data"}')
-            db.id_map_file.write_text('{"test": "mapping"}')
             
             backup_path = str(Path(self.temp_dir) / "backup")
             
@@ -473,8 +476,8 @@ class TestFaissVectorDatabase:
             # 驗證備份文件存在
             backup_dir = Path(backup_path)
             assert (backup_dir / "faiss_index.bin").exists()
-            assert (backup_dir / "metadata.json").exists()
-            assert (backup_dir / "id_mapping.json").exists()
+            assert (backup_dir / "manifest.json").exists()
+            assert (backup_dir / "metadata" / "rows.bin").exists()
             
             # 測試恢復
             restore_result = await db.restore_index("default", backup_path)
@@ -529,14 +532,1132 @@ class TestFaissVectorDatabase:
             # 創建一些測試文件
             db.index_path.mkdir(parents=True, exist_ok=True)
             db.index_file.write_bytes(b'0' * 1024)  # 1KB
-            db.metadata_file.write_text('test')
-            db.id_map_file.write_text('test')
+            db.manifest_file.write_text('test')
             
             size_mb = db._get_storage_size_mb()
             
             assert size_mb > 0
             assert isinstance(size_mb, float)
 
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_wal_batch_does_not_rewrite_snapshot(self):
+        """測試日誌模式下批次儲存不重寫完整快照"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        index_mtime = db.index_file.stat().st_mtime_ns
+        
+        await db.store_vectors_batch(np.random.rand(5, 8).tolist(), [f"doc_{i}" for i in range(5)])
+        
+        assert db.index_file.stat().st_mtime_ns == index_mtime
+        assert db._wal.pending_bytes > 0
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_wal_replay_after_restart(self):
+        """測試重啟後重放基礎快照與日誌"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        
+        vector_ids = await db.store_vectors_batch(
+            np.random.rand(5, 8).tolist(), [f"doc_{i}" for i in range(5)]
+        )
+        await db.delete_vector(vector_ids[0])
+        db._wal.close()  # 模擬未經壓實的程序結束
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        
+        assert reopened.index.ntotal == 5
+        assert reopened.next_id == 5
+        assert await reopened.get_vector_count() == 4
+        assert all(reopened.metadata_store.find(vid) is not None for vid in vector_ids)
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_wal_delete_record_stores_deleted_at_once(self):
+        """測試刪除記錄的刪除時間只寫入一份，重放後所有ID都被刪除"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        
+        await db.store_vectors_batch(np.random.rand(6, 8).tolist(), ["doc_a"] * 4 + ["doc_b"] * 2)
+        assert await db.delete_vectors_by_document("doc_a") == 4
+        
+        deletes = [record for record in db._wal.replay() if record.op == WAL_OP_DELETE]
+        assert len(deletes) == 1
+        assert len(deletes[0].faiss_ids) == 4
+        assert len(deletes[0].metadata_list) == 1 and 'deleted_at' in deletes[0].metadata_list[0]
+        db._wal.close()  # 模擬未經壓實的程序結束
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        assert await reopened.get_vector_count() == 2
+        assert reopened.metadata_store.deleted_mask(np.arange(6)).tolist() == [True] * 4 + [False] * 2
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_checkpoint_merges_wal_into_snapshot(self):
+        """測試壓實將日誌合併至基礎快照"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(np.random.rand(3, 8).tolist(), ["a", "b", "c"])
+        
+        assert await db.checkpoint() is True
+        assert db._wal.pending_bytes == 0
+        assert db._wal.list_segments() == [db._wal.active_segment_id]
+        
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        
+        assert reopened.index.ntotal == 3
+        assert reopened.metadata_store.row_count == 3
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_background_compaction_triggered_by_threshold(self):
+        """測試日誌超過閾值時觸發背景壓實"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, wal_compaction_bytes=1)
+        await db.initialize()
+        
+        await db.store_vectors_batch(np.random.rand(2, 8).tolist(), ["a", "b"])
+        await db._compaction_task
+        
+        assert db._wal.pending_bytes == 0
+        assert db._wal_checkpoint > 0
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_legacy_json_metadata_migrated(self):
+        """測試舊版 JSON 元數據遷移至欄式儲存"""
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        legacy_index = faiss.index_factory(8, "Flat", faiss.METRIC_INNER_PRODUCT)
+        legacy_index.add(np.random.rand(2, 8).astype(np.float32))
+        faiss.write_index(legacy_index, str(self.index_path / "faiss_index.bin"))
+        (self.index_path / "metadata.json").write_text(
+            '{"0": {"vector_id": "v0", "document_id": "doc1", "created_at": "2024-01-01T00:00:00"},'
+            ' "1": {"vector_id": "v1", "document_id": "doc2", "created_at": "2024-01-01T00:00:00", "deleted": true}}'
+        )
+        (self.index_path / "id_mapping.json").write_text(
+            '{"vector_id_map": {"v0": 0, "v1": 1}, "reverse_id_map": {"0": "v0", "1": "v1"}, "next_id": 2}'
+        )
+        
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        assert await db.initialize() is True
+        
+        assert db.manifest_file.exists()
+        assert not db.metadata_file.exists()
+        assert await db.get_vector_count() == 1
+        record = await db.get_vector("v0")
+        assert record.document_id == "doc1"
+        assert isinstance(db.index, faiss.IndexIDMap2)
+        assert db.delete_ratio == 0.5
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_search_returns_top_k_despite_tombstones(self):
+        """測試墓碑佔滿候選窗口時仍返回 top_k 個結果"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, tombstone_compaction_ratio=1.0)
+        await db.initialize()
+        
+        query = np.eye(8)[0]
+        embeddings = [query + 0.1 * i * np.eye(8)[1] for i in range(12)] + [-np.random.rand(8) for _ in range(8)]
+        vector_ids = await db.store_vectors_batch([e.tolist() for e in embeddings], [f"doc_{i}" for i in range(20)])
+        for vector_id in vector_ids[:8]:
+            await db.delete_vector(vector_id)
+        
+        results = await db.similarity_search(query.tolist(), top_k=3, similarity_threshold=-1.0)
+        
+        assert [r.vector_id for r in results] == vector_ids[8:11]
+        assert db.index.ntotal == 20
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_tombstone_compaction_removes_vectors(self):
+        """測試墓碑比例超過閾值時背景移除已刪除向量"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, tombstone_compaction_ratio=0.3)
+        await db.initialize()
+        
+        await db.store_vectors_batch(np.random.rand(6, 8).tolist(), ["a", "a", "a", "b", "b", "c"])
+        assert await db.delete_vectors_by_document("a") == 3
+        await db._tombstone_task
+        
+        stats = await db.get_statistics()
+        assert db.index.ntotal == 3
+        assert stats['delete_ratio'] == 0.0
+        assert stats['deleted_vectors'] == 3
+        
+        await db.close()
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        
+        assert reopened.index.ntotal == 3
+        assert await reopened.get_vector_count() == 3
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_knowledge_base_filter_pushed_down(self):
+        """測試知識庫過濾在索引內完成，不受其他知識庫的近鄰影響"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        
+        query = np.eye(8)[0]
+        # kb_big 的向量都比 kb_small 更接近查詢
+        await db.store_vectors_batch(
+            [(query + 0.01 * i * np.eye(8)[1]).tolist() for i in range(50)],
+            [f"kb_big_doc_{i}" for i in range(50)],
+            [{'knowledge_base_id': 'kb_big'} for _ in range(50)]
+        )
+        small_ids = await db.store_vectors_batch(
+            [(query + np.eye(8)[2 + i]).tolist() for i in range(2)],
+            ["kb_small_doc_0", "kb_small_doc_1"],
+            [{'knowledge_base_id': 'kb_small'} for _ in range(2)]
+        )
+        
+        results = await db.similarity_search(
+            query.tolist(), top_k=5, similarity_threshold=0.0, knowledge_base_ids=['kb_small']
+        )
+        
+        assert sorted(r.vector_id for r in results) == sorted(small_ids)
+        assert all(r.metadata['knowledge_base_id'] == 'kb_small' for r in results)
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_document_filter_survives_restart(self):
+        """測試重啟後由元數據重建的位圖仍能過濾文件"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(np.random.rand(4, 8).tolist(), ["a", "b", "a", "c"])
+        await db.delete_vector((await db.similarity_search(
+            np.random.rand(8).tolist(), top_k=4, similarity_threshold=-1.0, document_ids=["c"]
+        ))[0].vector_id)
+        db._wal.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        
+        results = await reopened.similarity_search(
+            np.random.rand(8).tolist(), top_k=10, similarity_threshold=-1.0, document_ids=["a", "c"]
+        )
+        
+        assert sorted(r.document_id for r in results) == ["a", "a"]
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_index_namespaces_are_isolated(self):
+        """測試各命名空間索引獨立儲存與搜索"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        
+        assert await db.create_index("kb_a", dimension=8) is True
+        assert await db.create_index("kb_a", dimension=8) is False
+        assert await db.create_index("../escape", dimension=8) is False
+        
+        kb_a = await db.get_index("kb_a")
+        kb_b = await db.get_index("kb_b", create=True)
+        await kb_a.store_vectors_batch(np.random.rand(3, 8).tolist(), ["a1", "a2", "a3"])
+        await kb_b.store_vectors_batch(np.random.rand(2, 8).tolist(), ["b1", "b2"])
+        
+        results = await kb_b.similarity_search(np.random.rand(8).tolist(), top_k=10, similarity_threshold=-1.0)
+        
+        assert sorted(r.document_id for r in results) == ["b1", "b2"]
+        assert await db.list_indexes() == ["default", "kb_a", "kb_b"]
+        assert await db.get_index("missing") is None
+        assert await db.get_index("default") is db
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_index_loaded_on_demand_after_restart(self):
+        """測試重啟後按需加載命名空間索引"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, metric="euclidean")
+        await db.initialize()
+        await db.create_index("kb_a", dimension=4)
+        kb_a = await db.get_index("kb_a")
+        await kb_a.store_vectors_batch(np.random.rand(2, 4).tolist(), ["a1", "a2"])
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        assert reopened._child_indexes == {}
+        
+        kb_a = await reopened.get_index("kb_a")
+        
+        assert kb_a.dimension == 4
+        assert kb_a.metric == "cosine"
+        assert await kb_a.get_vector_count() == 2
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_indexes_evicted_under_memory_budget(self):
+        """測試超過記憶體上限時逐出最久未使用的索引，固定或使用中的索引不被逐出"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, memory_budget_bytes=1)
+        await db.initialize()
+        vectors = np.random.default_rng(0).standard_normal((1000, 8)).astype(np.float32)
+        
+        for name in ("kb_a", "kb_b", "kb_c"):
+            async with db.use_index(name, create=True) as index:
+                await index.store_vectors_batch(vectors.copy(), [f"{name}_{i}" for i in range(1000)])
+        # 各索引大小相近（重新加載後欄位索引延遲建立而略小），上限容納兩個
+        index_bytes = db._child_indexes["kb_c"]._resident_bytes()
+        db._residency.budget_bytes = index_bytes * 2
+        
+        await db.get_index("kb_a")
+        assert set(db._child_indexes) == {"kb_a", "kb_c"}
+        await db.get_index("kb_b")
+        assert set(db._child_indexes) == {"kb_a", "kb_b"}
+        
+        # 重新加載被逐出的索引，寫入已保存
+        async with db.use_index("kb_c") as kb_c:
+            assert await kb_c.get_vector_count() == 1000
+            async with db.use_index("kb_a") as kb_a:
+                assert set(db._child_indexes) == {"kb_a", "kb_c"}
+                await db.get_index("kb_b")
+                # kb_a 與 kb_c 固定中，暫時超過上限
+                assert set(db._child_indexes) == {"kb_a", "kb_b", "kb_c"}
+                assert db.get_index_residency()['over_budget'] is True
+                results = await kb_a.similarity_search(vectors[3].tolist(), top_k=1)
+                assert results[0].document_id == "kb_a_3"
+        
+        # 寫入中的索引不被逐出
+        kb_b = db._child_indexes["kb_b"]
+        async with kb_b._lock:
+            await db.get_index("kb_a")
+            assert "kb_b" in db._child_indexes
+        
+        metrics = db.get_index_residency()
+        assert metrics['evictions'] >= 3
+        assert metrics['loads'] == metrics['evictions'] + len(db._child_indexes)
+        assert metrics['resident_indexes'] == len(db._child_indexes)
+        assert metrics['pinned_indexes'] == 0
+        assert metrics['max_load_ms'] > 0
+        assert (await db.get_statistics())['index_residency']['evictions'] == metrics['evictions']
+        await db.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_eviction_closes_outside_index_lock(self):
+        """測試逐出的索引在索引鎖外關閉：其他索引不需等待，再次取得時等待關閉完成後重新加載"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, memory_budget_bytes=1)
+        await db.initialize()
+        vectors = np.random.default_rng(0).standard_normal((10, 8)).astype(np.float32)
+        
+        async with db.use_index("kb_a", create=True) as kb_a:
+            await kb_a.store_vectors_batch(vectors.copy(), [f"kb_a_{i}" for i in range(10)])
+            release = asyncio.Event()
+            close = kb_a.close
+            
+            async def slow_close():
+                await release.wait()
+                await close()
+            kb_a.close = slow_close
+        
+        # 取得 kb_b 逐出 kb_a，kb_a 的關閉卡住時 kb_b 仍可立即取得
+        kb_b = await asyncio.wait_for(db.get_index("kb_b", create=True), timeout=5)
+        assert "kb_a" in db._closing_indexes
+        assert await asyncio.wait_for(db.get_index("kb_b"), timeout=5) is kb_b
+        
+        # 再次取得 kb_a 需等待關閉完成，不加載關閉前的舊內容
+        reacquire = asyncio.ensure_future(db.get_index("kb_a"))
+        await asyncio.sleep(0.05)
+        assert not reacquire.done()
+        release.set()
+        reloaded = await asyncio.wait_for(reacquire, timeout=5)
+        assert reloaded is not kb_a
+        assert await reloaded.get_vector_count() == 10
+        assert "kb_a" not in db._closing_indexes
+        await db.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_index_counters_and_generation_without_loading(self):
+        """測試輪詢計數與寫入世代不加載未常駐的索引，也不改變逐出順序"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, memory_budget_bytes=1)
+        await db.initialize()
+        vectors = np.random.default_rng(0).standard_normal((10, 8)).astype(np.float32)
+        
+        async with db.use_index("kb_a", create=True) as kb_a:
+            vector_ids = await kb_a.store_vectors_batch(vectors.copy(), [f"kb_a_{i}" for i in range(10)])
+            await kb_a.delete_vector(vector_ids[0])
+            generation = kb_a.get_write_generation()
+        await db.get_index("kb_b", create=True)
+        assert set(db._child_indexes) == {"kb_b"}
+        loads = db.get_index_residency()['loads']
+        
+        counters = await db.get_index_counters("kb_a")
+        assert counters['resident'] is False
+        assert (counters['total_vectors'], counters['active_vectors']) == (10, 9)
+        assert counters['knowledge_bases'] == {}
+        assert await db.get_index_write_generation("kb_a") == generation
+        assert (await db.get_index_counters("kb_b"))['resident'] is True
+        assert await db.get_index_counters("kb_missing") is None
+        assert await db.get_index_write_generation("kb_missing") is None
+        
+        assert set(db._child_indexes) == {"kb_b"}
+        assert db.get_index_residency()['loads'] == loads
+        
+        # 重新加載後世代改變，依賴逐出前內容的快取失效
+        await db.get_index("kb_a")
+        assert await db.get_index_write_generation("kb_a") != generation
+        await db.close()
+        
+        # 重新啟動後未加載的索引仍可由快照清單取得計數
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, memory_budget_bytes=1)
+        await db.initialize()
+        assert (await db.get_index_counters("kb_a"))['active_vectors'] == 9
+        assert await db.get_index_write_generation("kb_a") is None
+        assert db._child_indexes == {}
+        await db.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("persistence_mode", ["wal", "snapshot"])
+    async def test_concurrent_store_vector_coalesced(self, persistence_mode):
+        """測試同時進行的 store_vector 合併為少數批次寫入，且各自取得正確的向量ID"""
+        db = FaissVectorDatabase(
+            str(self.index_path), dimension=8, persistence_mode=persistence_mode, write_coalesce_max_batch=64
+        )
+        await db.initialize()
+        vectors = np.random.default_rng(0).standard_normal((150, 8)).astype(np.float32)
+        
+        vector_ids = await asyncio.gather(*[
+            db.store_vector(vectors[i], f"doc_{i}", {'position': i}) for i in range(150)
+        ])
+        assert len(set(vector_ids)) == 150
+        # 第一筆立即寫入，其餘在寫入期間累積為每批最多 64 筆
+        assert db._write_coalescer.batches == 4
+        
+        for i in (0, 77, 149):
+            record = await db.get_vector(vector_ids[i])
+            assert record.document_id == f"doc_{i}"
+            assert record.metadata['position'] == i
+        # 呼叫者的陣列不被正規化修改
+        assert np.linalg.norm(vectors[0]) != pytest.approx(1.0)
+        
+        stats = await db.get_statistics()
+        assert stats['coalesced_write_batches'] == 4
+        assert stats['coalesced_writes'] == 150
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8, persistence_mode=persistence_mode)
+        await reopened.initialize()
+        assert await reopened.get_vector_count() == 150
+        results = await reopened.similarity_search(vectors[42].tolist(), top_k=1)
+        assert results[0].vector_id == vector_ids[42]
+        await reopened.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_drop_index_removes_directory(self):
+        """測試刪除命名空間索引直接移除目錄"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        kb_a = await db.get_index("kb_a", create=True)
+        await kb_a.store_vectors_batch(np.random.rand(2, 8).tolist(), ["a1", "a2"])
+        
+        assert await db.drop_index("kb_a") is True
+        
+        assert not (db.indexes_dir / "kb_a").exists()
+        assert await db.list_indexes() == ["default"]
+        assert await db.drop_index("default") is False
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_default_index_vectors_moved_into_namespace(self):
+        """測試預設索引中的既有知識庫向量搬移至其命名空間索引"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        vector_ids = await db.store_vectors_batch(
+            np.random.rand(3, 8).tolist(), ["a1", "a2", "b1"],
+            [{'knowledge_base_id': 'kb_a'}, {'knowledge_base_id': 'kb_a'}, {'knowledge_base_id': 'kb_b'}]
+        )
+        
+        kb_a = await db.get_index("kb_a")
+        
+        assert kb_a is not None
+        assert await kb_a.get_vector_count() == 2
+        assert await db.get_vector_count() == 1
+        moved = await kb_a.get_vector(vector_ids[0])
+        assert moved.document_id == "a1"
+        assert moved.metadata['knowledge_base_id'] == 'kb_a'
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_ivf_promotion_after_threshold(self):
+        """測試向量數達門檻後訓練並升級為 IVF 索引"""
+        db = FaissVectorDatabase(
+            str(self.index_path), dimension=8, index_factory="IVF4,Flat", ann_promotion_threshold=100
+        )
+        await db.initialize()
+        assert db._ann_min_vectors() == 4 * 39
+        
+        embeddings = np.random.rand(200, 8)
+        vector_ids = await db.store_vectors_batch(embeddings.tolist(), [f"doc_{i}" for i in range(200)])
+        assert await db._promotion_task is True
+        
+        stats = await db.get_statistics()
+        assert stats['active_index_type'] == "IVF4,Flat"
+        assert db.index.ntotal == 200
+        
+        results = await db.similarity_search(embeddings[7].tolist(), top_k=1, similarity_threshold=0.0, nprobe=4)
+        assert results[0].vector_id == vector_ids[7]
+        
+        await db.close()
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8, index_factory="IVF4,Flat")
+        await reopened.initialize()
+        
+        assert reopened._is_ann_index()
+        assert reopened.index.ntotal == 200
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_hnsw_tombstones_rebuilt_and_filtered(self):
+        """測試 HNSW 索引以重建方式移除墓碑，並支援過濾與 efSearch 覆寫"""
+        db = FaissVectorDatabase(
+            str(self.index_path), dimension=8, index_factory="HNSW8",
+            ann_promotion_threshold=50, tombstone_compaction_ratio=0.2
+        )
+        await db.initialize()
+        await db.store_vectors_batch(
+            np.random.rand(60, 8).tolist(), [f"doc_{i % 3}" for i in range(60)],
+            [{'knowledge_base_id': f"kb_{i % 2}"} for i in range(60)]
+        )
+        await db._promotion_task
+        assert db._active_index_type() == "HNSW8"
+        
+        assert await db.delete_vectors_by_document("doc_0") == 20
+        assert await db._tombstone_task == 20
+        
+        assert db.index.ntotal == 40
+        assert db._active_index_type() == "HNSW8"
+        
+        results = await db.similarity_search(
+            np.random.rand(8).tolist(), top_k=50, similarity_threshold=-1.0,
+            knowledge_base_ids=["kb_1"], ef_search=128
+        )
+        assert len(results) == 20
+        assert {r.document_id for r in results} == {"doc_1", "doc_2"}
+        assert all(r.metadata['knowledge_base_id'] == "kb_1" for r in results)
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("index_factory", ["IVF4,Flat", "HNSW8", "SQ8"])
+    async def test_range_search_on_ann_indexes(self, index_factory):
+        """測試原生範圍搜索（IVF）與逐步加深搜索（HNSW、量化索引）都返回超過 top_k 的所有命中"""
+        db = FaissVectorDatabase(
+            str(self.index_path), dimension=8, index_factory=index_factory, ann_promotion_threshold=100,
+            nprobe=4
+        )
+        await db.initialize()
+        vectors = np.random.default_rng(1).standard_normal((300, 8)).astype(np.float32)
+        vector_ids = await db.store_vectors_batch(vectors.copy(), [f"doc_{i}" for i in range(300)])
+        if db._promotion_task is not None:
+            await db._promotion_task
+        
+        query = vectors[0]
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        exact = normalized @ (query / np.linalg.norm(query))
+        threshold = float(np.sort(exact)[::-1][99] - 1e-4)
+        
+        results = await db.range_search(query.tolist(), similarity_threshold=threshold, ef_search=300)
+        expected = {vector_ids[i] for i in np.flatnonzero(exact >= threshold)}
+        
+        assert len(results) > 64
+        assert all(r.similarity_score >= threshold for r in results)
+        assert len({r.vector_id for r in results} & expected) >= 0.95 * len(expected)
+        assert len(await db.range_search(query.tolist(), similarity_threshold=threshold, max_results=10)) == 10
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_range_search_includes_threshold_and_handles_unreachable(self):
+        """測試恰等於閾值的結果被包含，無法達到的閾值返回空結果"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=2, metric="euclidean")
+        await db.initialize()
+        await db.store_vectors_batch([[0.0, 0.0], [1.0, 0.0], [3.0, 0.0]], ["a", "b", "c"])
+        
+        # 平方 L2 距離 1 對應相似度 0.5
+        results = await db.range_search([0.0, 0.0], similarity_threshold=0.5)
+        assert [r.document_id for r in results] == ["a", "b"]
+        assert await db.range_search([0.0, 0.0], similarity_threshold=1.5) == []
+        assert len(await db.range_search([0.0, 0.0], similarity_threshold=0.0)) == 3
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_selective_metadata_filter_scored_exactly(self):
+        """測試過濾後候選很少時以原始向量精確計算，不搜索近似索引"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, index_factory="HNSW8", ann_promotion_threshold=100)
+        await db.initialize()
+        vectors = np.random.default_rng(2).standard_normal((400, 8)).astype(np.float32)
+        metadata = [{'language': 'rust' if i % 50 == 0 else 'python'} for i in range(400)]
+        vector_ids = await db.store_vectors_batch(vectors.copy(), [f"doc_{i}" for i in range(400)], metadata)
+        if db._promotion_task is not None:
+            await db._promotion_task
+        
+        query = vectors[3]
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        rust_rows = np.arange(0, 400, 50)
+        exact = normalized[rust_rows] @ (query / np.linalg.norm(query))
+        expected = [vector_ids[i] for i in rust_rows[np.argsort(-exact)][:5]]
+        
+        with patch.object(db, '_search', wraps=db._search) as search_spy:
+            results = await db.similarity_search(
+                query.tolist(), top_k=5, similarity_threshold=-1.0, metadata_filter={'language': 'rust'}
+            )
+            ranged = await db.range_search(
+                query.tolist(), similarity_threshold=-1.0, metadata_filter={'language': 'rust'}
+            )
+        
+        search_spy.assert_not_called()
+        assert [r.vector_id for r in results] == expected
+        assert [r.vector_id for r in ranged][:5] == expected
+        assert len(ranged) == 8
+        assert np.allclose([r.similarity_score for r in results], np.sort(exact)[::-1][:5], atol=1e-5)
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_metadata_filter_after_restart_does_not_decode_store(self):
+        """測試重新開啟後欄位索引由快照載入，過濾搜索不逐列解碼元數據"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        vectors = np.random.default_rng(3).standard_normal((500, 8)).astype(np.float32)
+        metadata = [{'language': 'rust' if i % 50 == 0 else 'python', 'document_path': f"src/{i}.rs"}
+                    for i in range(500)]
+        vector_ids = await db.store_vectors_batch(vectors.copy(), [f"doc_{i}" for i in range(500)], metadata)
+        await db.checkpoint()
+        # 快照之後寫入的列由日誌重放
+        await db.store_vector(vectors[7].tolist(), "tail", {'language': 'rust'})
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        store = reopened.metadata_store
+        with patch.object(store, 'get', wraps=store.get) as get_spy:
+            results = await reopened.similarity_search(
+                vectors[50].tolist(), top_k=3, similarity_threshold=-1.0, metadata_filter={'language': 'rust'}
+            )
+        
+        assert results[0].vector_id == vector_ids[50]
+        assert all(r.metadata['language'] == 'rust' for r in results)
+        # 只解碼命中的結果，不解碼整個元數據儲存
+        assert get_spy.call_count < 20
+        await reopened.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_invalid_index_factory_rejected(self):
+        """測試不合法的索引工廠字符串無法初始化"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, index_factory="NotAnIndex")
+        
+        assert await db.initialize() is False
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_get_vector_returns_stored_embedding(self):
+        """測試由原始向量儲存取回向量"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, metric="euclidean")
+        await db.initialize()
+        embeddings = np.random.rand(3, 8)
+        vector_ids = await db.store_vectors_batch(embeddings.tolist(), ["a", "b", "c"])
+        
+        record = await db.get_vector(vector_ids[1])
+        records = await db.get_vectors([vector_ids[2], "missing", vector_ids[0]])
+        
+        assert np.allclose(record.embedding, embeddings[1], atol=1e-6)
+        assert records[1] is None
+        assert [r.document_id for r in (records[0], records[2])] == ["c", "a"]
+        assert np.allclose(records[0].embedding, embeddings[2], atol=1e-6)
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_rebuild_index_offline_from_raw_vectors(self):
+        """測試以原始向量離線重建為其他索引類型"""
+        db = FaissVectorDatabase(
+            str(self.index_path), dimension=8, index_factory="IVF2,PQ2x4",
+            ann_promotion_threshold=0, raw_vector_dtype="float16"
+        )
+        await db.initialize()
+        embeddings = np.random.rand(700, 8)
+        vector_ids = await db.store_vectors_batch(embeddings.tolist(), [f"doc_{i}" for i in range(700)])
+        assert await db._promotion_task is True
+        
+        # PQ 索引無法重建原始向量，改由原始向量儲存提供
+        record = await db.get_vector(vector_ids[5])
+        normalized = embeddings[5] / np.linalg.norm(embeddings[5])
+        assert np.allclose(record.embedding, normalized, atol=1e-2)
+        
+        assert await db.rebuild_index("Flat") is True
+        assert db._active_index_type() == "Flat"
+        
+        results = await db.similarity_search(embeddings[5].tolist(), top_k=1, similarity_threshold=0.0)
+        assert results[0].vector_id == vector_ids[5]
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_blue_green_rebuild_with_rollback(self):
+        """測試背景重建期間搜索與寫入不受阻，切換後可回滾並保留切換後的寫入"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        embeddings = np.random.rand(60, 8)
+        await db.store_vectors_batch(embeddings.tolist(), [f"doc_{i}" for i in range(60)])
+        
+        # 建立期間暫停，確認搜索與寫入仍可進行
+        release = threading.Event()
+        build = db._build_trained_index
+        
+        def slow_build(*args):
+            release.wait(timeout=5)
+            return build(*args)
+        
+        with patch.object(db, '_build_trained_index', side_effect=slow_build):
+            assert db.start_rebuild("HNSW16") is True
+            assert db.start_rebuild("HNSW16") is False
+            await asyncio.sleep(0.05)
+            assert db.get_rebuild_status()['rebuilding'] is True
+            
+            assert len(await db.similarity_search(embeddings[0].tolist(), top_k=1, similarity_threshold=0.0)) == 1
+            during_ids = await db.store_vectors_batch(np.random.rand(5, 8).tolist(), [f"new_{i}" for i in range(5)])
+            release.set()
+            assert await db._rebuild_task is True
+        
+        status = db.get_rebuild_status()
+        assert status['active_index_type'] == "HNSW16"
+        assert status['index_generation'] == 1
+        assert status['previous_index_type'] == "Flat"
+        assert db.index.ntotal == 65
+        
+        after_ids = await db.store_vectors_batch(np.random.rand(3, 8).tolist(), ["late_0", "late_1", "late_2"])
+        assert await db.rollback_index() is True
+        assert db._active_index_type() == "Flat"
+        assert db.get_rebuild_status()['index_generation'] == 0
+        for vector_id in during_ids + after_ids:
+            record = await db.get_vector(vector_id)
+            results = await db.similarity_search(record.embedding, top_k=1, similarity_threshold=0.0)
+            assert results[0].vector_id == vector_id
+        
+        # 再次回滾切換回新世代，釋放後不可再回滾
+        assert await db.rollback_index() is True
+        assert db._active_index_type() == "HNSW16"
+        assert db.discard_previous_index() is True
+        assert await db.rollback_index() is False
+        await db.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_raw_vectors_backfilled_when_enabled(self):
+        """測試啟用原始向量儲存時由現有索引補齊"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, raw_vector_dtype=None)
+        await db.initialize()
+        embeddings = np.random.rand(4, 8)
+        vector_ids = await db.store_vectors_batch(embeddings.tolist(), ["a", "b", "c", "d"])
+        await db.delete_vector(vector_ids[0])
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        
+        assert reopened.raw_vectors.row_count == 4
+        record = await reopened.get_vector(vector_ids[3])
+        assert np.allclose(record.embedding, embeddings[3] / np.linalg.norm(embeddings[3]), atol=1e-6)
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_similarity_search_batch_matches_single_queries(self):
+        """測試批次搜索與逐一搜索結果一致且只呼叫一次索引搜索"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(
+            np.random.rand(30, 8).tolist(), [f"doc_{i}" for i in range(30)],
+            [{'knowledge_base_id': f"kb_{i % 2}"} for i in range(30)]
+        )
+        queries = np.random.rand(4, 8)
+        
+        expected = [
+            await db.similarity_search(q.tolist(), top_k=3, similarity_threshold=-1.0, knowledge_base_ids=["kb_0"])
+            for q in queries
+        ]
+        with patch.object(db, '_search', wraps=db._search) as search:
+            batch = await db.similarity_search_batch(queries, top_k=3, similarity_threshold=-1.0, knowledge_base_ids=["kb_0"])
+        
+        assert search.call_count == 1
+        assert [[r.vector_id for r in rs] for rs in batch] == [[r.vector_id for r in rs] for rs in expected]
+        assert await db.similarity_search_batch(np.zeros((0, 8))) == []
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_similarity_search_batch_rejects_wrong_shape(self):
+        """測試批次搜索拒絕維度不符的查詢矩陣"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        
+        with pytest.raises(Exception):
+            await db.similarity_search_batch(np.random.rand(2, 4))
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_concurrent_searches_run_in_parallel(self):
+        """測試多個搜索在執行緒池中並行執行而不互相阻塞"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(np.random.rand(10, 8).tolist(), [f"doc_{i}" for i in range(10)])
+        
+        # 兩個搜索都必須同時進入索引搜索才能通過屏障
+        barrier = threading.Barrier(2, timeout=5)
+        search = db.index.search
+        
+        def blocking_search(*args, **kwargs):
+            barrier.wait()
+            return search(*args, **kwargs)
+        
+        with patch.object(db.index, 'search', side_effect=blocking_search):
+            results = await asyncio.gather(
+                db.similarity_search(np.random.rand(8).tolist(), top_k=3, similarity_threshold=-1.0),
+                db.similarity_search(np.random.rand(8).tolist(), top_k=3, similarity_threshold=-1.0)
+            )
+        
+        assert [len(r) for r in results] == [3, 3]
+        await db.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_search_sees_whole_batch_during_ingestion(self):
+        """測試寫入與搜索並行時，搜索只看到完整批次之前或之後的狀態"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        
+        async def ingest():
+            for batch in range(5):
+                await db.store_vectors_batch(
+                    np.random.rand(20, 8).tolist(), [f"doc_{batch}"] * 20
+                )
+        
+        async def search():
+            counts = []
+            for _ in range(20):
+                results = await db.similarity_search(
+                    np.random.rand(8).tolist(), top_k=200, similarity_threshold=-1.0
+                )
+                counts.append(len(results))
+                await asyncio.sleep(0)
+            return counts
+        
+        _, counts = await asyncio.gather(ingest(), search())
+        
+        assert all(count % 20 == 0 for count in counts)
+        assert await db.get_vector_count() == 100
+        await db.close()
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_store_vectors_batch_accepts_float32_matrix(self):
+        """測試 float32 矩陣直接寫入並就地正規化，結果與列表輸入一致"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        embeddings = np.random.rand(5, 8).astype(np.float32)
+        expected = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        
+        vector_ids = await db.store_vectors_batch(embeddings, [f"doc_{i}" for i in range(5)])
+        
+        # 呼叫者交出的矩陣已被就地正規化，不另外複製
+        assert np.allclose(embeddings, expected)
+        record = await db.get_vector(vector_ids[2])
+        assert np.allclose(record.embedding, expected[2], atol=1e-6)
+        
+        with pytest.raises(Exception):
+            await db.store_vectors_batch(np.random.rand(2, 4).astype(np.float32), ["a", "b"])
+        await db.close()
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_read_only_replica_serves_snapshot(self):
+        """測試唯讀模式映射快照提供搜索、拒絕寫入並可重新加載新快照"""
+        writer = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await writer.initialize()
+        embeddings = np.random.rand(5, 8)
+        vector_ids = await writer.store_vectors_batch(embeddings.tolist(), [f"doc_{i}" for i in range(5)])
+        await writer.checkpoint()
+        
+        replica = FaissVectorDatabase(str(self.index_path), dimension=8, read_only=True)
+        assert await replica.initialize()
+        
+        results = await replica.similarity_search(embeddings[3].tolist(), top_k=1, similarity_threshold=-1.0)
+        assert results[0].vector_id == vector_ids[3]
+        assert (await replica.get_vector(vector_ids[0])).document_id == "doc_0"
+        with pytest.raises(Exception):
+            await replica.store_vector(np.random.rand(8).tolist(), "doc_x")
+        assert not await replica.delete_vector(vector_ids[0])
+        
+        # 寫入程序的新快照在重新加載後可見，替換文件不影響已映射的舊快照
+        await writer.store_vectors_batch(np.random.rand(3, 8).tolist(), ["a", "b", "c"])
+        await writer.checkpoint()
+        assert await replica.get_vector_count() == 5
+        assert await replica.reload()
+        assert await replica.get_vector_count() == 8
+        
+        await replica.close()
+        await writer.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_read_only_requires_existing_snapshot(self):
+        """測試唯讀模式不會創建新索引"""
+        replica = FaissVectorDatabase(str(self.index_path), dimension=8, read_only=True)
+        
+        assert not await replica.initialize()
+        assert not (self.index_path / "faiss_index.bin").exists()
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_sq8_rescoring_recall(self):
+        """測試 SQ8 量化索引以原始向量重算後的召回率與記憶體統計"""
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((2000, 32)).astype(np.float32)
+        queries = rng.standard_normal((20, 32)).astype(np.float32)
+        
+        exact = FaissVectorDatabase(str(self.index_path / "exact"), dimension=32)
+        quantized = FaissVectorDatabase(
+            str(self.index_path / "sq8"), dimension=32,
+            index_factory="SQ8", ann_promotion_threshold=1000
+        )
+        for db in (exact, quantized):
+            await db.initialize()
+            await db.store_vectors_batch(embeddings.copy(), [f"doc_{i}" for i in range(2000)])
+        await quantized.promote_index()
+        
+        expected = await exact.similarity_search_batch(queries, top_k=10, similarity_threshold=-1.0)
+        actual = await quantized.similarity_search_batch(queries, top_k=10, similarity_threshold=-1.0)
+        
+        # 兩個資料庫的向量ID不同，以文件ID比對
+        hits = sum(
+            len({r.document_id for r in e} & {r.document_id for r in a})
+            for e, a in zip(expected, actual)
+        )
+        assert hits / 200 >= 0.99
+        assert [r.document_id for r in actual[0]] == [r.document_id for r in expected[0]]
+        assert actual[0][0].similarity_score == pytest.approx(expected[0][0].similarity_score, abs=1e-5)
+        
+        stats = await quantized.get_statistics()
+        assert stats['active_index_type'] == "SQ8"
+        assert stats['rescoring'] is True
+        assert stats['bytes_per_vector'] == 32
+        assert stats['memory_savings'] == 0.75
+        
+        await exact.close()
+        await quantized.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_sqfp16_used_without_training(self):
+        """測試無需訓練的 SQfp16 索引在創建時直接使用"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8, index_factory="SQfp16")
+        await db.initialize()
+        embeddings = np.random.rand(5, 8)
+        vector_ids = await db.store_vectors_batch(embeddings.tolist(), [f"doc_{i}" for i in range(5)])
+        
+        results = await db.similarity_search(embeddings[1].tolist(), top_k=1, similarity_threshold=-1.0)
+        stats = await db.get_statistics()
+        
+        assert results[0].vector_id == vector_ids[1]
+        assert stats['active_index_type'] == "SQfp16"
+        assert stats['memory_savings'] == 0.5
+        await db.close()
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_writes_continue_during_snapshot(self):
+        """測試背景寫入快照期間寫入不被阻塞，之後的寫入由日誌重放"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(np.random.rand(3, 8).tolist(), ["a", "b", "c"])
+        
+        started = threading.Event()
+        release = threading.Event()
+        write_snapshot = db._write_snapshot
+        
+        def slow_write(snapshot):
+            started.set()
+            release.wait(5)
+            return write_snapshot(snapshot)
+        
+        with patch.object(db, '_write_snapshot', side_effect=slow_write):
+            checkpoint = asyncio.create_task(db.checkpoint())
+            await asyncio.to_thread(started.wait, 5)
+            await asyncio.wait_for(db.store_vectors_batch(np.random.rand(2, 8).tolist(), ["d", "e"]), timeout=2)
+            release.set()
+            assert await checkpoint
+        
+        manifest = json.loads(db.manifest_file.read_text())
+        assert manifest['next_id'] == 3
+        
+        # 模擬崩潰：不關閉直接重新開啟
+        db._wal.close()
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        assert await reopened.initialize()
+        assert await reopened.get_vector_count() == 5
+        await reopened.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_corrupted_snapshot_not_overwritten(self):
+        """測試索引文件校驗失敗時拒絕加載且不覆寫"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(np.random.rand(3, 8).tolist(), ["a", "b", "c"])
+        await db.close()
+        
+        data = bytearray(db.index_file.read_bytes())
+        data[-1] ^= 0xFF
+        db.index_file.write_bytes(bytes(data))
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        assert not await reopened.initialize()
+        assert db.index_file.read_bytes() == bytes(data)
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_interrupted_commit_rolled_forward(self):
+        """測試索引已替換但清單未替換時，重啟以暫存清單完成提交"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(np.random.rand(3, 8).tolist(), ["a", "b", "c"])
+        
+        real_replace = os.replace
+        
+        def crash_before_manifest(src, dst):
+            if str(dst).endswith("manifest.json"):
+                raise OSError("crash")
+            return real_replace(src, dst)
+        
+        with patch('os.replace', side_effect=crash_before_manifest):
+            assert not await db.checkpoint()
+        db._wal.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        assert await reopened.initialize()
+        assert reopened.index.ntotal == 3
+        assert await reopened.get_vector_count() == 3
+        assert not (self.index_path / "manifest.json.tmp").exists()
+        await reopened.close()
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_counters_maintained_without_scanning(self):
+        """測試計數在寫入與刪除時增量維護，讀取不掃描元數據，重啟後一致"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        vector_ids = await db.store_vectors_batch(
+            np.random.rand(4, 8).tolist(), ["a", "a", "b", "c"],
+            [{'knowledge_base_id': 'kb1'}] * 3 + [{'knowledge_base_id': 'kb2'}]
+        )
+        await db.delete_vector(vector_ids[3])
+        await db.delete_vector(vector_ids[3])
+        assert await db.delete_vectors_by_document("a") == 2
+        
+        with patch.object(db.metadata_store, 'active_count', side_effect=AssertionError), \
+                patch.object(db.metadata_store, 'unique_document_count', side_effect=AssertionError):
+            counters = await db.get_counters()
+            assert await db.get_vector_count() == 1
+        
+        assert counters['total_vectors'] == 4
+        assert counters['active_vectors'] == 1
+        assert counters['deleted_vectors'] == 3
+        assert counters['unique_documents'] == 1
+        assert counters['knowledge_bases'] == {'kb1': 1}
+        assert counters['storage_bytes'] > 0
+        assert await db.get_document_vector_count("b") == 1
+        assert await db.get_document_vector_count("a") == 0
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await reopened.initialize()
+        reopened_counters = await reopened.get_counters()
+        assert {k: v for k, v in reopened_counters.items() if k != 'storage_bytes'} == \
+            {k: v for k, v in counters.items() if k != 'storage_bytes'}
+        await reopened.close()
+
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_document_index_persisted_with_snapshot(self):
+        """測試按文件路徑刪除與計數使用倒排索引，重啟後直接載入而非重建"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        paths = ["a.py", "a.py", "b.py", "c.py"]
+        await db.store_vectors_batch(
+            np.random.rand(4, 8).tolist(), [f"kb_{p}_{i}" for i, p in enumerate(paths)],
+            [{'document_path': p} for p in paths]
+        )
+        
+        with patch.object(db.metadata_store, 'find_document', side_effect=AssertionError):
+            assert await db.delete_vectors_by_document("kb_c.py_3") == 1
+        assert await db.count_vectors_by_document_path("a.py") == 2
+        await db.close()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        with patch.object(reopened._documents, 'rebuild', side_effect=AssertionError):
+            assert await reopened.initialize()
+        
+        assert await reopened.delete_vectors_by_document_path("a.py") == 2
+        assert await reopened.count_vectors_by_document_path("a.py") == 0
+        assert await reopened.count_vectors_by_document_path("b.py") == 1
+        assert await reopened.get_vector_count() == 1
+        await reopened.close()
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_document_index_rebuilt_when_missing(self):
+        """測試倒排索引文件遺失時從元數據重建"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        await db.store_vectors_batch(
+            np.random.rand(3, 8).tolist(), ["x_0", "x_1", "y_0"],
+            [{'document_path': 'x.py'}, {'document_path': 'x.py'}, {'document_path': 'y.py'}]
+        )
+        await db.close()
+        db._documents.index_file.unlink()
+        
+        reopened = FaissVectorDatabase(str(self.index_path), dimension=8)
+        assert await reopened.initialize()
+        
+        assert await reopened.count_vectors_by_document_path("x.py") == 2
+        results = await reopened.similarity_search(
+            np.random.rand(8).tolist(), top_k=5, similarity_threshold=-1.0, document_ids=["y_0"]
+        )
+        assert [r.document_id for r in results] == ["y_0"]
+        await reopened.close()
+
 
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main([__file__])
+    
+    @pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+    @pytest.mark.asyncio
+    async def test_write_generation_changes_on_writes(self):
+        """測試寫入與刪除會改變寫入世代，搜索與無效刪除不會"""
+        db = FaissVectorDatabase(str(self.index_path), dimension=8)
+        await db.initialize()
+        initial = db.get_write_generation()
+        
+        vector_ids = await db.store_vectors_batch(np.random.rand(2, 8).tolist(), ["a", "b"], [{}, {}])
+        after_store = db.get_write_generation()
+        assert after_store != initial
+        
+        await db.similarity_search(np.random.rand(8).tolist(), top_k=2)
+        assert not await db.delete_vector("missing")
+        assert db.get_write_generation() == after_store
+        
+        assert await db.delete_vector(vector_ids[0])
+        assert db.get_write_generation() != after_store
+        await db.close()
@@ -4,6 +4,7 @@ Ollama Embedding 服務測試
 
 import pytest
 import httpx
+import numpy as np
 from unittest.mock import AsyncMock, patch, MagicMock
 from .ollama_embedding_service import (
     OllamaEmbeddingService, 
@@ -248,6 +249,29 @@ class TestOllamaEmbeddingService:
             with pytest.raises(httpx.ConnectError):
                 await service.generate_embeddings_batch(texts)
     
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_array_success(self, service):
+        """測試批次生成 Embedding 直接寫入 float32 矩陣且保持順序"""
+        responses = [
+            MagicMock(status_code=200, json=lambda value=value: {"embedding": [value] * 384})
+            for value in (0.1, 0.2, 0.3)
+        ]
+        
+        with patch('httpx.AsyncClient.post', side_effect=responses) as mock_post:
+            with patch('asyncio.sleep'):
+                results = await service.generate_embeddings_array(["text 1", "text 2", "text 3"], batch_size=2)
+        
+        assert results.shape == (3, 384)
+        assert results.dtype == np.float32 and results.flags['C_CONTIGUOUS']
+        assert np.allclose(results[:, 0], [0.1, 0.2, 0.3])
+        assert mock_post.call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_array_empty_list(self, service):
+        """測試批次生成空列表返回空矩陣"""
+        results = await service.generate_embeddings_array([])
+        assert results.shape == (0, 384)
+    
     @pytest.mark.asyncio
     async def test_get_model_info_success(self, service):
         """測試獲取模型資訊成功"""
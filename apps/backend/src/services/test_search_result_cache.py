@@ -0,0 +1,70 @@
+"""
+搜索結果快取測試
+"""
+
+from .search_result_cache import SearchResultCache, normalize_query
+
+
+class TestSearchResultCache:
+    """搜索結果快取測試類別"""
+
+    def _key(self, query: str, knowledge_base_id: str = "kb_1"):
+        return SearchResultCache.make_key(query, knowledge_base_id, 10, 0.7, "hybrid")
+
+    def test_normalize_query(self):
+        """測試查詢正規化合併空白並忽略大小寫"""
+        assert normalize_query("  Hello\tWORLD \n") == "hello world"
+
+    def test_hit_returns_copy(self):
+        """測試命中時返回副本，修改不影響快取內容"""
+        cache = SearchResultCache()
+        cache.put(self._key("q"), 1, [{'document_id': 'a'}])
+
+        results = cache.get(self._key("Q"), 1)
+        results[0]['document_id'] = 'changed'
+
+        assert cache.get(self._key("q"), 1) == [{'document_id': 'a'}]
+        assert cache.stats['hits'] == 2
+
+    def test_generation_mismatch_invalidates(self):
+        """測試寫入世代改變時條目失效"""
+        cache = SearchResultCache()
+        cache.put(self._key("q"), 1, [{'document_id': 'a'}])
+
+        assert cache.get(self._key("q"), 2) is None
+        assert cache.stats['entries'] == 0
+        assert cache.stats['invalidations'] == 1
+        assert cache.stats['misses'] == 1
+
+    def test_lru_eviction_by_entries_and_results(self):
+        """測試超出條目數或結果筆數上限時淘汰最久未使用的條目"""
+        cache = SearchResultCache(max_entries=2, max_total_results=3)
+        cache.put(self._key("a"), 1, [{}])
+        cache.put(self._key("b"), 1, [{}])
+        cache.get(self._key("a"), 1)
+        cache.put(self._key("c"), 1, [{}])
+
+        assert cache.get(self._key("b"), 1) is None
+        assert cache.get(self._key("a"), 1) is not None
+
+        cache.put(self._key("d"), 1, [{}, {}])
+        assert cache.stats['cached_results'] <= 3
+        assert cache.stats['evictions'] == 2
+
+    def test_invalidate_knowledge_base(self):
+        """測試只移除指定知識庫的條目"""
+        cache = SearchResultCache()
+        cache.put(self._key("q", "kb_1"), 1, [{}])
+        cache.put(self._key("q", "kb_2"), 1, [{}])
+
+        assert cache.invalidate_knowledge_base("kb_1") == 1
+        assert cache.get(self._key("q", "kb_1"), 1) is None
+        assert cache.get(self._key("q", "kb_2"), 1) is not None
+
+    def test_disabled(self):
+        """測試上限為 0 時停用快取"""
+        cache = SearchResultCache(max_entries=0)
+        cache.put(self._key("q"), 1, [{}])
+
+        assert not cache.enabled
+        assert cache.get(self._key("q"), 1) is None
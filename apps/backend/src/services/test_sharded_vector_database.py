@@ -0,0 +1,180 @@
+"""
+分片向量資料庫測試
+"""
+
+import json
+import pytest
+import tempfile
+import shutil
+import numpy as np
+from pathlib import Path
+
+from .faiss_vector_database import FaissVectorDatabase, FAISS_AVAILABLE
+from .sharded_vector_database import ShardedVectorDatabase, shard_for_document
+from .vector_backend_benchmark import benchmark_backend, _backend_factories
+
+
+def test_shard_for_document_is_stable():
+    """測試文件分片由內容決定，不受程序雜湊種子影響"""
+    assert shard_for_document("kb_a.py_0", 4) == shard_for_document("kb_a.py_0", 4)
+    assert {shard_for_document(f"doc_{i}", 4) for i in range(64)} == {0, 1, 2, 3}
+
+
+@pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")
+class TestShardedVectorDatabase:
+    """分片向量資料庫測試類別（使用真實的工作程序）"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_path = Path(self.temp_dir) / "sharded"
+        rng = np.random.default_rng(7)
+        self.vectors = rng.random((40, 8), dtype=np.float32)
+        self.document_ids = [f"doc_{i // 2}" for i in range(40)]
+        self.metadata = [{'knowledge_base_id': 'kb1' if i < 30 else 'kb2'} for i in range(40)]
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    @pytest.mark.asyncio
+    async def test_scatter_gather_matches_single_index(self):
+        """測試分片搜索合併結果與單一索引一致"""
+        single = FaissVectorDatabase(str(Path(self.temp_dir) / "single"), dimension=8)
+        sharded = ShardedVectorDatabase(str(self.index_path), num_shards=3, dimension=8)
+        assert await single.initialize()
+        assert await sharded.initialize()
+        try:
+            await single.store_vectors_batch(self.vectors.copy(), self.document_ids, self.metadata)
+            vector_ids = await sharded.store_vectors_batch(self.vectors, self.document_ids, self.metadata)
+            assert len(vector_ids) == 40 and None not in vector_ids
+
+            queries = self.vectors[:5]
+            expected = await single.similarity_search_batch(queries, top_k=7, similarity_threshold=0.0)
+            batch = await sharded.similarity_search_batch(queries, top_k=7, similarity_threshold=0.0)
+            single_query = await sharded.similarity_search(queries[0].tolist(), top_k=7, similarity_threshold=0.0)
+
+            for expected_row, row in zip(expected, batch):
+                assert [r.document_id for r in row] == [r.document_id for r in expected_row]
+                assert np.allclose([r.similarity_score for r in row], [r.similarity_score for r in expected_row])
+            assert [r.vector_id for r in single_query] == [r.vector_id for r in batch[0]]
+
+            filtered = await sharded.similarity_search(
+                queries[0].tolist(), top_k=40, similarity_threshold=0.0, knowledge_base_ids=['kb2']
+            )
+            assert len(filtered) == 10
+
+            expected_range = await single.range_search(queries[0].tolist(), similarity_threshold=0.3)
+            sharded_range = await sharded.range_search(queries[0].tolist(), similarity_threshold=0.3)
+            assert [r.document_id for r in sharded_range] == [r.document_id for r in expected_range]
+            assert len(await sharded.range_search(queries[0].tolist(), similarity_threshold=0.3, max_results=3)) == 3
+
+            record = await sharded.get_vector(vector_ids[3])
+            assert record.document_id == "doc_1"
+
+            counters = await sharded.get_counters()
+            assert counters['active_vectors'] == 40
+            assert counters['knowledge_bases'] == {'kb1': 30, 'kb2': 10}
+            stats = await sharded.get_statistics()
+            assert len(stats['shards']) == 3
+            assert sum(shard['active_vectors'] for shard in stats['shards']) == 40
+        finally:
+            await single.close()
+            await sharded.close()
+
+    @pytest.mark.asyncio
+    async def test_deletes_routed_and_persisted(self):
+        """測試刪除只路由到所屬分片，重新啟動後資料保留"""
+        sharded = ShardedVectorDatabase(str(self.index_path), num_shards=2, dimension=8)
+        assert await sharded.initialize()
+        generation = sharded.get_write_generation()
+        vector_ids = await sharded.store_vectors_batch(self.vectors, self.document_ids, self.metadata)
+        assert sharded.get_write_generation() != generation
+
+        assert await sharded.delete_vectors_by_document("doc_0") == 2
+        assert await sharded.delete_vector(vector_ids[2])
+        assert not await sharded.delete_vector("missing")
+        assert await sharded.get_vector_count() == 37
+        await sharded.close()
+
+        reopened = ShardedVectorDatabase(str(self.index_path), num_shards=2, dimension=8)
+        assert await reopened.initialize()
+        try:
+            assert await reopened.get_vector_count() == 37
+            assert await reopened.health_check()
+        finally:
+            await reopened.close()
+
+    @pytest.mark.asyncio
+    async def test_namespace_views_share_workers(self):
+        """測試命名空間索引視圖共用分片程序且互相隔離"""
+        sharded = ShardedVectorDatabase(str(self.index_path), num_shards=2, dimension=8)
+        assert await sharded.initialize()
+        try:
+            assert await sharded.get_index("kb1") is None
+            kb_index = await sharded.get_index("kb1", create=True)
+            await kb_index.store_vectors_batch(self.vectors[:6], self.document_ids[:6])
+
+            assert await kb_index.get_vector_count() == 6
+            assert await sharded.get_vector_count() == 0
+            assert "kb1" in await sharded.list_indexes()
+            assert (await sharded.get_index_counters("kb1"))['active_vectors'] == 6
+            assert await sharded.get_index_write_generation("kb1") == kb_index.get_write_generation()
+            assert await sharded.get_index_counters("kb2") is None
+            assert await sharded.get_index_write_generation("kb2") is None
+
+            await kb_index.close()
+            assert await sharded.drop_index("kb1")
+            assert await sharded.get_index("kb1") is None
+        finally:
+            await sharded.close()
+
+    @pytest.mark.asyncio
+    async def test_drop_index_without_running_shards(self):
+        """測試分片程序未啟動（關閉後或未初始化）時刪除索引直接移除各分片的索引目錄"""
+        sharded = ShardedVectorDatabase(str(self.index_path), num_shards=2, dimension=8)
+        assert await sharded.initialize()
+        kb_index = await sharded.get_index("kb1", create=True)
+        await kb_index.store_vectors_batch(self.vectors[:6], self.document_ids[:6])
+        await sharded.close()
+
+        index_dirs = [self.index_path / f"shard_{i:03d}" / "indexes" / "kb1" for i in range(2)]
+        assert all(index_dir.exists() for index_dir in index_dirs)
+
+        assert await sharded.drop_index("kb1")
+        assert not any(index_dir.exists() for index_dir in index_dirs)
+        assert not await sharded.drop_index("kb1")
+        assert not await sharded.drop_index("../kb1")
+
+        reopened = ShardedVectorDatabase(str(self.index_path), num_shards=2, dimension=8)
+        assert await reopened.initialize()
+        try:
+            assert "kb1" not in await reopened.list_indexes()
+        finally:
+            await reopened.close()
+
+    @pytest.mark.asyncio
+    async def test_benchmark_reports_shard_count(self):
+        """測試基準測試包含 1/2/4 個分片的後端並回報分片數"""
+        assert {'faiss-sharded-1', 'faiss-sharded-2', 'faiss-sharded-4'} <= set(_backend_factories())
+
+        sharded = _backend_factories()['faiss-sharded-2'](str(self.index_path), 8, "cosine")
+        assert await sharded.initialize()
+        try:
+            result = await benchmark_backend(sharded, self.vectors, self.vectors[:4], top_k=5)
+        finally:
+            await sharded.close()
+
+        assert result.shards == 2
+        assert result.recall == 1.0
+        assert result.queries_per_second > 0
+
+    @pytest.mark.asyncio
+    async def test_reshard_rejected(self):
+        """測試既有配置的分片數量不符時拒絕啟動"""
+        self.index_path.mkdir(parents=True)
+        with open(self.index_path / "shards.json", 'w', encoding='utf-8') as f:
+            json.dump({'num_shards': 4}, f)
+
+        sharded = ShardedVectorDatabase(str(self.index_path), num_shards=2, dimension=8)
+        assert not await sharded.initialize()
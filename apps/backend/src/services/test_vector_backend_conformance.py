@@ -0,0 +1,239 @@
+"""
+向量資料庫後端一致性測試
+所有後端以相同的正確性檢查（相對精確搜索的召回率）與吞吐量量測執行
+"""
+
+import pytest
+import tempfile
+import shutil
+import numpy as np
+from pathlib import Path
+
+from .faiss_vector_database import FaissVectorDatabase, FAISS_AVAILABLE, VectorStorageError, VectorSearchError
+from .numpy_vector_database import NumpyVectorDatabase
+from .vector_backend_benchmark import benchmark_backend, exact_top_k
+
+
+def _faiss(path: str, **kwargs) -> FaissVectorDatabase:
+    return FaissVectorDatabase(path, **kwargs)
+
+
+def _numpy(path: str, **kwargs) -> NumpyVectorDatabase:
+    # 小區塊確保測試覆蓋跨區塊合併
+    return NumpyVectorDatabase(path, block_size=16, **kwargs)
+
+
+def _numpy_float16(path: str, **kwargs) -> NumpyVectorDatabase:
+    return NumpyVectorDatabase(path, vector_dtype="float16", block_size=16, **kwargs)
+
+
+BACKENDS = [
+    pytest.param(_faiss, id="faiss", marks=pytest.mark.skipif(not FAISS_AVAILABLE, reason="Faiss not available")),
+    pytest.param(_numpy, id="numpy"),
+    pytest.param(_numpy_float16, id="numpy-float16"),
+]
+
+
+@pytest.mark.parametrize("factory", BACKENDS)
+class TestVectorBackendConformance:
+    """向量資料庫後端一致性測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_path = str(Path(self.temp_dir) / "index")
+        rng = np.random.default_rng(3)
+        self.vectors = rng.standard_normal((100, 8)).astype(np.float32)
+        self.queries = rng.standard_normal((6, 8)).astype(np.float32)
+        self.document_ids = [f"doc_{i // 4}" for i in range(100)]
+        self.metadata = [
+            {
+                'knowledge_base_id': f"kb_{i % 3}",
+                'document_path': f"{'src' if i < 60 else 'docs'}/file_{i // 4}.{'py' if i % 2 else 'md'}",
+                'language': 'python' if i % 2 else 'markdown',
+                'file_type': '.py' if i % 2 else '.md'
+            }
+            for i in range(100)
+        ]
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    async def _open(self, factory, **kwargs):
+        db = factory(self.index_path, dimension=8, **kwargs)
+        assert await db.initialize()
+        return db
+
+    @pytest.mark.asyncio
+    async def test_dimension_mismatch_raises_typed_errors(self, factory):
+        """測試維度不符時拋出帶錯誤碼的向量儲存與搜索錯誤"""
+        db = await self._open(factory)
+        try:
+            with pytest.raises(VectorStorageError) as storage_error:
+                await db.store_vectors_batch(np.zeros((2, 5), dtype=np.float32), ["doc_0", "doc_1"])
+            assert storage_error.value.code == "VECTOR_STORAGE_ERROR"
+
+            with pytest.raises(VectorSearchError) as search_error:
+                await db.similarity_search_batch(np.zeros((2, 5), dtype=np.float32))
+            assert search_error.value.code == "VECTOR_SEARCH_ERROR"
+            assert "(2, 5)" in search_error.value.message
+        finally:
+            await db.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("metric", ["cosine", "euclidean", "dot_product"])
+    async def test_exact_recall(self, factory, metric):
+        """測試精確後端的 top-k 與暴力搜索一致"""
+        db = await self._open(factory, metric=metric)
+        vector_ids = await db.store_vectors_batch(self.vectors.copy(), self.document_ids, self.metadata)
+        row_of = {vector_id: row for row, vector_id in enumerate(vector_ids)}
+
+        expected = exact_top_k(self.vectors, self.queries, 10, metric)
+        batch = await db.similarity_search_batch(self.queries, top_k=10, similarity_threshold=-np.inf)
+
+        for results, expected_rows in zip(batch, expected):
+            rows = [row_of[r.vector_id] for r in results]
+            assert len(set(rows) & set(expected_rows.tolist())) >= 9
+            scores = [r.similarity_score for r in results]
+            assert scores == sorted(scores, reverse=True)
+        await db.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+    async def test_range_search_returns_every_hit(self, factory, metric):
+        """測試範圍搜索返回所有不低於閾值的結果，不受 top_k 截斷"""
+        db = await self._open(factory, metric=metric)
+        vector_ids = await db.store_vectors_batch(self.vectors.copy(), self.document_ids, self.metadata)
+        query = self.vectors[0]
+
+        all_results = await db.similarity_search(query.tolist(), top_k=100, similarity_threshold=-np.inf)
+        scores = sorted((r.similarity_score for r in all_results), reverse=True)
+        threshold = (scores[29] + scores[30]) / 2
+        expected = {r.vector_id for r in all_results if r.similarity_score >= threshold}
+
+        results = await db.range_search(query.tolist(), similarity_threshold=threshold)
+        assert {r.vector_id for r in results} == expected
+        assert len(results) == 30
+        assert [r.similarity_score for r in results] == sorted((r.similarity_score for r in results), reverse=True)
+
+        capped = await db.range_search(query.tolist(), similarity_threshold=threshold, max_results=5)
+        assert [r.vector_id for r in capped] == [r.vector_id for r in results[:5]]
+
+        filtered = await db.range_search(query.tolist(), similarity_threshold=threshold, knowledge_base_ids=["kb_0"])
+        assert {r.vector_id for r in filtered} == {r.vector_id for r in results if r.metadata['knowledge_base_id'] == "kb_0"}
+
+        await db.delete_vector(vector_ids[0])
+        streamed = [
+            batch async for batch in db.range_search_iter(query.tolist(), similarity_threshold=threshold, batch_size=7)
+        ]
+        assert all(len(batch) <= 7 for batch in streamed)
+        assert [r.vector_id for batch in streamed for r in batch] == [r.vector_id for r in results if r.vector_id != vector_ids[0]]
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_filters_threshold_and_deletes(self, factory):
+        """測試知識庫、文件過濾、相似度閾值與刪除"""
+        db = await self._open(factory)
+        vector_ids = await db.store_vectors_batch(self.vectors.copy(), self.document_ids, self.metadata)
+        query = self.vectors[0].tolist()
+
+        kb_results = await db.similarity_search(query, top_k=100, similarity_threshold=-1.0, knowledge_base_ids=["kb_1"])
+        assert len(kb_results) == 33
+        assert {r.metadata['knowledge_base_id'] for r in kb_results} == {"kb_1"}
+
+        doc_results = await db.similarity_search(query, top_k=10, similarity_threshold=-1.0, document_ids=["doc_3"])
+        assert sorted(r.vector_id for r in doc_results) == sorted(vector_ids[12:16])
+
+        above = await db.similarity_search(query, top_k=100, similarity_threshold=0.5)
+        assert above[0].vector_id == vector_ids[0]
+        assert all(r.similarity_score >= 0.5 for r in above)
+
+        assert await db.delete_vector(vector_ids[0])
+        assert await db.delete_vectors_by_document("doc_1") == 4
+        assert await db.delete_vectors_by_document_path("src/file_2.py") == 2
+        assert await db.get_vector_count() == 93
+        assert await db.get_document_vector_count("doc_0") == 3
+
+        results = await db.similarity_search(query, top_k=100, similarity_threshold=-1.0)
+        returned = {r.vector_id for r in results}
+        assert len(results) == 93
+        assert not returned & ({vector_ids[0]} | set(vector_ids[4:8]) | {vector_ids[9], vector_ids[11]})
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_metadata_filter(self, factory):
+        """測試元數據過濾表達式（等值、IN、前綴）與知識庫過濾組合"""
+        db = await self._open(factory)
+        vector_ids = await db.store_vectors_batch(self.vectors.copy(), self.document_ids, self.metadata)
+        query = self.vectors[1].tolist()
+
+        def expected(predicate):
+            return {vector_id for vector_id, meta in zip(vector_ids, self.metadata) if predicate(meta)}
+
+        results = await db.similarity_search(
+            query, top_k=100, similarity_threshold=-1.0, metadata_filter={'language': 'python'}
+        )
+        assert {r.vector_id for r in results} == expected(lambda m: m['language'] == 'python')
+        assert results[0].vector_id == vector_ids[1]
+
+        results = await db.similarity_search(
+            query, top_k=100, similarity_threshold=-1.0,
+            knowledge_base_ids=["kb_2"], metadata_filter={'document_path': {'prefix': 'docs/'}, 'file_type': ['.md']}
+        )
+        assert {r.vector_id for r in results} == expected(
+            lambda m: m['knowledge_base_id'] == "kb_2" and m['document_path'].startswith('docs/') and m['file_type'] == '.md'
+        )
+
+        batch = await db.similarity_search_batch(
+            self.queries, top_k=5, similarity_threshold=-1.0, metadata_filter={'file_type': {'in': ['.py']}}
+        )
+        assert all(r.metadata['file_type'] == '.py' for results in batch for r in results)
+        assert all(len(results) == 5 for results in batch)
+
+        ranged = await db.range_search(
+            query, similarity_threshold=-1.0, metadata_filter={'document_path': {'prefix': 'src/file_1'}}
+        )
+        assert {r.vector_id for r in ranged} == expected(lambda m: m['document_path'].startswith('src/file_1'))
+
+        assert await db.similarity_search(query, top_k=10, metadata_filter={'language': 'rust'}) == []
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_persistence_and_namespaces(self, factory):
+        """測試重新開啟後資料與刪除保留，命名空間索引互相隔離"""
+        db = await self._open(factory)
+        vector_ids = await db.store_vectors_batch(self.vectors[:20].copy(), self.document_ids[:20])
+        await db.delete_vector(vector_ids[5])
+
+        kb_index = await db.get_index("kb_x", create=True)
+        await kb_index.store_vectors_batch(self.vectors[20:30].copy(), self.document_ids[20:30])
+        await db.close()
+
+        reopened = await self._open(factory)
+        assert await reopened.get_vector_count() == 19
+        results = await reopened.similarity_search(
+            self.vectors[5].tolist(), top_k=20, similarity_threshold=-1.0, document_ids=[self.document_ids[5]]
+        )
+        assert vector_ids[5] not in {r.vector_id for r in results}
+        record = await reopened.get_vector(vector_ids[3])
+        assert record.document_id == self.document_ids[3]
+
+        kb_index = await reopened.get_index("kb_x")
+        assert await kb_index.get_vector_count() == 10
+        assert "kb_x" in await reopened.list_indexes()
+        assert await reopened.drop_index("kb_x")
+        assert await reopened.get_index("kb_x") is None
+        await reopened.close()
+
+    @pytest.mark.asyncio
+    async def test_benchmark_reports_recall_and_throughput(self, factory):
+        """測試基準測試量測召回率與吞吐量"""
+        db = await self._open(factory)
+        result = await benchmark_backend(db, self.vectors, self.queries, top_k=5)
+        await db.close()
+
+        assert result.recall >= 0.95
+        assert result.queries_per_second > 0
+        assert result.batch_queries_per_second > 0
+        assert result.ingest_vectors_per_second > 0
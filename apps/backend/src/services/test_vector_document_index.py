@@ -0,0 +1,89 @@
+"""
+文件倒排索引測試
+"""
+
+import pytest
+import tempfile
+import shutil
+import uuid
+from pathlib import Path
+
+from .vector_metadata_store import VectorMetadataStore
+from .vector_document_index import (
+    VectorDocumentIndex, document_key, knowledge_base_key, document_path_key
+)
+
+
+class TestVectorDocumentIndex:
+    """文件倒排索引測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = VectorMetadataStore(Path(self.temp_dir) / "metadata")
+        self.store.open()
+        self.index_file = Path(self.temp_dir) / "documents.npy"
+        self.metadata_list = [
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_0',
+             'knowledge_base_id': 'kb1', 'document_path': 'a.py'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_1',
+             'knowledge_base_id': 'kb1', 'document_path': 'a.py'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb2_b.py_0',
+             'knowledge_base_id': 'kb2', 'document_path': 'b.py'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'orphan'},
+        ]
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_lookup_by_document_knowledge_base_and_path(self):
+        """測試依文件ID、知識庫與文件路徑查找"""
+        index = VectorDocumentIndex(self.index_file)
+        index.add(0, self.metadata_list)
+
+        assert index.lookup(document_key('kb1_a.py_1')).tolist() == [1]
+        assert index.lookup(knowledge_base_key('kb1')).tolist() == [0, 1]
+        assert index.lookup(document_path_key('a.py')).tolist() == [0, 1]
+        assert index.lookup(document_path_key('missing.py')).tolist() == []
+        assert index.lookup_many([document_key('orphan'), document_path_key('b.py')]).tolist() == [2, 3]
+
+    def test_write_and_load_drops_deleted_and_unsnapshotted(self):
+        """測試持久化時剔除已刪除與快照水位之後的向量，載入後可查找"""
+        self.store.append(0, self.metadata_list)
+        index = VectorDocumentIndex(self.index_file)
+        index.add(0, self.metadata_list)
+        self.store.mark_deleted([0])
+
+        index.write(index.freeze(row_count=3), self.store, self.index_file)
+
+        loaded = VectorDocumentIndex(self.index_file)
+        assert loaded.load()
+        assert loaded.lookup(document_path_key('a.py')).tolist() == [1]
+        assert loaded.lookup(document_key('orphan')).tolist() == []
+
+        loaded.add(4, [{'document_id': 'kb1_a.py_2', 'document_path': 'a.py'}])
+        assert loaded.lookup(document_path_key('a.py')).tolist() == [1, 4]
+
+    def test_rebuild_matches_incremental(self):
+        """測試從元數據儲存重建的結果與增量維護一致"""
+        self.store.append(0, self.metadata_list)
+        self.store.mark_deleted([2])
+        incremental = VectorDocumentIndex(self.index_file)
+        incremental.add(0, self.metadata_list)
+
+        rebuilt = VectorDocumentIndex(self.index_file)
+        rebuilt.rebuild(self.store)
+
+        for key in (knowledge_base_key('kb1'), document_path_key('a.py'), document_key('orphan')):
+            assert rebuilt.lookup(key).tolist() == incremental.lookup(key).tolist()
+        assert rebuilt.lookup(knowledge_base_key('kb2')).tolist() == []
+
+    def test_load_missing_file(self):
+        """測試文件不存在時載入失敗"""
+        assert not VectorDocumentIndex(self.index_file).load()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
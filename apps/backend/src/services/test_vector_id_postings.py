@@ -0,0 +1,139 @@
+"""
+向量ID倒排位圖測試
+"""
+
+import pytest
+import tempfile
+import shutil
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+from .vector_metadata_store import VectorMetadataStore
+from .vector_id_postings import VectorIdPostings
+from .vector_metadata_filter import parse_metadata_filter
+
+
+class TestVectorIdPostings:
+    """向量ID倒排位圖測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = VectorMetadataStore(Path(self.temp_dir) / "metadata")
+        self.store.open()
+        self.metadata_list = [
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_0', 'knowledge_base_id': 'kb1',
+             'language': 'python', 'file_type': '.py', 'document_path': 'src/a.py'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_1', 'knowledge_base_id': 'kb1',
+             'language': 'python', 'file_type': '.py', 'document_path': 'src/a.py'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb2_b.py_0', 'knowledge_base_id': 'kb2',
+             'language': 'markdown', 'file_type': '.md', 'document_path': 'docs/b.md'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_0', 'knowledge_base_id': 'kb1',
+             'language': 'python', 'file_type': '.pyi', 'document_path': 'src/sub/c.pyi'},
+        ]
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_filter_by_knowledge_base_and_ids(self):
+        """測試依知識庫與指定 faiss_id 過濾"""
+        postings = VectorIdPostings()
+        postings.add(0, self.metadata_list)
+
+        assert postings.filter_mask(knowledge_base_ids=['kb1']).tolist() == [True, True, False, True]
+        assert postings.filter_mask(faiss_ids=[0, 3, 99]).tolist() == [True, False, False, True]
+        assert postings.filter_mask(['kb2'], [0, 3]).tolist() == [False] * 4
+        assert not postings.filter_mask(knowledge_base_ids=['missing']).any()
+
+    def test_remove_excludes_from_all_filters(self):
+        """測試移除後不再出現在任何過濾結果中"""
+        postings = VectorIdPostings()
+        postings.add(0, self.metadata_list)
+
+        postings.remove([0, 99])
+
+        assert postings.filter_mask().tolist() == [False, True, True, True]
+        assert postings.filter_mask(faiss_ids=[0, 3]).tolist() == [False, False, False, True]
+        assert postings.live_count == 3
+
+    def test_capacity_growth(self):
+        """測試位圖容量自動擴充"""
+        postings = VectorIdPostings(initial_capacity=2)
+        postings.add(0, self.metadata_list[:2])
+        postings.add(2, self.metadata_list[2:])
+
+        assert postings.size == 4
+        assert postings.filter_mask(knowledge_base_ids=['kb1']).tolist() == [True, True, False, True]
+
+    def test_rebuild_matches_incremental(self):
+        """測試從元數據儲存重建的結果與增量維護一致"""
+        self.store.append(0, self.metadata_list)
+        self.store.mark_deleted([1])
+
+        postings = VectorIdPostings()
+        postings.rebuild(self.store)
+
+        assert postings.filter_mask(knowledge_base_ids=['kb1']).tolist() == [True, False, False, True]
+        assert postings.filter_mask(knowledge_base_ids=['kb2']).tolist() == [False, False, True, False]
+
+    def test_metadata_conditions(self):
+        """測試以元數據欄位條件（等值、IN、前綴）過濾"""
+        postings = VectorIdPostings(initial_capacity=2)
+        postings.add(0, self.metadata_list[:2])
+        postings.add(2, self.metadata_list[2:])
+
+        def mask(metadata_filter):
+            return postings.filter_mask(conditions=parse_metadata_filter(metadata_filter)).tolist()
+
+        assert mask({'language': 'python'}) == [True, True, False, True]
+        assert mask({'file_type': ['.pyi', '.md']}) == [False, False, True, True]
+        assert mask({'document_path': {'prefix': 'src/'}}) == [True, True, False, True]
+        assert mask({'document_path': {'prefix': ['src/sub/', 'docs/']}}) == [False, False, True, True]
+        assert mask({'knowledge_base_id': {'prefix': 'kb2'}}) == [False, False, True, False]
+        assert mask({'file_type': '.py', 'document_path': {'prefix': 'src/'}}) == [True, True, False, False]
+        assert mask({'language': 'rust'}) == [False] * 4
+
+    def test_rebuilt_field_index_built_on_first_filter(self):
+        """測試重建後的欄位索引於第一次過濾時從元數據儲存建立，之後隨寫入維護"""
+        self.store.append(0, self.metadata_list[:3])
+        self.store.mark_deleted([1])
+
+        postings = VectorIdPostings()
+        postings.rebuild(self.store)
+        conditions = parse_metadata_filter({'document_path': {'prefix': 'src/'}})
+        assert postings.filter_mask(conditions=conditions).tolist() == [True, False, False]
+
+        self.store.append(3, self.metadata_list[3:])
+        postings.add(3, self.metadata_list[3:])
+        assert postings.filter_mask(conditions=conditions).tolist() == [True, False, False, True]
+
+    def test_persisted_fields_loaded_without_decoding(self):
+        """測試持久化的欄位索引載入後只解碼快照之後的列"""
+        self.store.append(0, self.metadata_list[:3])
+        postings = VectorIdPostings()
+        postings.rebuild(self.store)
+        fields_file = Path(self.temp_dir) / "fields.npz"
+        # 尚未建立的欄位於寫入時從元數據儲存解碼
+        VectorIdPostings.write_fields(postings.freeze_fields(3), self.store, fields_file)
+
+        self.store.append(3, self.metadata_list[3:])
+        reopened = VectorIdPostings()
+        reopened.rebuild(self.store)
+        with patch.object(self.store, 'get', wraps=self.store.get) as get_spy:
+            assert reopened.load_fields(fields_file, 3)
+            conditions = parse_metadata_filter({'document_path': {'prefix': 'src/'}, 'file_type': '.pyi'})
+            assert reopened.filter_mask(conditions=conditions).tolist() == [False, False, False, True]
+        assert [call.args[0] for call in get_spy.call_args_list] == [3, 3, 3]
+
+        # 列數不符時不載入
+        assert not VectorIdPostings().load_fields(fields_file, 3)
+        other = VectorIdPostings()
+        other.rebuild(self.store)
+        assert not other.load_fields(fields_file, 4)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,69 @@
+"""
+命名空間索引常駐記錄測試
+"""
+
+import pytest
+
+from .vector_index_residency import IndexResidencyTracker
+
+
+class TestIndexResidencyTracker:
+    """索引常駐記錄測試類別"""
+
+    def test_candidates_follow_lru_order(self):
+        """測試依最久未使用的順序選出足以回到上限內的索引"""
+        tracker = IndexResidencyTracker(budget_bytes=250)
+        tracker.record_load("a", 100, 0.01)
+        tracker.record_load("b", 100, 0.02)
+        tracker.record_load("c", 100, 0.03)
+        tracker.touch("a")
+
+        assert tracker.resident_bytes == 300
+        assert tracker.eviction_candidates(lambda name: False) == ["b"]
+
+        tracker.update_bytes("c", 200)
+        assert tracker.eviction_candidates(lambda name: False) == ["b", "c"]
+
+    def test_pinned_and_busy_indexes_skipped(self):
+        """測試被固定或使用中的索引不會被選出"""
+        tracker = IndexResidencyTracker(budget_bytes=100)
+        for name in ("a", "b", "c"):
+            tracker.record_load(name, 100, 0.0)
+
+        tracker.pin("a")
+        tracker.pin("a")
+        assert tracker.eviction_candidates(lambda name: name == "b") == ["c"]
+
+        tracker.unpin("a")
+        assert tracker.is_pinned("a")
+        tracker.unpin("a")
+        assert tracker.eviction_candidates(lambda name: name == "b") == ["a", "c"]
+
+    def test_unlimited_budget_never_evicts(self):
+        """測試未設定上限時不逐出"""
+        tracker = IndexResidencyTracker()
+        tracker.record_load("a", 10 ** 12, 0.0)
+        assert tracker.eviction_candidates(lambda name: False) == []
+        assert tracker.metrics()['over_budget'] is False
+
+    def test_metrics(self):
+        """測試加載延遲與逐出統計"""
+        tracker = IndexResidencyTracker(budget_bytes=150)
+        tracker.record_load("a", 100, 0.010)
+        tracker.record_load("b", 100, 0.030)
+        tracker.record_eviction("a")
+
+        metrics = tracker.metrics()
+        assert metrics['resident_bytes'] == 100
+        assert metrics['indexes'] == {"b": 100}
+        assert metrics['loads'] == 2
+        assert metrics['evictions'] == 1
+        assert metrics['evicted_bytes'] == 100
+        assert metrics['mean_load_ms'] == pytest.approx(20.0)
+        assert metrics['max_load_ms'] == pytest.approx(30.0)
+        assert metrics['p95_load_ms'] == pytest.approx(30.0)
+        assert "a" not in tracker
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,55 @@
+"""
+向量元數據過濾表達式測試
+"""
+
+import pytest
+
+from .vector_metadata_filter import MetadataCondition, parse_metadata_filter
+
+
+class TestParseMetadataFilter:
+    """過濾表達式解析測試類別"""
+
+    def test_shorthand_and_explicit_forms(self):
+        """測試字串、列表與運算子映射的寫法"""
+        conditions = parse_metadata_filter({
+            'language': 'python',
+            'file_type': ['.pyi', '.py', '.py'],
+            'document_path': {'prefix': 'src/'}
+        })
+
+        assert conditions == (
+            MetadataCondition('document_path', 'prefix', ('src/',)),
+            MetadataCondition('file_type', 'in', ('.py', '.pyi')),
+            MetadataCondition('language', 'eq', ('python',)),
+        )
+        assert parse_metadata_filter({'file_type': {'in': ['.py', '.pyi']}}) == \
+            parse_metadata_filter({'file_type': ['.pyi', '.py']})
+        assert parse_metadata_filter(None) == ()
+
+    @pytest.mark.parametrize("metadata_filter", [
+        {'encoding': 'utf-8'},
+        {'language': {'regex': 'py.*'}},
+        {'language': 3},
+        {'language': []},
+        {'language': {'eq': ['python', 'rust']}},
+        {'language': {}},
+        ['language', 'python'],
+    ])
+    def test_invalid_expressions_rejected(self, metadata_filter):
+        """測試不合法的表達式被拒絕"""
+        with pytest.raises(ValueError):
+            parse_metadata_filter(metadata_filter)
+
+    def test_condition_matches(self):
+        """測試單個值的條件判斷"""
+        prefix = MetadataCondition('document_path', 'prefix', ('src/', 'lib/'))
+        assert prefix.matches('src/a.py')
+        assert prefix.matches('lib/b.py')
+        assert not prefix.matches('docs/src/a.md')
+        assert not prefix.matches(None)
+        assert MetadataCondition('language', 'in', ('go', 'python')).matches('python')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
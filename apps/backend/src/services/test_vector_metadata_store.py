@@ -0,0 +1,211 @@
+"""
+欄式向量元數據儲存測試
+"""
+
+import sys
+import pytest
+import tempfile
+import threading
+import shutil
+import uuid
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+
+from .vector_metadata_store import VectorMetadataStore, ROW_DTYPE
+
+
+class TestVectorMetadataStore:
+    """欄式向量元數據儲存測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = VectorMetadataStore(Path(self.temp_dir) / "metadata")
+        self.store.open()
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _metadata(self, i: int, **extra):
+        return {
+            'vector_id': str(uuid.uuid4()),
+            'document_id': f'kb1_src/file_{i}.py_{i}',
+            'created_at': datetime(2024, 1, 2, 3, 4, 5, 678901).isoformat(),
+            'knowledge_base_id': 'kb1',
+            'chunk_index': i,
+            'language': 'python',
+            **extra
+        }
+
+    def test_append_and_get_round_trip(self):
+        """測試追加後完整解碼元數據"""
+        metadata = self._metadata(0, file_type='.py')
+        self.store.append(0, [metadata])
+
+        decoded = self.store.get(0)
+
+        assert decoded == metadata
+        assert self.store.get(1) is None
+
+    def test_fixed_width_rows(self):
+        """測試定長列大小與欄位"""
+        self.store.append(0, [self._metadata(i) for i in range(3)])
+
+        assert self.store.rows_file.stat().st_size == 3 * ROW_DTYPE.itemsize
+        assert self.store.row_count == 3
+
+    def test_find_by_vector_id(self):
+        """測試根據向量ID查找"""
+        rows = [self._metadata(i) for i in range(4)]
+        self.store.append(0, rows)
+
+        assert self.store.find(rows[2]['vector_id']) == 2
+        assert self.store.find(str(uuid.uuid4())) is None
+
+    def test_find_many(self):
+        """測試批次查找向量ID"""
+        rows = [self._metadata(i) for i in range(4)]
+        self.store.append(0, rows)
+
+        found = self.store.find_many([rows[3]['vector_id'], str(uuid.uuid4()), rows[0]['vector_id']])
+
+        assert found.tolist() == [3, -1, 0]
+
+    def test_find_after_appends_and_reopen(self):
+        """測試查找表建立後的新增列、合併重排與重新開啟後的查找"""
+        rows = [self._metadata(i) for i in range(10)]
+        self.store.append(0, rows)
+        assert self.store.find(rows[9]['vector_id']) == 9
+
+        # 新增列先進入雜湊表，超過門檻後合併
+        more = [self._metadata(10 + i) for i in range(5000)]
+        self.store.append(10, more[:3])
+        assert self.store.find(more[2]['vector_id']) == 12
+        self.store.append(13, more[3:])
+        assert self.store._vid_delta == {}
+        assert self.store.find_many([more[4999]['vector_id'], rows[0]['vector_id']]).tolist() == [5009, 0]
+
+        # 重複的 vector_id 以第一列為準
+        self.store.append(5010, [dict(rows[5])])
+        assert self.store.find(rows[5]['vector_id']) == 5
+
+        self.store.open(row_count=5)
+        assert self.store.find(rows[5]['vector_id']) is None
+        assert self.store.find(rows[4]['vector_id']) == 4
+
+    def test_non_uuid_vector_id(self):
+        """測試非 UUID 格式的向量ID"""
+        self.store.append(0, [{'vector_id': 'custom-id', 'document_id': 'doc'}])
+
+        assert self.store.find('custom-id') == 0
+        assert self.store.get(0)['vector_id'] == 'custom-id'
+
+    def test_append_requires_contiguous_ids(self):
+        """測試 faiss_id 必須連續"""
+        with pytest.raises(ValueError):
+            self.store.append(1, [self._metadata(0)])
+
+    def test_mark_deleted_and_counts(self):
+        """測試刪除標記與統計"""
+        self.store.append(0, [
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'doc_a'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'doc_a'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'doc_b'},
+        ])
+
+        assert self.store.find_document('doc_a').tolist() == [0, 1]
+
+        assert self.store.mark_deleted([0, 0, 2], '2024-01-01T00:00:00') == 2
+
+        assert self.store.active_count() == 1
+        assert self.store.unique_document_count() == 1
+        assert self.store.deleted_mask(np.array([0, 1, 2, 99])).tolist() == [True, False, True, True]
+        assert self.store.get(0)['deleted_at'] == '2024-01-01T00:00:00'
+        assert self.store.find_document('doc_a').tolist() == [1]
+
+        # 刪除標記寫入文件，重新開啟後仍存在
+        self.store.open()
+        assert self.store.deleted_ids().tolist() == [0, 2]
+        assert self.store.get(2)['deleted_at'] == '2024-01-01T00:00:00'
+        assert 'deleted' not in self.store.get(1)
+
+    def test_reopen_truncates_to_snapshot(self):
+        """測試重新開啟時截斷至快照水位"""
+        self.store.append(0, [self._metadata(0)])
+        rows, heap = self.store.row_count, self.store.heap_bytes
+        self.store.append(1, [self._metadata(1)])
+
+        self.store.open(row_count=rows, heap_bytes=heap)
+
+        assert self.store.row_count == 1
+        assert self.store.get(0)['chunk_index'] == 0
+        self.store.append(1, [self._metadata(5)])
+        assert self.store.get(1)['chunk_index'] == 5
+
+    def test_read_only_open_keeps_file(self):
+        """測試唯讀開啟只映射快照水位且不截斷文件"""
+        self.store.append(0, [self._metadata(0)])
+        rows, heap = self.store.row_count, self.store.heap_bytes
+        self.store.append(1, [self._metadata(1)])
+        self.store.flush()
+
+        reader = VectorMetadataStore(self.store.store_dir)
+        reader.open(row_count=rows, heap_bytes=heap, read_only=True)
+
+        assert reader.row_count == 1
+        assert reader.get(0)['chunk_index'] == 0
+        assert self.store.rows_file.stat().st_size == 2 * ROW_DTYPE.itemsize
+        with pytest.raises(OSError):
+            reader.append(1, [self._metadata(2)])
+        reader.close()
+
+    def test_concurrent_reads_while_heap_grows(self):
+        """測試多個執行緒讀取元數據時字串堆持續增長（搜索與導入同時進行）"""
+        self.store.append(0, [self._metadata(i) for i in range(64)])
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    for faiss_id in range(self.store.row_count - 1, -1, -5):
+                        assert self.store.get(faiss_id)['chunk_index'] == faiss_id
+            except Exception as e:
+                errors.append(e)
+
+        # 縮短執行緒切換間隔，增加讀取與增長交錯的機會
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for _ in range(300):
+                start = self.store.row_count
+                self.store.append(start, [self._metadata(start + i, note="x" * 64) for i in range(4)])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            sys.setswitchinterval(switch_interval)
+
+        assert errors == []
+        assert self.store.get(self.store.row_count - 1)['note'] == "x" * 64
+
+    def test_knowledge_base_table_persisted(self):
+        """測試知識庫字典表持久化"""
+        self.store.append(0, [self._metadata(0), self._metadata(1, knowledge_base_id='kb2')])
+        self.store.close()
+
+        reopened = VectorMetadataStore(self.store.store_dir)
+        reopened.open()
+
+        assert reopened.get(1)['knowledge_base_id'] == 'kb2'
+        reopened.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,75 @@
+"""
+原始向量儲存測試
+"""
+
+import pytest
+import tempfile
+import shutil
+import numpy as np
+from pathlib import Path
+
+from .vector_raw_store import RawVectorStore
+
+
+class TestRawVectorStore:
+    """原始向量儲存測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_dir = Path(self.temp_dir) / "vectors"
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_append_and_get(self):
+        """測試追加後依 faiss_id 取回向量"""
+        store = RawVectorStore(self.store_dir, dimension=4)
+        store.open()
+        vectors = np.random.rand(5, 4).astype(np.float32)
+
+        store.append(0, vectors[:2])
+        store.append(2, vectors[2:])
+
+        assert store.vectors_file.stat().st_size == 5 * 4 * 4
+        assert np.array_equal(store.get(np.array([4, 0])), vectors[[4, 0]])
+        store.close()
+
+    def test_float16_storage(self):
+        """測試半精度儲存"""
+        store = RawVectorStore(self.store_dir, dimension=4, dtype="float16")
+        store.open()
+        vectors = np.random.rand(3, 4).astype(np.float32)
+
+        store.append(0, vectors)
+        restored = store.get(np.arange(3))
+
+        assert store.row_bytes == 8
+        assert restored.dtype == np.float32
+        assert np.allclose(restored, vectors, atol=1e-3)
+        store.close()
+
+    def test_reopen_truncates_to_snapshot(self):
+        """測試重新開啟時截斷至快照水位"""
+        store = RawVectorStore(self.store_dir, dimension=2)
+        store.open()
+        store.append(0, np.ones((3, 2)))
+
+        store.open(row_count=1)
+
+        assert store.row_count == 1
+        with pytest.raises(IndexError):
+            store.get(np.array([2]))
+        with pytest.raises(ValueError):
+            store.append(3, np.ones((1, 2)))
+        store.close()
+
+    def test_unsupported_dtype(self):
+        """測試不支援的精度"""
+        with pytest.raises(ValueError):
+            RawVectorStore(self.store_dir, dimension=2, dtype="int8")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,80 @@
+"""
+向量儲存計數器測試
+"""
+
+import pytest
+import tempfile
+import shutil
+import uuid
+from pathlib import Path
+
+from .vector_metadata_store import VectorMetadataStore
+from .vector_store_counters import VectorStoreCounters
+
+
+class TestVectorStoreCounters:
+    """向量儲存計數器測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = VectorMetadataStore(Path(self.temp_dir) / "metadata")
+        self.store.open()
+        self.metadata_list = [
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_0', 'knowledge_base_id': 'kb1'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_1', 'knowledge_base_id': 'kb1'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb2_b.py_0', 'knowledge_base_id': 'kb2'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'kb1_a.py_0', 'knowledge_base_id': 'kb1'},
+            {'vector_id': str(uuid.uuid4()), 'document_id': 'orphan'},
+        ]
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_add_counts_documents_and_knowledge_bases(self):
+        """測試寫入時累加各文件與知識庫的計數"""
+        counters = VectorStoreCounters()
+        counters.add(self.metadata_list)
+
+        assert counters.total == 5
+        assert counters.active == 5
+        assert counters.document_count == 4
+        assert counters.document_vectors('kb1_a.py_0') == 2
+        assert counters.document_vectors('missing') == 0
+        assert counters.knowledge_base_counts == {'kb1': 3, 'kb2': 1}
+
+    def test_remove_decrements_and_drops_empty_keys(self):
+        """測試刪除時扣減計數，歸零的文件與知識庫不再列出"""
+        self.store.append(0, self.metadata_list)
+        counters = VectorStoreCounters()
+        counters.add(self.metadata_list)
+
+        counters.remove(self.store, [0, 2])
+
+        assert counters.active == 3
+        assert counters.deleted == 2
+        assert counters.document_vectors('kb1_a.py_0') == 1
+        assert counters.knowledge_base_counts == {'kb1': 2}
+        assert counters.document_count == 3
+
+    def test_rebuild_matches_incremental(self):
+        """測試從元數據儲存重建的結果與增量維護一致"""
+        self.store.append(0, self.metadata_list)
+        incremental = VectorStoreCounters()
+        incremental.add(self.metadata_list)
+        incremental.remove(self.store, [1, 4])
+        self.store.mark_deleted([1, 4])
+
+        rebuilt = VectorStoreCounters()
+        rebuilt.rebuild(self.store)
+
+        assert (rebuilt.total, rebuilt.active) == (incremental.total, incremental.active)
+        assert rebuilt.document_count == incremental.document_count == self.store.unique_document_count()
+        assert rebuilt.knowledge_base_counts == incremental.knowledge_base_counts
+        assert rebuilt.active == self.store.active_count()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,137 @@
+"""
+向量寫前日誌測試
+"""
+
+import pytest
+import tempfile
+import shutil
+import numpy as np
+from pathlib import Path
+
+from .vector_write_ahead_log import VectorWriteAheadLog, WAL_OP_ADD, WAL_OP_DELETE
+
+
+class TestVectorWriteAheadLog:
+    """向量寫前日誌測試類別"""
+
+    def setup_method(self):
+        """每個測試方法前的設置"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.wal_dir = Path(self.temp_dir) / "wal"
+
+    def teardown_method(self):
+        """每個測試方法後的清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_append_and_replay(self):
+        """測試追加後重放記錄"""
+        wal = VectorWriteAheadLog(self.wal_dir, dimension=4)
+        wal.open()
+
+        vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+        wal.append_add(np.array([0, 1]), vectors, [{'vector_id': 'a'}, {'vector_id': 'b'}])
+        wal.append_delete(np.array([0]), [{'deleted_at': 'now'}])
+        wal.close()
+
+        records = list(VectorWriteAheadLog(self.wal_dir, dimension=4).replay())
+
+        assert [r.op for r in records] == [WAL_OP_ADD, WAL_OP_DELETE]
+        assert records[0].faiss_ids.tolist() == [0, 1]
+        assert np.array_equal(records[0].vectors, vectors)
+        assert records[0].metadata_list[1]['vector_id'] == 'b'
+        assert records[1].metadata_list[0]['deleted_at'] == 'now'
+
+    def test_replay_skips_checkpointed_segments(self):
+        """測試重放跳過已併入快照的日誌段"""
+        wal = VectorWriteAheadLog(self.wal_dir, dimension=2)
+        wal.open()
+
+        wal.append_add(np.array([0]), np.ones((1, 2)), [{}])
+        sealed_id = wal.rotate()
+        wal.append_add(np.array([1]), np.ones((1, 2)), [{}])
+
+        records = list(wal.replay(after_segment=sealed_id))
+
+        assert len(records) == 1
+        assert records[0].faiss_ids.tolist() == [1]
+
+    def test_segment_rotation_and_truncate(self):
+        """測試日誌段輪替與截斷"""
+        wal = VectorWriteAheadLog(self.wal_dir, dimension=4, segment_max_bytes=32)
+        wal.open()
+
+        for i in range(3):
+            wal.append_add(np.array([i]), np.ones((1, 4)), [{'i': i}])
+
+        assert len(wal.list_segments()) == 4  # 每筆記錄超過段大小，各自封存
+
+        removed = wal.truncate_through(wal.active_segment_id - 1)
+
+        assert removed == 3
+        assert wal.list_segments() == [wal.active_segment_id]
+        assert wal.pending_bytes == 0
+
+    def test_replay_truncates_torn_tail(self):
+        """測試重放時截斷不完整的尾部記錄"""
+        wal = VectorWriteAheadLog(self.wal_dir, dimension=2)
+        wal.open()
+        wal.append_add(np.array([0]), np.ones((1, 2)), [{}])
+        wal.close()
+
+        segment = self.wal_dir / "segment_00000001.wal"
+        valid_size = segment.stat().st_size
+        with open(segment, 'ab') as f:
+            f.write(b"VWAL\x01partial")
+
+        records = list(VectorWriteAheadLog(self.wal_dir, dimension=2).replay())
+
+        assert len(records) == 1
+        assert segment.stat().st_size == valid_size
+
+    def test_replay_stops_at_corrupt_middle_segment(self):
+        """測試中間日誌段損壞時停止重放並隔離其後的日誌段"""
+        wal = VectorWriteAheadLog(self.wal_dir, dimension=2)
+        wal.open()
+        wal.append_add(np.array([0]), np.ones((1, 2)), [{}])
+        wal.rotate()
+        wal.append_add(np.array([1]), np.ones((1, 2)), [{}])
+        wal.append_add(np.array([2]), np.ones((1, 2)), [{}])
+        wal.rotate()
+        wal.append_delete(np.array([2]), [{}])
+        wal.close()
+
+        # 損壞第二段的第二筆記錄
+        middle = self.wal_dir / "segment_00000002.wal"
+        data = bytearray(middle.read_bytes())
+        data[-1] ^= 0xFF
+        middle.write_bytes(bytes(data))
+
+        reopened = VectorWriteAheadLog(self.wal_dir, dimension=2)
+        records = list(reopened.replay())
+
+        assert [r.faiss_ids.tolist() for r in records] == [[0], [1]]
+        assert reopened.list_segments() == [1, 2]
+        assert (self.wal_dir / "segment_00000003.wal.corrupt").exists()
+
+        # 新的活動日誌段不重用被隔離的ID，再次重放結果相同
+        reopened.open()
+        assert reopened.active_segment_id == 4
+        reopened.append_add(np.array([3]), np.ones((1, 2)), [{}])
+        reopened.close()
+        records = list(VectorWriteAheadLog(self.wal_dir, dimension=2).replay())
+        assert [r.faiss_ids.tolist() for r in records] == [[0], [1], [3]]
+
+    def test_reset_discards_segments(self):
+        """測試重置會捨棄所有日誌段"""
+        wal = VectorWriteAheadLog(self.wal_dir, dimension=2)
+        wal.open()
+        wal.append_add(np.array([0]), np.ones((1, 2)), [{}])
+
+        wal.reset(checkpoint=5)
+
+        assert wal.active_segment_id == 6
+        assert list(wal.replay(after_segment=5)) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,113 @@
+"""
+單筆向量寫入合併測試
+"""
+
+import asyncio
+import pytest
+import numpy as np
+
+from .vector_write_coalescer import VectorWriteCoalescer
+
+
+class RecordingWriter:
+    """記錄每批寫入的批次寫入函數"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+
+    async def __call__(self, vectors, document_ids, metadata_list):
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("寫入失敗")
+        self.batches.append((vectors.shape, list(document_ids)))
+        return [f"{document_id}:{metadata['n']}" for document_id, metadata in zip(document_ids, metadata_list)]
+
+
+class TestVectorWriteCoalescer:
+    """單筆向量寫入合併測試類別"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_submits_coalesced(self):
+        """測試第一筆立即寫入，寫入期間提交的請求合併為一批，各呼叫者依序取得自己的ID"""
+        writer = RecordingWriter()
+        coalescer = VectorWriteCoalescer(writer)
+
+        vector_ids = await asyncio.gather(*[
+            coalescer.submit(np.full(4, i, dtype=np.float32), f"doc{i}", {'n': i}) for i in range(10)
+        ])
+
+        assert vector_ids == [f"doc{i}:{i}" for i in range(10)]
+        assert writer.batches == [((1, 4), ["doc0"]), ((9, 4), [f"doc{i}" for i in range(1, 10)])]
+        assert coalescer.batches == 2
+        assert coalescer.coalesced_writes == 10
+        assert coalescer.idle
+
+    @pytest.mark.asyncio
+    async def test_sequential_submits_not_delayed(self):
+        """測試依序提交時每筆立即寫入"""
+        writer = RecordingWriter()
+        coalescer = VectorWriteCoalescer(writer)
+
+        for i in range(3):
+            assert await coalescer.submit(np.zeros(4), f"doc{i}", {'n': i}) == f"doc{i}:{i}"
+        assert [shape for shape, _ in writer.batches] == [(1, 4)] * 3
+
+    @pytest.mark.asyncio
+    async def test_batches_capped_and_pipelined(self):
+        """測試單批不超過 max_batch，寫入進行中到達的請求合併為下一批"""
+        writer = RecordingWriter()
+        coalescer = VectorWriteCoalescer(writer, max_batch=4)
+
+        first = asyncio.gather(*[coalescer.submit(np.zeros(2), f"a{i}", {'n': i}) for i in range(7)])
+        await asyncio.sleep(0)
+        second = asyncio.gather(*[coalescer.submit(np.zeros(2), f"b{i}", {'n': i}) for i in range(3)])
+        await asyncio.gather(first, second)
+
+        assert [len(document_ids) for _, document_ids in writer.batches] == [1, 4, 4, 1]
+        assert writer.batches[2][1] == ["a5", "a6", "b0", "b1"]
+
+    @pytest.mark.asyncio
+    async def test_delay_waits_for_more_requests(self):
+        """測試設定等待時間時合併在等待期間到達的請求"""
+        writer = RecordingWriter()
+        coalescer = VectorWriteCoalescer(writer, delay=0.01)
+
+        first = asyncio.ensure_future(coalescer.submit(np.zeros(2), "a", {'n': 0}))
+        await asyncio.sleep(0.001)
+        second = asyncio.ensure_future(coalescer.submit(np.zeros(2), "b", {'n': 1}))
+        await asyncio.gather(first, second)
+
+        assert writer.batches == [((2, 2), ["a", "b"])]
+
+    @pytest.mark.asyncio
+    async def test_failure_propagated_to_every_caller(self):
+        """測試批次寫入失敗時每個呼叫者都收到錯誤"""
+        coalescer = VectorWriteCoalescer(RecordingWriter(fail=True))
+
+        results = await asyncio.gather(
+            *[coalescer.submit(np.zeros(2), f"doc{i}", {'n': i}) for i in range(3)],
+            return_exceptions=True
+        )
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert coalescer.batches == 0
+        assert coalescer.idle
+
+    @pytest.mark.asyncio
+    async def test_drain_writes_pending_requests(self):
+        """測試 drain 立即寫入等待中的請求"""
+        writer = RecordingWriter()
+        coalescer = VectorWriteCoalescer(writer, delay=60)
+
+        task = asyncio.ensure_future(coalescer.submit(np.zeros(2), "doc", {'n': 0}))
+        await asyncio.sleep(0)
+        assert coalescer.pending == 1
+
+        await coalescer.drain()
+        assert await task == "doc:0"
+        assert coalescer.idle
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,190 @@
+"""
+向量資料庫後端基準測試
+以相同資料對任一 VectorDatabaseInterface 實作量測召回率（相對精確搜索）與寫入、搜索吞吐量；
+分片後端以 1/2/4 個分片分別量測，比較每秒查詢數隨分片數的變化
+
+    python -m src.services.vector_backend_benchmark --vectors 20000 --queries 200
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Callable
+
+from ..interfaces.vector_database_interface import VectorDatabaseInterface
+
+
+@dataclass
+class BenchmarkResult:
+    """基準測試結果"""
+    backend: str
+    vectors: int
+    queries: int
+    top_k: int
+    recall: float
+    ingest_vectors_per_second: float
+    queries_per_second: float
+    batch_queries_per_second: float
+    shards: int = 1
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, metric: str = "cosine") -> np.ndarray:
+    """
+    以暴力搜索計算精確的 top-k 列號，作為召回率的基準
+
+    Args:
+        vectors: 向量矩陣 (n, dimension)
+        queries: 查詢矩陣 (q, dimension)
+        k: 每個查詢的結果數
+        metric: 距離度量方法
+
+    Returns:
+        np.ndarray: 依相似度降序排列的列號 (q, k)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+
+    if metric == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    scores = queries @ vectors.T
+    if metric == "euclidean":
+        scores = 2 * scores - (vectors ** 2).sum(axis=1)[None, :]
+
+    return np.argsort(-scores, axis=1, kind='stable')[:, :k]
+
+
+async def benchmark_backend(
+    db: VectorDatabaseInterface,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    top_k: int = 10,
+    metric: str = "cosine",
+    ingest_batch_size: int = 1000,
+    backend: str = ""
+) -> BenchmarkResult:
+    """
+    寫入向量後量測召回率與吞吐量（資料庫需已初始化且為空）
+
+    Args:
+        db: 向量資料庫
+        vectors: 寫入的向量矩陣 (n, dimension)
+        queries: 查詢矩陣 (q, dimension)
+        top_k: 每個查詢的結果數
+        metric: 資料庫使用的距離度量方法（用於計算精確基準）
+        ingest_batch_size: 每批寫入的向量數
+        backend: 結果中顯示的後端名稱
+
+    Returns:
+        BenchmarkResult: 基準測試結果
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+
+    started = time.perf_counter()
+    vector_ids: List[str] = []
+    for start in range(0, len(vectors), ingest_batch_size):
+        batch = vectors[start:start + ingest_batch_size].copy()
+        vector_ids.extend(await db.store_vectors_batch(
+            batch, [f"bench_{i}" for i in range(start, start + len(batch))]
+        ))
+    ingest_seconds = time.perf_counter() - started
+
+    row_of = {vector_id: row for row, vector_id in enumerate(vector_ids)}
+    expected = exact_top_k(vectors, queries, top_k, metric)
+
+    started = time.perf_counter()
+    results = [
+        await db.similarity_search(query.tolist(), top_k=top_k, similarity_threshold=-np.inf)
+        for query in queries
+    ]
+    search_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await db.similarity_search_batch(queries, top_k=top_k, similarity_threshold=-np.inf)
+    batch_seconds = time.perf_counter() - started
+
+    hits = sum(
+        len({row_of[r.vector_id] for r in row_results} & set(expected_rows.tolist()))
+        for row_results, expected_rows in zip(results, expected)
+    )
+
+    return BenchmarkResult(
+        backend=backend or type(db).__name__,
+        vectors=len(vectors),
+        queries=len(queries),
+        top_k=top_k,
+        recall=round(hits / max(expected.size, 1), 4),
+        ingest_vectors_per_second=round(len(vectors) / max(ingest_seconds, 1e-9), 1),
+        queries_per_second=round(len(queries) / max(search_seconds, 1e-9), 1),
+        batch_queries_per_second=round(len(queries) / max(batch_seconds, 1e-9), 1),
+        shards=getattr(db, 'num_shards', 1)
+    )
+
+
+def _backend_factories() -> Dict[str, Callable[[str, int, str], VectorDatabaseInterface]]:
+    """可用的後端（未安裝 Faiss 時只有 NumPy 後端），分片後端依分片數各列一項"""
+    from .numpy_vector_database import NumpyVectorDatabase
+    from .faiss_vector_database import FaissVectorDatabase, FAISS_AVAILABLE
+    from .sharded_vector_database import ShardedVectorDatabase
+
+    factories: Dict[str, Callable[[str, int, str], VectorDatabaseInterface]] = {
+        'numpy': lambda path, dimension, metric: NumpyVectorDatabase(path, dimension=dimension, metric=metric),
+        'numpy-float16': lambda path, dimension, metric: NumpyVectorDatabase(
+            path, dimension=dimension, metric=metric, vector_dtype="float16"
+        ),
+    }
+    if FAISS_AVAILABLE:
+        factories['faiss'] = lambda path, dimension, metric: FaissVectorDatabase(
+            path, dimension=dimension, metric=metric
+        )
+        for num_shards in (1, 2, 4):
+            factories[f'faiss-sharded-{num_shards}'] = (
+                lambda path, dimension, metric, num_shards=num_shards: ShardedVectorDatabase(
+                    path, num_shards=num_shards, dimension=dimension, metric=metric
+                )
+            )
+    return factories
+
+
+async def _run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.vectors, args.dimension), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+
+    results = []
+    for name, factory in _backend_factories().items():
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db = factory(str(Path(temp_dir) / name), args.dimension, args.metric)
+            if not await db.initialize():
+                continue
+            try:
+                result = await benchmark_backend(
+                    db, vectors, queries, top_k=args.top_k, metric=args.metric, backend=name
+                )
+                results.append(asdict(result))
+            finally:
+                await db.close()
+    return results
+
+
+def main() -> None:
+    """以隨機資料對所有可用後端執行基準測試並輸出 JSON"""
+    parser = argparse.ArgumentParser(description="向量資料庫後端基準測試")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "euclidean", "dot_product"])
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(asyncio.run(_run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
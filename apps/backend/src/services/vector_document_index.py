@@ -0,0 +1,237 @@
+"""
+文件倒排索引
+以 document_id、知識庫ID與文件路徑為鍵映射到 faiss_id，隨快照持久化為排序後的鍵值陣列，
+按文件刪除、計數與更新只需 O(log N + k)
+"""
+
+import os
+import logging
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Iterable
+
+from .vector_metadata_store import VectorMetadataStore, hash_document_id
+
+logger = logging.getLogger(__name__)
+
+# 持久化的倒排列：依 (key, faiss_id) 排序
+POSTING_DTYPE = np.dtype([
+    ('key', '<u8'),
+    ('faiss_id', '<i8'),
+])
+
+
+def document_key(document_id: str) -> int:
+    """document_id 的倒排鍵（與元數據的 doc_hash 欄位相同）"""
+    return hash_document_id(document_id)
+
+
+def knowledge_base_key(knowledge_base_id: str) -> int:
+    """知識庫ID的倒排鍵"""
+    return hash_document_id("\x00kb\x00" + knowledge_base_id)
+
+
+def document_path_key(document_path: str) -> int:
+    """文件路徑的倒排鍵"""
+    return hash_document_id("\x00path\x00" + document_path)
+
+
+def _posting_keys(metadata: Dict[str, Any]) -> List[int]:
+    """計算一個向量對應的所有倒排鍵"""
+    keys = [document_key(str(metadata['document_id']))]
+
+    knowledge_base_id = metadata.get('knowledge_base_id')
+    if isinstance(knowledge_base_id, str):
+        keys.append(knowledge_base_key(knowledge_base_id))
+
+    document_path = metadata.get('document_path')
+    if isinstance(document_path, str):
+        keys.append(document_path_key(document_path))
+
+    return keys
+
+
+class VectorDocumentIndex:
+    """持久化的文件 → faiss_id 倒排索引"""
+
+    def __init__(self, index_file: Path):
+        """
+        初始化倒排索引
+
+        Args:
+            index_file: 持久化文件路徑
+        """
+        self.index_file = Path(index_file)
+        self.reset()
+
+    def reset(self) -> None:
+        """清空索引"""
+        # 基礎快照中的排序倒排列（唯讀，通常為記憶體映射）
+        self._base = np.zeros(0, dtype=POSTING_DTYPE)
+        # 載入後新增的倒排列
+        self._delta: Dict[int, List[int]] = {}
+
+    @property
+    def size(self) -> int:
+        """倒排列總數（含已刪除向量）"""
+        return len(self._base) + sum(len(ids) for ids in self._delta.values())
+
+    def load(self) -> bool:
+        """
+        以記憶體映射載入持久化文件
+
+        Returns:
+            bool: 是否載入成功
+        """
+        self.reset()
+        if not self.index_file.exists():
+            return False
+
+        try:
+            base = np.load(self.index_file, mmap_mode='r', allow_pickle=False)
+        except (ValueError, OSError) as e:
+            logger.warning(f"無法載入文件倒排索引: {self.index_file} - {str(e)}")
+            return False
+
+        if base.dtype != POSTING_DTYPE or base.ndim != 1:
+            logger.warning(f"文件倒排索引格式不符: {self.index_file}")
+            return False
+
+        self._base = base
+        return True
+
+    def rebuild(self, store: VectorMetadataStore) -> None:
+        """
+        從元數據儲存重建（持久化文件缺失或與快照不符時使用）
+
+        Args:
+            store: 元數據儲存
+        """
+        self.reset()
+        if store.row_count == 0:
+            return
+
+        live_ids = np.flatnonzero(~store.deleted_mask(np.arange(store.row_count))).astype(np.int64)
+        parts = [(store.column('doc_hash')[live_ids], live_ids)]
+
+        kb_keys = np.array([knowledge_base_key(kb_id) for kb_id in store.knowledge_base_ids], dtype=np.uint64)
+        kb_codes = store.column('kb_code')[live_ids]
+        has_kb = kb_codes >= 0
+        parts.append((kb_keys[kb_codes[has_kb]], live_ids[has_kb]))
+
+        # 文件路徑存放在 JSON 欄位中，需逐列解碼
+        path_ids, path_keys = [], []
+        for faiss_id in live_ids.tolist():
+            document_path = (store.get(faiss_id) or {}).get('document_path')
+            if isinstance(document_path, str):
+                path_ids.append(faiss_id)
+                path_keys.append(document_path_key(document_path))
+        parts.append((np.array(path_keys, dtype=np.uint64), np.array(path_ids, dtype=np.int64)))
+
+        self._base = self._sorted_postings(parts)
+        logger.debug(f"重建文件倒排索引完成: {len(self._base)} 筆倒排列")
+
+    def add(self, start_id: int, metadata_list: List[Dict[str, Any]]) -> None:
+        """
+        加入連續 faiss_id 的向量
+
+        Args:
+            start_id: 第一個向量的 faiss_id
+            metadata_list: 每個向量的元數據
+        """
+        for offset, metadata in enumerate(metadata_list):
+            for key in _posting_keys(metadata):
+                self._delta.setdefault(key, []).append(start_id + offset)
+
+    def lookup(self, key: int) -> np.ndarray:
+        """
+        取得倒排鍵對應的 faiss_id（含已刪除向量，由呼叫方過濾）
+
+        Args:
+            key: 倒排鍵
+
+        Returns:
+            np.ndarray: Faiss ID 陣列
+        """
+        keys = self._base['key']
+        start = np.searchsorted(keys, np.uint64(key), side='left')
+        end = np.searchsorted(keys, np.uint64(key), side='right')
+        base_ids = np.asarray(self._base['faiss_id'][start:end], dtype=np.int64)
+
+        delta_ids = self._delta.get(key)
+        if not delta_ids:
+            return base_ids
+        return np.concatenate([base_ids, np.asarray(delta_ids, dtype=np.int64)])
+
+    def lookup_many(self, keys: Iterable[int]) -> np.ndarray:
+        """
+        取得多個倒排鍵對應的 faiss_id 聯集
+
+        Args:
+            keys: 倒排鍵列表
+
+        Returns:
+            np.ndarray: 排序且不重複的 Faiss ID 陣列
+        """
+        parts = [self.lookup(key) for key in keys]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def freeze(self, row_count: int) -> Dict[str, Any]:
+        """
+        凍結目前內容供背景寫入（呼叫方需持有寫者鎖）
+
+        Args:
+            row_count: 快照的元數據列數，只保留此水位內的向量
+
+        Returns:
+            Dict[str, Any]: 凍結的倒排列
+        """
+        keys, ids = [], []
+        for key, faiss_ids in self._delta.items():
+            keys.extend([key] * len(faiss_ids))
+            ids.extend(faiss_ids)
+
+        return {
+            'base': self._base,
+            'delta_keys': np.array(keys, dtype=np.uint64),
+            'delta_ids': np.array(ids, dtype=np.int64),
+            'row_count': row_count
+        }
+
+    def write(self, frozen: Dict[str, Any], store: VectorMetadataStore, target: Path) -> None:
+        """
+        將凍結的倒排列合併、剔除已刪除向量後寫入文件並同步
+
+        Args:
+            frozen: freeze 的返回值
+            store: 元數據儲存（用於剔除已刪除向量）
+            target: 寫入的文件路徑（通常為暫存文件）
+        """
+        base = frozen['base']
+        postings = self._sorted_postings([
+            (np.asarray(base['key']), np.asarray(base['faiss_id'])),
+            (frozen['delta_keys'], frozen['delta_ids'])
+        ])
+
+        in_snapshot = postings['faiss_id'] < frozen['row_count']
+        postings = postings[in_snapshot]
+        postings = postings[~store.deleted_mask(postings['faiss_id'])]
+
+        with open(target, 'wb') as f:
+            np.save(f, postings, allow_pickle=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _sorted_postings(parts: List[tuple]) -> np.ndarray:
+        """將 (keys, ids) 片段合併為依 (key, faiss_id) 排序的倒排列"""
+        keys = np.concatenate([np.asarray(k, dtype=np.uint64) for k, _ in parts])
+        ids = np.concatenate([np.asarray(i, dtype=np.int64) for _, i in parts])
+
+        postings = np.empty(len(keys), dtype=POSTING_DTYPE)
+        postings['key'] = keys
+        postings['faiss_id'] = ids
+        order = np.lexsort((ids, keys))
+        return postings[order]
@@ -0,0 +1,347 @@
+"""
+向量ID倒排位圖
+維護有效向量及各知識庫的 faiss_id 位圖，以及可過濾元數據欄位的字典編碼索引，
+供相似性搜索以 ID 選擇器預先過濾；欄位索引隨快照持久化，重新開啟時不需逐列解碼元數據
+"""
+
+import os
+import bisect
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Iterable, Sequence
+
+from .vector_metadata_store import VectorMetadataStore
+from .vector_metadata_filter import MetadataCondition
+
+logger = logging.getLogger(__name__)
+
+# 以字典編碼索引的元數據欄位（knowledge_base_id 另以每個知識庫一個位圖維護）
+FIELD_INDEX_KEYS = ('language', 'file_type', 'document_path')
+
+
+class _FieldCodes:
+    """
+    單一元數據欄位的字典編碼索引
+
+    每列一個 int32 值編號（-1 為缺少），過濾時先在值表上求值，
+    再以編號查表得到位圖；值表另保留排序副本供前綴條件二分查找
+    """
+
+    def __init__(self, capacity: int, codes: Optional[np.ndarray] = None, values: Optional[List[str]] = None):
+        self.codes = np.full(capacity, -1, dtype=np.int32)
+        self.values: List[str] = list(values or [])
+        self._value_codes: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+        self._sorted: Optional[List[str]] = None
+        if codes is not None:
+            self.codes[:len(codes)] = codes
+
+    def grow(self, capacity: int) -> None:
+        """擴充編號陣列"""
+        grown = np.full(capacity, -1, dtype=np.int32)
+        grown[:len(self.codes)] = self.codes
+        self.codes = grown
+
+    def set(self, row: int, value: Any) -> None:
+        """設定一列的欄位值（非字串視為缺少）"""
+        if not isinstance(value, str):
+            return
+        code = self._value_codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._value_codes[value] = code
+            self._sorted = None
+        self.codes[row] = code
+
+    def decode(self, store: VectorMetadataStore, key: str, start: int, end: int) -> None:
+        """從元數據儲存逐列解碼 [start, end) 的欄位值"""
+        for faiss_id in range(start, end):
+            self.set(faiss_id, (store.get(faiss_id) or {}).get(key))
+
+    def matching_codes(self, condition: MetadataCondition) -> List[int]:
+        """符合條件的值編號"""
+        if condition.operator != 'prefix':
+            return [self._value_codes[value] for value in condition.values if value in self._value_codes]
+
+        if self._sorted is None:
+            self._sorted = sorted(self.values)
+        matched = []
+        for prefix in condition.values:
+            position = bisect.bisect_left(self._sorted, prefix)
+            while position < len(self._sorted) and self._sorted[position].startswith(prefix):
+                matched.append(self._value_codes[self._sorted[position]])
+                position += 1
+        return matched
+
+    def mask(self, condition: MetadataCondition, size: int) -> np.ndarray:
+        """計算前 size 列符合條件的位圖"""
+        # 查表多留一格給缺少值（編號 -1 對應最後一格，永遠為 False）
+        table = np.zeros(len(self.values) + 1, dtype=bool)
+        table[self.matching_codes(condition)] = True
+        return table[self.codes[:size]]
+
+
+class VectorIdPostings:
+    """記憶體中的 faiss_id 倒排位圖"""
+
+    def __init__(self, initial_capacity: int = 1024):
+        """
+        初始化倒排位圖
+
+        Args:
+            initial_capacity: 位圖初始容量
+        """
+        self._initial_capacity = initial_capacity
+        self._store: Optional[VectorMetadataStore] = None
+        self._fields_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """清空所有位圖"""
+        self._capacity = self._initial_capacity
+        self.size = 0  # 已追蹤的 faiss_id 上限（不含）
+
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._kb_bitmaps: Dict[str, np.ndarray] = {}
+
+        # 欄位值存放在元數據的 JSON 欄位中：由元數據儲存重建時從快照載入（load_fields），
+        # 沒有快照時於第一次過濾才解碼建立；未連接元數據儲存時隨寫入即時維護
+        self._fields: Dict[str, _FieldCodes] = {}
+        if self._store is None:
+            self._fields = {key: _FieldCodes(self._capacity) for key in FIELD_INDEX_KEYS}
+
+    def rebuild(self, store: VectorMetadataStore) -> None:
+        """
+        從元數據儲存重建位圖
+
+        Args:
+            store: 元數據儲存
+        """
+        self._store = store
+        self.reset()
+        self._ensure_capacity(store.row_count)
+        self.size = store.row_count
+        if self.size == 0:
+            return
+
+        self._live[:self.size] = ~store.deleted_mask(np.arange(self.size))
+
+        kb_codes = store.column('kb_code')
+        for code, knowledge_base_id in enumerate(store.knowledge_base_ids):
+            bitmap = np.zeros(self._capacity, dtype=bool)
+            bitmap[:self.size] = kb_codes == code
+            self._kb_bitmaps[knowledge_base_id] = bitmap
+
+        logger.debug(f"重建倒排位圖完成: {self.size} 個向量, {len(self._kb_bitmaps)} 個知識庫")
+
+    def _ensure_capacity(self, size: int) -> None:
+        """必要時以倍增方式擴充所有位圖"""
+        if size <= self._capacity:
+            return
+
+        capacity = self._capacity
+        while capacity < size:
+            capacity *= 2
+
+        def grow(bitmap: np.ndarray) -> np.ndarray:
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:len(bitmap)] = bitmap
+            return grown
+
+        self._live = grow(self._live)
+        self._kb_bitmaps = {kb_id: grow(bitmap) for kb_id, bitmap in self._kb_bitmaps.items()}
+        for field in self._fields.values():
+            field.grow(capacity)
+        self._capacity = capacity
+
+    def _field(self, key: str) -> _FieldCodes:
+        """取得欄位索引，尚未建立時從元數據儲存逐列解碼建立"""
+        field = self._fields.get(key)
+        if field is not None:
+            return field
+
+        with self._fields_lock:
+            field = self._fields.get(key)
+            if field is None:
+                field = _FieldCodes(self._capacity)
+                field.decode(self._store, key, 0, min(self.size, self._store.row_count))
+                self._fields[key] = field
+                logger.debug(f"建立欄位索引完成: {key}, {len(field.values)} 個不同的值")
+        return field
+
+    def freeze_fields(self, row_count: int) -> Dict[str, Any]:
+        """
+        凍結已建立的欄位索引供背景寫入（呼叫方需持有寫者鎖）
+
+        Args:
+            row_count: 快照的元數據列數
+
+        Returns:
+            Dict[str, Any]: 各欄位的編號與值表副本（尚未建立的欄位為 None）
+        """
+        fields = {}
+        for key in FIELD_INDEX_KEYS:
+            field = self._fields.get(key)
+            fields[key] = None if field is None else (field.codes[:row_count].copy(), list(field.values))
+        return {'fields': fields, 'row_count': row_count}
+
+    @staticmethod
+    def write_fields(frozen: Dict[str, Any], store: VectorMetadataStore, target: Path) -> None:
+        """
+        將凍結的欄位索引寫入文件並同步，尚未建立的欄位在此（背景）從元數據儲存解碼
+
+        Args:
+            frozen: freeze_fields 的返回值
+            store: 元數據儲存
+            target: 寫入的文件路徑（通常為暫存文件）
+        """
+        row_count = frozen['row_count']
+        arrays = {}
+        for key, built in frozen['fields'].items():
+            if built is None:
+                field = _FieldCodes(row_count)
+                field.decode(store, key, 0, row_count)
+                built = (field.codes, field.values)
+            codes, values = built
+            arrays[f"{key}.codes"] = codes
+            arrays[f"{key}.values"] = np.array(values, dtype=np.str_)
+
+        with open(target, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_fields(self, fields_file: Path, row_count: int) -> bool:
+        """
+        載入快照中的欄位索引，快照之後的列（由日誌重放）才從元數據儲存解碼
+
+        需在 rebuild 之後呼叫
+
+        Args:
+            fields_file: 持久化文件路徑
+            row_count: 文件涵蓋的列數（快照清單記錄）
+
+        Returns:
+            bool: 是否載入成功（失敗時維持第一次過濾才建立）
+        """
+        if self._store is None or row_count > self.size or not Path(fields_file).exists():
+            return False
+
+        try:
+            fields = {}
+            with np.load(fields_file, allow_pickle=False) as data:
+                for key in FIELD_INDEX_KEYS:
+                    codes = data[f"{key}.codes"]
+                    if codes.dtype != np.int32 or len(codes) != row_count:
+                        raise ValueError(f"欄位 {key} 的編號長度不符: {len(codes)} != {row_count}")
+                    fields[key] = _FieldCodes(self._capacity, codes, data[f"{key}.values"].tolist())
+        except (ValueError, KeyError, OSError) as e:
+            logger.warning(f"無法載入欄位索引: {fields_file} - {str(e)}")
+            return False
+
+        for key, field in fields.items():
+            field.decode(self._store, key, row_count, self.size)
+        self._fields = fields
+        return True
+
+    def add(self, start_id: int, metadata_list: List[Dict[str, Any]]) -> None:
+        """
+        加入連續 faiss_id 的向量
+
+        Args:
+            start_id: 第一個向量的 faiss_id
+            metadata_list: 每個向量的元數據
+        """
+        end_id = start_id + len(metadata_list)
+        self._ensure_capacity(end_id)
+        self._live[start_id:end_id] = True
+        self.size = max(self.size, end_id)
+
+        for offset, metadata in enumerate(metadata_list):
+            faiss_id = start_id + offset
+
+            knowledge_base_id = metadata.get('knowledge_base_id')
+            if isinstance(knowledge_base_id, str):
+                bitmap = self._kb_bitmaps.get(knowledge_base_id)
+                if bitmap is None:
+                    bitmap = np.zeros(self._capacity, dtype=bool)
+                    self._kb_bitmaps[knowledge_base_id] = bitmap
+                bitmap[faiss_id] = True
+
+            for key, field in self._fields.items():
+                field.set(faiss_id, metadata.get(key))
+
+    def remove(self, faiss_ids: Iterable[int]) -> None:
+        """
+        將向量標記為無效
+
+        Args:
+            faiss_ids: Faiss ID 列表
+        """
+        ids = np.asarray(list(faiss_ids), dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < self.size)]
+        self._live[ids] = False
+
+    def filter_mask(
+        self,
+        knowledge_base_ids: Optional[List[str]] = None,
+        faiss_ids: Optional[np.ndarray] = None,
+        conditions: Sequence[MetadataCondition] = ()
+    ) -> np.ndarray:
+        """
+        計算符合過濾條件的有效向量位圖
+
+        Args:
+            knowledge_base_ids: 限制的知識庫ID列表
+            faiss_ids: 限制的 faiss_id（例如由文件倒排索引解析的文件向量）
+            conditions: 元數據欄位條件（AND）
+
+        Returns:
+            np.ndarray: 長度為 size 的布林陣列
+        """
+        mask = self._live[:self.size].copy()
+
+        if knowledge_base_ids is not None:
+            mask &= self._kb_mask(knowledge_base_ids)
+
+        for condition in conditions:
+            if not mask.any():
+                break
+            if condition.field == 'knowledge_base_id':
+                mask &= self._kb_mask([kb_id for kb_id in self._kb_bitmaps if condition.matches(kb_id)])
+            else:
+                mask &= self._field(condition.field).mask(condition, self.size)
+
+        if faiss_ids is not None:
+            ids = np.asarray(faiss_ids, dtype=np.int64)
+            ids = ids[(ids >= 0) & (ids < self.size)]
+            id_mask = np.zeros(self.size, dtype=bool)
+            id_mask[ids] = True
+            mask &= id_mask
+
+        return mask
+
+    def _kb_mask(self, knowledge_base_ids: Iterable[str]) -> np.ndarray:
+        """多個知識庫位圖的聯集"""
+        kb_mask = np.zeros(self.size, dtype=bool)
+        for knowledge_base_id in knowledge_base_ids:
+            bitmap = self._kb_bitmaps.get(knowledge_base_id)
+            if bitmap is not None:
+                kb_mask |= bitmap[:self.size]
+        return kb_mask
+
+    @property
+    def live_count(self) -> int:
+        """有效向量數量"""
+        return int(np.count_nonzero(self._live[:self.size]))
+
+    @property
+    def nbytes(self) -> int:
+        """位圖與欄位編號陣列佔用的位元組數"""
+        return (
+            self._live.nbytes
+            + sum(bitmap.nbytes for bitmap in self._kb_bitmaps.values())
+            + sum(field.codes.nbytes for field in self._fields.values())
+        )
@@ -0,0 +1,159 @@
+"""
+命名空間索引常駐記憶體管理
+以 LRU 順序記錄每個已加載索引的常駐位元組數，超過記憶體上限時選出可逐出的索引，
+並統計加載延遲與逐出次數
+"""
+
+from collections import OrderedDict, deque
+from typing import List, Dict, Optional, Any, Callable
+
+
+class IndexResidencyTracker:
+    """已加載索引的 LRU 常駐記錄"""
+
+    def __init__(self, budget_bytes: Optional[int] = None, latency_window: int = 256):
+        """
+        初始化常駐記錄
+
+        Args:
+            budget_bytes: 常駐位元組上限（None 或 0 表示不限制）
+            latency_window: 計算加載延遲百分位數時保留的最近樣本數
+        """
+        self.budget_bytes = budget_bytes or None
+
+        self._resident: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._load_seconds: deque = deque(maxlen=latency_window)
+
+        self.loads = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.total_load_seconds = 0.0
+        self.max_load_seconds = 0.0
+
+    @property
+    def resident_bytes(self) -> int:
+        """目前常駐的位元組數"""
+        return sum(self._resident.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._resident
+
+    def record_load(self, name: str, nbytes: int, seconds: float) -> None:
+        """
+        記錄索引加載，加入為最近使用
+
+        Args:
+            name: 索引名稱
+            nbytes: 常駐位元組數
+            seconds: 加載耗時
+        """
+        self._resident[name] = nbytes
+        self._resident.move_to_end(name)
+        self._load_seconds.append(seconds)
+        self.loads += 1
+        self.total_load_seconds += seconds
+        self.max_load_seconds = max(self.max_load_seconds, seconds)
+
+    def touch(self, name: str, nbytes: Optional[int] = None) -> None:
+        """
+        標記索引為最近使用
+
+        Args:
+            name: 索引名稱
+            nbytes: 目前的常駐位元組數（None 表示不更新）
+        """
+        if name not in self._resident:
+            return
+        if nbytes is not None:
+            self._resident[name] = nbytes
+        self._resident.move_to_end(name)
+
+    def update_bytes(self, name: str, nbytes: int) -> None:
+        """更新常駐位元組數，不改變使用順序"""
+        if name in self._resident:
+            self._resident[name] = nbytes
+
+    def remove(self, name: str) -> None:
+        """移除索引記錄（索引已關閉或刪除）"""
+        self._resident.pop(name, None)
+        self._pins.pop(name, None)
+
+    def record_eviction(self, name: str) -> None:
+        """記錄索引被逐出"""
+        self.evicted_bytes += self._resident.get(name, 0)
+        self.evictions += 1
+        self.remove(name)
+
+    def pin(self, name: str) -> None:
+        """固定索引，固定期間不會被逐出（可重複固定）"""
+        self._pins[name] = self._pins.get(name, 0) + 1
+
+    def unpin(self, name: str) -> None:
+        """解除一次固定"""
+        count = self._pins.get(name, 0) - 1
+        if count > 0:
+            self._pins[name] = count
+        else:
+            self._pins.pop(name, None)
+
+    def is_pinned(self, name: str) -> bool:
+        """索引是否被固定"""
+        return name in self._pins
+
+    def eviction_candidates(self, is_busy: Callable[[str], bool]) -> List[str]:
+        """
+        依最久未使用的順序選出逐出後可回到上限內的索引
+
+        被固定或仍有進行中操作的索引不會被選出；全部可逐出的索引仍不足時，
+        返回所有可逐出的索引（常駐量暫時高於上限）
+
+        Args:
+            is_busy: 判斷索引是否有進行中操作（寫入、搜索或背景任務）
+
+        Returns:
+            List[str]: 應逐出的索引名稱
+        """
+        if self.budget_bytes is None:
+            return []
+
+        excess = self.resident_bytes - self.budget_bytes
+        candidates: List[str] = []
+        for name, nbytes in self._resident.items():
+            if excess <= 0:
+                break
+            if self.is_pinned(name) or is_busy(name):
+                continue
+            candidates.append(name)
+            excess -= nbytes
+        return candidates
+
+    def _load_percentile(self, percentile: float) -> float:
+        """最近加載耗時的百分位數（秒）"""
+        if not self._load_seconds:
+            return 0.0
+        ordered = sorted(self._load_seconds)
+        return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        取得常駐與加載統計
+
+        Returns:
+            Dict[str, Any]: 上限、常駐量、各索引常駐位元組、固定數、加載與逐出次數及加載延遲
+        """
+        resident_bytes = self.resident_bytes
+        return {
+            'budget_bytes': self.budget_bytes,
+            'resident_bytes': resident_bytes,
+            'over_budget': self.budget_bytes is not None and resident_bytes > self.budget_bytes,
+            'resident_indexes': len(self._resident),
+            'pinned_indexes': len(self._pins),
+            'indexes': dict(self._resident),
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes,
+            'mean_load_ms': round(self.total_load_seconds * 1000 / self.loads, 3) if self.loads else 0.0,
+            'p95_load_ms': round(self._load_percentile(0.95) * 1000, 3),
+            'max_load_ms': round(self.max_load_seconds * 1000, 3)
+        }
@@ -0,0 +1,98 @@
+"""
+向量元數據過濾表達式
+解析等值、IN 與前綴條件，由倒排位圖在距離計算前求值
+
+    {"language": "python"}                      # 等值
+    {"file_type": [".py", ".pyi"]}              # IN
+    {"document_path": {"prefix": "src/"}}       # 前綴
+    {"language": {"in": ["python", "cython"]}, "document_path": {"prefix": "src/"}}
+
+多個欄位或運算子之間為 AND
+"""
+
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Any, Tuple
+
+# 可過濾的元數據欄位
+FILTER_FIELDS = ('knowledge_base_id', 'language', 'file_type', 'document_path')
+
+# 支援的運算子
+FILTER_OPERATORS = ('eq', 'in', 'prefix')
+
+
+@dataclass(frozen=True)
+class MetadataCondition:
+    """單一欄位條件"""
+    field: str
+    operator: str
+    values: Tuple[str, ...]
+
+    def matches(self, value: Any) -> bool:
+        """
+        判斷單個欄位值是否符合條件
+
+        Args:
+            value: 欄位值（缺少時為 None，永遠不符合）
+
+        Returns:
+            bool: 是否符合
+        """
+        if not isinstance(value, str):
+            return False
+        if self.operator == 'prefix':
+            return any(value.startswith(prefix) for prefix in self.values)
+        return value in self.values
+
+
+def _string_values(field: str, operator: str, raw: Any) -> Tuple[str, ...]:
+    """驗證條件值並轉換為字串元組"""
+    values = tuple(raw) if isinstance(raw, (list, tuple, set, frozenset)) else (raw,)
+    if not values:
+        raise ValueError(f"過濾條件沒有值: {field}.{operator}")
+    if not all(isinstance(value, str) for value in values):
+        raise ValueError(f"過濾條件的值必須為字串: {field}.{operator}")
+    if operator == 'eq' and len(values) != 1:
+        raise ValueError(f"等值條件只能有一個值: {field}")
+    # IN 條件以排序後的值表示，相同集合得到相同的條件（供快取鍵使用）
+    return tuple(sorted(set(values))) if operator == 'in' else values
+
+
+def parse_metadata_filter(metadata_filter: Optional[Dict[str, Any]]) -> Tuple[MetadataCondition, ...]:
+    """
+    解析過濾表達式
+
+    Args:
+        metadata_filter: 欄位到條件的映射；條件為字串（等值）、列表（IN）
+            或 {"eq" | "in" | "prefix": 值} 映射
+
+    Returns:
+        Tuple[MetadataCondition, ...]: 依欄位與運算子排序的條件（無過濾時為空）
+
+    Raises:
+        ValueError: 表達式不合法
+    """
+    if not metadata_filter:
+        return ()
+    if not isinstance(metadata_filter, dict):
+        raise ValueError("過濾表達式必須為欄位到條件的映射")
+
+    conditions: List[MetadataCondition] = []
+    for field, spec in metadata_filter.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"不支援過濾的欄位: {field}（支援 {', '.join(FILTER_FIELDS)}）")
+
+        if isinstance(spec, dict):
+            operators = spec
+        elif isinstance(spec, (list, tuple, set, frozenset)):
+            operators = {'in': spec}
+        else:
+            operators = {'eq': spec}
+
+        if not operators:
+            raise ValueError(f"過濾條件為空: {field}")
+        for operator, raw in operators.items():
+            if operator not in FILTER_OPERATORS:
+                raise ValueError(f"不支援的過濾運算子: {operator}（支援 {', '.join(FILTER_OPERATORS)}）")
+            conditions.append(MetadataCondition(field, operator, _string_values(field, operator, raw)))
+
+    return tuple(sorted(conditions, key=lambda condition: (condition.field, condition.operator, condition.values)))
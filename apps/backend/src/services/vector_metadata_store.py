@@ -0,0 +1,564 @@
+"""
+欄式向量元數據儲存
+以定長欄位陣列加上偏移索引的字串堆儲存每個向量的元數據，定長列以記憶體映射方式讀取，
+字串堆以 pread 讀取（多個搜索執行緒同時讀取時不共用可變的映射）
+"""
+
+import os
+import json
+import uuid
+import struct
+import hashlib
+import logging
+import numpy as np
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Any, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+# 每列（每個 faiss_id）的定長欄位
+ROW_DTYPE = np.dtype([
+    ('vid_hi', '<u8'),          # vector_id (UUID) 高 64 位
+    ('vid_lo', '<u8'),          # vector_id (UUID) 低 64 位
+    ('doc_hash', '<u8'),        # document_id 雜湊，用於向量化比對
+    ('doc_offset', '<u8'),      # document_id 在字串堆中的偏移
+    ('extra_offset', '<u8'),    # 其餘元數據 JSON 在字串堆中的偏移
+    ('created_at', '<i8'),      # 建立時間（自 epoch 起的微秒）
+    ('deleted_at', '<i8'),      # 刪除時間（自 epoch 起的微秒）
+    ('doc_length', '<u4'),
+    ('extra_length', '<u4'),
+    ('chunk_index', '<i4'),
+    ('kb_code', '<i4'),         # knowledge_base_id 在字典表中的編號
+    ('flags', 'u1'),
+])
+
+FLAG_DELETED = 0x01
+
+_MISSING_INT = -1
+_MISSING_TIME = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1)
+_VECTOR_ID_NAMESPACE = uuid.UUID("6f0b5a38-8a53-4c5e-9d0e-3f1f3c1d2b7a")
+_UUID_HALVES = struct.Struct(">QQ")
+
+# vector_id 查找表：載入後新增的列先放在雜湊表，超過此比例（相對已排序的列數）時合併重排
+_VID_DELTA_RATIO = 0.25
+_VID_DELTA_MIN = 4096
+
+# 以欄位形式儲存、不進入 JSON 的元數據鍵
+_COLUMN_KEYS = {'vector_id', 'document_id', 'created_at', 'deleted', 'deleted_at',
+                'chunk_index', 'knowledge_base_id'}
+
+
+def hash_document_id(document_id: str) -> int:
+    """計算 document_id 的 64 位雜湊"""
+    digest = hashlib.blake2b(document_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _encode_vector_id(vector_id: str) -> Tuple[int, int, bool]:
+    """將 vector_id 編碼為兩個 64 位整數，非標準 UUID 以 uuid5 映射"""
+    try:
+        parsed = uuid.UUID(vector_id)
+        canonical = str(parsed) == vector_id
+    except (ValueError, AttributeError, TypeError):
+        canonical = False
+
+    if not canonical:
+        parsed = uuid.uuid5(_VECTOR_ID_NAMESPACE, str(vector_id))
+
+    hi, lo = _UUID_HALVES.unpack(parsed.bytes)
+    return hi, lo, canonical
+
+
+def _encode_time(value: Any) -> int:
+    """將 ISO 時間字串轉換為自 epoch 起的微秒"""
+    if not value:
+        return _MISSING_TIME
+    try:
+        moment = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        return _MISSING_TIME
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _decode_time(value: int) -> Optional[str]:
+    """將微秒時間轉回 ISO 字串"""
+    if value == _MISSING_TIME:
+        return None
+    return (_EPOCH + timedelta(microseconds=int(value))).isoformat()
+
+
+class VectorMetadataStore:
+    """欄式、記憶體映射的向量元數據儲存"""
+
+    def __init__(self, store_dir: Path):
+        """
+        初始化元數據儲存
+
+        Args:
+            store_dir: 儲存目錄
+        """
+        self.store_dir = Path(store_dir)
+        self.rows_file = self.store_dir / "rows.bin"
+        self.heap_file = self.store_dir / "heap.bin"
+        self.kb_table_file = self.store_dir / "knowledge_bases.json"
+
+        self.row_count = 0
+        self.heap_bytes = 0
+        self.read_only = False
+
+        self._rows_fd: Optional[int] = None
+        self._heap_fd: Optional[int] = None
+        self._rows_map: Optional[np.memmap] = None
+
+        self._kb_table: List[str] = []
+        self._kb_codes: Dict[str, int] = {}
+
+        # vector_id → faiss_id：依 (vid_hi, vid_lo) 排序的欄位（首次查找時建立）加上之後新增列的雜湊表
+        self._vid_sorted: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._vid_delta: Dict[Tuple[int, int], int] = {}
+
+    # ------------------------------------------------------------------
+    # 生命週期
+    # ------------------------------------------------------------------
+
+    def open(
+        self,
+        row_count: Optional[int] = None,
+        heap_bytes: Optional[int] = None,
+        read_only: bool = False
+    ) -> None:
+        """
+        開啟儲存文件
+
+        Args:
+            row_count: 快照記錄的列數，超出部分會被截斷（之後由日誌重放）
+            heap_bytes: 快照記錄的字串堆大小
+            read_only: 唯讀開啟，只映射快照水位內的資料且不截斷文件
+        """
+        self.close()
+        self.read_only = read_only
+        self._reset_vid_index()
+
+        if read_only:
+            self._rows_fd = os.open(self.rows_file, os.O_RDONLY)
+            self._heap_fd = os.open(self.heap_file, os.O_RDONLY)
+        else:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            self._rows_fd = os.open(self.rows_file, os.O_RDWR | os.O_CREAT, 0o644)
+            self._heap_fd = os.open(self.heap_file, os.O_RDWR | os.O_CREAT, 0o644)
+
+        rows_size = os.fstat(self._rows_fd).st_size
+        heap_size = os.fstat(self._heap_fd).st_size
+
+        self.row_count = rows_size // ROW_DTYPE.itemsize
+        self.heap_bytes = heap_size
+
+        if row_count is not None and row_count < self.row_count:
+            self.row_count = row_count
+        if heap_bytes is not None and heap_bytes < self.heap_bytes:
+            self.heap_bytes = heap_bytes
+
+        # 截斷快照之後或不完整的寫入（唯讀時由寫入程序負責）
+        if not read_only:
+            if rows_size != self.row_count * ROW_DTYPE.itemsize:
+                os.ftruncate(self._rows_fd, self.row_count * ROW_DTYPE.itemsize)
+            if heap_size != self.heap_bytes:
+                os.ftruncate(self._heap_fd, self.heap_bytes)
+
+        self._load_kb_table()
+
+    def close(self) -> None:
+        """關閉儲存文件"""
+        self._release_maps()
+        for fd in (self._rows_fd, self._heap_fd):
+            if fd is not None:
+                os.close(fd)
+        self._rows_fd = None
+        self._heap_fd = None
+
+    def flush(self) -> None:
+        """將已寫入的資料同步到磁盤"""
+        for fd in (self._rows_fd, self._heap_fd):
+            if fd is not None:
+                os.fsync(fd)
+
+    def _release_maps(self) -> None:
+        """釋放記憶體映射"""
+        # 舊的映射由仍持有引用的讀取者保持有效，不主動關閉
+        self._rows_map = None
+
+    def _load_kb_table(self) -> None:
+        """加載知識庫ID字典表"""
+        self._kb_table = []
+        if self.kb_table_file.exists():
+            with open(self.kb_table_file, 'r', encoding='utf-8') as f:
+                self._kb_table = json.load(f)
+        self._kb_codes = {kb_id: code for code, kb_id in enumerate(self._kb_table)}
+
+    def _kb_code(self, knowledge_base_id: str) -> int:
+        """取得知識庫ID的編號，新的ID會加入字典表"""
+        code = self._kb_codes.get(knowledge_base_id)
+        if code is None:
+            code = len(self._kb_table)
+            self._kb_table.append(knowledge_base_id)
+            self._kb_codes[knowledge_base_id] = code
+
+            tmp_file = self.kb_table_file.with_suffix('.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._kb_table, f, ensure_ascii=False)
+            os.replace(tmp_file, self.kb_table_file)
+        return code
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def append(self, start_id: int, metadata_list: List[Dict[str, Any]]) -> None:
+        """
+        追加連續 faiss_id 的元數據
+
+        Args:
+            start_id: 第一個向量的 faiss_id，必須等於目前列數
+            metadata_list: 元數據列表
+        """
+        if start_id != self.row_count:
+            raise ValueError(f"faiss_id 不連續: {start_id} != {self.row_count}")
+        if not metadata_list:
+            return
+
+        rows = np.zeros(len(metadata_list), dtype=ROW_DTYPE)
+        heap = bytearray()
+        heap_offset = self.heap_bytes
+
+        for i, metadata in enumerate(metadata_list):
+            row = rows[i]
+            extra = {k: v for k, v in metadata.items() if k not in _COLUMN_KEYS}
+
+            hi, lo, canonical = _encode_vector_id(metadata['vector_id'])
+            row['vid_hi'] = hi
+            row['vid_lo'] = lo
+            if not canonical:
+                extra['vector_id'] = metadata['vector_id']
+
+            document_bytes = str(metadata['document_id']).encode('utf-8')
+            row['doc_hash'] = hash_document_id(str(metadata['document_id']))
+            row['doc_offset'] = heap_offset + len(heap)
+            row['doc_length'] = len(document_bytes)
+            heap += document_bytes
+
+            row['created_at'] = _encode_time(metadata.get('created_at'))
+            row['deleted_at'] = _encode_time(metadata.get('deleted_at'))
+            if metadata.get('deleted', False):
+                row['flags'] |= FLAG_DELETED
+
+            chunk_index = metadata.get('chunk_index')
+            if isinstance(chunk_index, int) and not isinstance(chunk_index, bool) and chunk_index >= 0:
+                row['chunk_index'] = chunk_index
+            else:
+                row['chunk_index'] = _MISSING_INT
+                if chunk_index is not None:
+                    extra['chunk_index'] = chunk_index
+
+            knowledge_base_id = metadata.get('knowledge_base_id')
+            if isinstance(knowledge_base_id, str):
+                row['kb_code'] = self._kb_code(knowledge_base_id)
+            else:
+                row['kb_code'] = _MISSING_INT
+                if knowledge_base_id is not None:
+                    extra['knowledge_base_id'] = knowledge_base_id
+
+            if extra:
+                extra_bytes = json.dumps(extra, ensure_ascii=False, default=str).encode('utf-8')
+                row['extra_offset'] = heap_offset + len(heap)
+                row['extra_length'] = len(extra_bytes)
+                heap += extra_bytes
+
+        # 先寫字串堆，再寫定長列，列存在即代表其字串已完整
+        os.pwrite(self._heap_fd, bytes(heap), self.heap_bytes)
+        self.heap_bytes += len(heap)
+
+        os.pwrite(self._rows_fd, rows.tobytes(), self.row_count * ROW_DTYPE.itemsize)
+        start = self.row_count
+        self.row_count += len(rows)
+
+        if self._vid_sorted is not None:
+            for offset, (hi, lo) in enumerate(zip(rows['vid_hi'].tolist(), rows['vid_lo'].tolist())):
+                self._vid_delta.setdefault((hi, lo), start + offset)
+            if len(self._vid_delta) > max(_VID_DELTA_MIN, _VID_DELTA_RATIO * len(self._vid_sorted[2])):
+                self._build_vid_index()
+
+    def mark_deleted(self, faiss_ids: Iterable[int], deleted_at: Optional[str] = None) -> int:
+        """
+        標記向量為已刪除（就地更新定長列）
+
+        Args:
+            faiss_ids: Faiss ID 列表
+            deleted_at: 刪除時間（ISO 格式）
+
+        Returns:
+            int: 新標記的數量
+        """
+        ids = np.asarray(list(faiss_ids), dtype=np.int64)
+        ids = np.unique(ids[(ids >= 0) & (ids < self.row_count)])
+        if len(ids) == 0:
+            return 0
+
+        rows = self._rows()
+        flags = rows['flags'][ids]
+        ids = ids[(flags & FLAG_DELETED) == 0]
+
+        if len(ids) == 0:
+            return 0
+
+        # 只映射涉及的列範圍並一次向量化更新；共用映射的寫入立即對其他讀取者可見，
+        # 持久化由 flush 的 fsync 負責
+        first, last = int(ids[0]), int(ids[-1])
+        span = np.memmap(self.rows_file, dtype=ROW_DTYPE, mode='r+',
+                         offset=first * ROW_DTYPE.itemsize, shape=(last - first + 1,))
+        positions = ids - first
+        span['deleted_at'][positions] = _encode_time(deleted_at or datetime.now().isoformat())
+        span['flags'][positions] |= FLAG_DELETED
+        del span
+
+        return len(ids)
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+
+    def _rows(self) -> np.ndarray:
+        """取得定長列的記憶體映射視圖"""
+        if self.row_count == 0:
+            return np.zeros(0, dtype=ROW_DTYPE)
+        if self._rows_map is None or len(self._rows_map) < self.row_count:
+            self._rows_map = np.memmap(self.rows_file, dtype=ROW_DTYPE, mode='r',
+                                       shape=(self.row_count,))
+        return self._rows_map[:self.row_count]
+
+    def _heap(self, offset: int, length: int) -> bytes:
+        """讀取字串堆中的一段位元組（pread 不依賴共用狀態，可由多個執行緒同時呼叫）"""
+        if length == 0:
+            return b""
+        return os.pread(self._heap_fd, length, offset)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        取得單個定長欄位的唯讀視圖
+
+        Args:
+            name: 欄位名稱（ROW_DTYPE 中的欄位）
+
+        Returns:
+            np.ndarray: 長度為 row_count 的陣列
+        """
+        return self._rows()[name]
+
+    @property
+    def knowledge_base_ids(self) -> List[str]:
+        """知識庫ID字典表（索引即 kb_code）"""
+        return list(self._kb_table)
+
+    def get(self, faiss_id: int) -> Optional[Dict[str, Any]]:
+        """
+        解碼單個向量的完整元數據
+
+        Args:
+            faiss_id: Faiss ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 元數據，如果不存在則返回None
+        """
+        if faiss_id < 0 or faiss_id >= self.row_count:
+            return None
+
+        row = self._rows()[faiss_id]
+        metadata: Dict[str, Any] = {}
+
+        if row['extra_length']:
+            metadata.update(json.loads(self._heap(int(row['extra_offset']), int(row['extra_length']))))
+
+        if 'vector_id' not in metadata:
+            metadata['vector_id'] = str(uuid.UUID(bytes=_UUID_HALVES.pack(int(row['vid_hi']), int(row['vid_lo']))))
+
+        metadata['document_id'] = self._heap(int(row['doc_offset']), int(row['doc_length'])).decode('utf-8')
+
+        created_at = _decode_time(int(row['created_at']))
+        if created_at is not None:
+            metadata['created_at'] = created_at
+
+        if row['chunk_index'] != _MISSING_INT:
+            metadata['chunk_index'] = int(row['chunk_index'])
+
+        if row['kb_code'] != _MISSING_INT:
+            metadata['knowledge_base_id'] = self._kb_table[int(row['kb_code'])]
+
+        if row['flags'] & FLAG_DELETED:
+            metadata['deleted'] = True
+            deleted_at = _decode_time(int(row['deleted_at']))
+            if deleted_at is not None:
+                metadata['deleted_at'] = deleted_at
+
+        return metadata
+
+    def get_vector_id(self, faiss_id: int) -> Optional[str]:
+        """取得 faiss_id 對應的 vector_id"""
+        metadata = self.get(faiss_id)
+        return metadata['vector_id'] if metadata else None
+
+    def _reset_vid_index(self) -> None:
+        """捨棄 vector_id 查找表（重新開啟時列數可能被截斷）"""
+        self._vid_sorted = None
+        self._vid_delta = {}
+
+    def _build_vid_index(self) -> None:
+        """將所有列依 (vid_hi, vid_lo) 排序建立查找表（穩定排序，重複的 vector_id 以最小的 faiss_id 為準）"""
+        rows = self._rows()
+        his = np.array(rows['vid_hi'])
+        los = np.array(rows['vid_lo'])
+        order = np.lexsort((los, his))
+        self._vid_sorted = (his[order], los[order], order.astype(np.int64))
+        self._vid_delta = {}
+
+    def _lookup_vids(self, his: np.ndarray, los: np.ndarray) -> np.ndarray:
+        """以二分搜尋查找 (vid_hi, vid_lo) 對應的 faiss_id，不存在的為 -1"""
+        if self._vid_sorted is None:
+            self._build_vid_index()
+        sorted_his, sorted_los, sorted_ids = self._vid_sorted
+
+        result = np.full(len(his), -1, dtype=np.int64)
+        if len(sorted_ids):
+            start = np.searchsorted(sorted_his, his, side='left')
+            end = np.searchsorted(sorted_his, his, side='right')
+
+            # vid_hi 唯一時直接比對 vid_lo
+            single = np.flatnonzero(end - start == 1)
+            matched = single[sorted_los[start[single]] == los[single]]
+            result[matched] = sorted_ids[start[matched]]
+
+            # 同一 vid_hi 有多列時在其範圍內依 vid_lo 二分搜尋
+            for i in np.flatnonzero(end - start > 1).tolist():
+                position = start[i] + np.searchsorted(sorted_los[start[i]:end[i]], los[i], side='left')
+                if position < end[i] and sorted_los[position] == los[i]:
+                    result[i] = sorted_ids[position]
+
+        if self._vid_delta:
+            for i in np.flatnonzero(result < 0).tolist():
+                result[i] = self._vid_delta.get((int(his[i]), int(los[i])), -1)
+        return result
+
+    def find(self, vector_id: str) -> Optional[int]:
+        """
+        根據 vector_id 查找 faiss_id（O(log N)）
+
+        Args:
+            vector_id: 向量ID
+
+        Returns:
+            Optional[int]: Faiss ID，如果不存在則返回None
+        """
+        hi, lo, _ = _encode_vector_id(vector_id)
+        faiss_id = int(self._lookup_vids(np.array([hi], dtype=np.uint64), np.array([lo], dtype=np.uint64))[0])
+        return faiss_id if faiss_id >= 0 else None
+
+    def find_many(self, vector_ids: List[str]) -> np.ndarray:
+        """
+        批次查找多個 vector_id 的 faiss_id
+
+        Args:
+            vector_ids: 向量ID列表
+
+        Returns:
+            np.ndarray: Faiss ID 陣列，不存在的為 -1
+        """
+        keys = [_encode_vector_id(vector_id)[:2] for vector_id in vector_ids]
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+
+        his = np.array([hi for hi, _ in keys], dtype=np.uint64)
+        los = np.array([lo for _, lo in keys], dtype=np.uint64)
+        return self._lookup_vids(his, los)
+
+    def find_document(self, document_id: str, include_deleted: bool = False) -> np.ndarray:
+        """
+        查找屬於指定文件的所有 faiss_id
+
+        Args:
+            document_id: 文件ID
+            include_deleted: 是否包含已刪除的向量
+
+        Returns:
+            np.ndarray: Faiss ID 陣列
+        """
+        rows = self._rows()
+        mask = rows['doc_hash'] == hash_document_id(document_id)
+        if not include_deleted:
+            mask &= (rows['flags'] & FLAG_DELETED) == 0
+
+        candidates = np.flatnonzero(mask).astype(np.int64)
+        return candidates[self.match_document(candidates, document_id)]
+
+    def match_document(self, faiss_ids: np.ndarray, document_id: str) -> np.ndarray:
+        """
+        逐一比對字串堆中的 document_id，排除雜湊碰撞
+
+        Args:
+            faiss_ids: 候選 Faiss ID 陣列
+            document_id: 文件ID
+
+        Returns:
+            np.ndarray: 布林陣列
+        """
+        rows = self._rows()
+        expected = document_id.encode('utf-8')
+        return np.array([
+            self._heap(int(rows['doc_offset'][faiss_id]), int(rows['doc_length'][faiss_id])) == expected
+            for faiss_id in np.asarray(faiss_ids, dtype=np.int64).tolist()
+        ], dtype=bool)
+
+    def deleted_mask(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """
+        取得一組 faiss_id 的刪除標記（超出範圍視為已刪除）
+
+        Args:
+            faiss_ids: Faiss ID 陣列
+
+        Returns:
+            np.ndarray: 布林陣列
+        """
+        ids = np.asarray(faiss_ids, dtype=np.int64)
+        in_range = (ids >= 0) & (ids < self.row_count)
+        mask = np.ones(len(ids), dtype=bool)
+        if in_range.any():
+            flags = self._rows()['flags'][ids[in_range]]
+            mask[in_range] = (flags & FLAG_DELETED) != 0
+        return mask
+
+    def deleted_ids(self) -> np.ndarray:
+        """所有已標記刪除的 faiss_id"""
+        rows = self._rows()
+        return np.flatnonzero((rows['flags'] & FLAG_DELETED) != 0).astype(np.int64)
+
+    def active_count(self) -> int:
+        """未刪除的向量數量"""
+        rows = self._rows()
+        return int(np.count_nonzero((rows['flags'] & FLAG_DELETED) == 0))
+
+    def unique_document_count(self) -> int:
+        """未刪除向量涵蓋的文件數量"""
+        rows = self._rows()
+        active = (rows['flags'] & FLAG_DELETED) == 0
+        return int(np.unique(rows['doc_hash'][active]).size)
+
+    @property
+    def storage_files(self) -> List[Path]:
+        """儲存使用的文件"""
+        return [self.rows_file, self.heap_file, self.kb_table_file]
+
+    @property
+    def storage_bytes(self) -> int:
+        """定長列與字串堆已使用的位元組數（不需 stat 文件）"""
+        return self.row_count * ROW_DTYPE.itemsize + self.heap_bytes
@@ -0,0 +1,148 @@
+"""
+原始向量儲存
+以 faiss_id 為列號的定長向量文件（float16/float32），記憶體映射讀取，供取回向量、重排序與離線重建索引
+"""
+
+import os
+import logging
+import numpy as np
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ("float16", "float32")
+
+
+class RawVectorStore:
+    """以 faiss_id 定址的原始向量儲存"""
+
+    def __init__(self, store_dir: Path, dimension: int, dtype: str = "float32"):
+        """
+        初始化原始向量儲存
+
+        Args:
+            store_dir: 儲存目錄
+            dimension: 向量維度
+            dtype: 儲存精度（"float16" 或 "float32"）
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支援的向量儲存精度: {dtype}")
+
+        self.store_dir = Path(store_dir)
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.vectors_file = self.store_dir / f"vectors.{dtype}.bin"
+
+        self.row_count = 0
+        self.read_only = False
+
+        self._fd: Optional[int] = None
+        self._map: Optional[np.memmap] = None
+
+    @property
+    def row_bytes(self) -> int:
+        """每個向量佔用的位元組數"""
+        return self.dimension * self.dtype.itemsize
+
+    def open(self, row_count: Optional[int] = None, read_only: bool = False) -> None:
+        """
+        開啟儲存文件
+
+        Args:
+            row_count: 快照記錄的列數，超出部分會被截斷（之後由日誌重放）
+            read_only: 唯讀開啟，只映射快照水位內的向量且不截斷文件
+        """
+        self.close()
+        self.read_only = read_only
+
+        if read_only:
+            self._fd = os.open(self.vectors_file, os.O_RDONLY)
+        else:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.vectors_file, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+
+        self.row_count = size // self.row_bytes
+        if row_count is not None and row_count < self.row_count:
+            self.row_count = row_count
+
+        # 截斷快照之後或不完整的寫入
+        if not read_only and size != self.row_count * self.row_bytes:
+            os.ftruncate(self._fd, self.row_count * self.row_bytes)
+
+    def close(self) -> None:
+        """關閉儲存文件"""
+        self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def flush(self) -> None:
+        """將已寫入的資料同步到磁盤"""
+        if self._fd is not None:
+            os.fsync(self._fd)
+
+    def append(self, start_id: int, vectors: np.ndarray) -> None:
+        """
+        追加連續 faiss_id 的向量
+
+        Args:
+            start_id: 第一個向量的 faiss_id，必須等於目前列數
+            vectors: 向量矩陣 (n, dimension)
+        """
+        if start_id != self.row_count:
+            raise ValueError(f"faiss_id 不連續: {start_id} != {self.row_count}")
+
+        matrix = np.ascontiguousarray(vectors, dtype=self.dtype).reshape(-1, self.dimension)
+        os.pwrite(self._fd, matrix.tobytes(), self.row_count * self.row_bytes)
+        self.row_count += len(matrix)
+
+    def _vectors(self) -> np.ndarray:
+        """取得向量文件的記憶體映射視圖"""
+        if self.row_count == 0:
+            return np.zeros((0, self.dimension), dtype=self.dtype)
+        if self._map is None or len(self._map) < self.row_count:
+            self._map = np.memmap(self.vectors_file, dtype=self.dtype, mode='r',
+                                  shape=(self.row_count, self.dimension))
+        return self._map[:self.row_count]
+
+    def get(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """
+        取得一組向量
+
+        Args:
+            faiss_ids: Faiss ID 陣列
+
+        Returns:
+            np.ndarray: float32 向量矩陣 (n, dimension)
+        """
+        ids = np.asarray(faiss_ids, dtype=np.int64)
+        if len(ids) and (ids.min() < 0 or ids.max() >= self.row_count):
+            raise IndexError(f"faiss_id 超出範圍: 0..{self.row_count - 1}")
+        return self._vectors()[ids].astype(np.float32)
+
+    def get_range(self, start: int, end: int) -> np.ndarray:
+        """
+        取得連續列號的向量（直接切片記憶體映射，不做花式索引）
+
+        Args:
+            start: 起始 faiss_id
+            end: 結束 faiss_id（不含）
+
+        Returns:
+            np.ndarray: float32 向量矩陣 (end - start, dimension)
+        """
+        if start < 0 or end > self.row_count or start > end:
+            raise IndexError(f"faiss_id 範圍超出: {start}..{end} / {self.row_count}")
+        return np.asarray(self._vectors()[start:end], dtype=np.float32)
+
+    @property
+    def storage_files(self) -> List[Path]:
+        """儲存使用的文件"""
+        return [self.vectors_file]
+
+    @property
+    def storage_bytes(self) -> int:
+        """已使用的位元組數（不需 stat 文件）"""
+        return self.row_count * self.row_bytes
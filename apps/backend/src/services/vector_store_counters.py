@@ -0,0 +1,145 @@
+"""
+向量儲存計數器
+於寫入與刪除時增量維護總數、有效數、各文件及各知識庫的向量數，讀取為 O(1)
+"""
+
+import logging
+import numpy as np
+from typing import List, Dict, Any, Iterable
+
+from .vector_metadata_store import VectorMetadataStore, hash_document_id
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStoreCounters:
+    """增量維護的向量計數"""
+
+    def __init__(self):
+        """初始化計數器"""
+        self.reset()
+
+    def reset(self) -> None:
+        """清空所有計數"""
+        self.total = 0  # 已分配的 faiss_id 數量（含已刪除）
+        self.active = 0
+
+        self._document_counts: Dict[int, int] = {}
+        self._knowledge_base_counts: Dict[str, int] = {}
+
+    @property
+    def deleted(self) -> int:
+        """已刪除的向量數量"""
+        return self.total - self.active
+
+    @property
+    def document_count(self) -> int:
+        """擁有有效向量的文件數量"""
+        return len(self._document_counts)
+
+    @property
+    def knowledge_base_counts(self) -> Dict[str, int]:
+        """各知識庫的有效向量數量"""
+        return dict(self._knowledge_base_counts)
+
+    def document_vectors(self, document_id: str) -> int:
+        """
+        取得文件的有效向量數量
+
+        Args:
+            document_id: 文件ID
+
+        Returns:
+            int: 有效向量數量
+        """
+        return self._document_counts.get(hash_document_id(document_id), 0)
+
+    def knowledge_base_vectors(self, knowledge_base_id: str) -> int:
+        """
+        取得知識庫的有效向量數量
+
+        Args:
+            knowledge_base_id: 知識庫ID
+
+        Returns:
+            int: 有效向量數量
+        """
+        return self._knowledge_base_counts.get(knowledge_base_id, 0)
+
+    def rebuild(self, store: VectorMetadataStore) -> None:
+        """
+        從元數據儲存重建計數（載入時執行一次）
+
+        Args:
+            store: 元數據儲存
+        """
+        self.reset()
+        self.total = store.row_count
+        if self.total == 0:
+            return
+
+        live = ~store.deleted_mask(np.arange(self.total))
+        self.active = int(np.count_nonzero(live))
+
+        hashes, counts = np.unique(store.column('doc_hash')[live], return_counts=True)
+        self._document_counts = dict(zip(hashes.tolist(), counts.tolist()))
+
+        kb_codes = store.column('kb_code')[live]
+        kb_counts = np.bincount(kb_codes[kb_codes >= 0], minlength=len(store.knowledge_base_ids))
+        self._knowledge_base_counts = {
+            knowledge_base_id: int(count)
+            for knowledge_base_id, count in zip(store.knowledge_base_ids, kb_counts)
+            if count
+        }
+
+        logger.debug(f"重建向量計數完成: {self.active}/{self.total} 個有效向量, {self.document_count} 個文件")
+
+    def add(self, metadata_list: List[Dict[str, Any]]) -> None:
+        """
+        計入新寫入的向量
+
+        Args:
+            metadata_list: 每個向量的元數據
+        """
+        self.total += len(metadata_list)
+        self.active += len(metadata_list)
+
+        for metadata in metadata_list:
+            doc_hash = hash_document_id(str(metadata['document_id']))
+            self._document_counts[doc_hash] = self._document_counts.get(doc_hash, 0) + 1
+
+            knowledge_base_id = metadata.get('knowledge_base_id')
+            if isinstance(knowledge_base_id, str):
+                self._knowledge_base_counts[knowledge_base_id] = \
+                    self._knowledge_base_counts.get(knowledge_base_id, 0) + 1
+
+    def remove(self, store: VectorMetadataStore, faiss_ids: Iterable[int]) -> None:
+        """
+        扣除被刪除的向量
+
+        Args:
+            store: 元數據儲存（用於查詢所屬文件與知識庫）
+            faiss_ids: 本次新刪除的 Faiss ID（呼叫方需排除原本已刪除者）
+        """
+        ids = np.asarray(list(faiss_ids), dtype=np.int64)
+        if len(ids) == 0:
+            return
+
+        self.active -= len(ids)
+
+        for doc_hash in store.column('doc_hash')[ids].tolist():
+            self._decrement(self._document_counts, doc_hash)
+
+        knowledge_base_ids = store.knowledge_base_ids
+        for code in store.column('kb_code')[ids].tolist():
+            if code >= 0:
+                self._decrement(self._knowledge_base_counts, knowledge_base_ids[code])
+
+    @staticmethod
+    def _decrement(counts: Dict[Any, int], key: Any) -> None:
+        """遞減計數，歸零時移除鍵"""
+        remaining = counts.get(key, 0) - 1
+        if remaining > 0:
+            counts[key] = remaining
+        else:
+            counts.pop(key, None)
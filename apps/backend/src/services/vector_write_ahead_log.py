@@ -0,0 +1,341 @@
+"""
+向量寫前日誌（WAL）
+以僅追加的日誌段記錄向量與元數據的寫入，供 Faiss 向量資料庫啟動時重放及背景壓實
+"""
+
+import os
+import json
+import zlib
+import struct
+import logging
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+# 記錄類型
+WAL_OP_ADD = 1
+WAL_OP_DELETE = 2
+
+# 記錄標頭：魔數、類型、向量數量、維度、負載長度
+_RECORD_MAGIC = b"VWAL"
+_HEADER = struct.Struct("<4sBIIQ")
+_CRC = struct.Struct("<I")
+
+_SEGMENT_PREFIX = "segment_"
+_SEGMENT_SUFFIX = ".wal"
+_QUARANTINE_SUFFIX = ".corrupt"
+
+
+@dataclass
+class WalRecord:
+    """WAL 記錄"""
+    op: int
+    segment_id: int
+    faiss_ids: np.ndarray
+    vectors: Optional[np.ndarray] = None
+    metadata_list: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class VectorWriteAheadLog:
+    """僅追加的向量日誌段管理"""
+
+    def __init__(
+        self,
+        wal_dir: Path,
+        dimension: int,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        sync_writes: bool = False
+    ):
+        """
+        初始化向量寫前日誌
+
+        Args:
+            wal_dir: 日誌段目錄
+            dimension: 向量維度
+            segment_max_bytes: 單個日誌段的最大大小，超過後輪替
+            sync_writes: 每次追加後是否 fsync
+        """
+        self.wal_dir = Path(wal_dir)
+        self.dimension = dimension
+        self.segment_max_bytes = segment_max_bytes
+        self.sync_writes = sync_writes
+
+        self.active_segment_id = 0
+        self.pending_bytes = 0  # 尚未併入快照的日誌大小
+        self._active_file = None
+        self._active_size = 0
+
+        self.wal_dir.mkdir(parents=True, exist_ok=True)
+
+    def _segment_path(self, segment_id: int) -> Path:
+        """日誌段文件路徑"""
+        return self.wal_dir / f"{_SEGMENT_PREFIX}{segment_id:08d}{_SEGMENT_SUFFIX}"
+
+    def list_segments(self) -> List[int]:
+        """列出現有日誌段ID（升序）"""
+        segment_ids = []
+        for path in self.wal_dir.glob(f"{_SEGMENT_PREFIX}*{_SEGMENT_SUFFIX}"):
+            try:
+                segment_ids.append(int(path.stem[len(_SEGMENT_PREFIX):]))
+            except ValueError:
+                logger.warning(f"忽略無法識別的日誌段: {path.name}")
+        return sorted(segment_ids)
+
+    def _quarantined_segments(self) -> List[int]:
+        """列出已隔離的日誌段ID"""
+        segment_ids = []
+        for path in self.wal_dir.glob(f"{_SEGMENT_PREFIX}*{_SEGMENT_SUFFIX}{_QUARANTINE_SUFFIX}*"):
+            try:
+                segment_ids.append(int(path.name[len(_SEGMENT_PREFIX):].split(".", 1)[0]))
+            except ValueError:
+                continue
+        return segment_ids
+
+    def open(self, checkpoint: int = 0) -> None:
+        """
+        開啟新的活動日誌段
+
+        Args:
+            checkpoint: 已併入基礎快照的最後日誌段ID
+        """
+        existing = self.list_segments()
+        self.pending_bytes = sum(
+            self._segment_path(segment_id).stat().st_size
+            for segment_id in existing if segment_id > checkpoint
+        )
+        # 新日誌段ID也需大於已隔離的日誌段，避免重複使用
+        self.active_segment_id = max([checkpoint] + existing + self._quarantined_segments()) + 1
+        self._open_active()
+
+    def _open_active(self) -> None:
+        """開啟活動日誌段文件"""
+        path = self._segment_path(self.active_segment_id)
+        self._active_file = open(path, 'ab')
+        self._active_size = self._active_file.tell()
+
+    def close(self) -> None:
+        """關閉活動日誌段"""
+        if self._active_file is not None:
+            self._active_file.flush()
+            os.fsync(self._active_file.fileno())
+            self._active_file.close()
+            self._active_file = None
+
+    def append_add(
+        self,
+        faiss_ids: np.ndarray,
+        vectors: np.ndarray,
+        metadata_list: List[Dict[str, Any]]
+    ) -> None:
+        """
+        追加新增向量記錄
+
+        Args:
+            faiss_ids: Faiss ID 陣列
+            vectors: 已正規化的向量矩陣 (n, dimension)
+            metadata_list: 每個向量的元數據
+        """
+        ids = np.ascontiguousarray(faiss_ids, dtype=np.int64)
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)
+        metadata_bytes = json.dumps(metadata_list, ensure_ascii=False, default=str).encode('utf-8')
+
+        payload = ids.tobytes() + matrix.tobytes() + metadata_bytes
+        self._append(WAL_OP_ADD, len(ids), payload)
+
+    def append_delete(
+        self,
+        faiss_ids: np.ndarray,
+        metadata_list: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """
+        追加刪除向量記錄
+
+        Args:
+            faiss_ids: 被刪除的 Faiss ID 陣列
+            metadata_list: 刪除時需保存的元數據（如刪除時間），整筆記錄共用，不需逐個ID重複
+        """
+        ids = np.ascontiguousarray(faiss_ids, dtype=np.int64)
+        metadata_bytes = json.dumps(metadata_list or [], ensure_ascii=False, default=str).encode('utf-8')
+
+        payload = ids.tobytes() + metadata_bytes
+        self._append(WAL_OP_DELETE, len(ids), payload)
+
+    def _append(self, op: int, count: int, payload: bytes) -> None:
+        """寫入一筆記錄並視需要輪替日誌段"""
+        if self._active_file is None:
+            raise RuntimeError("WAL 尚未開啟")
+
+        header = _HEADER.pack(_RECORD_MAGIC, op, count, self.dimension, len(payload))
+        crc = _CRC.pack(zlib.crc32(payload) & 0xFFFFFFFF)
+
+        self._active_file.write(header + payload + crc)
+        self._active_file.flush()
+        if self.sync_writes:
+            os.fsync(self._active_file.fileno())
+
+        record_size = _HEADER.size + len(payload) + _CRC.size
+        self._active_size += record_size
+        self.pending_bytes += record_size
+
+        if self._active_size >= self.segment_max_bytes:
+            self.rotate()
+
+    def rotate(self) -> int:
+        """
+        封存活動日誌段並開啟新段
+
+        Returns:
+            int: 被封存的日誌段ID
+        """
+        sealed_id = self.active_segment_id
+        self.close()
+        self.active_segment_id += 1
+        self._open_active()
+        return sealed_id
+
+    def truncate_through(self, segment_id: int) -> int:
+        """
+        刪除已併入快照的日誌段
+
+        Args:
+            segment_id: 刪除此ID（含）之前的所有封存日誌段
+
+        Returns:
+            int: 刪除的日誌段數量
+        """
+        removed = 0
+        for existing_id in self.list_segments():
+            if existing_id > segment_id or existing_id == self.active_segment_id:
+                continue
+            path = self._segment_path(existing_id)
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self.pending_bytes = max(0, self.pending_bytes - size)
+            removed += 1
+        return removed
+
+    def reset(self, checkpoint: int = 0) -> None:
+        """
+        捨棄所有日誌段（例如從備份恢復後）
+
+        Args:
+            checkpoint: 新基礎快照的檢查點，新日誌段ID從其後開始
+        """
+        self.close()
+        for existing_id in self.list_segments():
+            self._segment_path(existing_id).unlink()
+        self.pending_bytes = 0
+        self.active_segment_id = checkpoint + 1
+        self._open_active()
+
+    def replay(self, after_segment: int = 0) -> Iterator[WalRecord]:
+        """
+        依序重放檢查點之後的日誌記錄
+
+        Args:
+            after_segment: 已併入快照的最後日誌段ID
+
+        Yields:
+            WalRecord: 日誌記錄
+        """
+        segment_ids = [segment_id for segment_id in self.list_segments() if segment_id > after_segment]
+        for position, segment_id in enumerate(segment_ids):
+            intact = yield from self._read_segment(segment_id)
+            if not intact:
+                # 損壞之後的記錄不可套用，否則重放不連續（序號缺口、刪除不存在的向量）
+                for later_id in segment_ids[position + 1:]:
+                    self._quarantine(later_id)
+                return
+
+    def _quarantine(self, segment_id: int) -> None:
+        """將日誌段改名隔離，不再重放也不會被截斷刪除"""
+        path = self._segment_path(segment_id)
+        target = path.with_name(path.name + _QUARANTINE_SUFFIX)
+        suffix = 1
+        while target.exists():
+            target = path.with_name(f"{path.name}{_QUARANTINE_SUFFIX}{suffix}")
+            suffix += 1
+        os.replace(path, target)
+        self.pending_bytes = max(0, self.pending_bytes - target.stat().st_size)
+        logger.warning(f"日誌段 {path.name} 位於損壞記錄之後，已隔離為 {target.name}")
+
+    def _read_segment(self, segment_id: int) -> Iterator[WalRecord]:
+        """
+        讀取單個日誌段，遇到損壞的記錄時截斷該段其後的內容
+
+        Yields:
+            WalRecord: 日誌記錄
+
+        Returns:
+            bool: 日誌段是否完整（沒有損壞的記錄）
+        """
+        path = self._segment_path(segment_id)
+        valid_offset = 0
+
+        with open(path, 'rb') as f:
+            while True:
+                header_bytes = f.read(_HEADER.size)
+                if not header_bytes:
+                    break
+
+                record = None
+                if len(header_bytes) == _HEADER.size:
+                    magic, op, count, dimension, payload_len = _HEADER.unpack(header_bytes)
+                    payload = f.read(payload_len)
+                    crc_bytes = f.read(_CRC.size)
+
+                    if (magic == _RECORD_MAGIC and
+                            len(payload) == payload_len and
+                            len(crc_bytes) == _CRC.size and
+                            _CRC.unpack(crc_bytes)[0] == (zlib.crc32(payload) & 0xFFFFFFFF)):
+                        try:
+                            record = self._decode(op, count, dimension, payload, segment_id)
+                        except ValueError:
+                            record = None
+
+                if record is None:
+                    logger.warning(f"日誌段 {path.name} 在偏移 {valid_offset} 處損壞，截斷尾部")
+                    break
+
+                valid_offset = f.tell()
+                yield record
+
+        if valid_offset < path.stat().st_size:
+            with open(path, 'r+b') as f:
+                f.truncate(valid_offset)
+            return False
+        return True
+
+    @staticmethod
+    def _decode(op: int, count: int, dimension: int, payload: bytes, segment_id: int) -> WalRecord:
+        """解碼記錄負載"""
+        ids_size = count * 8
+        faiss_ids = np.frombuffer(payload, dtype=np.int64, count=count)
+
+        if op == WAL_OP_ADD:
+            vectors_size = count * dimension * 4
+            vectors = np.frombuffer(
+                payload, dtype=np.float32, count=count * dimension, offset=ids_size
+            ).reshape(count, dimension)
+            metadata_list = json.loads(payload[ids_size + vectors_size:].decode('utf-8'))
+            return WalRecord(op, segment_id, faiss_ids, vectors, metadata_list)
+
+        metadata_list = json.loads(payload[ids_size:].decode('utf-8'))
+        return WalRecord(op, segment_id, faiss_ids, None, metadata_list)
+
+    @property
+    def total_bytes(self) -> int:
+        """所有日誌段的總大小"""
+        total = 0
+        for segment_id in self.list_segments():
+            try:
+                total += self._segment_path(segment_id).stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
@@ -0,0 +1,128 @@
+"""
+單筆向量寫入合併
+將同時進行的 store_vector 呼叫合併為小批次寫入，每個呼叫者經由 Future 取得自己的向量ID
+
+採用群組提交：沒有寫入進行中時立即寫入（或等待 delay 秒累積更多請求）；
+寫入進行中時新的請求持續累積，前一批完成後立即作為下一批寫入，單批不超過 max_batch 筆
+"""
+
+import asyncio
+import logging
+import numpy as np
+from typing import List, Dict, Optional, Any, Tuple, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+BatchWriter = Callable[[np.ndarray, List[str], List[Dict[str, Any]]], Awaitable[List[str]]]
+
+
+class VectorWriteCoalescer:
+    """單筆向量寫入的合併緩衝區"""
+
+    def __init__(self, write_batch: BatchWriter, max_batch: int = 256, delay: float = 0.0):
+        """
+        初始化寫入合併
+
+        Args:
+            write_batch: 批次寫入函數，接收 (n, dimension) 矩陣、文件ID與元數據列表，返回向量ID列表
+            max_batch: 單批最多合併的請求數
+            delay: 沒有寫入進行中時等待更多請求的秒數（0 表示立即寫入，只合併寫入期間到達的請求）
+        """
+        self.write_batch = write_batch
+        self.max_batch = max(1, max_batch)
+        self.delay = delay
+
+        self._pending: List[Tuple[np.ndarray, str, Dict[str, Any], asyncio.Future]] = []
+        self._scheduled: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.coalesced_writes = 0
+
+    @property
+    def pending(self) -> int:
+        """等待寫入的請求數"""
+        return len(self._pending)
+
+    @property
+    def idle(self) -> bool:
+        """沒有等待中或進行中的寫入"""
+        return not self._pending and self._in_flight is None
+
+    async def submit(self, embedding: np.ndarray, document_id: str, metadata: Dict[str, Any]) -> str:
+        """
+        加入一筆寫入並等待其所在批次完成
+
+        Args:
+            embedding: 向量（已驗證維度）
+            document_id: 文件ID
+            metadata: 元數據
+
+        Returns:
+            str: 向量ID
+
+        Raises:
+            Exception: 所在批次寫入失敗時的錯誤
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((embedding, document_id, metadata, future))
+
+        if self._in_flight is None:
+            loop = asyncio.get_running_loop()
+            if len(self._pending) >= self.max_batch:
+                # 達到批次大小時不再等待
+                if self._scheduled is not None:
+                    self._scheduled.cancel()
+                self._scheduled = loop.call_soon(self._start_next)
+            elif self._scheduled is None:
+                if self.delay > 0:
+                    self._scheduled = loop.call_later(self.delay, self._start_next)
+                else:
+                    # 閒置時立即寫入，寫入期間到達的請求合併為下一批
+                    self._start_next()
+
+        # 呼叫者取消時寫入仍會完成，只是不再等待結果
+        return await asyncio.shield(future)
+
+    def _start_next(self) -> None:
+        """取出最多 max_batch 筆請求並開始寫入"""
+        self._scheduled = None
+        if self._in_flight is not None or not self._pending:
+            return
+
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        self._in_flight = asyncio.create_task(self._write(batch))
+
+    async def _write(self, batch: List[Tuple[np.ndarray, str, Dict[str, Any], asyncio.Future]]) -> None:
+        """寫入一批請求並將結果分派給各呼叫者"""
+        try:
+            vectors = np.stack([np.asarray(embedding, dtype=np.float32) for embedding, _, _, _ in batch])
+            vector_ids = await self.write_batch(
+                vectors, [document_id for _, document_id, _, _ in batch], [metadata for _, _, metadata, _ in batch]
+            )
+            for (_, _, _, future), vector_id in zip(batch, vector_ids):
+                if not future.done():
+                    future.set_result(vector_id)
+            self.batches += 1
+            self.coalesced_writes += len(batch)
+        except Exception as e:
+            logger.error(f"合併寫入 {len(batch)} 個向量失敗: {str(e)}")
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight = None
+            if self._pending:
+                self._start_next()
+
+    async def drain(self) -> None:
+        """寫入所有等待中的請求並等待完成（關閉前呼叫）"""
+        while True:
+            if self._in_flight is None:
+                if self._scheduled is not None:
+                    self._scheduled.cancel()
+                self._start_next()
+            if self._in_flight is None:
+                return
+            await asyncio.gather(self._in_flight, return_exceptions=True)